@@ -0,0 +1,368 @@
+"""Remote worker agent (`tg-copier agent`): runs Telegram workers on this node for the accounts the
+API assigns to it, so workers are no longer limited to the API host.
+
+The agent polls POST /api/agents/heartbeat every WORKER_HEARTBEAT_SECONDS (sooner after a worker
+exits) with its capacity, its running workers and the ones that exited. The API renews the
+running workers' leases on that heartbeat and answers with new assignments and the workers to
+stop. For an assignment the agent downloads the session file, a JSON mappings snapshot and any
+replacement media, then cold-starts `db run-worker --mappings-snapshot` locally. Stopping is the
+usual SIGTERM drain.
+
+Workers hold their lease only through the agent's heartbeats. If the API cannot be reached for
+a lease TTL, the agent stops its workers: by then the API may have placed those accounts on
+another agent. Auth is the shared AGENT_TOKEN as a bearer token plus the agent's own key, issued on
+its first heartbeat and kept in `work_dir`/agent.key; plain HTTP polling, so the agent needs
+nothing beyond the standard library. Use an https:// API URL: the API only hands session files to
+agents over HTTPS unless AGENT_ALLOW_HTTP is set.
+
+Workers write their runtime heartbeat (app.db.worker_heartbeats) to this node's SQLite; the agent
+reads it from `stats_db` and forwards it with each running worker. Profile requests for its
+workers (app.db.worker_profiles) go the same way: the agent copies them into `stats_db` and sends
+the finished profiles back with its next heartbeat. The workers also queue their message index
+rows (MESSAGE_INDEX_RELAY, app.db.message_index), which the agent relays the same way.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import ipaddress
+import logging
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+from urllib.parse import urlencode, urlsplit
+
+from app.db import agents, message_index, worker_heartbeats, worker_profiles
+from app.worker_drain import EXIT_OK
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT_SECONDS = 30.0
+POLL_SECONDS = 0.5  # how often worker exits are checked between heartbeats
+STOP_GRACE_SECONDS = 5.0  # beyond the drain deadline, as in the API's supervisor
+DEFAULT_HEARTBEAT_SECONDS = 5.0  # until the API's first reply says otherwise
+DEFAULT_LEASE_TTL_SECONDS = 30.0
+DEFAULT_DRAIN_TIMEOUT_SECONDS = 20.0
+
+
+class AgentApiError(Exception):
+    """The API could not be reached or rejected a request."""
+
+
+class ApiClient:
+    """Minimal JSON client for the agent endpoints (urllib, blocking)."""
+
+    def __init__(self, base_url: str, token: str, timeout: float = REQUEST_TIMEOUT_SECONDS) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.agent_key: str | None = None  # sent once the API has issued it
+
+    def _open(self, method: str, path: str, body: Any = None, params: dict | None = None):
+        url = self.base_url + path + (f"?{urlencode(params)}" if params else "")
+        headers = {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
+        if self.agent_key:
+            headers[agents.KEY_HEADER] = self.agent_key
+        req = urllib.request.Request(
+            url,
+            data=json.dumps(body).encode() if body is not None else None,
+            method=method,
+            headers=headers,
+        )
+        try:
+            return urllib.request.urlopen(req, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", "replace")[:200]
+            raise AgentApiError(f"{method} {path}: HTTP {e.code} {detail}") from e
+        except OSError as e:
+            raise AgentApiError(f"{method} {path}: {e}") from e
+
+    def request(self, method: str, path: str, body: Any = None, params: dict | None = None) -> Any:
+        with self._open(method, path, body, params) as resp:
+            return json.loads(resp.read() or b"null")
+
+    def download(self, path: str, dest: Path, params: dict | None = None) -> None:
+        with self._open("GET", path, params=params) as resp, open(dest, "wb") as f:
+            shutil.copyfileobj(resp, f)
+
+
+def spawn_worker_process(cmd: list[str], log_path: Path) -> subprocess.Popen:
+    """Cold-start a worker with stderr in log_path (the API's non-zygote path). The worker queues its
+    message index rows for the agent to relay."""
+    with open(log_path, "w", encoding="utf-8") as stderr_handle:
+        return subprocess.Popen(
+            cmd,
+            env={**os.environ, "MESSAGE_INDEX_RELAY": "1"},
+            stdout=subprocess.DEVNULL,
+            stderr=stderr_handle,
+            stdin=subprocess.DEVNULL,
+            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0,
+        )
+
+
+@dataclass(slots=True)
+class _Worker:
+    worker_id: str
+    account_id: int
+    generation: int
+    process: Any  # subprocess.Popen or anything with pid/poll/terminate/kill
+    stop_deadline: float | None = None
+
+
+class Agent:
+    def __init__(
+        self,
+        api: ApiClient,
+        agent_id: str,
+        capacity: int,
+        work_dir: Path,
+        host_id: str | None = None,
+        spawn: Callable[[list[str], Path], Any] = spawn_worker_process,
+        drain_timeout: float = DEFAULT_DRAIN_TIMEOUT_SECONDS,
+        stats_db: str | None = None,
+    ) -> None:
+        self.api = api
+        self.agent_id = agent_id
+        self.capacity = capacity
+        self.work_dir = Path(work_dir)
+        self.host_id = host_id or socket.gethostname()
+        self.spawn = spawn
+        self.drain_timeout = drain_timeout
+        self.stats_db = stats_db
+        self.heartbeat_seconds = DEFAULT_HEARTBEAT_SECONDS
+        self.lease_ttl_seconds = DEFAULT_LEASE_TTL_SECONDS
+        self.workers: dict[str, _Worker] = {}
+        self._exited: list[dict[str, Any]] = []
+        self._last_ok = time.monotonic()
+        self._traces_since = time.time()
+        for sub in ("sessions", "snapshots", "media", "logs"):
+            (self.work_dir / sub).mkdir(parents=True, exist_ok=True)
+        key_path = self.work_dir / "agent.key"
+        if key_path.is_file():
+            self.api.agent_key = key_path.read_text(encoding="utf-8").strip() or None
+
+    # --- workers ------------------------------------------------------------------------------
+
+    def _reap(self) -> bool:
+        """Collect exited workers and kill those past their drain deadline. True if any exited."""
+        now = time.monotonic()
+        reaped = False
+        for wid, w in list(self.workers.items()):
+            code = w.process.poll()
+            if code is None:
+                if w.stop_deadline is not None and now > w.stop_deadline:
+                    logger.warning("Worker %s did not drain in time; killing pid=%s", wid, w.process.pid)
+                    w.process.kill()
+                continue
+            del self.workers[wid]
+            reaped = True
+            self._exited.append(
+                {"worker_id": wid, "account_id": w.account_id, "generation": w.generation, "exit_code": code}
+            )
+            log = logger.info if code in (EXIT_OK, -signal.SIGTERM) else logger.warning
+            log("Worker %s (account_id=%s) exited with status %s", wid, w.account_id, code)
+        return reaped
+
+    def _stop(self, worker_id: str) -> None:
+        w = self.workers.get(worker_id)
+        if w is None or w.stop_deadline is not None:
+            return
+        logger.info("Stopping worker %s (account_id=%s)", worker_id, w.account_id)
+        w.stop_deadline = time.monotonic() + self.drain_timeout + STOP_GRACE_SECONDS
+        w.process.terminate()
+
+    def _fail(self, a: dict[str, Any], error: str) -> None:
+        logger.warning("Could not start worker %s: %s", a["worker_id"], error)
+        self._exited.append({
+            "worker_id": a["worker_id"], "account_id": a["account_id"], "generation": a["generation"], "error": error,
+        })
+
+    def _start(self, a: dict[str, Any]) -> None:
+        """Fetch an assignment's session, mappings and media, then spawn its worker."""
+        wid = a["worker_id"]
+        params = {"agent_id": self.agent_id}
+        bundle = self.api.request("GET", f"/api/agents/assignments/{wid}", params=params)
+        session_path = self.work_dir / "sessions" / f"account_{bundle['account_id']}.session"
+        session_path.write_bytes(base64.b64decode(bundle["session"]))
+        mappings = bundle["mappings"]
+        for m in mappings:
+            for t in m.get("transforms", []):
+                asset_id = t.get("replacement_media_asset_id")
+                if not asset_id or not t.get("replacement_media_asset_path"):
+                    continue
+                dest = self.work_dir / "media" / f"{asset_id}{Path(t['replacement_media_asset_path']).suffix}"
+                if not dest.exists():
+                    self.api.download(f"/api/agents/assignments/{wid}/media/{asset_id}", dest, params=params)
+                t["replacement_media_asset_path"] = str(dest.resolve())
+        snapshot_path = self.work_dir / "snapshots" / f"{wid}.json"
+        snapshot_path.write_text(json.dumps(mappings), encoding="utf-8")
+        cmd = [
+            sys.executable, "-m", "app.main",
+            "db", "run-worker",
+            str(bundle["user_id"]),
+            str(session_path.resolve()),
+            "--account-id", str(bundle["account_id"]),
+            "--mappings-snapshot", str(snapshot_path.resolve()),
+        ]
+        proc = self.spawn(cmd, self.work_dir / "logs" / f"worker_{bundle['account_id']}_{wid}.log")
+        self.workers[wid] = _Worker(wid, bundle["account_id"], bundle["generation"], proc)
+        logger.info("Started worker %s for account_id=%s pid=%s", wid, bundle["account_id"], proc.pid)
+
+    def _relay_profiles(self, requests: list[dict[str, Any]], reported: list[str]) -> None:
+        """Queue the API's profile requests for the node's workers; drop results it has received."""
+        if not self.stats_db:
+            if requests:
+                logger.warning("Profile requests ignored: the agent has no worker database (stats_db)")
+            return
+        try:
+            worker_profiles.forget_on_node(self.stats_db, reported)
+            worker_profiles.copy_to_node(self.stats_db, requests)
+        except sqlite3.Error as e:
+            logger.warning("Could not relay profile requests: %s", e)
+
+    def _save_key(self, key: str) -> None:
+        """Keep the key the API issued on the first heartbeat; without it the agent_id is locked out."""
+        key_path = self.work_dir / "agent.key"
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(key)
+        self.api.agent_key = key
+        logger.info("Agent %s registered; key saved to %s", self.agent_id, key_path)
+
+    # --- heartbeat loop -----------------------------------------------------------------------
+
+    def heartbeat(self, capacity: int | None = None) -> bool:
+        """One heartbeat round trip. Returns False if the API could not be reached."""
+        self._reap()
+        exited = list(self._exited)
+        stats = {}
+        profiles: list[dict[str, Any]] = []
+        index_rows: list[dict[str, Any]] = []
+        read_at = time.time()
+        if self.stats_db and self.workers:
+            stats = worker_heartbeats.read_local(
+                self.stats_db, [w.account_id for w in self.workers.values()], traces_since=self._traces_since
+            )
+        if self.stats_db:
+            profiles = worker_profiles.finished_on_node(self.stats_db)
+            index_rows = message_index.outbox_on_node(self.stats_db)
+        body = {
+            "agent_id": self.agent_id,
+            "host_id": self.host_id,
+            "capacity": self.capacity if capacity is None else capacity,
+            "running": [
+                {
+                    "worker_id": w.worker_id, "account_id": w.account_id, "generation": w.generation,
+                    "pid": w.process.pid, "stats": stats.get(w.account_id),
+                }
+                for w in self.workers.values()
+            ],
+            "exited": exited,
+            "profiles": profiles,
+            "message_index": index_rows,
+        }
+        try:
+            reply = self.api.request("POST", "/api/agents/heartbeat", body)
+        except AgentApiError as e:
+            logger.warning("Agent heartbeat failed: %s", e)
+            if self.workers and time.monotonic() - self._last_ok > self.lease_ttl_seconds:
+                # The leases have expired by now; the API may already run these accounts elsewhere.
+                for wid in list(self.workers):
+                    self._stop(wid)
+            return False
+        self._last_ok = time.monotonic()
+        if reply.get("agent_key"):
+            self._save_key(reply["agent_key"])
+        if index_rows:
+            try:
+                message_index.forget_relayed_on_node(self.stats_db, index_rows[-1]["id"])
+            except sqlite3.Error as e:
+                logger.warning("Could not drop relayed message index rows: %s", e)
+        # Workers store a trace up to one heartbeat after it started; the overlap is resent and
+        # ignored by the API (trace ids are unique).
+        self._traces_since = read_at - 2 * self.heartbeat_seconds
+        del self._exited[: len(exited)]
+        self.heartbeat_seconds = float(reply.get("heartbeat_seconds") or self.heartbeat_seconds)
+        self.lease_ttl_seconds = float(reply.get("lease_ttl_seconds") or self.lease_ttl_seconds)
+        for wid in reply.get("stop", []):
+            self._stop(wid)
+        self._relay_profiles(reply.get("profiles", []), [p["id"] for p in profiles])
+        pending = {e["worker_id"] for e in self._exited}
+        for a in reply.get("assignments", []):
+            if a["worker_id"] in self.workers or a["worker_id"] in pending:
+                continue
+            try:
+                self._start(a)
+            except (AgentApiError, OSError, KeyError, ValueError) as e:
+                self._fail(a, str(e))
+        return True
+
+    def _wait(self, stop: threading.Event, seconds: float) -> None:
+        """Sleep until the next heartbeat, a worker exit (reported right away) or stop."""
+        deadline = time.monotonic() + seconds
+        while not stop.is_set() and time.monotonic() < deadline:
+            if self._reap():
+                return
+            stop.wait(min(POLL_SECONDS, max(0.0, deadline - time.monotonic())))
+
+    def shutdown(self) -> None:
+        """Drain every worker, then report the exits with zero capacity (no new assignments)."""
+        for wid in list(self.workers):
+            self._stop(wid)
+        while self.workers:
+            self._reap()
+            time.sleep(POLL_SECONDS / 5)
+        self.heartbeat(capacity=0)
+
+    def run(self, stop: threading.Event) -> None:
+        logger.info(
+            "Agent %s on %s serving up to %d workers from %s", self.agent_id, self.host_id, self.capacity, self.api.base_url
+        )
+        while not stop.is_set():
+            self.heartbeat()
+            self._wait(stop, self.heartbeat_seconds)
+        logger.info("Agent %s stopping %d worker(s)", self.agent_id, len(self.workers))
+        self.shutdown()
+
+
+def _is_plain_http_to_remote(api_url: str) -> bool:
+    parts = urlsplit(api_url)
+    if parts.scheme != "http":
+        return False
+    if parts.hostname == "localhost":
+        return False
+    try:
+        return not ipaddress.ip_address(parts.hostname or "").is_loopback
+    except ValueError:
+        return True
+
+
+def run_agent(
+    api_url: str, token: str, agent_id: str, capacity: int, work_dir: str, drain_timeout: float, stats_db: str
+) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    if _is_plain_http_to_remote(api_url):
+        logger.warning(
+            "API URL %s is plain HTTP: the token, agent key and session files travel unencrypted, and the "
+            "API refuses session bundles unless AGENT_ALLOW_HTTP=true",
+            api_url,
+        )
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+    agent = Agent(
+        ApiClient(api_url, token), agent_id, capacity, Path(work_dir), drain_timeout=drain_timeout, stats_db=stats_db
+    )
+    agent.run(stop)
@@ -1,9 +1,29 @@
-"""Password hashing utilities using bcrypt directly."""
+"""Password hashing utilities using bcrypt directly.
+
+bcrypt is deliberately slow (~100-300 ms per call), so async code must use hash_password_async /
+verify_password_async: they run on a small dedicated thread pool (bcrypt releases the GIL) and
+raise PasswordHasherBusy instead of queueing without bound when too many are already in flight.
+"""
 
 from __future__ import annotations
 
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
 
+from app.config import settings
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password hash/verify operations are already queued; retry shortly."""
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_in_flight = 0
+
 
 def hash_password(password: str) -> str:
     # bcrypt has a 72-byte limit; truncate to avoid errors
@@ -19,3 +39,61 @@ def verify_password(plain: str, hashed: str | None) -> bool:
         return bcrypt.checkpw(pw_bytes, hashed.encode("ascii"))
     except (ValueError, TypeError):
         return False
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.password_hash_workers),
+                thread_name_prefix="bcrypt",
+            )
+        return _executor
+
+
+def _release(_future) -> None:
+    global _in_flight
+    with _executor_lock:
+        _in_flight -= 1
+
+
+async def _run_bounded(fn, *args):
+    """Run fn on the bcrypt pool. The slot is held until the thread finishes, even if the awaiting
+    request is cancelled, so the limit reflects real CPU work."""
+    global _in_flight
+    executor = _get_executor()
+    limit = settings.password_hash_max_pending
+    with _executor_lock:
+        if limit > 0 and _in_flight >= limit:
+            raise PasswordHasherBusy("Too many concurrent password operations")
+        _in_flight += 1
+    try:
+        future = executor.submit(fn, *args)
+    except BaseException:
+        _release(None)
+        raise
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_bounded(hash_password, password)
+
+
+async def verify_password_async(plain: str, hashed: str | None) -> bool:
+    if hashed is None:
+        return False
+    return await _run_bounded(verify_password, plain, hashed)
+
+
+def password_ops_in_flight() -> int:
+    return _in_flight
+
+
+def shutdown_password_executor() -> None:
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,78 @@
+"""In-process caches for request authentication: verified access tokens and user principals.
+
+Tokens are memoized by signature until they expire, so repeat requests skip JWT verification.
+Principals (the users row returned by get_current_user) are cached per user id for a short TTL and
+invalidated immediately when the row changes in this process; the TTL bounds staleness for
+changes made elsewhere (CLI, another API process).
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+
+from app.auth.jwt import decode_token
+from app.config import settings
+
+TOKEN_MEMO_MAX = 10_000
+
+# signature -> (signing input "header.payload", payload)
+_tokens: OrderedDict[str, tuple[str, dict]] = OrderedDict()
+# user_id -> (expires_at monotonic, principal)
+_principals: dict[int, tuple[float, dict]] = {}
+# Bumped on every invalidation; a load that started before an invalidation is not cached.
+_versions: dict[int, int] = {}
+
+
+def decode_access_token(token: str) -> dict | None:
+    """decode_token() with a memo keyed by signature; entries are dropped once the token expires."""
+    signing_input, _, signature = token.rpartition(".")
+    hit = _tokens.get(signature)
+    if hit is not None and hit[0] == signing_input:
+        payload = hit[1]
+        exp = payload.get("exp")
+        if exp is None or time.time() < exp:
+            _tokens.move_to_end(signature)
+            return payload
+        del _tokens[signature]
+    payload = decode_token(token)
+    if payload is not None and signature:
+        _tokens[signature] = (signing_input, payload)
+        if len(_tokens) > TOKEN_MEMO_MAX:
+            _tokens.popitem(last=False)
+    return payload
+
+
+def principal_version(user_id: int) -> int:
+    return _versions.get(user_id, 0)
+
+
+def get_cached_principal(user_id: int) -> dict | None:
+    entry = _principals.get(user_id)
+    if entry is None:
+        return None
+    expires_at, principal = entry
+    if time.monotonic() >= expires_at:
+        _principals.pop(user_id, None)
+        return None
+    return dict(principal)
+
+
+def cache_principal(user_id: int, principal: dict, version: int) -> None:
+    """Store a principal loaded from the DB, unless the row was invalidated while it was loading."""
+    ttl = settings.auth_principal_cache_ttl_seconds
+    if ttl <= 0 or principal_version(user_id) != version:
+        return
+    _principals[user_id] = (time.monotonic() + ttl, dict(principal))
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Call after any change to a users row (profile, role, status, password)."""
+    _versions[user_id] = principal_version(user_id) + 1
+    _principals.pop(user_id, None)
+
+
+def clear_auth_caches() -> None:
+    _tokens.clear()
+    _principals.clear()
+    _versions.clear()
@@ -6,6 +6,7 @@ import typer
 
 from app.config import settings
 from app.db.sqlite import init_sqlite
+from app.utils import startup_profile
 
 
 cli = typer.Typer(help="Telegram Client Copier CLI")
@@ -70,15 +71,36 @@ def run_worker(
     user_id: int,
     session_path: str,
     account_id: int | None = typer.Option(None, help="Telegram account ID (filters mappings)"),
+    lease_generation: int | None = typer.Option(
+        None, help="Worker lease generation claimed by the API; the worker heartbeats it and exits when it is lost"
+    ),
+    mappings_snapshot: str | None = typer.Option(
+        None, help="JSON mappings snapshot to run instead of reading mappings from SQLite (remote agents)"
+    ),
 ) -> None:
     """Run a Telegram sync worker for a user session."""
-    from app.worker import run_worker_sync
+    with startup_profile.phase("import worker"):
+        from app.worker import run_worker_sync
 
-    run_worker_sync(
+    code = run_worker_sync(
         user_id=user_id,
         session_path=session_path,
         telegram_account_id=account_id,
+        lease_generation=lease_generation,
+        mappings_snapshot=mappings_snapshot,
     )
+    if code:
+        raise typer.Exit(code)
+
+
+@cli.command("worker-zygote")
+def worker_zygote(
+    socket_path: str = typer.Option(settings.worker_zygote_socket, "--socket", help="Unix socket to listen on"),
+) -> None:
+    """Preload the worker and fork ready workers on request (started by the API)."""
+    from app.worker_zygote import serve
+
+    serve(socket_path)
 
 
 @cli.command("show-mappings")
@@ -110,7 +132,7 @@ def show_mappings(
 @cli.command()
 def create_admin(email: str, password: str, name: str = "") -> None:
     """Create an admin user (for bootstrap)."""
-    from app.auth.password import hash_password
+    from app.auth.password import hash_password_async
     from app.db.sqlite import get_sqlite
 
     asyncio.run(init_sqlite())
@@ -118,7 +140,7 @@ def create_admin(email: str, password: str, name: str = "") -> None:
     async def _create():
         db = await get_sqlite()
         try:
-            pw_hash = hash_password(password)
+            pw_hash = await hash_password_async(password)
             await db.execute(
                 """INSERT INTO users (email, password_hash, name, role, status)
                    VALUES (?, ?, ?, 'admin', 'active')""",
@@ -136,3 +158,229 @@ def create_admin(email: str, password: str, name: str = "") -> None:
 
     asyncio.run(_create())
 
+
+@cli.command("bench-password")
+def bench_password(
+    concurrency: int = typer.Option(8, "--concurrency", "-n", help="Concurrent logins (bcrypt verifies)"),
+    tick_ms: float = typer.Option(5.0, "--tick-ms", help="Event-loop probe interval"),
+) -> None:
+    """Measure event-loop lag during concurrent password verifies: inline bcrypt vs the bcrypt pool."""
+    import statistics
+    import time
+
+    from app.auth.password import (
+        hash_password,
+        shutdown_password_executor,
+        verify_password,
+        verify_password_async,
+    )
+
+    hashed = hash_password("benchmark")
+    concurrency = max(1, concurrency)
+
+    async def _inline():
+        verify_password("benchmark", hashed)
+
+    async def _offloaded():
+        await verify_password_async("benchmark", hashed)
+
+    async def _measure(login) -> tuple[list[float], float]:
+        lags: list[float] = []
+        done = asyncio.Event()
+
+        async def _probe():
+            interval = tick_ms / 1000
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(interval)
+                lags.append((time.perf_counter() - start - interval) * 1000)
+
+        probe = asyncio.create_task(_probe())
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe
+        return lags, elapsed
+
+    async def _run():
+        results = {}
+        for label, login in (("inline", _inline), ("bcrypt pool", _offloaded)):
+            results[label] = await _measure(login)
+        return results
+
+    settings.password_hash_max_pending = 0  # measure queueing, not 429s
+    try:
+        results = asyncio.run(_run())
+    finally:
+        shutdown_password_executor()
+    typer.echo(
+        f"{concurrency} concurrent verifies, {settings.password_hash_workers} bcrypt worker(s), "
+        f"{tick_ms:g} ms probe"
+    )
+    typer.echo(f"{'mode':<12} {'total s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for label, (lags, elapsed) in results.items():
+        lags = sorted(lags) or [0.0]
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+        typer.echo(
+            f"{label:<12} {elapsed:>8.2f} {statistics.median(lags):>11.1f} {p99:>11.1f} {lags[-1]:>11.1f}"
+        )
+
+
+@cli.command("export")
+def export_data(
+    dataset: str = typer.Argument(..., help="message-logs | worker-logs | message-index"),
+    output: str = typer.Option("-", "--output", "-o", help="Output file ('-' for stdout)"),
+    fmt: str = typer.Option("ndjson", "--format", "-f", help="ndjson | csv"),
+    gzip: bool = typer.Option(False, "--gzip", help="Gzip-compress the output"),
+    batch_size: int = typer.Option(500, "--batch-size", help="Rows fetched per database round trip"),
+    user_id: int | None = typer.Option(None, "--user-id", "-u", help="Only this user's rows"),
+    account_id: int | None = typer.Option(None, "--account-id", "-a", help="worker-logs: account filter"),
+    level: str | None = typer.Option(None, "--level", help="worker-logs: level filter"),
+    source_chat_id: int | None = typer.Option(None, "--source-chat-id"),
+    dest_chat_id: int | None = typer.Option(None, "--dest-chat-id"),
+    date_from: str | None = typer.Option(None, "--from", help="ISO start timestamp (log datasets)"),
+    date_to: str | None = typer.Option(None, "--to", help="ISO end timestamp (log datasets)"),
+) -> None:
+    """Stream logs or the message index to a file for offline analysis (same exporter as the API)."""
+    import sys
+
+    from app.services.exports import (
+        EXPORT_FORMATS,
+        MESSAGE_INDEX_FIELDS,
+        MESSAGE_LOG_FIELDS,
+        WORKER_LOG_FIELDS,
+        clamp_batch_size,
+        encode_export,
+        iter_message_index_batches,
+        iter_message_log_batches,
+        iter_worker_log_batches,
+        with_sqlite,
+    )
+    from app.services.log_queries import message_logs_match, worker_logs_match
+
+    if fmt not in EXPORT_FORMATS:
+        typer.echo(f"Error: --format must be one of: {', '.join(EXPORT_FORMATS)}", err=True)
+        raise typer.Exit(1)
+    batch_size = clamp_batch_size(batch_size)
+
+    if dataset == "message-logs":
+        from app.db.mongo import get_mongo_db
+
+        match = message_logs_match(
+            user_id=user_id,
+            source_chat_id=source_chat_id,
+            dest_chat_id=dest_chat_id,
+            date_from=date_from,
+            date_to=date_to,
+        )
+        fields = MESSAGE_LOG_FIELDS
+
+        def make_batches():
+            coll = get_mongo_db().message_logs
+            return with_sqlite(lambda db: iter_message_log_batches(coll, match, batch_size, db=db))
+    elif dataset == "worker-logs":
+        from app.db.mongo import get_mongo_db
+
+        match = worker_logs_match(
+            user_id=user_id, account_id=account_id, level=level, date_from=date_from, date_to=date_to
+        )
+        fields = WORKER_LOG_FIELDS
+
+        def make_batches():
+            return iter_worker_log_batches(get_mongo_db().worker_logs, match, batch_size)
+    elif dataset == "message-index":
+        fields = MESSAGE_INDEX_FIELDS
+
+        def make_batches():
+            return with_sqlite(
+                lambda db: iter_message_index_batches(
+                    db,
+                    batch_size,
+                    user_id=user_id,
+                    source_chat_id=source_chat_id,
+                    dest_chat_id=dest_chat_id,
+                )
+            )
+    else:
+        typer.echo("Error: dataset must be one of: message-logs, worker-logs, message-index", err=True)
+        raise typer.Exit(1)
+
+    async def _run(out) -> None:
+        async for chunk in encode_export(make_batches(), fmt, fields, gzip=gzip):
+            out.write(chunk)
+
+    if output == "-":
+        asyncio.run(_run(sys.stdout.buffer))
+        sys.stdout.buffer.flush()
+    else:
+        with open(output, "wb") as out:
+            asyncio.run(_run(out))
+        typer.echo(f"Exported {dataset} to {output}", err=True)
+
+
+@cli.command("migrate-logs-timeseries")
+def migrate_logs_timeseries(
+    collection: list[str] = typer.Option(
+        ["message_logs", "worker_logs"], "--collection", "-c", help="Log collection(s) to convert"
+    ),
+    batch_size: int = typer.Option(1000, "--batch-size", help="Documents copied per batch"),
+    drop_legacy: bool = typer.Option(False, "--drop-legacy", help="Drop <collection>_legacy after copying"),
+) -> None:
+    """Convert log collections to MongoDB time-series collections (stop workers first; resumable)."""
+    from app.db.mongo import get_mongo_db
+    from app.db.mongo_storage import LOG_COLLECTIONS, migrate_to_timeseries
+
+    for name in collection:
+        if name not in LOG_COLLECTIONS:
+            typer.echo(f"Error: unknown collection {name} (expected one of: {', '.join(LOG_COLLECTIONS)})", err=True)
+            raise typer.Exit(1)
+
+    def _progress(done: int, total: int) -> None:
+        typer.echo(f"  {done}/{total or '?'} documents", err=True)
+
+    async def _run():
+        mongo_db = get_mongo_db()
+        results = []
+        for name in collection:
+            typer.echo(f"Migrating {name}...")
+            results.append(
+                await migrate_to_timeseries(
+                    mongo_db, name, batch_size=max(1, batch_size), drop_legacy=drop_legacy, progress=_progress
+                )
+            )
+        return results
+
+    try:
+        results = asyncio.run(_run())
+    except Exception as e:
+        typer.echo(typer.style(f"FAIL - {e}", fg=typer.colors.RED), err=True)
+        raise typer.Exit(1)
+    for r in results:
+        typer.echo(f"{r['collection']}: {r['status']} (copied={r['copied']}, skipped_without_timestamp={r['skipped']})")
+
+
+@cli.command("prune-message-index")
+def prune_message_index_cmd(
+    batch_size: int = typer.Option(0, "--batch-size", help="Rows per delete transaction (0 = setting)"),
+) -> None:
+    """Delete dest_message_index rows past their retention and drop expired monthly partitions."""
+    from app.db.message_index import prune_message_index
+    from app.db.sqlite import get_sqlite
+
+    asyncio.run(init_sqlite())
+
+    async def _run():
+        db = await get_sqlite()
+        try:
+            return await prune_message_index(db, batch_size=batch_size or None)
+        finally:
+            await db.close()
+
+    result = asyncio.run(_run())
+    dropped = ", ".join(result["partitions_dropped"]) or "none"
+    typer.echo(
+        f"Deleted {result['deleted']} rows, stamped {result['stamped']} legacy rows, "
+        f"dropped partitions: {dropped}"
+    )
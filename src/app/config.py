@@ -17,6 +17,10 @@ class Settings(BaseSettings):
     mongo_uri: str = "mongodb://localhost:27017"
     mongo_db: str = "telegram_copier"
     sqlite_path: str = "data/app.db"
+    sqlite_pool_readers: int = 4  # read-only connections kept open by the API (plus one writer)
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kib: int = 16000
+    sqlite_mmap_size: int = 268_435_456  # 256 MiB
     sessions_dir: str = "data/sessions"
     media_assets_dir: str = "data/media_assets"
     media_upload_max_bytes: int = 52_428_800  # 50 MiB
@@ -25,7 +29,49 @@ class Settings(BaseSettings):
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     refresh_token_expire_days: int = 7
+    auth_principal_cache_ttl_seconds: int = 30  # 0 disables the get_current_user cache
+    password_hash_workers: int = 2  # threads dedicated to bcrypt hash/verify
+    password_hash_max_pending: int = 16  # queued + running bcrypt calls before 429; 0 = unbounded
     login_sessions_retention_days: int = 7
+    maintenance_enabled: bool = True  # periodic cleanup jobs in the API process
+    maintenance_initial_delay_seconds: float = 60.0  # after startup, so worker restore sees the registry first
+    maintenance_job_budget_seconds: float = 2.0  # time box per job run; unfinished work continues shortly after
+    maintenance_batch_size: int = 500  # rows/files per committed batch
+    worker_log_retention_days: int = 7  # data/worker_<account>_<id>.log files; 0 keeps them
+    log_tail_poll_interval_seconds: float = 1.0  # live log tail fallback when change streams are unavailable
+    log_tail_keepalive_seconds: float = 15.0
+    message_logs_retention_days: int = 0  # 0 = keep forever; Admin Settings override
+    worker_logs_retention_days: int = 0
+    logs_timeseries: bool = False  # create missing log collections as Mongo time-series
+    message_index_retention_days: int = 0  # 0 = keep forever; per-user/per-mapping overrides in SQLite
+    message_index_partition: str = "none"  # none | month (one attached SQLite file per month)
+    message_index_partition_dir: str = "data/message_index"
+    message_index_prune_batch_size: int = 5000  # rows per delete transaction
+    message_index_prune_pause_ms: int = 50  # pause between batches so other writers get the lock
+    worker_drain_timeout_seconds: float = 20.0  # on stop, time to finish in-flight sends before exiting
+    worker_heartbeat_seconds: float = 5.0  # how often a worker renews its lease
+    worker_lease_ttl_seconds: float = 30.0  # a worker whose lease is not renewed for this long is dead
+    worker_host_id: str = ""  # lease host id; defaults to the hostname
+    worker_stale_seconds: float = 20.0  # restart a worker whose runtime heartbeat is older (0 = never)
+    worker_zygote: bool = True  # fork workers from a preloaded process (POSIX); cold start otherwise
+    worker_zygote_socket: str = "data/worker_zygote.sock"
+    worker_placement: str = "local"  # local | agents (remote agents only) | auto (agents, else local)
+    agent_token: str = ""  # shared secret of `tg-copier agent`; empty disables the agent endpoints
+    agent_allow_http: bool = False  # serve session bundles to agents over plain HTTP (trusted network only)
+    message_index_relay: bool = False  # queue index rows for the agent to relay (set for the workers it runs)
+    metrics_enabled: bool = True  # GET /metrics (Prometheus) and API request timing
+    metrics_token: str = ""  # bearer token required by GET /metrics; empty = localhost scrapes only
+    metrics_open: bool = False  # without METRICS_TOKEN, let any host scrape (trusted network only)
+    slow_callback_seconds: float = 0.0  # log the event-loop stack when it is blocked longer (0 = off)
+    profiles_dir: str = "data/profiles"  # collapsed-stack output of POST /api/workers/{id}/profile
+    profile_max_seconds: float = 120.0  # longest profile an admin can request
+    profile_sample_hz: int = 100  # starting sample rate; halved while the sampler uses >2% of a CPU
+    profile_retention_days: int = 7  # profiles and their output kept (profiles maintenance job)
+    trace_sample_rate: float = 0.0  # share of worker messages traced per stage (0 = off, 1 = all)
+    trace_retention_hours: int = 24  # sampled message traces older than this are purged
+    copy_latency_slo_seconds: float = 60.0  # source message date -> completed send, per mapping
+    copy_latency_slo_percentile: float = 95.0  # the percentile held to the SLO
+    latency_rollup_retention_days: int = 30  # hourly per-mapping latency rollups
     testing: bool = False  # TESTING=1 skips slow startup (Mongo indexes, worker restore delay)
 
 
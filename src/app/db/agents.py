@@ -0,0 +1,102 @@
+"""Remote worker agents (`tg-copier agent`): registration, liveness and placement by load.
+
+One worker_agents row per agent (migration v20), refreshed by every agent heartbeat. An agent is
+live while its last heartbeat is younger than the lease TTL: past that its workers' leases have
+expired too, and the agent stops them itself. An agent's load is the number of worker_registry
+rows placed on it (agent_id), counted at placement time so back-to-back placements spread out
+before the agents report them running.
+
+Besides the shared AGENT_TOKEN, each agent holds a key of its own (X-Agent-Key), issued on its
+first heartbeat and bound to its agent_id; only the key's hash is stored (key_hash, v27). An admin
+resets it (DELETE /api/agents/{agent_id}/key) so the agent can register again, e.g. after losing
+its work directory.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import secrets
+import time
+from dataclasses import dataclass
+
+import aiosqlite
+
+from app.config import settings
+
+# Lease owner recorded for workers an agent runs (leases.claim(owner=...)).
+OWNER_PREFIX = "agent:"
+KEY_HEADER = "X-Agent-Key"
+
+
+@dataclass(slots=True)
+class Agent:
+    agent_id: str
+    host_id: str
+    capacity: int
+    last_seen: float
+    load: int
+
+    def live(self, now: float | None = None) -> bool:
+        return self.last_seen > (time.time() if now is None else now) - settings.worker_lease_ttl_seconds
+
+
+def owner(agent_id: str) -> str:
+    return f"{OWNER_PREFIX}{agent_id}"
+
+
+async def heartbeat(db: aiosqlite.Connection, agent_id: str, host_id: str, capacity: int) -> None:
+    """Register the agent or refresh its capacity and last_seen (committed by the caller)."""
+    await db.execute(
+        "INSERT INTO worker_agents (agent_id, host_id, capacity, last_seen) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(agent_id) DO UPDATE SET host_id = excluded.host_id, capacity = excluded.capacity, "
+        "last_seen = excluded.last_seen",
+        (agent_id, host_id, capacity, time.time()),
+    )
+
+
+def _key_hash(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+async def verify_key(db: aiosqlite.Connection, agent_id: str, key: str | None) -> bool | None:
+    """True if key is the agent's key, False if not, None if the agent has no key yet (not
+    registered, or registered before keys existed)."""
+    async with db.execute("SELECT key_hash FROM worker_agents WHERE agent_id = ?", (agent_id,)) as cur:
+        row = await cur.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return key is not None and hmac.compare_digest(_key_hash(key), row[0])
+
+
+async def issue_key(db: aiosqlite.Connection, agent_id: str) -> str | None:
+    """A new key for a registered agent that has none (not committed). None if another heartbeat
+    claimed the agent_id first."""
+    key = secrets.token_urlsafe(32)
+    cur = await db.execute(
+        "UPDATE worker_agents SET key_hash = ? WHERE agent_id = ? AND key_hash IS NULL", (_key_hash(key), agent_id)
+    )
+    return key if cur.rowcount else None
+
+
+async def reset_key(db: aiosqlite.Connection, agent_id: str) -> bool:
+    """Forget the agent's key so its next heartbeat is issued a new one (not committed)."""
+    cur = await db.execute("UPDATE worker_agents SET key_hash = NULL WHERE agent_id = ?", (agent_id,))
+    return cur.rowcount > 0
+
+
+async def list_agents(db: aiosqlite.Connection) -> list[Agent]:
+    """All registered agents with their current load."""
+    async with db.execute(
+        "SELECT a.agent_id, a.host_id, a.capacity, a.last_seen, "
+        "(SELECT COUNT(*) FROM worker_registry r WHERE r.agent_id = a.agent_id) AS load "
+        "FROM worker_agents a ORDER BY a.agent_id"
+    ) as cur:
+        return [Agent(*row) for row in await cur.fetchall()]
+
+
+async def place(db: aiosqlite.Connection) -> Agent | None:
+    """The live agent with a free slot and the lowest load/capacity ratio, or None."""
+    now = time.time()
+    free = [a for a in await list_agents(db) if a.live(now) and a.load < a.capacity]
+    return min(free, key=lambda a: (a.load / a.capacity, a.load), default=None)
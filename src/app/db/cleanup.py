@@ -1,37 +1,212 @@
-"""Database cleanup tasks."""
+"""Database and data-directory cleanup jobs (scheduled by app.services.maintenance)."""
 
 from __future__ import annotations
 
+import asyncio
 import logging
-
-import aiosqlite
+import os
+import re
+import time
+from datetime import datetime, timezone
 
 from app.config import settings
+from app.db.leases import REGISTRY_ROW_ORPHANED
+from app.db.message_index import prune_message_index
+from app.db.sqlite import get_sqlite
+from app.db.worker_profiles import expire as expire_profiles, profiles_dir
+from app.utils.paths import WORKER_LOG_DIR, resolve
 
 logger = logging.getLogger(__name__)
 
 
-async def purge_old_login_sessions(retention_days: int) -> int:
-    """
-    Delete completed/cancelled login_sessions older than retention_days.
-    Pending sessions are never deleted.
-    Returns number of rows deleted.
-    """
-    deleted = 0
+# Periodic jobs run by app.services.maintenance. Each takes a time.monotonic() deadline, works in
+# small committed batches, and returns (rows_or_files_removed, complete). Incomplete jobs are
+# rescheduled soon and pick up where they stopped.
+
+WORKER_LOG_RE = re.compile(r"^worker_(\d+)_(w\d+(?:-\d+)?)\.log$")
+SESSION_COPY_RE = re.compile(r"_worker_(\d+)\.session(-journal)?$")
+SESSION_COPY_GRACE_SECONDS = 600
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    except OSError:
+        return False
+    return True
+
+
+async def _delete_in_batches(sql: str, params: tuple, deadline: float, batch_size: int) -> tuple[int, bool]:
+    """Run 'DELETE ... WHERE rowid IN (SELECT rowid ... LIMIT ?)' until done or out of time."""
+    removed = 0
+    db = await get_sqlite()
     try:
-        async with aiosqlite.connect(settings.sqlite_path) as db:
-            cursor = await db.execute(
-                """
-                DELETE FROM login_sessions
-                WHERE status IN ('completed', 'cancelled')
-                AND created_at < datetime('now', '-' || ? || ' days')
-                """,
-                (retention_days,),
-            )
+        while True:
+            cur = await db.execute(sql, (*params, batch_size))
             await db.commit()
-            deleted = cursor.rowcount
-        if deleted:
-            logger.info("Purged %d old login_sessions rows (retention=%d days)", deleted, retention_days)
-    except Exception as e:
-        logger.warning("Login sessions purge failed (non-fatal): %s", e)
-    return deleted
+            removed += max(cur.rowcount, 0)
+            if cur.rowcount < batch_size:
+                return removed, True
+            if time.monotonic() >= deadline:
+                return removed, False
+            await asyncio.sleep(0)
+    finally:
+        await db.close()
+
+
+async def purge_login_sessions_job(deadline: float, batch_size: int) -> tuple[int, bool]:
+    """Completed/cancelled login_sessions older than LOGIN_SESSIONS_RETENTION_DAYS."""
+    return await _delete_in_batches(
+        """DELETE FROM login_sessions WHERE rowid IN (
+             SELECT rowid FROM login_sessions
+             WHERE status IN ('completed', 'cancelled')
+             AND created_at < datetime('now', '-' || ? || ' days') LIMIT ?)""",
+        (settings.login_sessions_retention_days,),
+        deadline,
+        batch_size,
+    )
+
+
+async def purge_expired_refresh_tokens_job(deadline: float, batch_size: int) -> tuple[int, bool]:
+    """refresh_tokens past expires_at (stored as ISO-8601 UTC by the login route)."""
+    return await _delete_in_batches(
+        "DELETE FROM refresh_tokens WHERE rowid IN (SELECT rowid FROM refresh_tokens WHERE expires_at < ? LIMIT ?)",
+        (datetime.now(timezone.utc).isoformat(),),
+        deadline,
+        batch_size,
+    )
+
+
+async def purge_dead_worker_registry_job(deadline: float, batch_size: int) -> tuple[int, bool]:
+    """worker_registry rows without a live lease (crashed workers; list_workers also does this).
+    Rows of remote agents are kept: agent heartbeats re-place those workers."""
+    return await _delete_in_batches(
+        f"""DELETE FROM worker_registry WHERE rowid IN (
+             SELECT rowid FROM worker_registry WHERE agent_id IS NULL AND {REGISTRY_ROW_ORPHANED} LIMIT ?)""",
+        (time.time(),),
+        deadline,
+        batch_size,
+    )
+
+
+async def purge_message_traces_job(deadline: float, batch_size: int) -> tuple[int, bool]:
+    """Sampled message traces older than TRACE_RETENTION_HOURS."""
+    return await _delete_in_batches(
+        """DELETE FROM message_traces WHERE rowid IN (
+             SELECT rowid FROM message_traces WHERE started_at < ? LIMIT ?)""",
+        (time.time() - settings.trace_retention_hours * 3600,),
+        deadline,
+        batch_size,
+    )
+
+
+async def purge_latency_rollups_job(deadline: float, batch_size: int) -> tuple[int, bool]:
+    """Hourly per-mapping latency rollups older than LATENCY_ROLLUP_RETENTION_DAYS."""
+    return await _delete_in_batches(
+        """DELETE FROM mapping_latency_rollups WHERE rowid IN (
+             SELECT rowid FROM mapping_latency_rollups WHERE hour < ? LIMIT ?)""",
+        (time.time() - settings.latency_rollup_retention_days * 86400,),
+        deadline,
+        batch_size,
+    )
+
+
+async def purge_profiles_job(deadline: float, batch_size: int) -> tuple[int, bool]:
+    """worker_profiles rows and data/profiles output older than PROFILE_RETENTION_DAYS; also fails
+    active profiles whose result is overdue."""
+    db = await get_sqlite()
+    try:
+        await expire_profiles(db)
+    finally:
+        await db.close()
+    cutoff = time.time() - settings.profile_retention_days * 86400
+    removed, complete = await _delete_in_batches(
+        "DELETE FROM worker_profiles WHERE rowid IN (SELECT rowid FROM worker_profiles WHERE created_at < ? LIMIT ?)",
+        (cutoff,),
+        deadline,
+        batch_size,
+    )
+    directory = profiles_dir()
+    if not complete or not directory.is_dir():
+        return removed, complete
+    for path in directory.glob("*.collapsed"):
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        removed += 1
+        if removed % batch_size == 0 and time.monotonic() >= deadline:
+            return removed, False
+    return removed, True
+
+
+async def purge_worker_session_copies_job(deadline: float, batch_size: int) -> tuple[int, bool]:
+    """Per-PID session copies (<name>_worker_<pid>.session) left behind by exited workers."""
+    sessions_dir = resolve(settings.sessions_dir)
+    if not sessions_dir.is_dir():
+        return 0, True
+    cutoff = time.time() - SESSION_COPY_GRACE_SECONDS
+    removed = 0
+    for path in sessions_dir.rglob("*_worker_*.session*"):
+        m = SESSION_COPY_RE.search(path.name)
+        if not m or _pid_alive(int(m.group(1))):
+            continue
+        try:
+            if path.stat().st_mtime > cutoff:
+                continue
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        removed += 1
+        if removed % batch_size == 0:
+            if time.monotonic() >= deadline:
+                return removed, False
+            await asyncio.sleep(0)
+    return removed, True
+
+
+async def purge_worker_stderr_logs_job(deadline: float, batch_size: int) -> tuple[int, bool]:
+    """worker_<account>_<id>.log files older than WORKER_LOG_RETENTION_DAYS, except those of
+    workers still in worker_registry."""
+    if settings.worker_log_retention_days <= 0 or not WORKER_LOG_DIR.is_dir():
+        return 0, True
+    db = await get_sqlite()
+    try:
+        async with db.execute("SELECT account_id, worker_id FROM worker_registry") as cur:
+            live = {(str(a), w) for a, w in await cur.fetchall()}
+    finally:
+        await db.close()
+    cutoff = time.time() - settings.worker_log_retention_days * 86400
+    removed = 0
+    for path in WORKER_LOG_DIR.iterdir():
+        m = WORKER_LOG_RE.match(path.name)
+        if not m or (m.group(1), m.group(2)) in live:
+            continue
+        try:
+            if path.stat().st_mtime > cutoff:
+                continue
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        removed += 1
+        if removed % batch_size == 0:
+            if time.monotonic() >= deadline:
+                return removed, False
+            await asyncio.sleep(0)
+    return removed, True
+
+
+async def prune_message_index_job(deadline: float, batch_size: int) -> tuple[int, bool]:
+    """dest_message_index rows and monthly partitions past retention (see app.db.message_index)."""
+    db = await get_sqlite()
+    try:
+        result = await prune_message_index(db, deadline=deadline)
+    finally:
+        await db.close()
+    return result["deleted"] + len(result["partitions_dropped"]), result["complete"]
@@ -0,0 +1,110 @@
+"""Per-mapping copy latency rollups (migration v24): one mapping_latency_rollups row per mapping
+and hour, holding a histogram over COPY_LATENCY_BUCKETS of source message date -> completed send.
+
+Workers keep cumulative per-mapping histograms (app.worker_stats) and ship them in every runtime
+heartbeat. worker_heartbeats.publish compares them with the account's previous heartbeat row and
+adds only the growth here, so rollups are maintained incrementally, a relayed heartbeat that is
+published twice adds nothing, and reading latency never scans message_logs. Percentiles are
+estimated from the buckets (linear interpolation within a bucket, like Prometheus'
+histogram_quantile).
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Iterable, Mapping
+
+import aiosqlite
+
+from app.utils.metrics import COPY_LATENCY_BUCKETS
+
+BUCKETS = COPY_LATENCY_BUCKETS
+QUANTILES = (("p50_seconds", 0.5), ("p95_seconds", 0.95), ("p99_seconds", 0.99))
+
+
+def growth(new: Mapping[str, list], old: Mapping[str, list] | None) -> dict[int, list[float]]:
+    """Histograms added since `old` (the same worker's previous heartbeat), per mapping. A
+    histogram that shrank belongs to a restarted worker and counts in full."""
+    out: dict[int, list[float]] = {}
+    for mapping_id, h in new.items():
+        if len(h) != len(BUCKETS) + 2:
+            continue
+        prev = (old or {}).get(mapping_id)
+        if prev is not None and len(prev) == len(h):
+            diff = [a - b for a, b in zip(h, prev)]
+            if min(diff) >= 0:
+                h = diff
+        if sum(h[:-1]) > 0:
+            out[int(mapping_id)] = list(h)
+    return out
+
+
+async def add(db: aiosqlite.Connection, histograms: Mapping[int, list[float]], at: float) -> None:
+    """Add histograms to the rollup row of each mapping for the hour of `at` (not committed)."""
+    hour = int(at // 3600 * 3600)
+    for mapping_id, h in histograms.items():
+        async with db.execute(
+            "SELECT counts, total_seconds FROM mapping_latency_rollups WHERE mapping_id = ? AND hour = ?",
+            (mapping_id, hour),
+        ) as cur:
+            row = await cur.fetchone()
+        counts = [int(c) for c in h[:-1]]
+        total = h[-1]
+        if row is not None:
+            counts = [a + b for a, b in zip(counts, json.loads(row[0]))]
+            total += row[1]
+        await db.execute(
+            "INSERT OR REPLACE INTO mapping_latency_rollups (mapping_id, hour, counts, total_seconds, messages) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (mapping_id, hour, json.dumps(counts), total, sum(counts)),
+        )
+
+
+def quantile(counts: list[int], q: float) -> float | None:
+    """Estimated q-quantile of a bucket histogram; above the last bound it reports that bound."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            if i == len(BUCKETS):
+                return BUCKETS[-1]
+            lower = BUCKETS[i - 1] if i else 0.0
+            return round(lower + (BUCKETS[i] - lower) * (rank - cumulative) / count, 3)
+        cumulative += count
+    return BUCKETS[-1]
+
+
+async def mapping_latency(
+    db: aiosqlite.Connection, mapping_ids: Iterable[int] | None, hours: float
+) -> dict[int, dict[str, Any]]:
+    """Latency over the last `hours` (whole rollup hours) per mapping with sends, with the merged
+    bucket counts; mapping_ids None means all mappings."""
+    since = int((time.time() - hours * 3600) // 3600 * 3600)
+    sql = "SELECT mapping_id, counts, total_seconds FROM mapping_latency_rollups WHERE hour >= ?"
+    params: list[Any] = [since]
+    if mapping_ids is not None:
+        ids = list(mapping_ids)
+        sql += f" AND mapping_id IN ({', '.join('?' * len(ids)) or 'NULL'})"
+        params += ids
+    merged: dict[int, list] = {}
+    async with db.execute(sql, params) as cur:
+        async for mapping_id, counts, total in cur:
+            acc = merged.setdefault(mapping_id, [[0] * (len(BUCKETS) + 1), 0.0])
+            acc[0] = [a + b for a, b in zip(acc[0], json.loads(counts))]
+            acc[1] += total
+    out: dict[int, dict[str, Any]] = {}
+    for mapping_id, (counts, total) in merged.items():
+        messages = sum(counts)
+        if not messages:
+            continue
+        out[mapping_id] = {
+            "messages": messages,
+            "mean_seconds": round(total / messages, 3),
+            **{key: quantile(counts, q) for key, q in QUANTILES},
+            "counts": counts,
+        }
+    return out
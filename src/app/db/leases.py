@@ -0,0 +1,153 @@
+"""Worker leases: which process runs the worker of an account, decided without signalling PIDs.
+
+One worker_leases row per account (migration v19). A lease is live while expires_at is in the
+future. Every change is a compare-and-swap on (account_id, generation):
+
+- claim() takes a free or expired lease and bumps the generation (a new worker identity);
+- the worker renews it every WORKER_HEARTBEAT_SECONDS and stops when renewal fails (fenced off)
+  or stop_requested is set;
+- release() frees it when the worker exits, or when a supervisor gives up on it.
+
+Generations are never reset, so a stale worker can never renew a newer claim. Times are Unix
+seconds from the writer's clock; hosts sharing a database need synchronised clocks.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import time
+from dataclasses import dataclass
+from typing import Iterable
+
+import aiosqlite
+
+from app.config import settings
+
+HOST_ID = settings.worker_host_id or socket.gethostname()
+# Identifies this API (or agent) process as a lease owner.
+INSTANCE_ID = f"{HOST_ID}:{os.getpid()}"
+
+# WHERE condition (bind time.time()) for worker_registry rows whose lease at the row's generation
+# is no longer live: the worker exited, crashed or was fenced off.
+REGISTRY_ROW_ORPHANED = (
+    "NOT EXISTS (SELECT 1 FROM worker_leases l WHERE l.account_id = worker_registry.account_id "
+    "AND l.generation = worker_registry.generation AND l.expires_at > ?)"
+)
+
+_LEASE_COLUMNS = "account_id, generation, owner, host_id, expires_at, heartbeat_at, stop_requested"
+
+
+@dataclass(slots=True)
+class Lease:
+    account_id: int
+    generation: int
+    owner: str
+    host_id: str
+    expires_at: float
+    heartbeat_at: float | None
+    stop_requested: bool
+
+    def live(self, now: float | None = None) -> bool:
+        return self.expires_at > (time.time() if now is None else now)
+
+
+def _lease(row) -> Lease:
+    return Lease(row[0], row[1], row[2], row[3], row[4], row[5], bool(row[6]))
+
+
+async def claim(
+    db: aiosqlite.Connection,
+    account_id: int,
+    owner: str = INSTANCE_ID,
+    host_id: str = HOST_ID,
+    ttl: float | None = None,
+) -> int | None:
+    """Claim the account if its lease is free or expired. Returns the new generation, or None
+    when another worker holds it. The TTL covers worker startup until its first heartbeat."""
+    now = time.time()
+    ttl = settings.worker_lease_ttl_seconds if ttl is None else ttl
+    await db.execute("INSERT OR IGNORE INTO worker_leases (account_id) VALUES (?)", (account_id,))
+    async with db.execute(
+        "UPDATE worker_leases SET generation = generation + 1, owner = ?, host_id = ?, expires_at = ?, "
+        "heartbeat_at = NULL, stop_requested = 0 WHERE account_id = ? AND expires_at <= ? RETURNING generation",
+        (owner, host_id, now + ttl, account_id, now),
+    ) as cur:
+        row = await cur.fetchone()
+    await db.commit()
+    return row[0] if row else None
+
+
+async def renew(
+    db: aiosqlite.Connection, account_id: int, generation: int, ttl: float | None = None
+) -> bool | None:
+    """Heartbeat from the worker holding `generation`. Returns stop_requested, or None when the
+    lease was lost (expired, released or claimed by a newer generation)."""
+    now = time.time()
+    ttl = settings.worker_lease_ttl_seconds if ttl is None else ttl
+    async with db.execute(
+        "UPDATE worker_leases SET expires_at = ?, heartbeat_at = ? "
+        "WHERE account_id = ? AND generation = ? AND expires_at > ? RETURNING stop_requested",
+        (now + ttl, now, account_id, generation, now),
+    ) as cur:
+        row = await cur.fetchone()
+    await db.commit()
+    return bool(row[0]) if row else None
+
+
+async def release(db: aiosqlite.Connection, account_id: int, generation: int) -> bool:
+    """Free the lease if it is still at `generation`."""
+    async with db.execute(
+        "UPDATE worker_leases SET owner = '', expires_at = 0, stop_requested = 0 "
+        "WHERE account_id = ? AND generation = ? RETURNING account_id",
+        (account_id, generation),
+    ) as cur:
+        row = await cur.fetchone()
+    await db.commit()
+    return row is not None
+
+
+async def request_stop(db: aiosqlite.Connection, account_id: int, generation: int) -> bool:
+    """Ask the worker holding `generation` to drain and exit (seen at its next heartbeat)."""
+    async with db.execute(
+        "UPDATE worker_leases SET stop_requested = 1 "
+        "WHERE account_id = ? AND generation = ? AND expires_at > ? RETURNING account_id",
+        (account_id, generation, time.time()),
+    ) as cur:
+        row = await cur.fetchone()
+    await db.commit()
+    return row is not None
+
+
+async def adopt(db: aiosqlite.Connection, account_id: int, generation: int, owner: str = INSTANCE_ID) -> bool:
+    """Take over supervision of a live lease (e.g. workers left by a previous API run on this host)."""
+    async with db.execute(
+        "UPDATE worker_leases SET owner = ? WHERE account_id = ? AND generation = ? AND expires_at > ? "
+        "RETURNING account_id",
+        (owner, account_id, generation, time.time()),
+    ) as cur:
+        row = await cur.fetchone()
+    await db.commit()
+    return row is not None
+
+
+async def get_lease(db: aiosqlite.Connection, account_id: int) -> Lease | None:
+    async with db.execute(
+        f"SELECT {_LEASE_COLUMNS} FROM worker_leases WHERE account_id = ?", (account_id,)
+    ) as cur:
+        row = await cur.fetchone()
+    return _lease(row) if row else None
+
+
+async def live_leases(db: aiosqlite.Connection, account_ids: Iterable[int] | None = None) -> dict[int, Lease]:
+    """Live leases by account_id (all accounts when account_ids is None)."""
+    query = f"SELECT {_LEASE_COLUMNS} FROM worker_leases WHERE expires_at > ?"
+    params: list = [time.time()]
+    if account_ids is not None:
+        ids = list(account_ids)
+        if not ids:
+            return {}
+        query += f" AND account_id IN ({', '.join('?' * len(ids))})"
+        params += ids
+    async with db.execute(query, params) as cur:
+        return {row[0]: _lease(row) for row in await cur.fetchall()}
@@ -0,0 +1,537 @@
+"""dest_message_index storage: reply lookups, retention pruning and optional monthly partitions.
+
+Rows carry created_at (UTC, datetime('now') format). Retention resolves per mapping, then per
+user, then the global default (Admin Settings / MESSAGE_INDEX_RETENTION_DAYS); NULL inherits and
+0 keeps rows forever. Pruning deletes expired rows in small batches, committing and pausing
+between them, so workers are never locked out of the database for long.
+
+With MESSAGE_INDEX_PARTITION=month new rows go to one SQLite file per calendar month
+(<MESSAGE_INDEX_PARTITION_DIR>/dmi_YYYYMM.db) that is ATTACHed to the connections using the index;
+rows written before partitioning stay in the main table. Reads always cover the main table plus
+any partition files present. A month whose rows are all past retention is dropped by unlinking
+its file instead of deleting rows. At most MAX_ATTACHED_PARTITIONS months can be read at once:
+API reads refuse with TooManyPartitionsError beyond that, workers' reply lookups see the newest.
+
+Workers on a remote agent (MESSAGE_INDEX_RELAY) also queue each row in message_index_outbox; the
+agent sends the queue with its heartbeats and the API stores the rows (save_relayed), so the API's
+index is complete. Reply lookups on a node only see the rows written on that node.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import time
+import weakref
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import aiosqlite
+
+from app.config import settings
+from app.db.row_counts import cached_count, has_row_counts
+from app.db.sqlite import get_sqlite
+from app.services.app_settings import get_setting_sync
+from app.utils.chat_ids import alternate_chat_id
+
+logger = logging.getLogger(__name__)
+
+TABLE = "dest_message_index"
+COLUMNS = "user_id, source_chat_id, source_msg_id, dest_chat_id, dest_msg_id, created_at"
+PARTITION_MODES = ("none", "month")
+RETENTION_SETTING_KEY = "message_index_retention_days"
+# SQLite allows 10 attached databases per connection by default; leave headroom for callers.
+MAX_ATTACHED_PARTITIONS = 8
+PARTITION_FILE_RE = re.compile(r"^dmi_(\d{6})\.db$")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"  # matches datetime('now')
+RELAY_BATCH = 2000  # outbox rows an agent sends per heartbeat
+
+PARTITION_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS dest_message_index (
+  user_id INTEGER NOT NULL,
+  source_chat_id INTEGER NOT NULL,
+  source_msg_id INTEGER NOT NULL,
+  dest_chat_id INTEGER NOT NULL,
+  dest_msg_id INTEGER NOT NULL,
+  created_at TEXT,
+  PRIMARY KEY (user_id, source_chat_id, source_msg_id, dest_chat_id)
+);
+CREATE INDEX IF NOT EXISTS ix_dest_message_index_user_created ON dest_message_index(user_id, created_at);
+CREATE TABLE IF NOT EXISTS row_counts (
+  table_name TEXT NOT NULL,
+  user_id INTEGER NOT NULL,
+  n INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (table_name, user_id)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS dest_message_index_count_ai AFTER INSERT ON dest_message_index BEGIN
+  INSERT INTO row_counts (table_name, user_id, n) VALUES ('dest_message_index', new.user_id, 1)
+  ON CONFLICT (table_name, user_id) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS dest_message_index_count_ad AFTER DELETE ON dest_message_index BEGIN
+  UPDATE row_counts SET n = n - 1 WHERE table_name = 'dest_message_index' AND user_id = old.user_id;
+END;
+"""
+# Keyset order of list pages: the primary key, so every page is an index range scan.
+KEY_COLUMNS = ("user_id", "source_chat_id", "source_msg_id", "dest_chat_id")
+
+# connection -> {partition key: schema alias}; entries vanish with the connection.
+_attached: weakref.WeakKeyDictionary[aiosqlite.Connection, dict[str, str]] = weakref.WeakKeyDictionary()
+_attach_locks: weakref.WeakKeyDictionary[aiosqlite.Connection, asyncio.Lock] = weakref.WeakKeyDictionary()
+_warned_attach_limit = False
+
+
+class TooManyPartitionsError(RuntimeError):
+    """More partition files on disk than one connection can attach."""
+
+
+def partition_mode() -> str:
+    mode = (settings.message_index_partition or "none").strip().lower()
+    return mode if mode in PARTITION_MODES else "none"
+
+
+def partition_dir() -> Path:
+    return Path(settings.message_index_partition_dir)
+
+
+def month_key(when: datetime) -> str:
+    return when.strftime("%Y%m")
+
+
+def partition_path(key: str) -> Path:
+    return partition_dir() / f"dmi_{key}.db"
+
+
+def list_partition_keys() -> list[str]:
+    """Monthly partition keys (YYYYMM) present on disk, newest first."""
+    try:
+        names = os.listdir(partition_dir())
+    except FileNotFoundError:
+        return []
+    return sorted((m.group(1) for n in names if (m := PARTITION_FILE_RE.match(n))), reverse=True)
+
+
+def _create_partition_file(path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(PARTITION_SCHEMA_SQL)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def _attach(db: aiosqlite.Connection, key: str) -> bool:
+    aliases = _attached.setdefault(db, {})
+    if key in aliases:
+        return True
+    path = partition_path(key)
+    if not path.exists():
+        return False  # ATTACH would create an empty file in its place
+    alias = f"dmi_{key}"
+    try:
+        await db.execute(f"ATTACH DATABASE ? AS {alias}", (str(path),))
+        async with db.execute(
+            f"SELECT 1 FROM {alias}.sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)
+        ) as cur:
+            has_table = await cur.fetchone() is not None
+    except sqlite3.OperationalError as e:
+        logger.warning("Could not attach message index partition %s: %s", path, e)
+        return False
+    if not has_table:
+        await db.execute(f"DETACH DATABASE {alias}")
+        return False
+    aliases[key] = alias
+    return True
+
+
+async def _detach(db: aiosqlite.Connection, key: str) -> bool:
+    aliases = _attached.get(db, {})
+    alias = aliases.get(key)
+    if alias is None:
+        return True
+    try:
+        await db.execute(f"DETACH DATABASE {alias}")
+    except sqlite3.OperationalError as e:
+        # Still in use by an unfinished statement on this connection; retried on the next sync.
+        logger.debug("Could not detach %s yet: %s", alias, e)
+        return False
+    del aliases[key]
+    return True
+
+
+def require_readable_partitions() -> None:
+    """Raise TooManyPartitionsError if some partitions would be left out of a read."""
+    count = len(list_partition_keys())
+    if count > MAX_ATTACHED_PARTITIONS:
+        raise TooManyPartitionsError(
+            f"{count} message index partitions on disk; at most {MAX_ATTACHED_PARTITIONS} can be read. "
+            "Set a retention so old months are dropped."
+        )
+
+
+@asynccontextmanager
+async def index_reader() -> AsyncIterator[aiosqlite.Connection]:
+    """A connection of its own for API reads. Partitions are ATTACHed per connection and stay
+    attached, so they are kept off the pool's shared readers."""
+    db = await get_sqlite()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def sync_partitions(db: aiosqlite.Connection) -> list[str]:
+    """Attach the newest partition files to db and detach pruned ones. Returns attached keys,
+    newest first."""
+    global _warned_attach_limit
+    wanted = list_partition_keys()
+    if len(wanted) > MAX_ATTACHED_PARTITIONS:
+        if not _warned_attach_limit:
+            logger.warning(
+                "%d message index partitions on disk; only the newest %d are readable. "
+                "Set a retention so old months are dropped.",
+                len(wanted),
+                MAX_ATTACHED_PARTITIONS,
+            )
+            _warned_attach_limit = True
+        wanted = wanted[:MAX_ATTACHED_PARTITIONS]
+    lock = _attach_locks.setdefault(db, asyncio.Lock())
+    async with lock:
+        for key in list(_attached.get(db, {})):
+            if key not in wanted:
+                await _detach(db, key)
+        for key in wanted:
+            await _attach(db, key)
+        aliases = _attached.get(db, {})
+        return [key for key in wanted if key in aliases]
+
+
+async def table_sources(db: aiosqlite.Connection) -> list[str]:
+    """Tables holding index rows: attached partitions newest first, then the main table."""
+    keys = await sync_partitions(db)
+    if not keys:
+        return [TABLE]
+    aliases = _attached[db]
+    return [f"{aliases[key]}.{TABLE}" for key in keys] + [f"main.{TABLE}"]
+
+
+async def read_source(db: aiosqlite.Connection) -> str:
+    """FROM-clause target covering every table in table_sources() (columns: COLUMNS)."""
+    sources = await table_sources(db)
+    if len(sources) == 1:
+        return sources[0]
+    return "(" + " UNION ALL ".join(f"SELECT {COLUMNS} FROM {t}" for t in sources) + ")"
+
+
+async def select_page(
+    db: aiosqlite.Connection,
+    filters: dict[str, int],
+    limit: int,
+    after: list | None = None,
+    offset: int = 0,
+) -> list[tuple]:
+    """Rows (COLUMNS) matching the column = value filters in KEY_COLUMNS order, starting after the
+    `after` key. With partitions each table is one arm of a UNION ALL, so SQLite merges the arms'
+    primary-key scans instead of sorting them."""
+    where = "".join(f" AND {col} = ?" for col in filters)
+    params = list(filters.values())
+    if after is not None:
+        # Key columns pinned by an equality filter are constant; comparing only the rest lets the
+        # primary key seek straight to the cursor.
+        fixed = 0
+        while fixed < len(KEY_COLUMNS) - 1 and KEY_COLUMNS[fixed] in filters:
+            fixed += 1
+        rest = KEY_COLUMNS[fixed:]
+        where += f" AND ({', '.join(rest)}) > ({', '.join('?' for _ in rest)})"
+        params += after[fixed:]
+    sources = await table_sources(db)
+    query = " UNION ALL ".join(f"SELECT {COLUMNS} FROM {t} WHERE 1=1{where}" for t in sources)
+    query += f" ORDER BY {', '.join(KEY_COLUMNS)} LIMIT ? OFFSET ?"
+    async with db.execute(query, params * len(sources) + [limit, offset]) as cur:
+        return await cur.fetchall()
+
+
+async def count_rows(db: aiosqlite.Connection, user_id: int | None = None) -> int:
+    """Index rows owned by user_id (all users when None), read from the row_counts caches.
+    Partition files created before row counts existed are counted directly."""
+    total = 0
+    for source in await table_sources(db):
+        schema = source.split(".")[0] if "." in source else "main"
+        if await has_row_counts(db, schema):
+            total += await cached_count(db, TABLE, user_id, schema)
+            continue
+        query, params = f"SELECT COUNT(*) FROM {source}", []
+        if user_id is not None:
+            query += " WHERE user_id = ?"
+            params.append(user_id)
+        async with db.execute(query, params) as cur:
+            total += (await cur.fetchone())[0]
+    return total
+
+
+async def _write_table(db: aiosqlite.Connection) -> str:
+    """Table new rows go to: this month's partition (created and attached on demand) or the main table."""
+    if partition_mode() != "month":
+        return TABLE
+    key = month_key(datetime.now(timezone.utc))
+    path = partition_path(key)
+    if not path.exists():
+        await asyncio.to_thread(_create_partition_file, path)
+    await sync_partitions(db)
+    alias = _attached.get(db, {}).get(key)
+    if alias is None:
+        raise RuntimeError(f"Message index partition {path} could not be attached")
+    return f"{alias}.{TABLE}"
+
+
+# %s is the created_at value: datetime('now') for a local copy, a placeholder for relayed rows.
+_UPSERT = (
+    "INSERT INTO {table} (" + COLUMNS + ") VALUES (?, ?, ?, ?, ?, %s) "
+    "ON CONFLICT (user_id, source_chat_id, source_msg_id, dest_chat_id) DO UPDATE SET "
+    "dest_msg_id = excluded.dest_msg_id, created_at = excluded.created_at"
+)
+
+
+async def save_dest_mapping(
+    db: aiosqlite.Connection,
+    user_id: int,
+    source_chat_id: int,
+    source_msg_id: int,
+    dest_chat_id: int,
+    dest_msg_id: int,
+) -> None:
+    values = (user_id, source_chat_id, source_msg_id, dest_chat_id, dest_msg_id)
+    await db.execute(_UPSERT.format(table=await _write_table(db)) % "datetime('now')", values)
+    if settings.message_index_relay:
+        await db.execute(
+            f"INSERT INTO message_index_outbox ({COLUMNS}) VALUES (?, ?, ?, ?, ?, datetime('now'))", values
+        )
+    await db.commit()
+
+
+async def save_relayed(db: aiosqlite.Connection, agent_id: str, rows: list[dict]) -> int:
+    """Store index rows an agent relayed (not committed), keeping the node's created_at. Only rows
+    of users whose workers run on that agent are accepted. Returns the number stored."""
+    if not rows:
+        return 0
+    async with db.execute("SELECT DISTINCT user_id FROM worker_registry WHERE agent_id = ?", (agent_id,)) as cur:
+        users = {r[0] for r in await cur.fetchall()}
+    values = [tuple(r[c] for c in COLUMNS.split(", ")) for r in rows if r["user_id"] in users]
+    if values:
+        await db.executemany(_UPSERT.format(table=await _write_table(db)) % "?", values)
+    return len(values)
+
+
+def outbox_on_node(sqlite_path: str, limit: int = RELAY_BATCH) -> list[dict]:
+    """Blocking (agent): the oldest rows the node's workers queued for the API, with their outbox id."""
+    try:
+        conn = sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True, timeout=1.0)
+    except sqlite3.Error:
+        return []
+    try:
+        cur = conn.execute(f"SELECT id, {COLUMNS} FROM message_index_outbox ORDER BY id LIMIT ?", (limit,))
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, r)) for r in cur]
+    except sqlite3.Error:
+        return []
+    finally:
+        conn.close()
+
+
+def forget_relayed_on_node(sqlite_path: str, last_id: int) -> None:
+    """Blocking (agent): drop outbox rows up to last_id once the API has stored them."""
+    with sqlite3.connect(sqlite_path, timeout=5.0) as conn:
+        conn.execute("DELETE FROM message_index_outbox WHERE id <= ?", (last_id,))
+    conn.close()
+
+
+async def lookup_dest_msg_id(
+    db: aiosqlite.Connection,
+    user_id: int,
+    source_chat_id: int,
+    source_msg_id: int,
+    dest_chat_id: int,
+) -> int | None:
+    """Newest copy wins: partitions are searched newest first, then the main table."""
+    for table in await table_sources(db):
+        async with db.execute(
+            f"SELECT dest_msg_id FROM {table} "
+            "WHERE user_id = ? AND source_chat_id = ? AND source_msg_id = ? AND dest_chat_id = ?",
+            (user_id, source_chat_id, source_msg_id, dest_chat_id),
+        ) as cur:
+            row = await cur.fetchone()
+        if row:
+            return row[0]
+    return None
+
+
+def default_retention_days() -> int | None:
+    """Global retention in days (app_settings override, else env). None = keep forever."""
+    stored = get_setting_sync(RETENTION_SETTING_KEY)
+    if stored is not None:
+        try:
+            days = int(stored)
+        except ValueError:
+            logger.warning("Ignoring invalid %s=%r", RETENTION_SETTING_KEY, stored)
+            days = 0
+    else:
+        days = settings.message_index_retention_days or 0
+    return days if days > 0 else None
+
+
+def _resolve(override: int | None, inherited: int | None) -> int | None:
+    if override is None:
+        return inherited
+    return override if override > 0 else None
+
+
+def _month_end(key: str) -> datetime:
+    year, month = int(key[:4]), int(key[4:])
+    if month == 12:
+        return datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+    return datetime(year, month + 1, 1, tzinfo=timezone.utc)
+
+
+def _in_clause(column: str, values: list[int]) -> str:
+    return f"{column} IN ({', '.join('?' * len(values))})"
+
+
+async def _batched(
+    db: aiosqlite.Connection,
+    result: dict,
+    key: str,
+    sql: str,
+    params: tuple,
+    batch_size: int,
+    pause: float,
+    deadline: float | None,
+) -> bool:
+    """Run a rowid-batched DELETE/UPDATE (sql ends with 'LIMIT ?') until it touches fewer than
+    batch_size rows, committing after every batch so the write lock is released in between.
+    Counts go to result[key]. Returns False (and marks result incomplete) once deadline passes."""
+    while True:
+        cur = await db.execute(sql, (*params, batch_size))
+        await db.commit()
+        result[key] += max(cur.rowcount, 0)
+        if cur.rowcount < batch_size:
+            return True
+        if deadline is not None and time.monotonic() >= deadline:
+            result["complete"] = False
+            return False
+        await asyncio.sleep(pause)
+
+
+async def drop_partition(db: aiosqlite.Connection, key: str) -> None:
+    """Detach a monthly partition and unlink its files. Other connections detach it on their next
+    sync; until then they keep reading the unlinked file."""
+    await _detach(db, key)
+    path = partition_path(key)
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+    logger.info("Dropped message index partition %s", path.name)
+
+
+async def prune_message_index(
+    db: aiosqlite.Connection,
+    *,
+    now: datetime | None = None,
+    batch_size: int | None = None,
+    pause_seconds: float | None = None,
+    deadline: float | None = None,
+) -> dict:
+    """Delete dest_message_index rows past their retention. Returns counts of deleted rows,
+    legacy rows stamped with created_at, and dropped partition keys. With a deadline
+    (time.monotonic()) it stops after the batch that crosses it and reports complete=False;
+    the next run picks up where it left off."""
+    now = now or datetime.now(timezone.utc)
+    now_str = now.strftime(TIMESTAMP_FORMAT)
+    batch_size = max(1, batch_size or settings.message_index_prune_batch_size)
+    pause = settings.message_index_prune_pause_ms / 1000 if pause_seconds is None else pause_seconds
+    default_days = default_retention_days()
+
+    async with db.execute("SELECT id, message_index_retention_days FROM users") as cur:
+        user_days = {r[0]: _resolve(r[1], default_days) for r in await cur.fetchall()}
+    async with db.execute(
+        "SELECT user_id, source_chat_id, dest_chat_id, message_index_retention_days "
+        "FROM channel_mappings WHERE message_index_retention_days IS NOT NULL"
+    ) as cur:
+        mapping_rows = await cur.fetchall()
+    overrides: dict[int, list[tuple[list[int], list[int], int | None]]] = {}
+    for uid, src, dest, days in mapping_rows:
+        srcs = [c for c in (src, alternate_chat_id(src)) if c is not None]
+        dests = [c for c in (dest, alternate_chat_id(dest)) if c is not None]
+        overrides.setdefault(uid, []).append((srcs, dests, _resolve(days, None)))
+
+    result = {"deleted": 0, "stamped": 0, "partitions_dropped": [], "complete": True}
+
+    # Rows from before created_at existed start aging now rather than being deleted outright.
+    for uid in user_days:
+        if not await _batched(
+            db,
+            result,
+            "stamped",
+            f"UPDATE main.{TABLE} SET created_at = ? WHERE rowid IN "
+            f"(SELECT rowid FROM main.{TABLE} WHERE user_id = ? AND created_at IS NULL LIMIT ?)",
+            (now_str, uid),
+            batch_size,
+            pause,
+            deadline,
+        ):
+            return result
+
+    # A whole month can go once it is older than the longest retention anyone has.
+    retentions = list(user_days.values()) + [d for rules in overrides.values() for _, _, d in rules]
+    if not retentions:
+        longest = default_days
+    else:
+        longest = None if None in retentions else max(retentions)
+    if longest is not None:
+        horizon = now - timedelta(days=longest)
+        for key in list_partition_keys():
+            if _month_end(key) <= horizon:
+                await drop_partition(db, key)
+                result["partitions_dropped"].append(key)
+
+    for table in await table_sources(db):
+        delete = f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {{where}} LIMIT ?)"
+        for uid, days in user_days.items():
+            rules = overrides.get(uid, [])
+            for srcs, dests, mapping_days in rules:
+                if mapping_days is None:
+                    continue
+                where = (
+                    f"user_id = ? AND {_in_clause('source_chat_id', srcs)} "
+                    f"AND {_in_clause('dest_chat_id', dests)} AND created_at < ?"
+                )
+                cutoff = (now - timedelta(days=mapping_days)).strftime(TIMESTAMP_FORMAT)
+                params = (uid, *srcs, *dests, cutoff)
+                if not await _batched(
+                    db, result, "deleted", delete.format(where=where), params, batch_size, pause, deadline
+                ):
+                    return result
+            if days is None:
+                continue
+            where = "user_id = ? AND created_at < ?"
+            user_params: list = [uid, (now - timedelta(days=days)).strftime(TIMESTAMP_FORMAT)]
+            for srcs, dests, _ in rules:
+                # Mappings with their own retention were handled above.
+                where += f" AND NOT ({_in_clause('source_chat_id', srcs)} AND {_in_clause('dest_chat_id', dests)})"
+                user_params.extend([*srcs, *dests])
+            if not await _batched(
+                db, result, "deleted", delete.format(where=where), tuple(user_params), batch_size, pause, deadline
+            ):
+                return result
+
+    if result["deleted"] or result["partitions_dropped"]:
+        logger.info(
+            "Pruned dest_message_index: %d rows deleted, %d partitions dropped",
+            result["deleted"],
+            len(result["partitions_dropped"]),
+        )
+    return result
@@ -0,0 +1,156 @@
+"""Sampled message traces of the workers' handlers (app.worker_traces), in message_traces
+(migration v23).
+
+A worker hands its traces over with each runtime heartbeat and app.db.worker_heartbeats.publish
+saves them here. On remote agents that is the node's SQLite: read_local() attaches the node's
+recent traces to the relayed heartbeat and the API saves them again (INSERT OR IGNORE on the
+trace id, so relaying twice is harmless). Old traces are purged by the message_traces
+maintenance job (TRACE_RETENTION_HOURS).
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Iterable
+
+import aiosqlite
+
+COLUMNS = ("trace_id", "account_id", "started_at", "duration_ms", "outcome", "attributes", "spans")
+_SELECT = f"SELECT {', '.join(COLUMNS)} FROM message_traces"
+
+SERVICE_NAME = "tg-copier-worker"
+SCOPE_NAME = "app.worker_traces"
+
+
+def _row(row) -> dict[str, Any]:
+    trace = dict(zip(COLUMNS, row))
+    trace["attributes"] = json.loads(trace["attributes"] or "{}")
+    trace["spans"] = json.loads(trace["spans"] or "[]")
+    return trace
+
+
+def _values(account_id: int, trace: dict[str, Any]) -> tuple:
+    return (
+        trace["trace_id"], account_id, trace["started_at"], trace["duration_ms"], trace["outcome"],
+        json.dumps(trace.get("attributes") or {}), json.dumps(trace.get("spans") or []),
+    )
+
+
+async def save(db: aiosqlite.Connection, account_id: int, traces: Iterable[dict[str, Any]]) -> None:
+    """Insert traces not stored yet (not committed; publish commits with the heartbeat row)."""
+    await db.executemany(
+        f"INSERT OR IGNORE INTO message_traces ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+        [_values(account_id, t) for t in traces],
+    )
+
+
+def read_recent(conn, account_id: int, since: float) -> list[dict[str, Any]]:
+    """Blocking read (sqlite3) of the account's traces started after `since`, for the agent relay."""
+    rows = conn.execute(
+        _SELECT + " WHERE account_id = ? AND started_at > ? ORDER BY started_at", (account_id, since)
+    ).fetchall()
+    return [_row(r) for r in rows]
+
+
+async def list_traces(
+    db: aiosqlite.Connection,
+    account_ids: list[int] | None,
+    outcome: str | None = None,
+    mapping_id: int | None = None,
+    since: float | None = None,
+    limit: int = 50,
+) -> list[dict[str, Any]]:
+    """Newest first; account_ids None means all accounts."""
+    clauses: list[str] = []
+    params: list[Any] = []
+    if account_ids is not None:
+        clauses.append(f"account_id IN ({', '.join('?' * len(account_ids)) or 'NULL'})")
+        params += account_ids
+    if outcome is not None:
+        clauses.append("outcome = ?")
+        params.append(outcome)
+    if since is not None:
+        clauses.append("started_at >= ?")
+        params.append(since)
+    if mapping_id is not None:
+        clauses.append("EXISTS (SELECT 1 FROM json_each(spans) WHERE json_extract(value, '$.mapping_id') = ?)")
+        params.append(mapping_id)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    async with db.execute(_SELECT + where + " ORDER BY started_at DESC LIMIT ?", [*params, limit]) as cur:
+        return [_row(r) for r in await cur.fetchall()]
+
+
+async def get_trace(db: aiosqlite.Connection, trace_id: str) -> dict[str, Any] | None:
+    async with db.execute(_SELECT + " WHERE trace_id = ?", (trace_id,)) as cur:
+        row = await cur.fetchone()
+    return _row(row) if row else None
+
+
+def _attributes(values: dict[str, Any]) -> list[dict[str, Any]]:
+    out = []
+    for key, value in values.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}  # OTLP/JSON encodes 64-bit integers as strings
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        out.append({"key": key, "value": typed})
+    return out
+
+
+def _nanos(ms: float) -> int:
+    return int(round(ms * 1_000_000))
+
+
+def to_otlp(traces: Iterable[dict[str, Any]]) -> dict[str, Any]:
+    """OTLP/JSON (ExportTraceServiceRequest) of stored traces, one resource per account: a root
+    "message" span per trace, a "mapping" span per mapping under it and the stage spans under
+    their mapping. Span ids are derived from the trace id and the span's position."""
+    by_account: dict[int, list[dict[str, Any]]] = {}
+    for trace in traces:
+        tid = trace["trace_id"]
+        start = int(round(trace["started_at"] * 1e9))
+        root_id = f"{tid[:8]}{0:08x}"
+        mapping_spans: dict[Any, str] = {}
+        spans = [{
+            "traceId": tid,
+            "spanId": root_id,
+            "name": "message",
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(start + _nanos(trace["duration_ms"])),
+            "attributes": _attributes({**trace["attributes"], "outcome": trace["outcome"]}),
+            "status": {"code": 2 if trace["outcome"] == "failed" else 1},
+        }]
+        # Mapping spans are recorded when the mapping finishes, after its stages: assign ids first.
+        for i, span in enumerate(trace["spans"], start=1):
+            if span["name"] == "mapping":
+                mapping_spans[span["mapping_id"]] = f"{tid[:8]}{i:08x}"
+        for i, span in enumerate(trace["spans"], start=1):
+            is_mapping = span["name"] == "mapping"
+            begin = start + _nanos(span["offset_ms"])
+            spans.append({
+                "traceId": tid,
+                "spanId": f"{tid[:8]}{i:08x}",
+                "parentSpanId": root_id if is_mapping else mapping_spans.get(span["mapping_id"], root_id),
+                "name": span["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(begin),
+                "endTimeUnixNano": str(begin + _nanos(span["duration_ms"])),
+                "attributes": _attributes({"mapping_id": span["mapping_id"], **span.get("attributes", {})}),
+            })
+        by_account.setdefault(trace["account_id"], []).extend(spans)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": _attributes({"service.name": SERVICE_NAME, "account_id": account_id})},
+                "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": spans}],
+            }
+            for account_id, spans in sorted(by_account.items())
+        ]
+    }
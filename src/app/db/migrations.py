@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import hashlib
 import logging
+import sqlite3
 
 import aiosqlite
 
@@ -161,9 +162,295 @@ MIGRATIONS = [
     ALTER TABLE mapping_transform_rules ADD COLUMN replacement_media_asset_id INTEGER REFERENCES media_assets(id);
     ALTER TABLE mapping_transform_rules ADD COLUMN apply_to_media_types TEXT;
     """,
+    # v15: dest_message_index.created_at and message index retention overrides (NULL = inherit)
+    """
+    ALTER TABLE dest_message_index ADD COLUMN created_at TEXT;
+    CREATE INDEX IF NOT EXISTS ix_dest_message_index_user_created ON dest_message_index(user_id, created_at);
+    ALTER TABLE users ADD COLUMN message_index_retention_days INTEGER;
+    ALTER TABLE channel_mappings ADD COLUMN message_index_retention_days INTEGER;
+    """,
+    # v16: maintenance scheduler run history
+    """
+    CREATE TABLE IF NOT EXISTS maintenance_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job TEXT NOT NULL,
+        started_at TEXT NOT NULL,
+        duration_ms INTEGER NOT NULL,
+        removed INTEGER NOT NULL DEFAULT 0,
+        complete INTEGER NOT NULL DEFAULT 1,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS ix_maintenance_runs_job_id ON maintenance_runs(job, id);
+    """,
+    # v17: FTS5 search tables (external content, synced by triggers) for list endpoint `q` search
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS mappings_fts USING fts5(
+        name, source_chat_title, dest_chat_title, source_chat_id, dest_chat_id,
+        content='channel_mappings', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE TRIGGER IF NOT EXISTS channel_mappings_fts_ai AFTER INSERT ON channel_mappings BEGIN
+        INSERT INTO mappings_fts(rowid, name, source_chat_title, dest_chat_title, source_chat_id, dest_chat_id)
+        VALUES (new.id, new.name, new.source_chat_title, new.dest_chat_title, new.source_chat_id, new.dest_chat_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS channel_mappings_fts_ad AFTER DELETE ON channel_mappings BEGIN
+        INSERT INTO mappings_fts(mappings_fts, rowid, name, source_chat_title, dest_chat_title, source_chat_id, dest_chat_id)
+        VALUES ('delete', old.id, old.name, old.source_chat_title, old.dest_chat_title, old.source_chat_id, old.dest_chat_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS channel_mappings_fts_au AFTER UPDATE OF name, source_chat_title, dest_chat_title, source_chat_id, dest_chat_id ON channel_mappings BEGIN
+        INSERT INTO mappings_fts(mappings_fts, rowid, name, source_chat_title, dest_chat_title, source_chat_id, dest_chat_id)
+        VALUES ('delete', old.id, old.name, old.source_chat_title, old.dest_chat_title, old.source_chat_id, old.dest_chat_id);
+        INSERT INTO mappings_fts(rowid, name, source_chat_title, dest_chat_title, source_chat_id, dest_chat_id)
+        VALUES (new.id, new.name, new.source_chat_title, new.dest_chat_title, new.source_chat_id, new.dest_chat_id);
+    END;
+    INSERT INTO mappings_fts(mappings_fts) VALUES ('rebuild');
+    CREATE VIRTUAL TABLE IF NOT EXISTS accounts_fts USING fts5(
+        name, phone,
+        content='telegram_accounts', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE TRIGGER IF NOT EXISTS telegram_accounts_fts_ai AFTER INSERT ON telegram_accounts BEGIN
+        INSERT INTO accounts_fts(rowid, name, phone) VALUES (new.id, new.name, new.phone);
+    END;
+    CREATE TRIGGER IF NOT EXISTS telegram_accounts_fts_ad AFTER DELETE ON telegram_accounts BEGIN
+        INSERT INTO accounts_fts(accounts_fts, rowid, name, phone) VALUES ('delete', old.id, old.name, old.phone);
+    END;
+    CREATE TRIGGER IF NOT EXISTS telegram_accounts_fts_au AFTER UPDATE OF name, phone ON telegram_accounts BEGIN
+        INSERT INTO accounts_fts(accounts_fts, rowid, name, phone) VALUES ('delete', old.id, old.name, old.phone);
+        INSERT INTO accounts_fts(rowid, name, phone) VALUES (new.id, new.name, new.phone);
+    END;
+    INSERT INTO accounts_fts(accounts_fts) VALUES ('rebuild');
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        email, name,
+        content='users', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, email, name) VALUES (new.id, new.email, new.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, email, name) VALUES ('delete', old.id, old.email, old.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF email, name ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, email, name) VALUES ('delete', old.id, old.email, old.name);
+        INSERT INTO users_fts(rowid, email, name) VALUES (new.id, new.email, new.name);
+    END;
+    INSERT INTO users_fts(users_fts) VALUES ('rebuild');
+    """,
+    # v18: per-user row counts kept by triggers (list totals without COUNT(*)) and indexes that
+    # serve every list sort order, scoped by user_id and unscoped, so pages never sort in a temp B-tree
+    """
+    CREATE TABLE IF NOT EXISTS row_counts (
+        table_name TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (table_name, user_id)
+    ) WITHOUT ROWID;
+    CREATE TRIGGER IF NOT EXISTS channel_mappings_count_ai AFTER INSERT ON channel_mappings BEGIN
+        INSERT INTO row_counts (table_name, user_id, n) VALUES ('channel_mappings', new.user_id, 1)
+        ON CONFLICT (table_name, user_id) DO UPDATE SET n = n + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS channel_mappings_count_ad AFTER DELETE ON channel_mappings BEGIN
+        UPDATE row_counts SET n = n - 1 WHERE table_name = 'channel_mappings' AND user_id = old.user_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS channel_mappings_count_au AFTER UPDATE OF user_id ON channel_mappings
+    WHEN new.user_id IS NOT old.user_id BEGIN
+        UPDATE row_counts SET n = n - 1 WHERE table_name = 'channel_mappings' AND user_id = old.user_id;
+        INSERT INTO row_counts (table_name, user_id, n) VALUES ('channel_mappings', new.user_id, 1)
+        ON CONFLICT (table_name, user_id) DO UPDATE SET n = n + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS telegram_accounts_count_ai AFTER INSERT ON telegram_accounts BEGIN
+        INSERT INTO row_counts (table_name, user_id, n) VALUES ('telegram_accounts', new.user_id, 1)
+        ON CONFLICT (table_name, user_id) DO UPDATE SET n = n + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS telegram_accounts_count_ad AFTER DELETE ON telegram_accounts BEGIN
+        UPDATE row_counts SET n = n - 1 WHERE table_name = 'telegram_accounts' AND user_id = old.user_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS telegram_accounts_count_au AFTER UPDATE OF user_id ON telegram_accounts
+    WHEN new.user_id IS NOT old.user_id BEGIN
+        UPDATE row_counts SET n = n - 1 WHERE table_name = 'telegram_accounts' AND user_id = old.user_id;
+        INSERT INTO row_counts (table_name, user_id, n) VALUES ('telegram_accounts', new.user_id, 1)
+        ON CONFLICT (table_name, user_id) DO UPDATE SET n = n + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS dest_message_index_count_ai AFTER INSERT ON dest_message_index BEGIN
+        INSERT INTO row_counts (table_name, user_id, n) VALUES ('dest_message_index', new.user_id, 1)
+        ON CONFLICT (table_name, user_id) DO UPDATE SET n = n + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS dest_message_index_count_ad AFTER DELETE ON dest_message_index BEGIN
+        UPDATE row_counts SET n = n - 1 WHERE table_name = 'dest_message_index' AND user_id = old.user_id;
+    END;
+    INSERT OR REPLACE INTO row_counts (table_name, user_id, n)
+    SELECT 'channel_mappings', user_id, COUNT(*) FROM channel_mappings GROUP BY user_id;
+    INSERT OR REPLACE INTO row_counts (table_name, user_id, n)
+    SELECT 'telegram_accounts', user_id, COUNT(*) FROM telegram_accounts GROUP BY user_id;
+    INSERT OR REPLACE INTO row_counts (table_name, user_id, n)
+    SELECT 'dest_message_index', user_id, COUNT(*) FROM dest_message_index GROUP BY user_id;
+    CREATE INDEX IF NOT EXISTS ix_channel_mappings_user_name ON channel_mappings(user_id, name);
+    CREATE INDEX IF NOT EXISTS ix_channel_mappings_user_source ON channel_mappings(user_id, source_chat_id);
+    CREATE INDEX IF NOT EXISTS ix_channel_mappings_user_dest ON channel_mappings(user_id, dest_chat_id);
+    CREATE INDEX IF NOT EXISTS ix_channel_mappings_user_enabled ON channel_mappings(user_id, enabled);
+    CREATE INDEX IF NOT EXISTS ix_channel_mappings_user_created ON channel_mappings(user_id, created_at);
+    CREATE INDEX IF NOT EXISTS ix_channel_mappings_name ON channel_mappings(name);
+    CREATE INDEX IF NOT EXISTS ix_channel_mappings_source ON channel_mappings(source_chat_id);
+    CREATE INDEX IF NOT EXISTS ix_channel_mappings_dest ON channel_mappings(dest_chat_id);
+    CREATE INDEX IF NOT EXISTS ix_channel_mappings_enabled ON channel_mappings(enabled);
+    CREATE INDEX IF NOT EXISTS ix_channel_mappings_created ON channel_mappings(created_at);
+    CREATE INDEX IF NOT EXISTS ix_telegram_accounts_user_name ON telegram_accounts(user_id, name);
+    CREATE INDEX IF NOT EXISTS ix_telegram_accounts_user_type ON telegram_accounts(user_id, type);
+    CREATE INDEX IF NOT EXISTS ix_telegram_accounts_user_created ON telegram_accounts(user_id, created_at);
+    CREATE INDEX IF NOT EXISTS ix_telegram_accounts_name ON telegram_accounts(name);
+    CREATE INDEX IF NOT EXISTS ix_telegram_accounts_type ON telegram_accounts(type);
+    CREATE INDEX IF NOT EXISTS ix_telegram_accounts_status ON telegram_accounts(status);
+    CREATE INDEX IF NOT EXISTS ix_telegram_accounts_created ON telegram_accounts(created_at);
+    """,
+    # v19: worker leases (one row per account, generation never reset) replace PID liveness checks;
+    # worker_registry rows point at the lease generation they were spawned under.
+    """
+    CREATE TABLE IF NOT EXISTS worker_leases (
+        account_id INTEGER PRIMARY KEY,
+        generation INTEGER NOT NULL DEFAULT 0,
+        owner TEXT NOT NULL DEFAULT '',
+        host_id TEXT NOT NULL DEFAULT '',
+        expires_at REAL NOT NULL DEFAULT 0,
+        heartbeat_at REAL,
+        stop_requested INTEGER NOT NULL DEFAULT 0
+    );
+    ALTER TABLE worker_registry ADD COLUMN generation INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE worker_registry ADD COLUMN host_id TEXT NOT NULL DEFAULT '';
+    DELETE FROM worker_registry WHERE rowid NOT IN (SELECT MAX(rowid) FROM worker_registry GROUP BY account_id);
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_worker_registry_account ON worker_registry(account_id);
+    """,
+    # v20: remote worker agents (`tg-copier agent`); worker_registry.agent_id is NULL for workers
+    # spawned by the API itself.
+    """
+    CREATE TABLE IF NOT EXISTS worker_agents (
+        agent_id TEXT PRIMARY KEY,
+        host_id TEXT NOT NULL DEFAULT '',
+        capacity INTEGER NOT NULL DEFAULT 0,
+        last_seen REAL NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    ALTER TABLE worker_registry ADD COLUMN agent_id TEXT;
+    CREATE INDEX IF NOT EXISTS ix_worker_registry_agent ON worker_registry(agent_id);
+    """,
+    # v21: runtime heartbeat of each account's worker (app.db.worker_heartbeats); mappings holds
+    # per-mapping message counters as JSON.
+    """
+    CREATE TABLE IF NOT EXISTS worker_heartbeats (
+        account_id INTEGER PRIMARY KEY,
+        generation INTEGER NOT NULL DEFAULT 0,
+        pid INTEGER,
+        host_id TEXT NOT NULL DEFAULT '',
+        updated_at REAL NOT NULL,
+        started_at REAL,
+        last_update_at REAL,
+        last_send_at REAL,
+        loop_lag_ms REAL,
+        rss_bytes INTEGER,
+        cpu_seconds REAL,
+        inflight INTEGER,
+        log_queue INTEGER,
+        mappings TEXT NOT NULL DEFAULT '{}'
+    );
+    """,
+    # v22: the worker's metrics registry snapshot (app.utils.metrics) rides on its heartbeat.
+    """
+    ALTER TABLE worker_heartbeats ADD COLUMN metrics TEXT NOT NULL DEFAULT '{}';
+    """,
+    # v23: sampled message traces of the workers' handlers (app.db.message_traces); attributes and
+    # spans are JSON.
+    """
+    CREATE TABLE IF NOT EXISTS message_traces (
+        trace_id TEXT PRIMARY KEY,
+        account_id INTEGER NOT NULL,
+        started_at REAL NOT NULL,
+        duration_ms REAL NOT NULL,
+        outcome TEXT NOT NULL,
+        attributes TEXT NOT NULL DEFAULT '{}',
+        spans TEXT NOT NULL DEFAULT '[]'
+    );
+    CREATE INDEX IF NOT EXISTS ix_message_traces_account_started ON message_traces(account_id, started_at);
+    CREATE INDEX IF NOT EXISTS ix_message_traces_started ON message_traces(started_at);
+    """,
+    # v24: per-mapping copy latency histograms. Heartbeats carry the worker's cumulative histograms;
+    # publishing adds their growth to one rollup row per mapping and hour (app.db.latency_rollups).
+    """
+    ALTER TABLE worker_heartbeats ADD COLUMN latency TEXT NOT NULL DEFAULT '{}';
+    CREATE TABLE IF NOT EXISTS mapping_latency_rollups (
+        mapping_id INTEGER NOT NULL,
+        hour INTEGER NOT NULL,
+        counts TEXT NOT NULL,
+        total_seconds REAL NOT NULL DEFAULT 0,
+        messages INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (mapping_id, hour)
+    );
+    CREATE INDEX IF NOT EXISTS ix_mapping_latency_rollups_hour ON mapping_latency_rollups(hour);
+    """,
+    # v25: the worker's most recent slow-callback reports (app.utils.loop_monitor) as JSON.
+    """
+    ALTER TABLE worker_heartbeats ADD COLUMN slow_callbacks TEXT NOT NULL DEFAULT '[]';
+    """,
+    # v26: on-demand profiles of a worker or the API (app.db.worker_profiles). Workers poll for
+    # pending rows of their account; agents copy them to their node and relay the results.
+    """
+    CREATE TABLE IF NOT EXISTS worker_profiles (
+        id TEXT PRIMARY KEY,
+        target TEXT NOT NULL,
+        worker_id TEXT,
+        account_id INTEGER,
+        seconds REAL NOT NULL,
+        hz INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        path TEXT,
+        samples INTEGER,
+        overhead_pct REAL,
+        error TEXT,
+        requested_by INTEGER,
+        created_at REAL NOT NULL,
+        finished_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS ix_worker_profiles_account_status ON worker_profiles(account_id, status);
+    """,
+    # v27: per-agent keys (app.db.agents); only their hash is kept.
+    """
+    ALTER TABLE worker_agents ADD COLUMN key_hash TEXT;
+    """,
+    # v28: on agent nodes, the dest_message_index rows the node's workers wrote that its agent has
+    # not relayed to the API yet (app.db.message_index).
+    """
+    CREATE TABLE IF NOT EXISTS message_index_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        source_chat_id INTEGER NOT NULL,
+        source_msg_id INTEGER NOT NULL,
+        dest_chat_id INTEGER NOT NULL,
+        dest_msg_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    """,
 ]
 
 
+# Stored in PRAGMA user_version once every migration is applied; init_sqlite skips the schema and
+# migration check entirely when the database already reports this version.
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def split_statements(sql: str) -> list[str]:
+    """Split a migration script into statements. sqlite3.complete_statement decides where a
+    statement ends, so semicolons inside trigger bodies (BEGIN ... END) and string literals do not
+    split it."""
+    statements: list[str] = []
+    buf = ""
+    for line in sql.strip().splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            stmt = buf.strip().rstrip(";").strip()
+            if stmt:
+                statements.append(stmt)
+            buf = ""
+    if buf.strip():
+        statements.append(buf.strip())
+    return statements
+
+
 def _migration_hash(sql: str | None) -> str:
     if sql is None:
         return "v1_base"
@@ -196,10 +483,7 @@ async def run_migrations(db: aiosqlite.Connection) -> None:
         name = f"m{i}_{_migration_hash(sql)}"
         if name in applied:
             continue
-        for stmt in sql.strip().split(";"):
-            stmt = stmt.strip()
-            if not stmt:
-                continue
+        for stmt in split_statements(sql):
             try:
                 await db.execute(stmt)
             except aiosqlite.OperationalError as e:
@@ -213,3 +497,5 @@ async def run_migrations(db: aiosqlite.Connection) -> None:
         )
         await db.commit()
         logger.info("Applied migration: %s", name)
+    await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    await db.commit()
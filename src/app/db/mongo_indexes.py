@@ -6,28 +6,61 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# One index per query shape (equality filter, then the keyset sort on (timestamp, _id), which also
+# bounds date_from/date_to). When several filters are combined the planner seeks on one of them and
+# applies the rest as residual filters; no shape needs a collection scan or an in-memory sort.
+# The timestamp (TTL) index is managed by app.db.mongo_storage together with retention.
 INDEXES = {
     "message_logs": [
-        {"keys": [("user_id", 1), ("timestamp", -1)], "name": "ix_user_timestamp"},
-        {"keys": [("timestamp", 1)], "name": "ix_timestamp"},
+        {"keys": [("user_id", 1), ("timestamp", -1), ("_id", -1)], "name": "ix_user_timestamp_id"},
+        {"keys": [("timestamp", -1), ("_id", -1)], "name": "ix_timestamp_id"},
+        {"keys": [("source_chat_id", 1), ("timestamp", -1), ("_id", -1)], "name": "ix_source_timestamp_id"},
+        {"keys": [("dest_chat_id", 1), ("timestamp", -1), ("_id", -1)], "name": "ix_dest_timestamp_id"},
     ],
     "worker_logs": [
-        {"keys": [("user_id", 1), ("timestamp", -1)], "name": "ix_user_timestamp"},
-        {"keys": [("timestamp", 1)], "name": "ix_timestamp"},
+        {"keys": [("user_id", 1), ("timestamp", -1), ("_id", -1)], "name": "ix_user_timestamp_id"},
+        {"keys": [("timestamp", -1), ("_id", -1)], "name": "ix_timestamp_id"},
+        {"keys": [("account_id", 1), ("timestamp", -1), ("_id", -1)], "name": "ix_account_timestamp_id"},
+        {"keys": [("level", 1), ("timestamp", -1), ("_id", -1)], "name": "ix_level_timestamp_id"},
     ],
 }
 
+# Indexes made redundant by a wider replacement above; dropped if still present.
+SUPERSEDED_INDEXES = {
+    "message_logs": ["ix_user_timestamp"],
+    "worker_logs": ["ix_user_timestamp"],
+}
+
 
 async def ensure_mongo_indexes() -> None:
-    """Create indexes on MongoDB collections if they do not exist."""
+    """Create log collections/indexes if they do not exist and apply retention settings."""
     try:
         from app.db.mongo import get_mongo_db
+        from app.db.mongo_storage import (
+            TIMESERIES_INDEXES,
+            apply_all_log_retention,
+            ensure_log_collections,
+            is_timeseries,
+        )
 
         mongo_db = get_mongo_db()
+        await ensure_log_collections(mongo_db)
         for coll_name, index_specs in INDEXES.items():
             coll = mongo_db[coll_name]
+            if await is_timeseries(mongo_db, coll_name):
+                for spec in TIMESERIES_INDEXES.get(coll_name, []):
+                    await coll.create_index(spec["keys"], name=spec["name"])
+                    logger.info("MongoDB index %s.%s ensured", coll_name, spec["name"])
+                continue
             for spec in index_specs:
                 await coll.create_index(spec["keys"], name=spec["name"])
                 logger.info("MongoDB index %s.%s ensured", coll_name, spec["name"])
+            existing = await coll.index_information()
+            for name in SUPERSEDED_INDEXES.get(coll_name, []):
+                if name in existing:
+                    await coll.drop_index(name)
+                    logger.info("MongoDB index %s.%s dropped (superseded)", coll_name, name)
+        await apply_all_log_retention(mongo_db)
     except Exception as e:
         logger.warning("MongoDB index creation skipped (Mongo may be unconfigured): %s", e)
+
@@ -0,0 +1,209 @@
+"""Storage layout and retention for the MongoDB log collections (message_logs, worker_logs).
+
+Retention is enforced by MongoDB itself: a TTL index on timestamp for regular collections, or the
+collection-level expireAfterSeconds for time-series collections. Settings come from app_settings
+(Admin Settings) with env fallback; an empty/0 value keeps logs forever.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Callable
+
+from pymongo.errors import CollectionInvalid
+
+from app.config import settings
+from app.services.app_settings import get_setting_sync
+
+logger = logging.getLogger(__name__)
+
+LOG_COLLECTIONS = ("message_logs", "worker_logs")
+TTL_INDEX_NAME = "ix_timestamp"
+
+# Time-series collections allow a single metaField; user_id is what every log query filters on.
+# account_id stays a regular (indexed) field.
+TIMESERIES_OPTIONS = {"timeField": "timestamp", "metaField": "user_id", "granularity": "seconds"}
+TIMESERIES_INDEXES = {
+    "message_logs": [
+        {"keys": [("user_id", 1), ("timestamp", -1)], "name": "ix_user_timestamp"},
+    ],
+    "worker_logs": [
+        {"keys": [("user_id", 1), ("timestamp", -1)], "name": "ix_user_timestamp"},
+        {"keys": [("account_id", 1), ("timestamp", -1)], "name": "ix_account_timestamp"},
+    ],
+}
+LEGACY_SUFFIX = "_legacy"
+MIGRATION_PROGRESS_COLLECTION = "_log_migrations"
+
+
+def retention_setting_key(coll_name: str) -> str:
+    return f"{coll_name}_retention_days"
+
+
+def get_retention_days(coll_name: str) -> int | None:
+    """Retention for a log collection in days (app_settings override, else env). None = keep forever."""
+    stored = get_setting_sync(retention_setting_key(coll_name))
+    if stored is not None:
+        try:
+            days = int(stored)
+        except ValueError:
+            logger.warning("Ignoring invalid %s=%r", retention_setting_key(coll_name), stored)
+            days = 0
+    else:
+        days = getattr(settings, retention_setting_key(coll_name)) or 0
+    return days if days > 0 else None
+
+
+def timeseries_enabled() -> bool:
+    stored = get_setting_sync("logs_timeseries")
+    if stored is not None:
+        return stored.strip().lower() in ("1", "true", "yes", "on")
+    return settings.logs_timeseries
+
+
+async def is_timeseries(mongo_db, coll_name: str) -> bool:
+    async for info in await mongo_db.list_collections(filter={"name": coll_name}):
+        return info.get("type") == "timeseries"
+    return False
+
+
+async def _collection_exists(mongo_db, coll_name: str) -> bool:
+    return coll_name in await mongo_db.list_collection_names(filter={"name": coll_name})
+
+
+async def create_timeseries_collection(mongo_db, coll_name: str, retention_days: int | None = None) -> None:
+    kwargs = {"expireAfterSeconds": retention_days * 86400} if retention_days else {}
+    await mongo_db.create_collection(coll_name, timeseries=TIMESERIES_OPTIONS, **kwargs)
+    logger.info("MongoDB time-series collection %s created", coll_name)
+
+
+async def ensure_log_collections(mongo_db) -> None:
+    """In time-series mode, create missing log collections as time-series (existing ones are left
+    alone; use `tg-copier db migrate-logs-timeseries` to convert them)."""
+    if not timeseries_enabled():
+        return
+    for coll_name in LOG_COLLECTIONS:
+        if await _collection_exists(mongo_db, coll_name):
+            continue
+        try:
+            await create_timeseries_collection(mongo_db, coll_name, get_retention_days(coll_name))
+        except CollectionInvalid:
+            pass  # created concurrently
+
+
+async def apply_log_retention(mongo_db, coll_name: str, retention_days: int | None) -> None:
+    """Make MongoDB expire documents older than retention_days (None disables expiry)."""
+    seconds = retention_days * 86400 if retention_days else None
+    if await is_timeseries(mongo_db, coll_name):
+        await mongo_db.command("collMod", coll_name, expireAfterSeconds=seconds if seconds else "off")
+        return
+    coll = mongo_db[coll_name]
+    existing = (await coll.index_information()).get(TTL_INDEX_NAME)
+    current = existing.get("expireAfterSeconds") if existing else None
+    if existing and current == seconds:
+        return
+    if existing and current is not None and seconds is not None:
+        # Changing the TTL of an existing TTL index is a metadata-only collMod.
+        await mongo_db.command(
+            "collMod", coll_name, index={"name": TTL_INDEX_NAME, "expireAfterSeconds": seconds}
+        )
+    else:
+        if existing:
+            await coll.drop_index(TTL_INDEX_NAME)
+        kwargs = {"expireAfterSeconds": seconds} if seconds else {}
+        await coll.create_index([("timestamp", 1)], name=TTL_INDEX_NAME, **kwargs)
+    logger.info("MongoDB %s retention set to %s", coll_name, f"{retention_days} days" if seconds else "unlimited")
+
+
+async def apply_all_log_retention(mongo_db) -> None:
+    for coll_name in LOG_COLLECTIONS:
+        await apply_log_retention(mongo_db, coll_name, get_retention_days(coll_name))
+
+
+async def _present_ids(target, docs: list[dict]) -> set:
+    """_ids of docs already in the time-series target (the timestamp range lets it skip buckets)."""
+    timestamps = [d["timestamp"] for d in docs]
+    query = {"_id": {"$in": [d["_id"] for d in docs]}, "timestamp": {"$gte": min(timestamps), "$lte": max(timestamps)}}
+    return {d["_id"] for d in await target.find(query, {"_id": 1}).to_list(None)}
+
+
+async def migrate_to_timeseries(
+    mongo_db,
+    coll_name: str,
+    *,
+    batch_size: int = 1000,
+    drop_legacy: bool = False,
+    progress: Callable[[int, int], None] | None = None,
+) -> dict:
+    """Move an existing log collection into a time-series collection of the same name.
+
+    The regular collection is renamed to <name>_legacy (time-series collections cannot be renamed)
+    and a time-series collection is created in its place, so new writes land there immediately.
+    Documents are then copied in _id order in batches, keeping their _id; progress is checkpointed
+    in _log_migrations so an interrupted run resumes after the last checkpointed batch. The first
+    batch of a run may already be partly copied (interrupted between insert and checkpoint), and
+    time-series collections have no unique _id index, so its documents already present are skipped.
+    Stop workers first: a write between the rename and the create would recreate a regular
+    collection.
+    """
+    legacy_name = coll_name + LEGACY_SUFFIX
+    legacy_exists = await _collection_exists(mongo_db, legacy_name)
+    if await is_timeseries(mongo_db, coll_name) and not legacy_exists:
+        return {"collection": coll_name, "status": "already_timeseries", "copied": 0, "skipped": 0}
+    if not legacy_exists:
+        if not await _collection_exists(mongo_db, coll_name):
+            await create_timeseries_collection(mongo_db, coll_name, get_retention_days(coll_name))
+            return {"collection": coll_name, "status": "created", "copied": 0, "skipped": 0}
+        await mongo_db[coll_name].rename(legacy_name)
+        legacy_exists = True
+    if not await _collection_exists(mongo_db, coll_name):
+        await create_timeseries_collection(mongo_db, coll_name, get_retention_days(coll_name))
+    elif not await is_timeseries(mongo_db, coll_name):
+        raise RuntimeError(
+            f"{coll_name} was recreated as a regular collection during migration (workers still writing?). "
+            f"Stop workers, move its documents into {legacy_name}, drop {coll_name}, then rerun."
+        )
+
+    for spec in TIMESERIES_INDEXES.get(coll_name, []):
+        await mongo_db[coll_name].create_index(spec["keys"], name=spec["name"])
+
+    progress_coll = mongo_db[MIGRATION_PROGRESS_COLLECTION]
+    state = await progress_coll.find_one({"_id": coll_name}) or {}
+    last_id = state.get("last_id")
+    copied = int(state.get("copied", 0))
+    skipped = int(state.get("skipped", 0))
+    total = await mongo_db[legacy_name].estimated_document_count()
+    source = mongo_db[legacy_name]
+    target = mongo_db[coll_name]
+    first_batch = True
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = await source.find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        # Time-series documents require the timeField; anything without a timestamp cannot move.
+        docs = [d for d in batch if d.get("timestamp") is not None]
+        skipped += len(batch) - len(docs)
+        new_docs = docs
+        if docs and first_batch:
+            present = await _present_ids(target, docs)
+            new_docs = [d for d in docs if d["_id"] not in present]
+        first_batch = False
+        if new_docs:
+            await target.insert_many(new_docs, ordered=False)
+        copied += len(docs)
+        last_id = batch[-1]["_id"]
+        await progress_coll.update_one(
+            {"_id": coll_name},
+            {"$set": {"last_id": last_id, "copied": copied, "skipped": skipped}},
+            upsert=True,
+        )
+        if progress:
+            progress(copied + skipped, total)
+
+    status = "migrated"
+    if drop_legacy:
+        await source.drop()
+        await progress_coll.delete_one({"_id": coll_name})
+        status = "migrated_legacy_dropped"
+    return {"collection": coll_name, "status": status, "copied": copied, "skipped": skipped}
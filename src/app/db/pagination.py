@@ -0,0 +1,66 @@
+"""Keyset ("after" cursor) pagination helpers for SQLite list endpoints.
+
+A page is ordered by a sort key followed by unique tie-breaker columns (usually (col, id)), and
+the cursor encodes the key of the last row served. The next page is everything strictly after that
+key, which the matching index turns into a range seek instead of reading and discarding OFFSET
+rows. Only the first key column may be NULL (SQLite sorts NULLs first ascending, last descending).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from app.utils.cursor import decode_cursor, encode_cursor
+
+
+def key_cursor(values: Sequence) -> str:
+    """Opaque `after` token for the sort key of the last row served."""
+    return encode_cursor({"k": list(values)})
+
+
+def parse_key_cursor(token: str, size: int) -> list:
+    """Decode a key_cursor token for a sort key of `size` columns. Raises ValueError."""
+    key = decode_cursor(token).get("k")
+    if not isinstance(key, list) or len(key) != size:
+        raise ValueError("Invalid cursor")
+    if any(v is not None and not isinstance(v, (int, float, str)) for v in key):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def order_by(columns: Sequence[str], descending: bool = False) -> str:
+    direction = "DESC" if descending else "ASC"
+    return "ORDER BY " + ", ".join(f"{c} {direction}" for c in columns)
+
+
+def sort_columns(col: str) -> list[str]:
+    """Key columns for sorting a table with an integer id by col: (col, id), or just id."""
+    return ["id"] if col == "id" else [col, "id"]
+
+
+def after_condition(columns: Sequence[str], values: Sequence, descending: bool = False) -> tuple[str, list]:
+    """WHERE fragment selecting rows strictly after `values` in order_by(columns, descending).
+    Uses a row-value comparison so SQLite can seek the index that serves the order."""
+    op = "<" if descending else ">"
+    first, rest = columns[0], list(columns[1:])
+    if values[0] is not None:
+        cond = f"({', '.join(columns)}) {op} ({', '.join('?' for _ in columns)})"
+        params = list(values)
+        if descending:
+            # NULLs come after every value in descending order.
+            return f"({cond} OR {first} IS NULL)", params
+        return cond, params
+    if not rest:
+        return ("0" if descending else f"{first} IS NOT NULL"), []
+    tail = f"({', '.join(rest)}) {op} ({', '.join('?' for _ in rest)})"
+    if descending:
+        return f"({first} IS NULL AND {tail})", list(values[1:])
+    return f"(({first} IS NULL AND {tail}) OR {first} IS NOT NULL)", list(values[1:])
+
+
+def next_cursor(rows: Sequence[Sequence], page_size: int, key_indexes: Sequence[int]) -> str | None:
+    """Cursor after the last row of a page fetched with LIMIT page_size + 1, or None on the last page."""
+    if len(rows) <= page_size:
+        return None
+    last = rows[page_size - 1]
+    return key_cursor([last[i] for i in key_indexes])
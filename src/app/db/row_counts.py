@@ -0,0 +1,35 @@
+"""Per-user row counts maintained by triggers, so list endpoints can report totals without COUNT(*).
+
+Migration v18 creates row_counts(table_name, user_id, n) and AFTER INSERT / DELETE (and UPDATE OF
+user_id) triggers on the counted tables; message index partition files carry the same table and
+triggers for their own rows. Counts are exact for a whole user (or all users); filtered or searched
+lists still count their matches.
+"""
+
+from __future__ import annotations
+
+import aiosqlite
+
+COUNTED_TABLES = ("channel_mappings", "telegram_accounts", "dest_message_index")
+
+
+async def has_row_counts(db: aiosqlite.Connection, schema: str = "main") -> bool:
+    async with db.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = 'row_counts'"
+    ) as cur:
+        return await cur.fetchone() is not None
+
+
+async def cached_count(
+    db: aiosqlite.Connection, table: str, user_id: int | None = None, schema: str = "main"
+) -> int:
+    """Rows of `table` in `schema` owned by user_id (all users when None)."""
+    if table not in COUNTED_TABLES:
+        raise ValueError(f"{table} has no row count")
+    query = f"SELECT COALESCE(SUM(n), 0) FROM {schema}.row_counts WHERE table_name = ?"
+    params: list = [table]
+    if user_id is not None:
+        query += " AND user_id = ?"
+        params.append(user_id)
+    async with db.execute(query, params) as cur:
+        return (await cur.fetchone())[0]
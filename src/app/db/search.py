@@ -0,0 +1,56 @@
+"""FTS5 search over mappings, accounts and users.
+
+Migration v17 creates external-content FTS5 tables kept in sync by triggers:
+  mappings_fts  -> channel_mappings (name, source/dest chat titles, source/dest chat ids)
+  accounts_fts  -> telegram_accounts (name, phone)
+  users_fts     -> users (email, name)
+List endpoints accept `q`; every word of it is matched as a prefix and all words must match.
+Results are ranked by bm25 when there are at most RANK_MAX_ROWS of them; scoring is per match, so
+broader queries (a word found in most rows) keep id order and stay cheap.
+"""
+
+from __future__ import annotations
+
+import re
+
+FTS_TABLES = {
+    "channel_mappings": "mappings_fts",
+    "telegram_accounts": "accounts_fts",
+    "users": "users_fts",
+}
+MAX_TERMS = 8
+RANK_MAX_ROWS = 1000
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(q: str | None) -> str | None:
+    """Turn free text into a safe FTS5 MATCH expression of quoted prefix terms, or None when q
+    has no searchable words. "Foo -1001234" -> '"foo"* "1001234"*'."""
+    if not q:
+        return None
+    terms = _TERM_RE.findall(q.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def search_from(table: str, q: str | None) -> tuple[str, list]:
+    """FROM clause for `table`, restricted to rows matching q when q has words to search for.
+    The FTS subquery is the outer loop (CROSS JOIN), so SQLite runs the MATCH once instead of per
+    row, and exposes the bm25 score as fts_rank (computed only if selected or sorted on). Returns
+    (clause, params); the params come before those of the WHERE clause."""
+    expr = match_expression(q)
+    if expr is None:
+        return f"FROM {table}", []
+    fts = FTS_TABLES[table]
+    return (
+        f"FROM (SELECT rowid AS fts_id, rank AS fts_rank FROM {fts} WHERE {fts} MATCH ?) AS fts"
+        f" CROSS JOIN {table} ON {table}.id = fts.fts_id",
+        [expr],
+    )
+
+
+def rank_order(total: int) -> str:
+    """ORDER BY for a search without explicit sort: best matches first unless too many matched."""
+    return "ORDER BY fts_rank, id" if total <= RANK_MAX_ROWS else "ORDER BY id"
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+import asyncio
+import itertools
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 import aiosqlite
 
 from app.config import settings
+from app.utils.metrics import REGISTRY
 
 
 SCHEMA_SQL = """
@@ -57,18 +63,123 @@ CREATE TABLE IF NOT EXISTS dest_message_index (
 """
 
 
+def _connection_pragmas() -> list[str]:
+    return [
+        f"PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout_ms)}",
+        "PRAGMA synchronous = NORMAL",  # safe with WAL: only the last commits can be lost on power failure
+        f"PRAGMA cache_size = -{int(settings.sqlite_cache_size_kib)}",
+        f"PRAGMA mmap_size = {int(settings.sqlite_mmap_size)}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+
+
+async def _tune(db: aiosqlite.Connection) -> aiosqlite.Connection:
+    for pragma in _connection_pragmas():
+        await db.execute(pragma)
+    return db
+
+
 async def init_sqlite() -> None:
     db_path = Path(settings.sqlite_path)
     if db_path.parent:
         db_path.parent.mkdir(parents=True, exist_ok=True)
+    from app.db.migrations import SCHEMA_VERSION, run_migrations
+
     async with aiosqlite.connect(settings.sqlite_path) as db:
+        async with db.execute("PRAGMA user_version") as cur:
+            if (await cur.fetchone())[0] == SCHEMA_VERSION:
+                return  # fully migrated (and already in WAL mode): skip the schema and migration check
+        # WAL is persistent in the database file: readers no longer block the writer and vice versa.
+        await db.execute("PRAGMA journal_mode = WAL")
         await db.executescript(SCHEMA_SQL)
         await db.commit()
-        from app.db.migrations import run_migrations
-
         await run_migrations(db)
 
 
 async def get_sqlite() -> aiosqlite.Connection:
-    return await aiosqlite.connect(settings.sqlite_path)
+    return await _tune(await aiosqlite.connect(settings.sqlite_path))
+
+
+class SqlitePool:
+    """Long-lived connections for the API process: one writer, serialized by a lock and handed to
+    one request at a time, plus read-only readers shared round-robin (aiosqlite runs each
+    connection's statements on its own thread, so concurrent reads on a reader are safe)."""
+
+    def __init__(self, path: str, readers: int = 4) -> None:
+        self.path = path
+        self._reader_count = max(1, readers)
+        self._writer: aiosqlite.Connection | None = None
+        self._readers: list[aiosqlite.Connection] = []
+        self._next_reader = itertools.cycle(range(self._reader_count))
+        self._write_lock = asyncio.Lock()
+
+    async def open(self) -> None:
+        self._writer = await _tune(await aiosqlite.connect(self.path))
+        ro_uri = Path(self.path).resolve().as_uri() + "?mode=ro"
+        for _ in range(self._reader_count):
+            reader = await _tune(await aiosqlite.connect(ro_uri, uri=True))
+            await reader.execute("PRAGMA query_only = 1")
+            self._readers.append(reader)
+
+    async def close(self) -> None:
+        for conn in [self._writer, *self._readers]:
+            if conn is not None:
+                await conn.close()
+        self._writer = None
+        self._readers = []
+
+    def reader(self) -> aiosqlite.Connection:
+        return self._readers[next(self._next_reader)]
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        start = time.perf_counter()
+        async with self._write_lock:
+            acquired = time.perf_counter()
+            REGISTRY.observe("tgcopier_sqlite_writer_wait_seconds", acquired - start)
+            try:
+                yield self._writer
+            finally:
+                # Never leak a half-finished transaction into the next request.
+                if self._writer is not None and self._writer.in_transaction:
+                    await self._writer.rollback()
+                REGISTRY.observe("tgcopier_sqlite_writer_hold_seconds", time.perf_counter() - acquired)
+
+
+_pool: SqlitePool | None = None
+
+
+def get_sqlite_pool() -> SqlitePool | None:
+    return _pool
+
+
+async def open_sqlite_pool() -> SqlitePool:
+    global _pool
+    await close_sqlite_pool()
+    pool = SqlitePool(settings.sqlite_path, readers=settings.sqlite_pool_readers)
+    await pool.open()
+    _pool = pool
+    return pool
+
+
+async def close_sqlite_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.close()
+
 
+@asynccontextmanager
+async def sqlite_writer() -> AsyncIterator[aiosqlite.Connection]:
+    """The pooled writer for the enclosed statements only (a fresh connection when no pool is open).
+    Keep network calls, waits and password hashing outside the block: every API write queues here."""
+    pool = _pool
+    if pool is None:
+        db = await get_sqlite()
+        try:
+            yield db
+        finally:
+            await db.close()
+        return
+    async with pool.writer() as db:
+        yield db
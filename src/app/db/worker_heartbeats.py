@@ -0,0 +1,151 @@
+"""Worker runtime heartbeats: one worker_heartbeats row per account (migration v21), rewritten by
+the worker every WORKER_HEARTBEAT_SECONDS with its app.worker_stats snapshot (including its
+metrics registry, rendered by GET /metrics, its per-mapping copy latency histograms, whose growth
+is added to app.db.latency_rollups, and the message traces sampled since the previous heartbeat,
+stored in app.db.message_traces).
+
+The row is written from the worker's event loop, so a row that stops updating while the lease is
+still live means the loop is blocked or the process is frozen (restart_stale_workers in the
+workers router). Workers on remote agents write to the node's SQLite; the agent reads the row with
+read_local() and forwards it in its heartbeat.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from typing import Any, Iterable
+
+import aiosqlite
+
+from app.config import settings
+from app.db import latency_rollups, message_traces
+
+COLUMNS = (
+    "account_id", "generation", "pid", "host_id", "updated_at", "started_at", "last_update_at",
+    "last_send_at", "loop_lag_ms", "rss_bytes", "cpu_seconds", "inflight", "log_queue", "mappings",
+    "metrics", "latency", "slow_callbacks",
+)
+_SELECT = f"SELECT {', '.join(COLUMNS)} FROM worker_heartbeats"
+
+
+def _row(row) -> dict[str, Any]:
+    hb = dict(zip(COLUMNS, row))
+    hb["mappings"] = json.loads(hb["mappings"] or "{}")
+    hb["metrics"] = json.loads(hb["metrics"] or "{}")
+    hb["latency"] = json.loads(hb["latency"] or "{}")
+    hb["slow_callbacks"] = json.loads(hb["slow_callbacks"] or "[]")
+    return hb
+
+
+def _in(account_ids: Iterable[int] | None) -> tuple[str, list]:
+    if account_ids is None:
+        return "", []
+    ids = list(account_ids)
+    return f" WHERE account_id IN ({', '.join('?' * len(ids)) or 'NULL'})", ids
+
+
+async def publish(db: aiosqlite.Connection, hb: dict[str, Any]) -> None:
+    """Replace the account's heartbeat row, roll up its latency growth and store its traces
+    (committed here)."""
+    if hb.get("latency"):
+        async with db.execute(
+            "SELECT generation, latency FROM worker_heartbeats WHERE account_id = ?", (hb["account_id"],)
+        ) as cur:
+            prev = await cur.fetchone()
+        same_worker = prev is not None and prev[0] == hb.get("generation", 0)
+        added = latency_rollups.growth(hb["latency"], json.loads(prev[1] or "{}") if same_worker else None)
+        if added:
+            await latency_rollups.add(db, added, hb.get("updated_at") or time.time())
+    values = {
+        **hb,
+        "host_id": hb.get("host_id") or "",
+        "updated_at": hb.get("updated_at") or time.time(),
+        "mappings": json.dumps(hb.get("mappings") or {}),
+        "metrics": json.dumps(hb.get("metrics") or {}),
+        "latency": json.dumps(hb.get("latency") or {}),
+        "slow_callbacks": json.dumps(hb.get("slow_callbacks") or []),
+    }
+    await db.execute(
+        f"INSERT OR REPLACE INTO worker_heartbeats ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(COLUMNS))})",
+        [values.get(c) for c in COLUMNS],
+    )
+    if hb.get("traces"):
+        await message_traces.save(db, hb["account_id"], hb["traces"])
+    await db.commit()
+
+
+async def get_heartbeats(db: aiosqlite.Connection, account_ids: Iterable[int] | None = None) -> dict[int, dict]:
+    """Heartbeats by account_id (all accounts when account_ids is None)."""
+    where, params = _in(account_ids)
+    async with db.execute(_SELECT + where, params) as cur:
+        return {row[0]: _row(row) for row in await cur.fetchall()}
+
+
+def read_local(sqlite_path: str, account_ids: Iterable[int], traces_since: float | None = None) -> dict[int, dict]:
+    """Blocking read for the agent (no event loop); empty if the database or table is missing.
+    With traces_since, each heartbeat carries the account's traces started after it."""
+    where, params = _in(account_ids)
+    try:
+        conn = sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True, timeout=1.0)
+    except sqlite3.Error:
+        return {}
+    try:
+        heartbeats = {row[0]: _row(row) for row in conn.execute(_SELECT + where, params)}
+    except sqlite3.Error:
+        return {}
+    try:
+        if traces_since is not None:
+            for account_id, hb in heartbeats.items():
+                hb["traces"] = message_traces.read_recent(conn, account_id, traces_since)
+        return heartbeats
+    except sqlite3.Error:
+        return heartbeats
+    finally:
+        conn.close()
+
+
+def summary_for(
+    heartbeats: dict[int, dict[str, Any]], account_id: int, generation: int | None, now: float | None = None
+) -> dict[str, Any] | None:
+    """summarize() of the account's heartbeat if it belongs to the worker of that lease generation
+    (None before its first one). A heartbeat of an earlier generation belongs to the previous worker
+    of the account; generation 0 is an unrelayed one written on an agent's node."""
+    hb = heartbeats.get(account_id)
+    if hb is None or hb["generation"] not in (generation, 0):
+        return None
+    return summarize(hb, now)
+
+
+def is_stale(summary: dict[str, Any] | None) -> bool:
+    """Whether a worker's heartbeat summary is past WORKER_STALE_SECONDS (never, when that is 0)."""
+    if settings.worker_stale_seconds <= 0:
+        return False
+    return summary is None or summary["age_seconds"] > settings.worker_stale_seconds
+
+
+def summarize(hb: dict[str, Any] | None, now: float | None = None) -> dict[str, Any] | None:
+    """API view of a heartbeat: age, totals over mappings and the per-mapping counters."""
+    if hb is None:
+        return None
+    now = time.time() if now is None else now
+    totals = {"in": 0, "out": 0, "filtered": 0, "failed": 0}
+    for counters in hb["mappings"].values():
+        for key in totals:
+            totals[key] += counters.get(key, 0)
+    return {
+        "updated_at": hb["updated_at"],
+        "age_seconds": round(now - hb["updated_at"], 1),
+        "last_update_at": hb["last_update_at"],
+        "last_send_at": hb["last_send_at"],
+        "loop_lag_ms": hb["loop_lag_ms"],
+        "slow_callbacks": hb["slow_callbacks"],
+        "rss_bytes": hb["rss_bytes"],
+        "cpu_seconds": hb["cpu_seconds"],
+        "inflight": hb["inflight"],
+        "log_queue": hb["log_queue"],
+        "messages": totals,
+        "mappings": hb["mappings"],
+    }
@@ -0,0 +1,223 @@
+"""On-demand profiles (migration v26): one worker_profiles row per POST /api/workers/{id}/profile.
+
+A row targets the API itself or a worker, by account. Local workers poll their SQLite (the
+API's) for pending rows of their account, run app.utils.profiler in a thread and write the
+collapsed stacks to PROFILES_DIR. For a worker on a remote agent the API hands the request to the
+agent in its heartbeat reply. The agent copies the row to its node's SQLite, where the worker
+picks it up the same way. On a later heartbeat the agent sends the result back and the API writes
+it to its own PROFILES_DIR.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import secrets
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Iterable
+
+import aiosqlite
+
+from app.config import settings
+from app.utils.paths import resolve
+
+ID_PATTERN = r"^p\d+-[0-9a-f]{8}$"  # ids made by create(); also names the output file
+COLUMNS = (
+    "id", "target", "worker_id", "account_id", "seconds", "hz", "status", "path", "samples",
+    "overhead_pct", "error", "requested_by", "created_at", "finished_at",
+)
+_SELECT = f"SELECT {', '.join(COLUMNS)} FROM worker_profiles"
+# A profile without a result this long after it should have ended failed (its worker is gone).
+RESULT_GRACE_SECONDS = 120
+
+
+def profiles_dir() -> Path:
+    return resolve(settings.profiles_dir)
+
+
+def write_output(profile_id: str, collapsed: str) -> Path:
+    path = profiles_dir() / f"{profile_id}.collapsed"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(collapsed, encoding="utf-8")
+    return path
+
+
+def _row(row) -> dict[str, Any]:
+    return dict(zip(COLUMNS, row))
+
+
+async def create(
+    db: aiosqlite.Connection,
+    target: str,
+    seconds: float,
+    hz: int,
+    requested_by: int,
+    worker_id: str | None = None,
+    account_id: int | None = None,
+    status: str = "pending",
+) -> dict[str, Any]:
+    profile = {
+        "id": f"p{int(time.time())}-{secrets.token_hex(4)}",
+        "target": target,
+        "worker_id": worker_id,
+        "account_id": account_id,
+        "seconds": seconds,
+        "hz": hz,
+        "status": status,
+        "requested_by": requested_by,
+        "created_at": time.time(),
+    }
+    await db.execute(
+        f"INSERT INTO worker_profiles ({', '.join(profile)}) VALUES ({', '.join('?' * len(profile))})",
+        list(profile.values()),
+    )
+    await db.commit()
+    return await get(db, profile["id"])
+
+
+async def get(db: aiosqlite.Connection, profile_id: str) -> dict[str, Any] | None:
+    async with db.execute(_SELECT + " WHERE id = ?", (profile_id,)) as cur:
+        row = await cur.fetchone()
+    return _row(row) if row else None
+
+
+async def list_profiles(db: aiosqlite.Connection, limit: int = 50) -> list[dict[str, Any]]:
+    async with db.execute(_SELECT + " ORDER BY created_at DESC LIMIT ?", (limit,)) as cur:
+        return [_row(r) for r in await cur.fetchall()]
+
+
+async def active(db: aiosqlite.Connection, target: str, account_id: int | None) -> dict[str, Any] | None:
+    """The target's pending or running profile, if any."""
+    async with db.execute(
+        _SELECT + " WHERE target = ? AND account_id IS ? AND status IN ('pending', 'running')",
+        (target, account_id),
+    ) as cur:
+        row = await cur.fetchone()
+    return _row(row) if row else None
+
+
+async def expire(db: aiosqlite.Connection) -> None:
+    """Fail active profiles whose result is overdue (committed here)."""
+    await db.execute(
+        "UPDATE worker_profiles SET status = 'failed', error = 'no result (worker stopped?)', finished_at = ? "
+        "WHERE status IN ('pending', 'running') AND created_at + seconds + ? < ?",
+        (time.time(), RESULT_GRACE_SECONDS, time.time()),
+    )
+    await db.commit()
+
+
+async def claim_pending(db: aiosqlite.Connection, account_id: int) -> list[dict[str, Any]]:
+    """Mark the account's pending worker profiles running and return them (for the worker)."""
+    async with db.execute(
+        _SELECT + " WHERE target = 'worker' AND account_id = ? AND status = 'pending'", (account_id,)
+    ) as cur:
+        rows = [_row(r) for r in await cur.fetchall()]
+    for row in rows:
+        await db.execute("UPDATE worker_profiles SET status = 'running' WHERE id = ?", (row["id"],))
+    await db.commit()
+    return rows
+
+
+async def finish(
+    db: aiosqlite.Connection,
+    profile_id: str,
+    status: str,
+    path: str | None = None,
+    samples: int | None = None,
+    overhead_pct: float | None = None,
+    error: str | None = None,
+) -> None:
+    await db.execute(
+        "UPDATE worker_profiles SET status = ?, path = ?, samples = ?, overhead_pct = ?, error = ?, finished_at = ? "
+        "WHERE id = ?",
+        (status, path, samples, overhead_pct, error, time.time(), profile_id),
+    )
+    await db.commit()
+
+
+# --- remote agents --------------------------------------------------------------------------------
+
+
+async def take_for_agent(db: aiosqlite.Connection, account_ids: Iterable[int]) -> list[dict[str, Any]]:
+    """Pending profiles of the agent's workers, marked running (not committed): the heartbeat reply
+    hands them to the agent."""
+    ids = list(account_ids)
+    if not ids:
+        return []
+    async with db.execute(
+        f"SELECT id, account_id, seconds, hz, created_at FROM worker_profiles WHERE target = 'worker' "
+        f"AND status = 'pending' AND account_id IN ({', '.join('?' * len(ids))})",
+        ids,
+    ) as cur:
+        rows = await cur.fetchall()
+    for row in rows:
+        await db.execute("UPDATE worker_profiles SET status = 'running' WHERE id = ?", (row[0],))
+    return [dict(zip(("id", "account_id", "seconds", "hz", "created_at"), row)) for row in rows]
+
+
+async def store_relayed(db: aiosqlite.Connection, agent_id: str, results: Iterable[dict[str, Any]]) -> None:
+    """Record the results an agent relayed, writing their output here (not committed). Only active
+    worker profiles of accounts whose worker runs on that agent are accepted; anything else (a
+    result that came too late, or another agent's profile) is ignored."""
+    for r in results:
+        async with db.execute(
+            "SELECT p.id FROM worker_profiles p JOIN worker_registry w ON w.account_id = p.account_id "
+            "WHERE p.id = ? AND p.target = 'worker' AND p.status IN ('pending', 'running') AND w.agent_id = ?",
+            (r["id"], agent_id),
+        ) as cur:
+            if await cur.fetchone() is None:
+                continue
+        path = None
+        if r.get("status") == "done":
+            path = str(await asyncio.to_thread(write_output, r["id"], r.get("collapsed") or ""))
+        await db.execute(
+            "UPDATE worker_profiles SET status = ?, path = ?, samples = ?, overhead_pct = ?, error = ?, "
+            "finished_at = ? WHERE id = ?",
+            (r.get("status"), path, r.get("samples"), r.get("overhead_pct"), r.get("error"), time.time(), r["id"]),
+        )
+
+
+def copy_to_node(sqlite_path: str, requests: Iterable[dict[str, Any]]) -> None:
+    """Blocking (agent): queue relayed requests for the node's workers."""
+    with sqlite3.connect(sqlite_path, timeout=5.0) as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO worker_profiles (id, target, account_id, seconds, hz, created_at) "
+            "VALUES (?, 'worker', ?, ?, ?, ?)",
+            [(r["id"], r["account_id"], r["seconds"], r["hz"], r.get("created_at") or time.time()) for r in requests],
+        )
+    conn.close()
+
+
+def finished_on_node(sqlite_path: str) -> list[dict[str, Any]]:
+    """Blocking (agent): finished profiles on the node, with their collapsed stacks."""
+    try:
+        conn = sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True, timeout=1.0)
+    except sqlite3.Error:
+        return []
+    try:
+        rows = [_row(r) for r in conn.execute(_SELECT + " WHERE status IN ('done', 'failed')")]
+    except sqlite3.Error:
+        return []
+    finally:
+        conn.close()
+    results = []
+    for r in rows:
+        result = {k: r[k] for k in ("id", "status", "samples", "overhead_pct", "error")}
+        if r["status"] == "done":
+            try:
+                result["collapsed"] = Path(r["path"]).read_text(encoding="utf-8")
+            except (OSError, TypeError) as e:
+                result.update(status="failed", error=f"profile output unreadable: {e}")
+        results.append(result)
+    return results
+
+
+def forget_on_node(sqlite_path: str, profile_ids: Iterable[str]) -> None:
+    """Blocking (agent): drop relayed results from the node (the output files stay until purged)."""
+    ids = list(profile_ids)
+    if not ids:
+        return
+    with sqlite3.connect(sqlite_path, timeout=5.0) as conn:
+        conn.execute(f"DELETE FROM worker_profiles WHERE id IN ({', '.join('?' * len(ids))})", ids)
+    conn.close()
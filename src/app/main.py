@@ -1,20 +1,66 @@
 from __future__ import annotations
 
-import typer
-import uvicorn
+from app.utils import startup_profile
 
-from app.cli.main import cli as cli_app
-from app.web.app import create_app
+# Only the CLI skeleton is imported up front; each command imports what it needs, so a worker
+# never loads FastAPI, the routers or uvicorn.
+with startup_profile.phase("import cli"):
+    import typer
+
+    from app.cli.main import cli as cli_app
 
 
 app = typer.Typer(help="Telegram Client Copier")
 app.add_typer(cli_app, name="db")
 
 
+@app.callback()
+def main(
+    profile_startup: bool = typer.Option(
+        False, "--profile-startup", help="Print a phase-by-phase import and timing breakdown of startup."
+    ),
+) -> None:
+    """Telegram Client Copier."""
+    if profile_startup:
+        startup_profile.enable()
+
+
 @app.command()
 def api(host: str = "0.0.0.0", port: int = 8000) -> None:
     """Run the FastAPI server."""
-    uvicorn.run(create_app(), host=host, port=port)
+    with startup_profile.phase("import web app"):
+        import uvicorn
+
+        from app.web.app import create_app
+    with startup_profile.phase("create app"):
+        web_app = create_app()
+    uvicorn.run(web_app, host=host, port=port)
+
+
+@app.command()
+def agent(
+    api_url: str = typer.Option(..., "--api-url", help="Base URL of the API, e.g. http://api-host:8000"),
+    token: str = typer.Option(..., "--token", envvar="AGENT_TOKEN", help="The API's AGENT_TOKEN"),
+    capacity: int = typer.Option(4, "--capacity", min=0, help="Most workers this node runs at once"),
+    agent_id: str = typer.Option("", "--agent-id", help="Unique per agent (default: hostname)"),
+    work_dir: str = typer.Option("", "--work-dir", help="Sessions, snapshots and logs (default: data/agent/<id>)"),
+) -> None:
+    """Run workers on this node for accounts the API assigns to it."""
+    import socket
+
+    from app.agent import run_agent
+    from app.config import settings
+
+    agent_id = agent_id or socket.gethostname()
+    run_agent(
+        api_url,
+        token,
+        agent_id,
+        capacity,
+        work_dir or f"data/agent/{agent_id}",
+        drain_timeout=settings.worker_drain_timeout_seconds,
+        stats_db=settings.sqlite_path,
+    )
 
 
 def run() -> None:
@@ -23,4 +69,3 @@ def run() -> None:
 
 if __name__ == "__main__":
     run()
-
@@ -9,6 +9,8 @@ import aiosqlite
 
 from app.config import settings
 
+MAX_RETENTION_DAYS = 3650  # upper bound of every *_retention_days setting and override
+
 
 def get_setting_sync(key: str) -> str | None:
     """Sync read for use in MongoDB client (avoids async deps). Empty string treated as unset → fallback to env."""
@@ -0,0 +1,213 @@
+"""Streaming NDJSON/CSV exports of message_logs, worker_logs and dest_message_index.
+
+Rows are pulled from the database in batches and encoded batch by batch, so memory stays bounded
+by batch_size regardless of how many rows are exported. Used by the /export API routes and the
+`db export` CLI command.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import zlib
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+from typing import Any
+
+from app.db.message_index import read_source
+from app.db.sqlite import get_sqlite
+from app.services.log_queries import (
+    LOG_SORT,
+    fill_missing_chat_titles,
+    message_log_item,
+    worker_log_item,
+)
+
+EXPORT_FORMATS = ("ndjson", "csv")
+DEFAULT_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 5000
+
+MESSAGE_LOG_FIELDS = [
+    "user_id",
+    "source_chat_id",
+    "source_msg_id",
+    "dest_chat_id",
+    "dest_msg_id",
+    "source_chat_title",
+    "dest_chat_title",
+    "timestamp",
+    "mapping_id",
+    "dispatched_at",
+    "completed_at",
+    "status",
+]
+WORKER_LOG_FIELDS = ["user_id", "account_id", "level", "message", "timestamp"]
+MESSAGE_INDEX_FIELDS = ["user_id", "source_chat_id", "source_msg_id", "dest_chat_id", "dest_msg_id"]
+
+_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def clamp_batch_size(batch_size: int) -> int:
+    return max(1, min(int(batch_size), MAX_BATCH_SIZE))
+
+
+def export_media_type(fmt: str, gzip: bool) -> str:
+    return "application/gzip" if gzip else _MEDIA_TYPES[fmt]
+
+
+def export_filename(name: str, fmt: str, gzip: bool) -> str:
+    return f"{name}.{fmt}{'.gz' if gzip else ''}"
+
+
+async def _mongo_batches(coll, match: dict, batch_size: int) -> AsyncIterator[list[dict]]:
+    """Group documents from a server-side cursor into lists of at most batch_size."""
+    pipeline = [{"$match": match}, {"$sort": LOG_SORT}]
+    batch: list[dict] = []
+    async for doc in coll.aggregate(pipeline, batchSize=batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def iter_message_log_batches(
+    coll, match: dict, batch_size: int, *, db=None, owner_id: int | None = None
+) -> AsyncIterator[list[dict]]:
+    """Yield message_logs rows (list-endpoint shape) per batch. When db is given, missing chat
+    titles are filled from channel_mappings. owner_id restricts output to that user's rows."""
+    async for docs in _mongo_batches(coll, match, batch_size):
+        items = [message_log_item(doc) for doc in docs]
+        if db is not None:
+            await fill_missing_chat_titles(db, items)
+        if owner_id is not None:
+            items = [it for it in items if it.get("user_id") is not None and int(it["user_id"]) == owner_id]
+        if items:
+            yield items
+
+
+async def iter_worker_log_batches(
+    coll, match: dict, batch_size: int, *, owner_id: int | None = None
+) -> AsyncIterator[list[dict]]:
+    """Yield worker_logs rows (list-endpoint shape) per batch."""
+    async for docs in _mongo_batches(coll, match, batch_size):
+        items = [worker_log_item(doc) for doc in docs]
+        if owner_id is not None:
+            items = [it for it in items if it.get("user_id") is not None and int(it["user_id"]) == owner_id]
+        if items:
+            yield items
+
+
+async def iter_message_index_batches(
+    db,
+    batch_size: int,
+    *,
+    user_id: int | None = None,
+    source_chat_id: int | None = None,
+    dest_chat_id: int | None = None,
+) -> AsyncIterator[list[dict]]:
+    """Yield dest_message_index rows per batch, walking the primary key with a keyset predicate.
+    Each batch is its own short statement, so no read transaction is held open between batches."""
+    where = ""
+    filters: list = []
+    if user_id is not None:
+        where += " AND user_id = ?"
+        filters.append(user_id)
+    if source_chat_id is not None:
+        where += " AND source_chat_id = ?"
+        filters.append(source_chat_id)
+    if dest_chat_id is not None:
+        where += " AND dest_chat_id = ?"
+        filters.append(dest_chat_id)
+    source = await read_source(db)
+    last: tuple | None = None
+    while True:
+        query = (
+            "SELECT user_id, source_chat_id, source_msg_id, dest_chat_id, dest_msg_id "
+            f"FROM {source} WHERE 1=1" + where
+        )
+        params = list(filters)
+        if last is not None:
+            query += " AND (user_id, source_chat_id, source_msg_id, dest_chat_id) > (?, ?, ?, ?)"
+            params.extend(last)
+        query += " ORDER BY user_id, source_chat_id, source_msg_id, dest_chat_id LIMIT ?"
+        params.append(batch_size)
+        async with db.execute(query, params) as cur:
+            rows = await cur.fetchall()
+        if not rows:
+            return
+        yield [dict(zip(MESSAGE_INDEX_FIELDS, r)) for r in rows]
+        if len(rows) < batch_size:
+            return
+        last = (rows[-1][0], rows[-1][1], rows[-1][2], rows[-1][3])
+
+
+async def encode_ndjson(batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield "".join(json.dumps(row, default=str, ensure_ascii=False) + "\n" for row in batch).encode("utf-8")
+
+
+async def encode_csv(batches: AsyncIterator[list[dict]], fields: list[str]) -> AsyncIterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    yield buf.getvalue().encode("utf-8")
+    async for batch in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(batch)
+        yield buf.getvalue().encode("utf-8")
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a byte stream incrementally into a single gzip member."""
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def encode_export(
+    batches: AsyncIterator[list[dict]], fmt: str, fields: list[str], gzip: bool = False
+) -> AsyncIterator[bytes]:
+    """Encode row batches as NDJSON or CSV bytes, optionally gzip-compressed."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    chunks = encode_ndjson(batches) if fmt == "ndjson" else encode_csv(batches, fields)
+    return gzip_chunks(chunks) if gzip else chunks
+
+
+async def with_sqlite(make_batches: Callable[[Any], AsyncIterator[list[dict]]]) -> AsyncIterator[list[dict]]:
+    """Run make_batches(db) on a connection owned by the stream (request-scoped connections are
+    closed before a streaming body finishes)."""
+    db = await get_sqlite()
+    try:
+        async for batch in make_batches(db):
+            yield batch
+    finally:
+        await db.close()
+
+
+async def prime_stream(batches: AsyncGenerator[list[dict], None]) -> AsyncGenerator[list[dict], None]:
+    """Pull the first batch now so connection/query errors surface before the response starts.
+    Returns an iterator that replays that batch followed by the rest of the stream; closing it
+    closes batches (routes pass its aclose as the response's BackgroundTask, so a client that
+    disconnects mid-export does not leave a with_sqlite connection open)."""
+    try:
+        first = await batches.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def replay() -> AsyncGenerator[list[dict], None]:
+        try:
+            if first is not None:
+                yield first
+            async for batch in batches:
+                yield batch
+        finally:
+            await batches.aclose()
+
+    return replay()
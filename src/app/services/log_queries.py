@@ -0,0 +1,240 @@
+"""Query building and pagination for the MongoDB log collections (message_logs, worker_logs)."""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.utils.cursor import decode_cursor, encode_cursor
+
+# Totals above this are reported as "COUNT_CAP+" instead of being counted exactly.
+COUNT_CAP = 10_000
+COUNT_MODES = ("exact", "capped", "estimated", "none")
+
+# Equality filters accepted by the list/export/stream endpoints; every combination (with or without a
+# timestamp range) must be served by an index in app.db.mongo_indexes.INDEXES.
+MESSAGE_LOG_FILTERS = ("user_id", "source_chat_id", "dest_chat_id")
+WORKER_LOG_FILTERS = ("user_id", "account_id", "level")
+
+# Newest first; _id breaks ties between entries sharing a timestamp so keyset pages are stable.
+LOG_SORT = {"timestamp": -1, "_id": -1}
+_LOG_SORT_REVERSED = {"timestamp": 1, "_id": 1}
+
+
+def parse_iso_datetime(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def scoped_user_id(user: dict, user_id: int | None) -> int | None:
+    """Non-admins are always restricted to their own data; admins only when user_id is given."""
+    if user["role"] != "admin":
+        return int(user["id"])
+    return int(user_id) if user_id is not None else None
+
+
+def _timestamp_range(date_from: str | None, date_to: str | None) -> dict | None:
+    if not date_from and not date_to:
+        return None
+    rng: dict = {}
+    if date_from:
+        rng["$gte"] = parse_iso_datetime(date_from)
+    if date_to:
+        rng["$lte"] = parse_iso_datetime(date_to)
+    return rng
+
+
+def message_logs_match(
+    *,
+    user_id: int | None = None,
+    source_chat_id: int | None = None,
+    dest_chat_id: int | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+) -> dict:
+    match: dict = {}
+    if user_id is not None:
+        match["user_id"] = user_id
+    if source_chat_id is not None:
+        match["source_chat_id"] = source_chat_id
+    if dest_chat_id is not None:
+        match["dest_chat_id"] = dest_chat_id
+    rng = _timestamp_range(date_from, date_to)
+    if rng:
+        match["timestamp"] = rng
+    return match
+
+
+def worker_logs_match(
+    *,
+    user_id: int | None = None,
+    account_id: int | None = None,
+    level: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+) -> dict:
+    match: dict = {}
+    if user_id is not None:
+        match["user_id"] = user_id
+    if account_id is not None:
+        match["account_id"] = account_id
+    if level is not None:
+        match["level"] = level.upper()
+    rng = _timestamp_range(date_from, date_to)
+    if rng:
+        match["timestamp"] = rng
+    return match
+
+
+def _iso(ts: Any) -> str:
+    return ts.isoformat() if hasattr(ts, "isoformat") else str(ts)
+
+
+def message_log_item(doc: dict) -> dict:
+    """API representation of a message_logs document (empty titles normalised to None)."""
+    return {
+        "user_id": doc.get("user_id"),
+        "source_chat_id": doc.get("source_chat_id"),
+        "source_msg_id": doc.get("source_msg_id"),
+        "dest_chat_id": doc.get("dest_chat_id"),
+        "dest_msg_id": doc.get("dest_msg_id"),
+        "source_chat_title": doc.get("source_chat_title") or None,
+        "dest_chat_title": doc.get("dest_chat_title") or None,
+        "timestamp": _iso(doc.get("timestamp")),
+        "mapping_id": doc.get("mapping_id"),
+        "dispatched_at": _iso(doc["dispatched_at"]) if doc.get("dispatched_at") else None,
+        "completed_at": _iso(doc["completed_at"]) if doc.get("completed_at") else None,
+        "status": doc.get("status"),
+    }
+
+
+def worker_log_item(doc: dict) -> dict:
+    """API representation of a worker_logs document."""
+    return {
+        "user_id": doc.get("user_id"),
+        "account_id": doc.get("account_id"),
+        "level": doc.get("level"),
+        "message": doc.get("message"),
+        "timestamp": _iso(doc.get("timestamp")),
+    }
+
+
+async def fill_missing_chat_titles(db, items: list[dict]) -> None:
+    """Fill missing source/dest titles in message_log_item() dicts from channel_mappings (one query)."""
+    need_fallback: set[tuple[int, int, int]] = set()
+    for it in items:
+        if (not it.get("source_chat_title") or not it.get("dest_chat_title")) and (
+            it.get("user_id") is not None
+            and it.get("source_chat_id") is not None
+            and it.get("dest_chat_id") is not None
+        ):
+            need_fallback.add((it["user_id"], it["source_chat_id"], it["dest_chat_id"]))
+    if not need_fallback:
+        return
+    title_map: dict[tuple[int, int, int], tuple[str | None, str | None]] = {}
+    keys_list = list(need_fallback)
+    placeholders = ",".join(["(?,?,?)"] * len(keys_list))
+    params = [x for t in keys_list for x in t]
+    async with db.execute(
+        f"SELECT user_id, source_chat_id, dest_chat_id, source_chat_title, dest_chat_title "
+        f"FROM channel_mappings WHERE (user_id, source_chat_id, dest_chat_id) IN "
+        f"(VALUES {placeholders})",
+        params,
+    ) as cur:
+        async for row in cur:
+            uid, src_id, dest_id = row[0], row[1], row[2]
+            st, dt = row[3] or None, row[4] or None
+            title_map[(int(uid), int(src_id), int(dest_id))] = (st, dt)
+    for it in items:
+        key = (it["user_id"], it["source_chat_id"], it["dest_chat_id"])
+        if key in title_map and (not it.get("source_chat_title") or not it.get("dest_chat_title")):
+            st, dt = title_map[key]
+            if not it.get("source_chat_title"):
+                it["source_chat_title"] = st
+            if not it.get("dest_chat_title"):
+                it["dest_chat_title"] = dt
+
+
+def page_pipeline(match: dict, page: int, page_size: int) -> list[dict]:
+    """Offset pagination (page-number fallback). Deep pages scan and discard (page-1)*page_size docs."""
+    return [
+        {"$match": match},
+        {"$sort": LOG_SORT},
+        {"$skip": (page - 1) * page_size},
+        {"$limit": page_size},
+    ]
+
+
+def parse_cursor(token: str) -> dict[str, Any]:
+    """Decode a log cursor into {"ts": datetime, "id": ObjectId, "d": "next"|"prev"}. Raises ValueError."""
+    values = decode_cursor(token)
+    try:
+        ts = datetime.fromisoformat(values["ts"])
+        oid = ObjectId(values["id"])
+    except (KeyError, TypeError, ValueError, InvalidId) as e:
+        raise ValueError("Invalid cursor") from e
+    direction = values.get("d", "next")
+    if direction not in ("next", "prev"):
+        raise ValueError("Invalid cursor")
+    return {"ts": ts, "id": oid, "d": direction}
+
+
+def cursor_pipeline(match: dict, cursor: dict[str, Any] | None, page_size: int) -> list[dict]:
+    """Keyset pagination on (timestamp, _id): seeks straight to the cursor position via the index.
+    Fetches one extra document to tell whether another page exists."""
+    direction = cursor["d"] if cursor else "next"
+    if cursor:
+        op, op_eq = ("$lt", "$lte") if direction == "next" else ("$gt", "$gte")
+        # The plain timestamp bound gives the planner tight index bounds; the $or only trims ties.
+        seek = {
+            "timestamp": {op_eq: cursor["ts"]},
+            "$or": [{"timestamp": {op: cursor["ts"]}}, {"_id": {op: cursor["id"]}}],
+        }
+        match = {"$and": [match, seek]} if match else seek
+    return [
+        {"$match": match},
+        {"$sort": LOG_SORT if direction == "next" else _LOG_SORT_REVERSED},
+        {"$limit": page_size + 1},
+    ]
+
+
+def _doc_cursor(doc: dict, direction: str) -> str | None:
+    ts = doc.get("timestamp")
+    if not isinstance(ts, datetime) or doc.get("_id") is None:
+        return None
+    return encode_cursor({"ts": ts.isoformat(), "id": str(doc["_id"]), "d": direction})
+
+
+async def fetch_cursor_page(
+    coll, match: dict, cursor: dict[str, Any] | None, page_size: int
+) -> tuple[list[dict], str | None, str | None]:
+    """Return (docs newest-first, next_cursor, prev_cursor) for one keyset page.
+    cursor is the parse_cursor() result, or None for the first page."""
+    docs = [doc async for doc in coll.aggregate(cursor_pipeline(match, cursor, page_size))]
+    has_more = len(docs) > page_size
+    docs = docs[:page_size]
+    if cursor and cursor["d"] == "prev":
+        docs.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, cursor is not None
+    next_cursor = _doc_cursor(docs[-1], "next") if docs and has_next else None
+    prev_cursor = _doc_cursor(docs[0], "prev") if docs and has_prev else None
+    return docs, next_cursor, prev_cursor
+
+
+async def count_logs(coll, match: dict, mode: str) -> tuple[int | None, bool]:
+    """Return (total, is_exact). 'capped' stops counting at COUNT_CAP; 'estimated' uses collection
+    metadata when there is no filter (falls back to capped otherwise); 'none' skips counting."""
+    if mode == "none":
+        return None, False
+    if mode == "exact":
+        return await coll.count_documents(match), True
+    if mode == "estimated" and not match:
+        return await coll.estimated_document_count(), False
+    total = await coll.count_documents(match, limit=COUNT_CAP + 1)
+    if total > COUNT_CAP:
+        return COUNT_CAP, False
+    return total, True
@@ -0,0 +1,205 @@
+"""Live tail of the MongoDB log collections, fanned out from one upstream reader to many subscribers.
+
+Each collection gets one LogTailHub. The hub runs a single upstream task while it has subscribers:
+a change stream when the deployment supports it (replica set / sharded), otherwise a poll on _id
+(ObjectIds are assigned at insertion, so late writes with an older timestamp are not skipped). New documents are matched against every subscriber's filter in-process
+and pushed to per-subscriber queues, so idle dashboards cost no database queries of their own.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.config import settings
+from app.services.log_queries import message_log_item, worker_log_item
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 1000
+POLL_BATCH = 500
+_RETRY_DELAY_SECONDS = 5.0
+
+_ITEM_FNS: dict[str, Callable[[dict], dict]] = {
+    "message_logs": message_log_item,
+    "worker_logs": worker_log_item,
+}
+
+
+def doc_matches(doc: dict, match: dict) -> bool:
+    """Equality match of a raw log document against a filter built by *_logs_match (no date range)."""
+    return all(doc.get(key) == value for key, value in match.items())
+
+
+@dataclass(eq=False)
+class Subscription:
+    match: dict
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+    dropped: int = 0
+
+    def offer(self, item: dict) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+
+class LogTailHub:
+    """Fan-out of new documents in one log collection to filtered subscribers."""
+
+    def __init__(
+        self,
+        collection: str,
+        *,
+        coll_factory: Callable[[], Any] | None = None,
+        poll_interval: float | None = None,
+    ) -> None:
+        self.collection = collection
+        self._item_fn = _ITEM_FNS.get(collection, lambda doc: doc)
+        self._coll_factory = coll_factory or self._default_coll
+        self._poll_interval = poll_interval
+        self._subscribers: set[Subscription] = set()
+        self._task: asyncio.Task | None = None
+        self._resume_token: Any = None
+        self._position: Any = None  # last _id seen by the poll
+        self.mode: str | None = None  # "change_stream" | "poll" once the upstream is running
+
+    def _default_coll(self):
+        from app.db.mongo import get_mongo_db
+
+        return get_mongo_db()[self.collection]
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, match: dict) -> Subscription:
+        sub = Subscription(match=match)
+        self._subscribers.add(sub)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subscribers.discard(sub)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self.mode = None
+
+    async def stop(self) -> None:
+        self._subscribers.clear()
+        task, self._task = self._task, None
+        self.mode = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def publish(self, doc: dict) -> None:
+        item = None
+        for sub in list(self._subscribers):
+            if doc_matches(doc, sub.match):
+                if item is None:
+                    item = self._item_fn(doc)
+                sub.offer(item)
+
+    async def _run(self) -> None:
+        coll = None
+        use_change_stream = True
+        self._position = None
+        while True:
+            try:
+                if coll is None:
+                    coll = self._coll_factory()
+                if use_change_stream:
+                    try:
+                        await self._watch(coll)
+                    except OperationFailure as e:
+                        logger.info("Change streams unavailable for %s, polling instead: %s", self.collection, e)
+                        use_change_stream = False
+                        continue
+                else:
+                    await self._poll(coll)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning("Log tail on %s interrupted, retrying: %s", self.collection, e)
+                await asyncio.sleep(_RETRY_DELAY_SECONDS)
+
+    async def _watch(self, coll) -> None:
+        kwargs = {"resume_after": self._resume_token} if self._resume_token else {}
+        async with coll.watch([{"$match": {"operationType": "insert"}}], **kwargs) as stream:
+            self.mode = "change_stream"
+            async for change in stream:
+                self._resume_token = stream.resume_token
+                doc = change.get("fullDocument")
+                if doc:
+                    self.publish(doc)
+
+    async def _poll(self, coll) -> None:
+        """Poll for documents after the last seen _id in _id order. The position is kept on the hub,
+        so a retry after a Mongo error resumes where it stopped."""
+        self.mode = "poll"
+        interval = self._poll_interval or settings.log_tail_poll_interval_seconds
+        if self._position is None:
+            newest = [d async for d in coll.aggregate([{"$sort": {"_id": -1}}, {"$limit": 1}])]
+            if newest:
+                self._position = newest[0]["_id"]
+        while True:
+            match = {"_id": {"$gt": self._position}} if self._position is not None else {}
+            pipeline = [{"$match": match}, {"$sort": {"_id": 1}}, {"$limit": POLL_BATCH}]
+            docs = [d async for d in coll.aggregate(pipeline)]
+            for doc in docs:
+                self.publish(doc)
+                self._position = doc["_id"]
+            if len(docs) < POLL_BATCH:
+                await asyncio.sleep(interval)
+
+
+_hubs: dict[str, LogTailHub] = {}
+
+
+def get_log_tail_hub(collection: str) -> LogTailHub:
+    hub = _hubs.get(collection)
+    if hub is None:
+        hub = _hubs[collection] = LogTailHub(collection)
+    return hub
+
+
+async def stop_log_tail_hubs() -> None:
+    for hub in list(_hubs.values()):
+        await hub.stop()
+    _hubs.clear()
+
+
+async def sse_events(
+    hub: LogTailHub, match: dict, event: str, keepalive: float | None = None
+) -> AsyncIterator[str]:
+    """Server-Sent Events for one subscriber. Emits a comment line as keepalive while idle and a
+    'dropped' event if the client fell behind and items were discarded. The subscription lives
+    exactly as long as the stream is being consumed."""
+    interval = keepalive or settings.log_tail_keepalive_seconds
+    sub = hub.subscribe(match)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                item = await asyncio.wait_for(sub.queue.get(), timeout=interval)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if sub.dropped:
+                yield f"event: dropped\ndata: {json.dumps({'count': sub.dropped})}\n\n"
+                sub.dropped = 0
+            yield f"event: {event}\ndata: {json.dumps(item, default=str)}\n\n"
+    finally:
+        hub.unsubscribe(sub)
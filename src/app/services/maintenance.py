@@ -0,0 +1,216 @@
+"""Background maintenance scheduler for the API process.
+
+Registered jobs run one at a time on their own intervals, each time-boxed to
+MAINTENANCE_JOB_BUDGET_SECONDS and working in small committed batches, so cleanup never holds the
+database (or the event loop) long enough to compete with requests. A job that runs out of time
+is rescheduled after INCOMPLETE_RETRY_SECONDS instead of its full interval. Every run is recorded
+in maintenance_runs and summarized by GET /api/admin/maintenance.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.db import cleanup
+from app.db.sqlite import get_sqlite
+
+logger = logging.getLogger(__name__)
+
+INCOMPLETE_RETRY_SECONDS = 5.0
+STOP_GRACE_SECONDS = 5.0
+RUN_HISTORY_PER_JOB = 50
+
+
+@dataclass
+class MaintenanceJob:
+    name: str
+    interval_seconds: float
+    run: Callable[[float, int], Awaitable[tuple[int, bool]]]  # (deadline, batch_size) -> (removed, complete)
+    description: str = ""
+    # Runtime state
+    next_run: float = 0.0  # time.monotonic()
+    running: bool = False
+    runs: int = 0
+    failures: int = 0
+    total_removed: int = 0
+    last_run: dict | None = field(default=None)
+
+
+def default_jobs() -> list[MaintenanceJob]:
+    return [
+        MaintenanceJob("login_sessions", 3600, cleanup.purge_login_sessions_job,
+                       "Completed/cancelled Telegram login sessions past retention"),
+        MaintenanceJob("refresh_tokens", 3600, cleanup.purge_expired_refresh_tokens_job,
+                       "Expired refresh tokens"),
+        MaintenanceJob("worker_registry", 300, cleanup.purge_dead_worker_registry_job,
+                       "worker_registry rows whose process has exited"),
+        MaintenanceJob("message_traces", 900, cleanup.purge_message_traces_job,
+                       "Sampled message traces past retention"),
+        MaintenanceJob("latency_rollups", 6 * 3600, cleanup.purge_latency_rollups_job,
+                       "Per-mapping latency rollups past retention"),
+        MaintenanceJob("profiles", 300, cleanup.purge_profiles_job,
+                       "Overdue on-demand profiles (marked failed); profiles and output past retention"),
+        MaintenanceJob("worker_session_copies", 3600, cleanup.purge_worker_session_copies_job,
+                       "Per-PID session copies left by exited workers"),
+        MaintenanceJob("worker_stderr_logs", 6 * 3600, cleanup.purge_worker_stderr_logs_job,
+                       "Old worker_<account>_<id>.log files"),
+        MaintenanceJob("message_index", 3600, cleanup.prune_message_index_job,
+                       "dest_message_index rows and partitions past retention"),
+    ]
+
+
+class MaintenanceScheduler:
+    def __init__(self, jobs: list[MaintenanceJob] | None = None) -> None:
+        self.jobs: dict[str, MaintenanceJob] = {}
+        self._task: asyncio.Task | None = None
+        self._busy = False
+        self._stopping = False
+        for job in jobs if jobs is not None else default_jobs():
+            self.register(job)
+
+    def register(self, job: MaintenanceJob) -> None:
+        self.jobs[job.name] = job
+
+    def start(self, initial_delay: float | None = None) -> None:
+        if self._task is not None:
+            return
+        delay = settings.maintenance_initial_delay_seconds if initial_delay is None else initial_delay
+        first = time.monotonic() + delay
+        for job in self.jobs.values():
+            job.next_run = first
+        self._task = asyncio.create_task(self._loop(), name="maintenance-scheduler")
+
+    async def stop(self) -> None:
+        """Stop the loop. A job already running is let finish (and record its run) within its
+        budget instead of being cancelled with a database connection mid-query."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._stopping = True
+        if not self._busy:
+            task.cancel()
+        try:
+            await asyncio.wait_for(task, timeout=settings.maintenance_job_budget_seconds + STOP_GRACE_SECONDS)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._stopping = False
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    async def _loop(self) -> None:
+        while not self._stopping:
+            now = time.monotonic()
+            due = [j for j in self.jobs.values() if j.next_run <= now and not j.running]
+            if not due:
+                wait = min(j.next_run for j in self.jobs.values()) - now if self.jobs else 3600
+                await asyncio.sleep(max(wait, 0.05))
+                continue
+            job = min(due, key=lambda j: j.next_run)
+            self._busy = True
+            try:
+                await self.run_job(job)
+            finally:
+                self._busy = False
+
+    async def run_job(self, job: MaintenanceJob) -> dict:
+        """Run one job now within the time budget, record the outcome and schedule its next run."""
+        budget = settings.maintenance_job_budget_seconds
+        started_at = datetime.now(timezone.utc).isoformat()
+        start = time.monotonic()
+        job.running = True
+        removed, complete, error = 0, True, None
+        try:
+            removed, complete = await job.run(start + budget, max(1, settings.maintenance_batch_size))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Maintenance job %s failed", job.name)
+            error = str(e) or type(e).__name__
+        finally:
+            job.running = False
+        duration_ms = int((time.monotonic() - start) * 1000)
+        job.runs += 1
+        job.total_removed += removed
+        if error:
+            job.failures += 1
+        job.next_run = time.monotonic() + (job.interval_seconds if complete or error else INCOMPLETE_RETRY_SECONDS)
+        job.last_run = {
+            "started_at": started_at,
+            "duration_ms": duration_ms,
+            "removed": removed,
+            "complete": complete,
+            "error": error,
+        }
+        if removed:
+            logger.info("Maintenance %s removed %d in %d ms%s", job.name, removed, duration_ms,
+                        "" if complete else " (continuing)")
+        await self._record(job.name, job.last_run)
+        return job.last_run
+
+    async def _record(self, name: str, run: dict) -> None:
+        try:
+            db = await get_sqlite()
+            try:
+                await db.execute(
+                    """INSERT INTO maintenance_runs (job, started_at, duration_ms, removed, complete, error)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (name, run["started_at"], run["duration_ms"], run["removed"], int(run["complete"]), run["error"]),
+                )
+                await db.execute(
+                    """DELETE FROM maintenance_runs WHERE job = ? AND id NOT IN (
+                         SELECT id FROM maintenance_runs WHERE job = ? ORDER BY id DESC LIMIT ?)""",
+                    (name, name, RUN_HISTORY_PER_JOB),
+                )
+                await db.commit()
+            finally:
+                await db.close()
+        except Exception as e:
+            logger.warning("Could not record maintenance run for %s: %s", name, e)
+
+    def status(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "name": job.name,
+                "description": job.description,
+                "interval_seconds": job.interval_seconds,
+                "running": job.running,
+                "next_run_in_seconds": round(max(job.next_run - now, 0.0), 1) if self.started else None,
+                "runs": job.runs,
+                "failures": job.failures,
+                "total_removed": job.total_removed,
+                "last_run": job.last_run,
+            }
+            for job in self.jobs.values()
+        ]
+
+
+_scheduler: MaintenanceScheduler | None = None
+
+
+def get_maintenance_scheduler() -> MaintenanceScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = MaintenanceScheduler()
+    return _scheduler
+
+
+async def start_maintenance() -> None:
+    if settings.maintenance_enabled:
+        get_maintenance_scheduler().start()
+
+
+async def stop_maintenance() -> None:
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.stop()
+    _scheduler = None
@@ -0,0 +1,266 @@
+"""Set-based mutations over many channel mappings at once.
+
+Every function here changes any number of mappings with a fixed number of statements
+(INSERT ... SELECT, or one executemany per table) inside a single transaction, and reports the
+active Telegram accounts whose workers need a refresh, resolved by one grouped query. Callers pass
+BulkResult.account_ids to workers.restart_workers_for_accounts so each account is restarted
+exactly once, however many of its mappings changed.
+
+import_mappings / export_mappings back POST /api/mappings/bulk and GET /api/mappings/export: a
+mapping travels with its filters, transforms and schedule override nested, as JSON or as CSV with
+the nested parts in JSON-encoded cells.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from collections.abc import Iterable, Sequence
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+import aiosqlite
+
+from app.services.mapping_service import WEEKDAY_COLS
+
+EXPORT_FORMATS = ("json", "csv")
+MAX_IMPORT_MAPPINGS = 20000
+
+MAPPING_FIELDS = [
+    "source_chat_id",
+    "dest_chat_id",
+    "name",
+    "telegram_account_id",
+    "source_chat_title",
+    "dest_chat_title",
+    "enabled",
+]
+FILTER_FIELDS = ["include_text", "exclude_text", "media_types", "regex_pattern"]
+
+
+class TransformValues(NamedTuple):
+    """Column values of one mapping_transform_rules row (after its mapping_id)."""
+
+    rule_type: str
+    find_text: str | None
+    replace_text: str | None
+    regex_pattern: str | None
+    regex_flags: str | None
+    replacement_media_asset_id: int | None
+    apply_to_media_types: str | None
+    enabled: int
+    priority: int
+
+
+TRANSFORM_FIELDS = list(TransformValues._fields)
+NESTED_FIELDS = ["filters", "transforms", "schedule"]
+CSV_FIELDS = ["id", "user_id", *MAPPING_FIELDS, *NESTED_FIELDS]
+
+# Accounts whose worker serves a mapping: its pinned account, or every active account of the
+# owner when the mapping is not pinned (same resolution as restart_workers_for_mapping).
+_AFFECTED_ACCOUNTS = """
+    SELECT DISTINCT a.id
+    FROM channel_mappings m
+    JOIN telegram_accounts a
+      ON a.status = 'active' AND a.session_path IS NOT NULL AND a.session_path != ''
+     AND (a.id = m.telegram_account_id OR (m.telegram_account_id IS NULL AND a.user_id = m.user_id))
+    WHERE {where}
+    ORDER BY a.id
+"""
+
+
+@dataclass(slots=True)
+class BulkResult:
+    affected: int = 0
+    account_ids: list[int] = field(default_factory=list)
+    mapping_ids: list[int] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class MappingImportRow:
+    """A validated mapping to import; tuples follow MAPPING_FIELDS, FILTER_FIELDS and WEEKDAY_COLS."""
+
+    mapping: tuple
+    filters: list[tuple] = field(default_factory=list)
+    transforms: list[TransformValues] = field(default_factory=list)
+    schedule: tuple | None = None
+
+
+@asynccontextmanager
+async def _transaction(db: aiosqlite.Connection):
+    try:
+        yield
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+
+
+async def _accounts(db: aiosqlite.Connection, where: str, params: tuple) -> list[int]:
+    async with db.execute(_AFFECTED_ACCOUNTS.format(where=where), params) as cur:
+        return [r[0] for r in await cur.fetchall()]
+
+
+def _upsert_schedule_sql(where: str) -> str:
+    """INSERT ... SELECT of one schedule (14 bound values) onto the mappings matching where.
+    The WHERE clause also keeps SQLite from parsing ON CONFLICT as a join constraint."""
+    cols = ", ".join(WEEKDAY_COLS)
+    values = ", ".join("?" for _ in WEEKDAY_COLS)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in WEEKDAY_COLS)
+    return (
+        f"INSERT INTO mapping_schedules (mapping_id, {cols}) "
+        f"SELECT id, {values} FROM channel_mappings WHERE {where} "
+        f"ON CONFLICT(mapping_id) DO UPDATE SET {updates}"
+    )
+
+
+async def apply_user_schedule(db: aiosqlite.Connection, user_id: int) -> BulkResult:
+    """Copy the user's default schedule onto all of their mappings in one statement."""
+    cols = ", ".join(WEEKDAY_COLS)
+    async with db.execute(f"SELECT {cols} FROM user_schedules WHERE user_id = ?", (user_id,)) as cur:
+        row = await cur.fetchone()
+    if not row or all(x is None for x in row):
+        return BulkResult()
+    async with _transaction(db):
+        cur = await db.execute(
+            _upsert_schedule_sql("user_id = ?"),
+            (*row, user_id),
+        )
+        affected = cur.rowcount
+    return BulkResult(affected, await _accounts(db, "m.user_id = ?", (user_id,)))
+
+
+async def import_mappings(db: aiosqlite.Connection, user_id: int, rows: Sequence[MappingImportRow]) -> BulkResult:
+    """Insert mappings with their filters, transforms and schedules for user_id: one executemany
+    per table, all in one transaction."""
+    if not rows:
+        return BulkResult()
+    now = datetime.now(timezone.utc).isoformat()
+    async with _transaction(db):
+        await db.executemany(
+            f"INSERT INTO channel_mappings (user_id, {', '.join(MAPPING_FIELDS)}, created_at) "
+            f"VALUES (?, {', '.join('?' for _ in MAPPING_FIELDS)}, ?)",
+            [(user_id, *r.mapping, now) for r in rows],
+        )
+        async with db.execute("SELECT last_insert_rowid()") as cur:
+            last_id = (await cur.fetchone())[0]
+        # AUTOINCREMENT ids handed out inside one write transaction are consecutive.
+        ids = list(range(last_id - len(rows) + 1, last_id + 1))
+        async with db.execute(
+            "SELECT COUNT(*) FROM channel_mappings WHERE id BETWEEN ? AND ? AND user_id = ? AND created_at = ?",
+            (ids[0], last_id, user_id, now),
+        ) as cur:
+            if (await cur.fetchone())[0] != len(rows):
+                raise RuntimeError("Imported mapping ids are not contiguous")
+        filters = [(mid, *f) for mid, r in zip(ids, rows) for f in r.filters]
+        if filters:
+            await db.executemany(
+                f"INSERT INTO mapping_filters (mapping_id, {', '.join(FILTER_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' for _ in FILTER_FIELDS)})",
+                filters,
+            )
+        transforms = [(mid, *t) for mid, r in zip(ids, rows) for t in r.transforms]
+        if transforms:
+            await db.executemany(
+                f"INSERT INTO mapping_transform_rules (mapping_id, {', '.join(TRANSFORM_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' for _ in TRANSFORM_FIELDS)})",
+                transforms,
+            )
+        schedules = [(mid, *r.schedule) for mid, r in zip(ids, rows) if r.schedule is not None]
+        if schedules:
+            await db.executemany(
+                f"INSERT INTO mapping_schedules (mapping_id, {', '.join(WEEKDAY_COLS)}) "
+                f"VALUES (?, {', '.join('?' for _ in WEEKDAY_COLS)})",
+                schedules,
+            )
+        account_ids = await _accounts(db, "m.id BETWEEN ? AND ?", (ids[0], last_id))
+    return BulkResult(len(rows), account_ids, ids)
+
+
+async def export_mappings(db: aiosqlite.Connection, user_id: int | None) -> list[dict]:
+    """All mappings (of user_id, or everyone when None) with nested filters, transforms and
+    schedule override, in id order. Four queries regardless of the number of mappings."""
+    where, params = ("WHERE m.user_id = ?", (user_id,)) if user_id is not None else ("", ())
+    async with db.execute(
+        f"SELECT m.id, m.user_id, {', '.join('m.' + c for c in MAPPING_FIELDS)} "
+        f"FROM channel_mappings m {where} ORDER BY m.id",
+        params,
+    ) as cur:
+        items = {
+            r[0]: {
+                "id": r[0],
+                "user_id": r[1],
+                **dict(zip(MAPPING_FIELDS, r[2:])),
+                "enabled": bool(r[8]),
+                "filters": [],
+                "transforms": [],
+                "schedule": None,
+            }
+            for r in await cur.fetchall()
+        }
+    if not items:
+        return []
+    join = f"JOIN channel_mappings m ON m.id = c.mapping_id {where}"
+    async with db.execute(
+        f"SELECT c.mapping_id, {', '.join('c.' + c for c in FILTER_FIELDS)} FROM mapping_filters c {join} ORDER BY c.id",
+        params,
+    ) as cur:
+        for r in await cur.fetchall():
+            items[r[0]]["filters"].append(dict(zip(FILTER_FIELDS, r[1:])))
+    async with db.execute(
+        f"SELECT c.mapping_id, {', '.join('c.' + c for c in TRANSFORM_FIELDS)} FROM mapping_transform_rules c {join} "
+        "ORDER BY c.priority, c.id",
+        params,
+    ) as cur:
+        for r in await cur.fetchall():
+            rule = dict(zip(TRANSFORM_FIELDS, r[1:]))
+            rule["enabled"] = bool(rule["enabled"])
+            items[r[0]]["transforms"].append(rule)
+    async with db.execute(
+        f"SELECT c.mapping_id, {', '.join('c.' + c for c in WEEKDAY_COLS)} FROM mapping_schedules c {join}",
+        params,
+    ) as cur:
+        for r in await cur.fetchall():
+            if any(x is not None for x in r[1:]):
+                items[r[0]]["schedule"] = dict(zip(WEEKDAY_COLS, r[1:]))
+    return list(items.values())
+
+
+def mappings_to_csv(items: Iterable[dict]) -> str:
+    """Encode exported mappings as CSV; filters, transforms and schedule become JSON cells."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=CSV_FIELDS, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for item in items:
+        row = {k: item.get(k) for k in CSV_FIELDS}
+        for k in NESTED_FIELDS:
+            if row[k]:
+                row[k] = json.dumps(row[k], ensure_ascii=False, separators=(",", ":"))
+            else:
+                row[k] = None
+        row["enabled"] = "true" if row["enabled"] else "false"
+        writer.writerow(row)
+    return buf.getvalue()
+
+
+def mappings_from_csv(text: str) -> list[dict]:
+    """Decode CSV in the export layout into raw (unvalidated) mapping dicts. Empty cells are
+    omitted; id and user_id columns are ignored. Raises ValueError on malformed JSON cells."""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {"source_chat_id", "dest_chat_id"} <= set(reader.fieldnames):
+        raise ValueError("CSV header must include source_chat_id and dest_chat_id")
+    items = []
+    for line, row in enumerate(reader, start=2):
+        item = {k: v for k, v in row.items() if k in MAPPING_FIELDS and v not in (None, "")}
+        for k in NESTED_FIELDS:
+            cell = row.get(k)
+            if cell:
+                try:
+                    item[k] = json.loads(cell)
+                except ValueError:
+                    raise ValueError(f"Line {line}: {k} is not valid JSON") from None
+        items.append(item)
+    return items
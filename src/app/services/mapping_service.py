@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from typing import Iterable
 
 import aiosqlite
@@ -96,6 +96,24 @@ class ChannelMapping:
     schedule: Schedule | None = None
 
 
+def mappings_to_snapshot(mappings: Iterable[ChannelMapping]) -> list[dict]:
+    """JSON-serialisable copy of loaded mappings (workers run by remote agents load it instead of
+    querying SQLite)."""
+    return [asdict(m) for m in mappings]
+
+
+def mappings_from_snapshot(items: list[dict]) -> list[ChannelMapping]:
+    return [
+        ChannelMapping(**{
+            **item,
+            "filters": [MappingFilter(**f) for f in item.get("filters", [])],
+            "transforms": [MappingTransform(**t) for t in item.get("transforms", [])],
+            "schedule": Schedule(**item["schedule"]) if item.get("schedule") else None,
+        })
+        for item in items
+    ]
+
+
 async def list_enabled_mappings(
     db: aiosqlite.Connection,
     user_id: int,
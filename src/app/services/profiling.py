@@ -0,0 +1,59 @@
+"""Running on-demand profiles (app.db.worker_profiles) in the API process and in workers."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any
+
+import aiosqlite
+
+from app.config import settings
+from app.db import worker_profiles
+from app.db.sqlite import get_sqlite
+from app.utils import profiler
+
+logger = logging.getLogger(__name__)
+
+_api_tasks: set[asyncio.Task] = set()
+
+
+async def run_profile(db: aiosqlite.Connection, profile: dict[str, Any]) -> None:
+    """Sample this process for the profile's duration (in a thread) and record the result."""
+    try:
+        result = await asyncio.to_thread(profiler.sample, profile["seconds"], profile["hz"])
+        path = await asyncio.to_thread(worker_profiles.write_output, profile["id"], result["collapsed"])
+    except Exception as e:
+        logger.exception("Profile %s failed", profile["id"])
+        await worker_profiles.finish(db, profile["id"], "failed", error=str(e))
+        return
+    await worker_profiles.finish(
+        db, profile["id"], "done", path=str(path), samples=result["samples"], overhead_pct=result["overhead_pct"]
+    )
+    logger.info("Profile %s done: %d samples, %.2f%% overhead", profile["id"], result["samples"], result["overhead_pct"])
+
+
+def start_api_profile(profile: dict[str, Any]) -> None:
+    """Profile the API process in the background."""
+
+    async def _run() -> None:
+        db = await get_sqlite()
+        try:
+            await run_profile(db, profile)
+        finally:
+            await db.close()
+
+    task = asyncio.create_task(_run(), name=f"profile-{profile['id']}")
+    _api_tasks.add(task)
+    task.add_done_callback(_api_tasks.discard)
+
+
+async def serve_worker_profiles(db: aiosqlite.Connection, account_id: int) -> None:
+    """Worker task: every WORKER_HEARTBEAT_SECONDS, run the account's pending profiles."""
+    while True:
+        try:
+            for profile in await worker_profiles.claim_pending(db, account_id):
+                await run_profile(db, profile)
+        except Exception as e:
+            logger.warning("Profile request check failed (will retry): %s", e)
+        await asyncio.sleep(settings.worker_heartbeat_seconds)
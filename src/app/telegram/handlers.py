@@ -3,32 +3,26 @@ from __future__ import annotations
 import datetime
 import logging
 import re
+import time
 from typing import Iterable
 
 import aiosqlite
 from telethon import events
-from telethon.errors import ChatIdInvalidError
+from telethon.errors import ChatIdInvalidError, FloodWaitError, SlowModeWaitError
 from telethon.tl.custom.message import Message
 from telethon.tl.types import MessageMediaWebPage
 
+from app.db.message_index import lookup_dest_msg_id, save_dest_mapping
 from app.services.mapping_service import ChannelMapping, MappingFilter, MappingTransform, Schedule
+from app.utils.chat_ids import alternate_chat_id
 from app.utils.regex import regex_flags_from_string
+from app.worker_stats import WorkerStats
+from app.worker_traces import MessageTrace
 
 logger = logging.getLogger(__name__)
 _TEMPLATE_TOKEN_RE = re.compile(r"\{\{\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*\}\}")
 
 
-def _alternate_chat_id(chat_id: int) -> int | None:
-    """Return the alternate format for a Telegram chat ID (legacy vs full channel).
-    Channels use -100xxxxxxxxxx, legacy groups use -xxxxxxxxx. Both refer to the same chat.
-    """
-    if chat_id >= 0:
-        return None
-    if chat_id <= -1000000000000:
-        return chat_id + 1000000000000  # full -> legacy
-    return chat_id - 1000000000000  # legacy -> full
-
-
 def _message_media_type(message: Message) -> str:
     if message.voice:
         return "voice"
@@ -183,13 +177,7 @@ async def _lookup_reply_dest_id(
     source_reply_msg_id: int,
     dest_chat_id: int,
 ) -> int | None:
-    async with db.execute(
-        "SELECT dest_msg_id FROM dest_message_index "
-        "WHERE user_id = ? AND source_chat_id = ? AND source_msg_id = ? AND dest_chat_id = ?",
-        (user_id, source_chat_id, source_reply_msg_id, dest_chat_id),
-    ) as cursor:
-        row = await cursor.fetchone()
-    return row[0] if row else None
+    return await lookup_dest_msg_id(db, user_id, source_chat_id, source_reply_msg_id, dest_chat_id)
 
 
 async def _save_dest_mapping(
@@ -200,13 +188,7 @@ async def _save_dest_mapping(
     dest_chat_id: int,
     dest_msg_id: int,
 ) -> None:
-    await db.execute(
-        "INSERT OR REPLACE INTO dest_message_index "
-        "(user_id, source_chat_id, source_msg_id, dest_chat_id, dest_msg_id) "
-        "VALUES (?, ?, ?, ?, ?)",
-        (user_id, source_chat_id, source_msg_id, dest_chat_id, dest_msg_id),
-    )
-    await db.commit()
+    await save_dest_mapping(db, user_id, source_chat_id, source_msg_id, dest_chat_id, dest_msg_id)
 
 
 def build_message_handler(
@@ -214,11 +196,17 @@ def build_message_handler(
     mappings: list[ChannelMapping],
     db: aiosqlite.Connection,
     mongo_db,
+    stats: WorkerStats | None = None,
 ):
+    """Build the NewMessage handler. `stats` (the worker's, published in its heartbeat) receives
+    per-mapping counters, stage latencies, send errors and sampled message traces; a private one
+    is used when omitted."""
+    if stats is None:
+        stats = WorkerStats()
     mapping_by_source: dict[int, list[ChannelMapping]] = {}
     for mapping in mappings:
         cids: list[int] = [mapping.source_chat_id]
-        alt = _alternate_chat_id(mapping.source_chat_id)
+        alt = alternate_chat_id(mapping.source_chat_id)
         if alt is not None:
             cids.append(alt)
         for cid in cids:
@@ -231,10 +219,24 @@ def build_message_handler(
         message = event.message
         if not message:
             return
-
+        stats.update_received()
+        trace = stats.tracer.start(source_chat_id=event.chat_id, message_id=message.id, user_id=user_id)
+        if trace is None:
+            await _handle(event, message, None)
+            return
+        try:
+            await _handle(event, message, trace)
+        except BaseException as e:
+            trace.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            if trace.spans:  # messages without a mapping are not kept
+                stats.tracer.finish(trace)
+
+    async def _handle(event: events.NewMessage.Event, message: Message, trace: MessageTrace | None) -> None:
         source_chat_id = event.chat_id
         candidates = [source_chat_id]
-        alt = _alternate_chat_id(source_chat_id)
+        alt = alternate_chat_id(source_chat_id)
         if alt is not None:
             candidates.append(alt)
         matched: list[ChannelMapping] = []
@@ -256,7 +258,12 @@ def build_message_handler(
             if mapping.id in seen:
                 continue
             seen.add(mapping.id)
+            stats.count(mapping.id, "in")
+            t = mapping_start = time.perf_counter()
             if not _passes_filters(message, mapping.filters):
+                stats.count(mapping.id, "filtered")
+                if trace is not None:
+                    trace.mapping_done(mapping.id, "filtered", mapping_start)
                 continue
             msg_time = message.date
             if msg_time.tzinfo is None:
@@ -265,7 +272,11 @@ def build_message_handler(
                 msg_time = msg_time.astimezone(datetime.timezone.utc)
             if not _passes_schedule(msg_time, mapping.schedule):
                 logger.debug("Skipped (outside schedule) msg_id=%s mapping_id=%s", message.id, mapping.id)
+                stats.count(mapping.id, "filtered")
+                if trace is not None:
+                    trace.mapping_done(mapping.id, "filtered", mapping_start)
                 continue
+            t = stats.lap("filter", t, trace, mapping.id)
 
             source_chat_title = (
                 (getattr(event.chat, "title", None) if event.chat else None)
@@ -290,6 +301,7 @@ def build_message_handler(
                 media_type=media_type,
             )
             replacement_media_path = _pick_media_replacement(message, mapping.transforms)
+            t = stats.lap("transform", t, trace, mapping.id)
             reply_to_msg_id = None
             if message.reply_to and message.reply_to.reply_to_msg_id:
                 reply_to_msg_id = await _lookup_reply_dest_id(
@@ -299,13 +311,15 @@ def build_message_handler(
                     source_reply_msg_id=message.reply_to.reply_to_msg_id,
                     dest_chat_id=mapping.dest_chat_id,
                 )
+                t = stats.lap("reply_lookup", t, trace, mapping.id)
 
             sent = None
             dest_ids = [mapping.dest_chat_id]
-            alt_dest = _alternate_chat_id(mapping.dest_chat_id)
+            alt_dest = alternate_chat_id(mapping.dest_chat_id)
             if alt_dest is not None:
                 dest_ids.append(alt_dest)
             last_err: Exception | None = None
+            dispatched_at = datetime.datetime.now(datetime.timezone.utc)
             for dest_id in dest_ids:
                 try:
                     incoming_supported_media = (
@@ -357,18 +371,34 @@ def build_message_handler(
                     continue
                 except Exception as e:
                     last_err = e
+                    stats.count(mapping.id, "failed")
+                    stats.send_failed(e)
+                    if isinstance(e, (FloodWaitError, SlowModeWaitError)):
+                        stats.flood_wait(e.seconds)
+                    if trace is not None:
+                        stats.lap("send", t, trace, mapping.id)
+                        trace.mapping_done(mapping.id, "failed", mapping_start)
                     raise
+            t = stats.lap("send", t, trace, mapping.id)
+            completed_at = datetime.datetime.now(datetime.timezone.utc)
             if sent is None and last_err:
+                stats.count(mapping.id, "failed")
+                stats.send_failed(last_err)
+                if trace is not None:
+                    trace.mapping_done(mapping.id, "failed", mapping_start)
                 logger.warning(
                     "Failed to send to dest_chat_id=%s (tried %s): %s",
                     mapping.dest_chat_id, dest_ids, last_err,
                 )
 
             if sent:
+                stats.count(mapping.id, "out")
+                stats.sent(msg_time.timestamp(), mapping.id)
                 logger.info(
                     "Forwarded msg %s from chat %s -> %s",
                     message.id, source_chat_id, mapping.dest_chat_id,
                 )
+                t = time.perf_counter()
                 await _save_dest_mapping(
                     db=db,
                     user_id=user_id,
@@ -377,12 +407,14 @@ def build_message_handler(
                     dest_chat_id=mapping.dest_chat_id,
                     dest_msg_id=sent.id,
                 )
+                index_done = stats.lap("index", t, trace, mapping.id)
+                stats.db_write("sqlite", "dest_index", index_done - t)
                 try:
                     source_title = str(source_chat_title) if source_chat_title else ""
                     # Fetch dest title from Telegram; mapping rarely has it (Add Mapping doesn't set it)
                     dest_title = mapping.dest_chat_title or ""
                     if not dest_title:
-                        for dest_id in (mapping.dest_chat_id, _alternate_chat_id(mapping.dest_chat_id)):
+                        for dest_id in (mapping.dest_chat_id, alternate_chat_id(mapping.dest_chat_id)):
                             if dest_id is None:
                                 continue
                             try:
@@ -396,6 +428,7 @@ def build_message_handler(
                 except Exception:
                     source_title = ""
                     dest_title = ""
+                t = stats.lap("dest_title", index_done, trace, mapping.id)
                 try:
                     await mongo_db.message_logs.insert_one({
                         "user_id": user_id,
@@ -406,10 +439,17 @@ def build_message_handler(
                         "source_chat_title": source_title,
                         "dest_chat_title": dest_title,
                         "timestamp": message.date,
+                        "mapping_id": mapping.id,
+                        "dispatched_at": dispatched_at,
+                        "completed_at": completed_at,
                         "status": "ok",
                     })
+                    stats.db_write("mongo", "message_log", time.perf_counter() - t)
                 except Exception as e:
                     logger.warning("Failed to write message log (non-fatal): %s", e)
+                stats.lap("message_log", t, trace, mapping.id)
+                if trace is not None:
+                    trace.mapping_done(mapping.id, "sent", mapping_start)
 
     return _handler
 
@@ -0,0 +1,25 @@
+"""Opaque pagination cursor tokens shared by keyset-paginated list endpoints."""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+
+
+def encode_cursor(values: dict) -> str:
+    """Encode a small dict of keyset values as a URL-safe opaque token."""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(token: str) -> dict:
+    """Decode a token produced by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, dict):
+        raise ValueError("Invalid cursor")
+    return values
@@ -0,0 +1,94 @@
+"""Event-loop lag sampling and an opt-in slow-callback reporter, for workers and the API.
+
+The sampler sleeps LAG_SAMPLE_SECONDS at a time and records how late each wake-up is into
+tgcopier_event_loop_lag_seconds. It shows that the loop was blocked, not by what.
+
+With SLOW_CALLBACK_SECONDS > 0 a watchdog thread also pings the loop (call_soon_threadsafe)
+several times per threshold. When a ping is not answered within the threshold, something is
+holding the loop: the watchdog logs the loop thread's current stack (sys._current_frames), which
+points at the blocking call itself (a sync Mongo insert, proc.wait, bcrypt, a file write), and
+counts it in tgcopier_slow_callbacks_total. One report per stall; its duration is filled in once
+the loop answers again. Workers publish their recent reports in the runtime heartbeat.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any
+
+from app.utils.metrics import Registry
+
+logger = logging.getLogger(__name__)
+
+LAG_SAMPLE_SECONDS = 0.5
+SLOW_CALLBACK_REPORTS = 5  # most recent reports kept (and published by workers)
+STACK_LIMIT = 25  # innermost frames in a report
+
+
+class LoopMonitor:
+    def __init__(self, registry: Registry, slow_callback_seconds: float = 0.0) -> None:
+        self.registry = registry
+        self.slow_callback_seconds = slow_callback_seconds
+        self.slow_callbacks: deque[dict[str, Any]] = deque(maxlen=SLOW_CALLBACK_REPORTS)
+        self._lag_max = 0.0
+
+    def take_max_lag(self) -> float:
+        """Largest lag since the previous call."""
+        lag, self._lag_max = self._lag_max, 0.0
+        return lag
+
+    async def run(self, interval: float = LAG_SAMPLE_SECONDS) -> None:
+        """Sample loop lag until cancelled; the watchdog thread (if enabled) lives as long."""
+        stop = threading.Event()
+        if self.slow_callback_seconds > 0:
+            threading.Thread(
+                target=self._watch,
+                args=(asyncio.get_running_loop(), threading.get_ident(), stop),
+                name="loop-watchdog",
+                daemon=True,
+            ).start()
+        try:
+            while True:
+                start = time.monotonic()
+                await asyncio.sleep(interval)
+                lag = max(time.monotonic() - start - interval, 0.0)
+                self._lag_max = max(self._lag_max, lag)
+                self.registry.observe("tgcopier_event_loop_lag_seconds", lag)
+        finally:
+            stop.set()
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread: int, stop: threading.Event) -> None:
+        threshold = self.slow_callback_seconds
+        while not stop.wait(threshold / 4):
+            answered = threading.Event()
+            posted = time.monotonic()
+            try:
+                loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:  # loop closed
+                return
+            if answered.wait(threshold):
+                continue
+            report = self._report(loop_thread, time.monotonic() - posted)
+            while not answered.wait(threshold):
+                if stop.is_set() or loop.is_closed():
+                    return
+            report["blocked_ms"] = round((time.monotonic() - posted) * 1000, 1)
+            logger.info("Event loop unblocked after %.0f ms", report["blocked_ms"])
+
+    def _report(self, loop_thread: int, blocked: float) -> dict[str, Any]:
+        frame = sys._current_frames().get(loop_thread)
+        stack = "".join(traceback.format_list(traceback.extract_stack(frame, limit=STACK_LIMIT))) if frame else ""
+        report = {"at": time.time(), "blocked_ms": round(blocked * 1000, 1), "stack": stack}
+        self.slow_callbacks.append(report)
+        self.registry.inc("tgcopier_slow_callbacks_total")
+        logger.warning(
+            "Event loop blocked for more than %.0f ms (SLOW_CALLBACK_SECONDS); loop thread stack:\n%s",
+            blocked * 1000, stack,
+        )
+        return report
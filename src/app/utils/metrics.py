@@ -0,0 +1,143 @@
+"""In-process counters, gauges and histograms, rendered in the Prometheus text format.
+
+The API records into REGISTRY (request latency, SQLite writer). Each worker keeps its own
+Registry (app.worker_stats) and ships it as a JSON snapshot in its runtime heartbeat, so GET
+/metrics renders the API's registry together with every live worker's last snapshot (labelled by
+account_id) without ever calling into a worker. Recording is a dict update under a lock: the
+worker's Mongo log thread records too.
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COPY_LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+# name -> (type, help, histogram buckets)
+FAMILIES: dict[str, tuple[str, str, tuple[float, ...] | None]] = {
+    "tgcopier_http_request_duration_seconds": (
+        "histogram", "API request latency by route template.", LATENCY_BUCKETS),
+    "tgcopier_sqlite_writer_wait_seconds": (
+        "histogram", "Time API requests waited for the pooled SQLite writer.", LATENCY_BUCKETS),
+    "tgcopier_sqlite_writer_hold_seconds": (
+        "histogram", "Time API requests held the pooled SQLite writer (lock hold, not statement time).",
+        LATENCY_BUCKETS),
+    "tgcopier_db_write_seconds": (
+        "histogram", "Latency of Mongo and SQLite writes by store and operation.", LATENCY_BUCKETS),
+    "tgcopier_handler_stage_seconds": (
+        "histogram", "Worker message handler latency per stage.", LATENCY_BUCKETS),
+    "tgcopier_copy_latency_seconds": (
+        "histogram", "From the source message date to the completed send.", COPY_LATENCY_BUCKETS),
+    "tgcopier_send_errors_total": ("counter", "Failed sends by exception type.", None),
+    "tgcopier_floodwaits_total": ("counter", "Telegram flood waits (slept through or raised).", None),
+    "tgcopier_floodwait_seconds_total": ("counter", "Seconds of Telegram flood wait.", None),
+    "tgcopier_event_loop_lag_seconds": (
+        "histogram", "How late the event loop woke from a sleep (app.utils.loop_monitor).", LATENCY_BUCKETS),
+    "tgcopier_slow_callbacks_total": (
+        "counter", "Event-loop stalls longer than SLOW_CALLBACK_SECONDS (stack logged).", None),
+    # Rendered from the worker heartbeat columns (not recorded into a Registry).
+    "tgcopier_worker_messages_total": ("counter", "Messages per mapping and outcome.", None),
+    "tgcopier_worker_queue_depth": ("gauge", "Worker queue depths (inflight handlers, log queue).", None),
+    "tgcopier_worker_loop_lag_seconds": ("gauge", "Worst event-loop lag since the previous heartbeat.", None),
+    "tgcopier_worker_rss_bytes": ("gauge", "Worker resident set size.", None),
+    "tgcopier_worker_cpu_seconds_total": ("counter", "Worker CPU time.", None),
+    "tgcopier_worker_heartbeat_age_seconds": ("gauge", "Seconds since the worker's last heartbeat.", None),
+}
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _key(labels: Mapping[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._gauges: dict[tuple[str, Labels], float] = {}
+        # (name, labels) -> [count per bucket..., count above the last bucket, sum]
+        self._histograms: dict[tuple[str, Labels], list[float]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = (name, _key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._gauges[(name, _key(labels))] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        buckets = FAMILIES[name][2]
+        key = (name, _key(labels))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0.0] * (len(buckets) + 2)
+            h[bisect.bisect_left(buckets, value)] += 1
+            h[-1] += value
+
+    def snapshot(self) -> dict[str, list]:
+        """JSON-serializable copy: {"counters"|"gauges": [[name, labels, value]], "histograms":
+        [[name, labels, bucket counts, sum]]}."""
+        with self._lock:
+            return {
+                "counters": [[n, dict(l), v] for (n, l), v in self._counters.items()],
+                "gauges": [[n, dict(l), v] for (n, l), v in self._gauges.items()],
+                "histograms": [[n, dict(l), h[:-1], h[-1]] for (n, l), h in self._histograms.items()],
+            }
+
+
+REGISTRY = Registry()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Mapping[str, Any], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(str(v))}"' for k, v in sorted(labels.items())]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render(sources: Iterable[tuple[Mapping[str, Any], dict[str, list]]]) -> str:
+    """Prometheus text format (0.0.4) of registry snapshots, each with labels added to all of its
+    samples (e.g. a worker's account_id). Families missing from FAMILIES are skipped."""
+    lines: dict[str, list[str]] = {}
+    for extra, snap in sources:
+        for kind in ("counters", "gauges"):
+            for name, labels, value in snap.get(kind, []):
+                if name in FAMILIES:
+                    lines.setdefault(name, []).append(f"{name}{_labels({**labels, **extra})} {_number(value)}")
+        for name, labels, counts, total in snap.get("histograms", []):
+            family = FAMILIES.get(name)
+            if family is None or family[2] is None or len(counts) != len(family[2]) + 1:
+                continue
+            out = lines.setdefault(name, [])
+            merged = {**labels, **extra}
+            cumulative = 0.0
+            for bound, count in zip((*family[2], math.inf), counts):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                out.append(f"{name}_bucket{_labels(merged, le)} {_number(cumulative)}")
+            out.append(f"{name}_sum{_labels(merged)} {_number(total)}")
+            out.append(f"{name}_count{_labels(merged)} {_number(cumulative)}")
+    text: list[str] = []
+    for name, samples in lines.items():
+        kind, help_text, _ = FAMILIES[name]
+        text += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *samples]
+    return "\n".join(text) + "\n" if text else ""
@@ -0,0 +1,16 @@
+"""Project paths. Relative data paths in settings (SESSIONS_DIR, PROFILES_DIR, ...) are resolved
+against the project root, not the working directory."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]  # utils -> app -> src -> project
+# Worker stderr logs (worker_<account_id>_<worker_id>.log, written by the API that spawns them) and
+# the zygote's log; the worker_logs maintenance job purges the same directory.
+WORKER_LOG_DIR = PROJECT_ROOT / "data"
+
+
+def resolve(path: str | Path) -> Path:
+    p = Path(path)
+    return p if p.is_absolute() else PROJECT_ROOT / p
@@ -0,0 +1,79 @@
+"""Startup phase timing for `tg-copier --profile-startup`.
+
+Entry points wrap imports and startup steps in phase(); each phase records its wall time and the
+modules it imported (grouped by top-level package). Recording is always on and costs a set
+difference per phase; report() prints the breakdown only when --profile-startup enabled it.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TextIO
+
+# app.main imports this module first, so this is as close to interpreter start as the app gets.
+_T0 = time.perf_counter()
+TOP_PACKAGES = 4
+
+
+@dataclass(slots=True)
+class Phase:
+    name: str
+    seconds: float
+    modules: int
+    packages: list[tuple[str, int]]
+
+
+_phases: list[Phase] = []
+_enabled = False
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """Restart the clock and drop recorded phases (a worker forked by the zygote starts here)."""
+    global _T0
+    _T0 = time.perf_counter()
+    _phases.clear()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    before = set(sys.modules)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        new = set(sys.modules) - before
+        packages = Counter(m.partition(".")[0] for m in new).most_common(TOP_PACKAGES)
+        _phases.append(Phase(name, seconds, len(new), packages))
+
+
+def phases() -> list[Phase]:
+    return list(_phases)
+
+
+def report(file: TextIO | None = None) -> None:
+    """Print the phases recorded so far (only when enabled)."""
+    if not _enabled:
+        return
+    out = file or sys.stderr
+    total = time.perf_counter() - _T0
+    print("startup profile (since app.main import):", file=out)
+    for p in _phases:
+        packages = ", ".join(f"{name} {count}" for name, count in p.packages)
+        print(f"  {p.name:<28} {p.seconds * 1000:8.1f} ms  {p.modules:5d} modules  {packages}", file=out)
+    print(f"  {'total':<28} {total * 1000:8.1f} ms  {len(sys.modules):5d} modules loaded", file=out)
+    out.flush()
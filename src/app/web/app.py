@@ -4,27 +4,40 @@ import asyncio
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app.auth.password import PasswordHasherBusy, shutdown_password_executor
+from app.auth.principal_cache import clear_auth_caches
 from app.config import settings
-from app.db.cleanup import purge_old_login_sessions
 from app.db.mongo_indexes import ensure_mongo_indexes
-from app.db.sqlite import get_sqlite, init_sqlite
+from app.db.sqlite import close_sqlite_pool, get_sqlite, init_sqlite, open_sqlite_pool
+from app.services.log_tail import stop_log_tail_hubs
+from app.services.maintenance import start_maintenance, stop_maintenance
+from app.utils import startup_profile
+from app.utils.loop_monitor import LoopMonitor
+from app.utils.metrics import REGISTRY
+from app.web.request_metrics import RequestMetricsMiddleware
 from app.web.routers import (
     accounts,
     accounts_login,
+    admin_maintenance,
     admin_settings,
     admin_stats,
     admin_users,
+    agents,
     auth,
     filters,
     mappings,
     media_assets,
     message_index,
     message_logs,
+    metrics,
+    profiles,
     schedules,
     stats,
+    traces,
     transforms,
     worker_logs,
     workers,
@@ -35,10 +48,15 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_sqlite()
-    await purge_old_login_sessions(settings.login_sessions_retention_days)
+    with startup_profile.phase("init sqlite"):
+        await init_sqlite()
+        await open_sqlite_pool()
+    clear_auth_caches()
     if not settings.testing:
-        await ensure_mongo_indexes()
+        # Preloads in the background so it is warm by the time restore spawns workers.
+        workers.start_worker_zygote()
+        with startup_profile.phase("mongo indexes"):
+            await ensure_mongo_indexes()
 
     async def _delayed_restore():
         """Restore workers a few seconds after startup so DB, Mongo, etc. are fully ready."""
@@ -53,12 +71,27 @@ async def lifespan(app: FastAPI):
             await db.close()
 
     asyncio.create_task(_delayed_restore())
+    loop_monitor = asyncio.create_task(
+        LoopMonitor(REGISTRY, settings.slow_callback_seconds).run(), name="loop-monitor"
+    )
+    if not settings.testing:
+        workers.start_worker_supervisor()
+    if settings.metrics_enabled and settings.metrics_open and not settings.metrics_token:
+        logger.warning("GET /metrics is open to any host (METRICS_OPEN=true without METRICS_TOKEN)")
+    await start_maintenance()
+    startup_profile.report()
     yield
-    db = await get_sqlite()
+    loop_monitor.cancel()
+    await asyncio.gather(loop_monitor, return_exceptions=True)
+    await stop_maintenance()
+    await workers.stop_worker_supervisor()
+    await stop_log_tail_hubs()
     try:
-        await workers.terminate_all_workers(db)
+        await workers.terminate_all_workers()
     finally:
-        await db.close()
+        await workers.stop_worker_zygote()
+        await close_sqlite_pool()
+        shutdown_password_executor()
 
 
 def create_app() -> FastAPI:
@@ -70,14 +103,27 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    if settings.metrics_enabled:
+        app.add_middleware(RequestMetricsMiddleware)
+
+    @app.exception_handler(PasswordHasherBusy)
+    async def password_hasher_busy(_request: Request, _exc: PasswordHasherBusy):
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"detail": "Too many concurrent sign-in attempts, retry shortly"},
+            headers={"Retry-After": "1"},
+        )
 
     @app.get("/health")
     async def health():
         return {"status": "ok"}
 
+    app.include_router(metrics.router)
+
     app.include_router(auth.router, prefix="/api")
     app.include_router(admin_users.router, prefix="/api")
     app.include_router(admin_settings.router, prefix="/api")
+    app.include_router(admin_maintenance.router, prefix="/api")
     app.include_router(accounts.router, prefix="/api")
     app.include_router(accounts_login.router, prefix="/api")
     app.include_router(mappings.router, prefix="/api")
@@ -89,7 +135,10 @@ def create_app() -> FastAPI:
     app.include_router(message_logs.router, prefix="/api")
     app.include_router(worker_logs.router, prefix="/api")
     app.include_router(workers.router, prefix="/api")
+    app.include_router(profiles.router, prefix="/api")
+    app.include_router(agents.router, prefix="/api")
     app.include_router(stats.router, prefix="/api")
+    app.include_router(traces.router, prefix="/api")
     app.include_router(admin_stats.router, prefix="/api")
 
     return app
@@ -2,43 +2,58 @@
 
 from __future__ import annotations
 
+import hmac
+import ipaddress
 from typing import Annotated
 
 import aiosqlite
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from app.auth.jwt import decode_token
-from app.db.sqlite import get_sqlite
+from app.auth.principal_cache import (
+    cache_principal,
+    decode_access_token,
+    get_cached_principal,
+    principal_version,
+)
+from app.config import settings
+from app.db.sqlite import get_sqlite, get_sqlite_pool, sqlite_writer
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
 
 async def get_db() -> aiosqlite.Connection:
-    db = await get_sqlite()
-    try:
+    """The pooled writer connection, held exclusively for the request (fresh connection if no pool).
+    Routes that call Telegram, wait for workers or hash passwords take ReadDb instead and open
+    app.db.sqlite.sqlite_writer() around their writes only."""
+    async with sqlite_writer() as db:
         yield db
-    finally:
-        await db.close()
+
+
+async def get_read_db() -> aiosqlite.Connection:
+    """A shared read-only pooled connection for routes that never write."""
+    pool = get_sqlite_pool()
+    if pool is None:
+        db = await get_sqlite()
+        try:
+            yield db
+        finally:
+            await db.close()
+        return
+    yield pool.reader()
 
 
 Db = Annotated[aiosqlite.Connection, Depends(get_db)]
+ReadDb = Annotated[aiosqlite.Connection, Depends(get_read_db)]
 
 
-async def get_current_user(
-    db: Db,
-    credentials: Annotated[
-        HTTPAuthorizationCredentials | None, Depends(bearer_scheme)
-    ] = None,
-) -> dict:
-    """Extract and validate JWT, return user dict from DB."""
-    tok = credentials.credentials if credentials is not None else None
+def _user_id_from_token(tok: str | None) -> int:
     if not tok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated",
         )
-    payload = decode_token(tok)
+    payload = decode_access_token(tok)
     if not payload or payload.get("type") != "access":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -50,6 +65,10 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token",
         )
+    return int(user_id)
+
+
+async def _fetch_user(db: aiosqlite.Connection, user_id: int) -> dict:
     async with db.execute(
         "SELECT id, email, name, role, status, timezone FROM users WHERE id = ? AND status = 'active'",
         (user_id,),
@@ -70,6 +89,37 @@ async def get_current_user(
     }
 
 
+async def _user_from_token(tok: str | None) -> dict:
+    """Resolve the principal for an access token. Cached principals cost no database read; on a
+    miss a pooled reader is used (or a short-lived connection when no pool is open)."""
+    user_id = _user_id_from_token(tok)
+    cached = get_cached_principal(user_id)
+    if cached is not None:
+        return cached
+    version = principal_version(user_id)
+    pool = get_sqlite_pool()
+    if pool is not None:
+        user = await _fetch_user(pool.reader(), user_id)
+    else:
+        db = await get_sqlite()
+        try:
+            user = await _fetch_user(db, user_id)
+        finally:
+            await db.close()
+    cache_principal(user_id, user, version)
+    return user
+
+
+async def get_current_user(
+    credentials: Annotated[
+        HTTPAuthorizationCredentials | None, Depends(bearer_scheme)
+    ] = None,
+) -> dict:
+    """Extract and validate JWT, return user dict (cached briefly; see app.auth.principal_cache)."""
+    tok = credentials.credentials if credentials is not None else None
+    return await _user_from_token(tok)
+
+
 CurrentUser = Annotated[dict, Depends(get_current_user)]
 
 
@@ -83,3 +133,97 @@ async def require_admin(user: CurrentUser) -> dict:
 
 
 AdminUser = Annotated[dict, Depends(require_admin)]
+
+
+async def get_stream_user(
+    credentials: Annotated[
+        HTTPAuthorizationCredentials | None, Depends(bearer_scheme)
+    ] = None,
+    access_token: str | None = None,
+) -> dict:
+    """Like get_current_user, but also accepts ?access_token= (EventSource cannot set headers)."""
+    tok = credentials.credentials if credentials is not None else access_token
+    return await _user_from_token(tok)
+
+
+StreamUser = Annotated[dict, Depends(get_stream_user)]
+
+
+async def require_agent(
+    credentials: Annotated[
+        HTTPAuthorizationCredentials | None, Depends(bearer_scheme)
+    ] = None,
+) -> None:
+    """Remote worker agents authenticate with the shared AGENT_TOKEN, not a user JWT."""
+    if not settings.agent_token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Worker agents are disabled",
+        )
+    tok = credentials.credentials if credentials is not None else ""
+    if not hmac.compare_digest(tok.encode(), settings.agent_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid agent token",
+        )
+
+
+def _is_loopback(host: str | None) -> bool:
+    try:
+        return host is not None and ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+async def require_secure_transport(request: Request) -> None:
+    """Agent session bundles carry Telegram sessions: only over HTTPS (as seen by the API, so run
+    uvicorn with --proxy-headers behind a TLS proxy) or from localhost, unless AGENT_ALLOW_HTTP=true."""
+    if settings.agent_allow_http or request.url.scheme == "https":
+        return
+    if _is_loopback(request.client.host if request.client else None):
+        return
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Session bundles are only served over HTTPS (AGENT_ALLOW_HTTP=true on a trusted network)",
+    )
+
+
+async def require_metrics_scraper(
+    request: Request,
+    credentials: Annotated[
+        HTTPAuthorizationCredentials | None, Depends(bearer_scheme)
+    ] = None,
+) -> None:
+    """GET /metrics: disabled by METRICS_ENABLED=false; needs METRICS_TOKEN as a bearer token if set.
+    Without a token only localhost may scrape, unless METRICS_OPEN=true."""
+    if not settings.metrics_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Metrics are disabled",
+        )
+    if not settings.metrics_token:
+        if settings.metrics_open or _is_loopback(request.client.host if request.client else None):
+            return
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Set METRICS_TOKEN to scrape /metrics from another host",
+        )
+    tok = credentials.credentials if credentials is not None else ""
+    if not hmac.compare_digest(tok.encode(), settings.metrics_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+        )
+
+
+async def get_agent_db() -> aiosqlite.Connection:
+    """A connection of its own rather than the pooled writer, so agent heartbeats (which a stopping
+    worker's drain waits for) never queue behind API requests."""
+    db = await get_sqlite()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+AgentDb = Annotated[aiosqlite.Connection, Depends(get_agent_db)]
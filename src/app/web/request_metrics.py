@@ -0,0 +1,52 @@
+"""API request latency for GET /metrics (tgcopier_http_request_duration_seconds)."""
+
+from __future__ import annotations
+
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.metrics import REGISTRY
+
+
+def route_template(scope: Scope) -> str:
+    """The matched route's path template, e.g. /api/workers/{worker_id}/stop. Included routers keep
+    their own paths (without the include prefix), so the prefix is taken from the request path."""
+    path_format = getattr(scope.get("route"), "path_format", None)
+    if path_format is None:
+        return "unmatched"
+    depth = path_format.count("/")
+    return scope["path"].rsplit("/", depth)[0] + path_format if depth else path_format
+
+
+class RequestMetricsMiddleware:
+    """Times each HTTP request by method, route template (not the raw path, so ids do not explode
+    the label set) and status class. Plain ASGI, so streamed responses pass through unbuffered."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status_code = 500
+
+        async def _send(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # The router records the matched route in the (shared) scope.
+            REGISTRY.observe(
+                "tgcopier_http_request_duration_seconds",
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=route_template(scope),
+                status=f"{status_code // 100}xx",
+            )
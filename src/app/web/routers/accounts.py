@@ -9,63 +9,79 @@ from pathlib import Path
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 
 from app.config import settings
+from app.db.pagination import after_condition, next_cursor, order_by, parse_key_cursor, sort_columns
+from app.db.row_counts import cached_count
+from app.db.search import rank_order, search_from
+from app.db.sqlite import sqlite_writer
 from app.web.schemas.accounts import TelegramAccountUpdate
-from app.web.deps import AdminUser, CurrentUser, Db
+from app.web.deps import AdminUser, CurrentUser, Db, ReadDb
 from app.web.routers.workers import stop_workers_for_account
 
 router = APIRouter(prefix="/accounts", tags=["accounts"])
 
 
 _ALLOWED_SORT = {"id", "name", "type", "status", "created_at", "user_id"}
+_LIST_COLUMNS = ["id", "user_id", "name", "type", "session_path", "phone", "status", "created_at"]
 
 
 @router.get("")
 async def list_accounts(
-    db: Db,
+    db: ReadDb,
     user: CurrentUser,
     user_id: int | None = None,
+    q: str | None = None,
     page: int = 1,
     page_size: int = 20,
-    sort_by: str = "id",
+    sort_by: str | None = None,
     sort_order: str = "asc",
+    after: str | None = None,
 ) -> dict:
-    """List telegram accounts. Users see own; admins can filter by user_id. Returns paginated {items, total, page, page_size, total_pages}."""
+    """List telegram accounts. Users see own; admins can filter by user_id. q searches name and
+    phone (word prefixes, best matches first unless sort_by is given). Returns paginated
+    {items, total, page, page_size, total_pages, next_cursor}; pass next_cursor as `after` to
+    continue by index seek instead of OFFSET (not available for relevance order)."""
     page_size = min(max(1, page_size), 100)
     page = max(1, page)
-    offset = (page - 1) * page_size
     col = sort_by if sort_by in _ALLOWED_SORT else "id"
-    direction = "DESC" if sort_order.lower() == "desc" else "ASC"
-    order = f"ORDER BY {col} {direction}"
+    descending = sort_order.lower() == "desc"
+    keys = sort_columns(col)
+    try:
+        after_key = parse_key_cursor(after, len(keys)) if after else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+    source, params = search_from("telegram_accounts", q)
+    searching = bool(params)
+    scope_id = user_id if user["role"] == "admin" else user["id"]
+    conditions = []
+    if scope_id is not None:
+        conditions.append("user_id = ?")
+        params.append(scope_id)
 
-    if user["role"] == "admin":
-        if user_id is not None:
-            scope_id = user_id
-        else:
-            scope_id = -1
-        if scope_id == -1:
-            base = "FROM telegram_accounts"
-            params: list = []
-        else:
-            base = "FROM telegram_accounts WHERE user_id = ?"
-            params = [scope_id]
+    if searching:
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        async with db.execute(f"SELECT COUNT(*) {source}{where}", params) as cur:
+            total = (await cur.fetchone())[0]
     else:
-        base = "FROM telegram_accounts WHERE user_id = ?"
-        params = [user["id"]]
-
-    async with db.execute(f"SELECT COUNT(*) {base}", params) as cur:
-        total = (await cur.fetchone())[0]
+        total = await cached_count(db, "telegram_accounts", scope_id)
+    ranked = searching and sort_by is None and after_key is None
+    order = rank_order(total) if ranked else order_by(keys, descending)
+    offset = (page - 1) * page_size
+    if after_key is not None:
+        cond, cond_params = after_condition(keys, after_key, descending)
+        conditions.append(cond)
+        params.extend(cond_params)
+        offset = 0
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
 
-    params.extend([page_size, offset])
+    params.extend([page_size + 1, offset])
     async with db.execute(
-        f"SELECT id, user_id, name, type, session_path, phone, status, created_at {base} {order} LIMIT ? OFFSET ?",
+        f"SELECT {', '.join(_LIST_COLUMNS)} {source}{where} {order} LIMIT ? OFFSET ?",
         params,
     ) as cur:
         rows = await cur.fetchall()
+    cursor = None if ranked else next_cursor(rows, page_size, [_LIST_COLUMNS.index(k) for k in keys])
 
-    items = [
-        {"id": r[0], "user_id": r[1], "name": r[2], "type": r[3], "session_path": r[4], "phone": r[5], "status": r[6], "created_at": r[7]}
-        for r in rows
-    ]
+    items = [dict(zip(_LIST_COLUMNS, r)) for r in rows[:page_size]]
     total_pages = max(1, (total + page_size - 1) // page_size) if total else 1
     return {
         "items": items,
@@ -73,13 +89,14 @@ async def list_accounts(
         "page": page,
         "page_size": page_size,
         "total_pages": total_pages,
+        "next_cursor": cursor,
     }
 
 
 @router.get("/{account_id}")
 async def get_account(
     account_id: int,
-    db: Db,
+    db: ReadDb,
     user: CurrentUser,
 ) -> dict:
     """Get telegram account by ID."""
@@ -217,10 +234,11 @@ async def update_account(
 @router.delete("/{account_id}")
 async def delete_account(
     account_id: int,
-    db: Db,
+    db: ReadDb,
     user: CurrentUser,
 ) -> dict:
-    """Delete telegram account and safely disable related mappings/workers."""
+    """Delete telegram account and safely disable related mappings/workers. The workers drain
+    without the writer held."""
     async with db.execute(
         "SELECT id, user_id, session_path FROM telegram_accounts WHERE id = ?",
         (account_id,),
@@ -232,16 +250,19 @@ async def delete_account(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
     # Disable mappings that use this account
-    await db.execute(
-        "UPDATE channel_mappings SET enabled = 0 WHERE telegram_account_id = ?",
-        (account_id,),
-    )
+    async with sqlite_writer() as wdb:
+        await wdb.execute(
+            "UPDATE channel_mappings SET enabled = 0 WHERE telegram_account_id = ?",
+            (account_id,),
+        )
+        await wdb.commit()
 
     # Stop any running workers for this account
-    await stop_workers_for_account(account_id, db)
+    await stop_workers_for_account(account_id)
 
-    await db.execute("DELETE FROM telegram_accounts WHERE id = ?", (account_id,))
-    await db.commit()
+    async with sqlite_writer() as wdb:
+        await wdb.execute("DELETE FROM telegram_accounts WHERE id = ?", (account_id,))
+        await wdb.commit()
 
     if row[2]:
         try:
@@ -14,7 +14,8 @@ from telethon.errors import (
 )
 
 from app.config import settings
-from app.web.deps import CurrentUser, Db
+from app.db.sqlite import sqlite_writer
+from app.web.deps import CurrentUser, Db, ReadDb
 
 
 router = APIRouter(prefix="/accounts/login", tags=["accounts-login"])
@@ -40,8 +41,8 @@ class CancelLoginRequest(BaseModel):
 
 
 @router.post("/begin", response_model=BeginLoginResponse)
-async def begin_login(data: BeginLoginRequest, user: CurrentUser, db: Db) -> dict:
-    """Begin Telethon phone login for a user account."""
+async def begin_login(data: BeginLoginRequest, user: CurrentUser) -> dict:
+    """Begin Telethon phone login for a user account. The writer is only taken once the code is sent."""
     phone = data.phone.strip()
     if not phone.startswith("+") or len(phone) < 5:
         raise HTTPException(
@@ -70,14 +71,15 @@ async def begin_login(data: BeginLoginRequest, user: CurrentUser, db: Db) -> dic
             detail=f"Failed to send code: {e}",
         ) from e
 
-    cursor = await db.execute(
-        """
-        INSERT INTO login_sessions (user_id, phone, tmp_session_name, status, phone_code_hash)
-        VALUES (?, ?, ?, 'pending', ?)
-        """,
-        (user["id"], phone, tmp_session_name, phone_code_hash),
-    )
-    await db.commit()
+    async with sqlite_writer() as db:
+        cursor = await db.execute(
+            """
+            INSERT INTO login_sessions (user_id, phone, tmp_session_name, status, phone_code_hash)
+            VALUES (?, ?, ?, 'pending', ?)
+            """,
+            (user["id"], phone, tmp_session_name, phone_code_hash),
+        )
+        await db.commit()
     login_session_id = cursor.lastrowid
 
     await client.disconnect()
@@ -86,8 +88,9 @@ async def begin_login(data: BeginLoginRequest, user: CurrentUser, db: Db) -> dic
 
 
 @router.post("/complete")
-async def complete_login(data: CompleteLoginRequest, user: CurrentUser, db: Db) -> dict:
-    """Complete Telethon phone login, persist session, and create telegram_accounts row."""
+async def complete_login(data: CompleteLoginRequest, user: CurrentUser, db: ReadDb) -> dict:
+    """Complete Telethon phone login, persist session, and create telegram_accounts row. Sign-in
+    runs before the writer is taken."""
     async with db.execute(
         "SELECT id, user_id, phone, tmp_session_name, status, phone_code_hash "
         "FROM login_sessions WHERE id = ?",
@@ -166,14 +169,15 @@ async def complete_login(data: CompleteLoginRequest, user: CurrentUser, db: Db)
         now = datetime.now(timezone.utc).isoformat()
         account_name = data.account_name or "User account"
 
-        cursor = await db.execute(
-            """
-            INSERT INTO telegram_accounts (user_id, type, status, name, created_at)
-            VALUES (?, 'user', 'active', ?, ?)
-            """,
-            (login_user_id, account_name, now),
-        )
-        await db.commit()
+        async with sqlite_writer() as wdb:
+            cursor = await wdb.execute(
+                """
+                INSERT INTO telegram_accounts (user_id, type, status, name, created_at)
+                VALUES (?, 'user', 'active', ?, ?)
+                """,
+                (login_user_id, account_name, now),
+            )
+            await wdb.commit()
         account_id = cursor.lastrowid
 
         sessions_base = Path(settings.sessions_dir) / str(login_user_id)
@@ -190,22 +194,22 @@ async def complete_login(data: CompleteLoginRequest, user: CurrentUser, db: Db)
 
         tmp_file.replace(final_path)
 
-        await db.execute(
-            "UPDATE telegram_accounts SET session_path = ? WHERE id = ?",
-            (str(final_path), account_id),
-        )
-        await db.execute(
-            "UPDATE login_sessions SET status = 'completed' WHERE id = ?",
-            (login_id,),
-        )
-        await db.commit()
-
-        async with db.execute(
-            "SELECT id, user_id, name, type, session_path, phone, status, created_at "
-            "FROM telegram_accounts WHERE id = ?",
-            (account_id,),
-        ) as cur:
-            acc_row = await cur.fetchone()
+        async with sqlite_writer() as wdb:
+            await wdb.execute(
+                "UPDATE telegram_accounts SET session_path = ? WHERE id = ?",
+                (str(final_path), account_id),
+            )
+            await wdb.execute(
+                "UPDATE login_sessions SET status = 'completed' WHERE id = ?",
+                (login_id,),
+            )
+            await wdb.commit()
+            async with wdb.execute(
+                "SELECT id, user_id, name, type, session_path, phone, status, created_at "
+                "FROM telegram_accounts WHERE id = ?",
+                (account_id,),
+            ) as cur:
+                acc_row = await cur.fetchone()
 
         return {
             "id": acc_row[0],
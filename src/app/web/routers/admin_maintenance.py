@@ -0,0 +1,54 @@
+"""Admin maintenance API - background cleanup job status and manual runs."""
+
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException, status
+
+from app.config import settings
+from app.services.maintenance import get_maintenance_scheduler
+from app.web.deps import AdminUser, ReadDb
+
+router = APIRouter(prefix="/admin/maintenance", tags=["admin-maintenance"])
+
+
+@router.get("")
+async def get_maintenance_status(db: ReadDb, _admin: AdminUser, history: int = 20) -> dict:
+    """Scheduler state per job (this API process) plus the most recent recorded runs."""
+    scheduler = get_maintenance_scheduler()
+    history = min(max(0, history), 200)
+    async with db.execute(
+        """SELECT job, started_at, duration_ms, removed, complete, error
+           FROM maintenance_runs ORDER BY id DESC LIMIT ?""",
+        (history,),
+    ) as cur:
+        rows = await cur.fetchall()
+    return {
+        "enabled": settings.maintenance_enabled,
+        "started": scheduler.started,
+        "job_budget_seconds": settings.maintenance_job_budget_seconds,
+        "batch_size": settings.maintenance_batch_size,
+        "jobs": scheduler.status(),
+        "recent_runs": [
+            {
+                "job": r[0],
+                "started_at": r[1],
+                "duration_ms": r[2],
+                "removed": r[3],
+                "complete": bool(r[4]),
+                "error": r[5],
+            }
+            for r in rows
+        ],
+    }
+
+
+@router.post("/{job_name}/run")
+async def run_maintenance_job(job_name: str, _admin: AdminUser) -> dict:
+    """Run one job now (same time box as scheduled runs)."""
+    scheduler = get_maintenance_scheduler()
+    job = scheduler.jobs.get(job_name)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown maintenance job")
+    if job.running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job is already running")
+    return {"name": job.name, "last_run": await scheduler.run_job(job)}
@@ -1,17 +1,26 @@
-"""Admin settings API - MongoDB URI, etc."""
+"""Admin settings API - MongoDB URI, log and message index retention, etc."""
 
 from __future__ import annotations
 
+import logging
 import re
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from pydantic import BaseModel
 
 from app.config import settings
-from app.services.app_settings import get_setting, mask_mongo_uri, set_setting
-from app.web.deps import AdminUser, Db
+from app.db import message_index
+from app.db.mongo_storage import (
+    LOG_COLLECTIONS,
+    get_retention_days,
+    retention_setting_key,
+    timeseries_enabled,
+)
+from app.services.app_settings import MAX_RETENTION_DAYS, get_setting, mask_mongo_uri, set_setting
+from app.web.deps import AdminUser, Db, ReadDb
 
 router = APIRouter(prefix="/admin/settings", tags=["admin-settings"])
+logger = logging.getLogger(__name__)
 
 MONGO_URI_PATTERN = re.compile(r"^mongodb(\+srv)?://.+$")
 
@@ -19,21 +28,45 @@ MONGO_URI_PATTERN = re.compile(r"^mongodb(\+srv)?://.+$")
 class SettingsUpdate(BaseModel):
     mongo_uri: str | None = None
     mongo_db: str | None = None
+    message_logs_retention_days: int | None = None  # 0 = keep forever
+    worker_logs_retention_days: int | None = None
+    logs_timeseries: bool | None = None
+    message_index_retention_days: int | None = None  # 0 = keep forever; per-user/mapping overrides win
 
 
 async def _get_settings_dict(db: Db) -> dict:
     mongo_uri = await get_setting(db, "mongo_uri")
     mongo_db = await get_setting(db, "mongo_db")
-    return {
+    result = {
         "mongo_uri": mask_mongo_uri(mongo_uri or settings.mongo_uri),
         "mongo_uri_set": bool(mongo_uri),
         "mongo_db": mongo_db or settings.mongo_db,
         "mongo_db_set": bool(mongo_db),
     }
+    for coll_name in LOG_COLLECTIONS:
+        key = retention_setting_key(coll_name)
+        result[key] = get_retention_days(coll_name)
+        result[f"{key}_set"] = bool(await get_setting(db, key))
+    result["logs_timeseries"] = timeseries_enabled()
+    result["logs_timeseries_set"] = bool(await get_setting(db, "logs_timeseries"))
+    result["message_index_retention_days"] = message_index.default_retention_days()
+    result["message_index_retention_days_set"] = bool(await get_setting(db, message_index.RETENTION_SETTING_KEY))
+    return result
+
+
+async def _apply_log_retention() -> None:
+    """Push retention to MongoDB now; if Mongo is unreachable it is applied at next startup."""
+    from app.db.mongo import get_mongo_db
+    from app.db.mongo_storage import apply_all_log_retention
+
+    try:
+        await apply_all_log_retention(get_mongo_db())
+    except Exception as e:
+        logger.warning("Log retention saved but not applied to MongoDB: %s", e)
 
 
 @router.get("")
-async def get_settings(db: Db, _admin: AdminUser) -> dict:
+async def get_settings(db: ReadDb, _admin: AdminUser) -> dict:
     """Get app settings (MongoDB URI is masked)."""
     return await _get_settings_dict(db)
 
@@ -43,8 +76,11 @@ async def update_settings(
     db: Db,
     _admin: AdminUser,
     data: SettingsUpdate,
+    background_tasks: BackgroundTasks,
 ) -> dict:
-    """Update app settings. Pass only fields to change."""
+    """Update app settings. Pass only fields to change. Every field is validated before any is
+    saved; changed log retention is pushed to MongoDB after the response."""
+    updates: dict[str, str | None] = {}
     if data.mongo_uri is not None:
         val = data.mongo_uri.strip() or None
         if val and not MONGO_URI_PATTERN.match(val):
@@ -52,7 +88,7 @@ async def update_settings(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="mongo_uri must be a valid MongoDB connection string (mongodb:// or mongodb+srv://)",
             )
-        await set_setting(db, "mongo_uri", val)
+        updates["mongo_uri"] = val
     if data.mongo_db is not None:
         val = data.mongo_db.strip() or None
         if val and not all(c.isalnum() or c in "_-" for c in val):
@@ -60,7 +96,24 @@ async def update_settings(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="mongo_db must be alphanumeric (with - or _ allowed)",
             )
-        await set_setting(db, "mongo_db", val)
+        updates["mongo_db"] = val
+    log_retention_keys = [retention_setting_key(c) for c in LOG_COLLECTIONS]
+    for key in [*log_retention_keys, message_index.RETENTION_SETTING_KEY]:
+        days = getattr(data, key)
+        if days is None:
+            continue
+        if days < 0 or days > MAX_RETENTION_DAYS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{key} must be between 0 (keep forever) and {MAX_RETENTION_DAYS}",
+            )
+        updates[key] = str(days)
+    if data.logs_timeseries is not None:
+        updates["logs_timeseries"] = "1" if data.logs_timeseries else "0"
+    for key, val in updates.items():
+        await set_setting(db, key, val)
+    if any(key in updates for key in log_retention_keys):
+        background_tasks.add_task(_apply_log_retention)
     return await _get_settings_dict(db)
 
 
@@ -6,15 +6,16 @@ from datetime import datetime, timedelta, timezone
 
 from fastapi import APIRouter, Depends
 
+from app.db import worker_heartbeats
 from app.db.mongo import get_mongo_db
-from app.web.deps import AdminUser, Db
-from app.web.routers.workers import _is_process_alive, _workers
+from app.web.deps import AdminUser, ReadDb
+from app.web.routers.workers import live_worker_count, worker_health
 
 router = APIRouter(prefix="/admin/stats", tags=["admin-stats"])
 
 
 @router.get("/dashboard")
-async def get_admin_dashboard_stats(user: AdminUser, db: Db) -> dict:
+async def get_admin_dashboard_stats(user: AdminUser, db: ReadDb) -> dict:
     """Admin dashboard: system-wide statistics."""
     now = datetime.now(timezone.utc)
     today_end = now.replace(hour=23, minute=59, second=59, microsecond=999999)
@@ -52,7 +53,11 @@ async def get_admin_dashboard_stats(user: AdminUser, db: Db) -> dict:
             active_accounts = row[0]
 
     # Workers count (from in-memory registry)
-    workers_count = sum(1 for w in _workers.values() if _is_process_alive(w))
+    workers_count = live_worker_count()
+
+    # Runtime heartbeats of those workers; stale ones are restarted by the worker supervisor
+    health = await worker_health(db)
+    workers_stale = sum(1 for h in health if worker_heartbeats.is_stale(h["heartbeat"]))
 
     # MongoDB: message stats
     messages_last_7d = 0
@@ -176,6 +181,8 @@ async def get_admin_dashboard_stats(user: AdminUser, db: Db) -> dict:
         "mappings_total": mappings_total,
         "mappings_enabled": mappings_enabled,
         "workers_count": workers_count,
+        "workers_stale": workers_stale,
+        "worker_health": health,
         "active_accounts": active_accounts,
         "messages_last_7d": messages_last_7d,
         "messages_prev_7d": messages_prev_7d,
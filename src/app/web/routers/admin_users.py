@@ -4,8 +4,11 @@ from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, status
 
-from app.auth.password import hash_password
-from app.web.deps import AdminUser, Db
+from app.auth.password import hash_password_async
+from app.auth.principal_cache import invalidate_principal
+from app.db.search import rank_order, search_from
+from app.db.sqlite import sqlite_writer
+from app.web.deps import AdminUser, ReadDb
 from app.web.schemas.users import UserCreate, UserResponse, UserUpdate
 
 router = APIRouter(prefix="/admin/users", tags=["admin-users"])
@@ -16,24 +19,27 @@ _ALLOWED_SORT = {"id", "email", "name", "role", "status", "created_at"}
 
 @router.get("")
 async def list_users(
-    db: Db,
+    db: ReadDb,
     _admin: AdminUser,
     page: int = 1,
     page_size: int = 20,
     role: str | None = None,
     status_filter: str | None = None,
-    sort_by: str = "id",
+    q: str | None = None,
+    sort_by: str | None = None,
     sort_order: str = "asc",
 ) -> dict:
-    """List users with optional filters. Returns paginated {items, total, page, page_size, total_pages}."""
+    """List users with optional filters; q searches email and name (word prefixes, best matches
+    first unless sort_by is given). Returns paginated {items, total, page, page_size, total_pages}."""
     page_size = min(max(1, page_size), 100)
     page = max(1, page)
     offset = (page - 1) * page_size
     col = sort_by if sort_by in _ALLOWED_SORT else "id"
     direction = "DESC" if sort_order.lower() == "desc" else "ASC"
+    source, params = search_from("users", q)
+    searching = bool(params)
 
-    base = "FROM users WHERE 1=1"
-    params: list = []
+    base = f"{source} WHERE 1=1"
     if role:
         base += " AND role = ?"
         params.append(role)
@@ -43,8 +49,9 @@ async def list_users(
 
     async with db.execute(f"SELECT COUNT(*) {base}", params) as cur:
         total = (await cur.fetchone())[0]
+    order = rank_order(total) if searching and sort_by is None else f"ORDER BY {col} {direction}"
 
-    query = f"SELECT id, email, name, role, status, created_at {base} ORDER BY {col} {direction} LIMIT ? OFFSET ?"
+    query = f"SELECT id, email, name, role, status, created_at {base} {order} LIMIT ? OFFSET ?"
     params.extend([page_size, offset])
     async with db.execute(query, params) as cur:
         rows = await cur.fetchall()
@@ -64,29 +71,30 @@ async def list_users(
 
 
 @router.post("", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def create_user(data: UserCreate, db: Db, _admin: AdminUser) -> dict:
-    """Create a new user."""
-    password_hash = hash_password(data.password)
-    try:
-        cursor = await db.execute(
-            """INSERT INTO users (email, password_hash, name, role, status)
-               VALUES (?, ?, ?, ?, 'active')""",
-            (data.email.lower(), password_hash, data.name or "", data.role),
-        )
-        await db.commit()
-        uid = cursor.lastrowid
-    except Exception as e:
-        if "UNIQUE" in str(e) or "unique" in str(e).lower():
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Email already registered",
-            ) from e
-        raise
-    async with db.execute(
-        "SELECT id, email, name, role, status, created_at FROM users WHERE id = ?",
-        (uid,),
-    ) as cur:
-        row = await cur.fetchone()
+async def create_user(data: UserCreate, _admin: AdminUser) -> dict:
+    """Create a new user. The password is hashed before the writer is taken."""
+    password_hash = await hash_password_async(data.password)
+    async with sqlite_writer() as db:
+        try:
+            cursor = await db.execute(
+                """INSERT INTO users (email, password_hash, name, role, status)
+                   VALUES (?, ?, ?, ?, 'active')""",
+                (data.email.lower(), password_hash, data.name or "", data.role),
+            )
+            await db.commit()
+            uid = cursor.lastrowid
+        except Exception as e:
+            if "UNIQUE" in str(e) or "unique" in str(e).lower():
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Email already registered",
+                ) from e
+            raise
+        async with db.execute(
+            "SELECT id, email, name, role, status, created_at FROM users WHERE id = ?",
+            (uid,),
+        ) as cur:
+            row = await cur.fetchone()
     return {
         "id": row[0],
         "email": row[1],
@@ -98,7 +106,7 @@ async def create_user(data: UserCreate, db: Db, _admin: AdminUser) -> dict:
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: Db, _admin: AdminUser) -> dict:
+async def get_user(user_id: int, db: ReadDb, _admin: AdminUser) -> dict:
     """Get user by ID."""
     async with db.execute(
         "SELECT id, email, name, role, status, created_at FROM users WHERE id = ?",
@@ -119,9 +127,9 @@ async def get_user(user_id: int, db: Db, _admin: AdminUser) -> dict:
 
 @router.patch("/{user_id}", response_model=UserResponse)
 async def update_user(
-    user_id: int, data: UserUpdate, db: Db, _admin: AdminUser
+    user_id: int, data: UserUpdate, db: ReadDb, _admin: AdminUser
 ) -> dict:
-    """Update user."""
+    """Update user. A new password is hashed before the writer is taken."""
     updates: list[str] = []
     params: list = []
     if data.name is not None:
@@ -135,14 +143,16 @@ async def update_user(
         params.append(data.status)
     if data.password is not None:
         updates.append("password_hash = ?")
-        params.append(hash_password(data.password))
+        params.append(await hash_password_async(data.password))
     if updates:
         params.append(user_id)
-        await db.execute(
-            f"UPDATE users SET {', '.join(updates)}, updated_at = datetime('now') WHERE id = ?",
-            params,
-        )
-        await db.commit()
+        async with sqlite_writer() as wdb:
+            await wdb.execute(
+                f"UPDATE users SET {', '.join(updates)}, updated_at = datetime('now') WHERE id = ?",
+                params,
+            )
+            await wdb.commit()
+        invalidate_principal(user_id)
     async with db.execute(
         "SELECT id, email, name, role, status, created_at FROM users WHERE id = ?",
         (user_id,),
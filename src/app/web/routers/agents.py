@@ -0,0 +1,198 @@
+"""Remote worker agent routes: heartbeats (capacity, worker health, assignments) and the session and
+mapping bundle an agent needs to run an assigned worker. See app.agent for the agent side.
+
+Every route but the admin ones needs AGENT_TOKEN plus the agent's own key (app.db.agents), which
+binds agent_id to the caller; the bundle routes are also refused over plain HTTP."""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import time
+from pathlib import Path
+from typing import Any
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+
+from app.config import settings
+from app.db import agents, message_index, worker_profiles
+from app.services.mapping_service import list_enabled_mappings, mappings_to_snapshot
+from app.utils.paths import resolve
+from app.web.deps import AdminUser, AgentDb, Db, ReadDb, require_agent, require_secure_transport
+from app.web.routers import workers
+
+router = APIRouter(prefix="/agents", tags=["agents"])
+
+
+class AgentWorker(BaseModel):
+    worker_id: str
+    account_id: int
+    generation: int
+    pid: int | None = None
+    stats: dict[str, Any] | None = None  # the worker's runtime heartbeat (app.db.worker_heartbeats)
+
+
+class ExitedWorker(AgentWorker):
+    exit_code: int | None = None
+    error: str | None = None
+
+
+class ProfileResult(BaseModel):
+    id: str = Field(pattern=worker_profiles.ID_PATTERN)
+    status: str = Field(pattern="^(done|failed)$")
+    samples: int | None = None
+    overhead_pct: float | None = None
+    error: str | None = None
+    collapsed: str | None = None  # collapsed stacks (app.utils.profiler) when done
+
+
+class IndexEntry(BaseModel):
+    id: int  # outbox row id on the node
+    user_id: int
+    source_chat_id: int
+    source_msg_id: int
+    dest_chat_id: int
+    dest_msg_id: int
+    created_at: str = Field(pattern=r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+
+
+class HeartbeatRequest(BaseModel):
+    agent_id: str = Field(min_length=1, max_length=128)
+    host_id: str = Field("", max_length=255)
+    capacity: int = Field(ge=0)
+    running: list[AgentWorker] = []
+    exited: list[ExitedWorker] = []
+    profiles: list[ProfileResult] = []  # finished profiles of its workers (app.db.worker_profiles)
+    message_index: list[IndexEntry] = Field([], max_length=message_index.RELAY_BATCH)
+
+
+AgentKey = Header(None, alias=agents.KEY_HEADER)
+
+
+async def _require_key(db, agent_id: str, key: str | None) -> None:
+    if await agents.verify_key(db, agent_id, key) is not True:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid agent key")
+
+
+async def _assignment_row(db, agent_id: str, worker_id: str) -> tuple:
+    async with db.execute(
+        "SELECT r.user_id, r.account_id, r.generation FROM worker_registry r "
+        "JOIN worker_leases l ON l.account_id = r.account_id AND l.generation = r.generation "
+        "WHERE r.worker_id = ? AND r.agent_id = ? AND l.expires_at > ?",
+        (worker_id, agent_id, time.time()),
+    ) as cur:
+        row = await cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
+    return row
+
+
+@router.post("/heartbeat", dependencies=[Depends(require_agent)])
+async def agent_heartbeat(body: HeartbeatRequest, db: AgentDb, agent_key: str | None = AgentKey) -> dict:
+    """Register the agent, renew the leases of its running workers and hand out its assignments
+    and the profile requests for its workers. The first heartbeat of an agent_id is issued its key."""
+    known = await agents.verify_key(db, body.agent_id, agent_key)
+    if known is False:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid agent key")
+    await agents.heartbeat(db, body.agent_id, body.host_id or body.agent_id, body.capacity)
+    issued = None
+    if known is None:
+        issued = await agents.issue_key(db, body.agent_id)
+        if issued is None:
+            await db.rollback()
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid agent key")
+    await db.commit()
+    # Before sync_agent_workers: a worker that finished a profile may have exited since.
+    await worker_profiles.store_relayed(db, body.agent_id, [p.model_dump() for p in body.profiles])
+    await message_index.save_relayed(
+        db, body.agent_id, [e.model_dump(exclude={"id"}) for e in body.message_index]
+    )
+    assignments, stop = await workers.sync_agent_workers(
+        db,
+        body.agent_id,
+        [w.model_dump() for w in body.running],
+        [w.model_dump() for w in body.exited],
+    )
+    await workers.replace_lost_agent_workers(db)
+    profiles = await worker_profiles.take_for_agent(db, {w.account_id for w in body.running})
+    await db.commit()
+    reply = {
+        "assignments": assignments,
+        "stop": stop,
+        "profiles": profiles,
+        "heartbeat_seconds": settings.worker_heartbeat_seconds,
+        "lease_ttl_seconds": settings.worker_lease_ttl_seconds,
+    }
+    if issued is not None:
+        reply["agent_key"] = issued
+    return reply
+
+
+@router.get("/assignments/{worker_id}", dependencies=[Depends(require_agent), Depends(require_secure_transport)])
+async def get_assignment_bundle(
+    worker_id: str, agent_id: str, db: AgentDb, agent_key: str | None = AgentKey
+) -> dict:
+    """Session file and mappings snapshot for a worker assigned to the agent."""
+    await _require_key(db, agent_id, agent_key)
+    user_id, account_id, generation = await _assignment_row(db, agent_id, worker_id)
+    async with db.execute("SELECT session_path FROM telegram_accounts WHERE id = ?", (account_id,)) as cur:
+        acc_row = await cur.fetchone()
+    session_path = resolve(acc_row[0]) if acc_row and acc_row[0] else None
+    if session_path is None or not session_path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session file not found")
+    session = await asyncio.to_thread(session_path.read_bytes)
+    mappings = list(await list_enabled_mappings(db, user_id, telegram_account_id=account_id))
+    return {
+        "worker_id": worker_id,
+        "user_id": user_id,
+        "account_id": account_id,
+        "generation": generation,
+        "session": base64.b64encode(session).decode("ascii"),
+        "mappings": mappings_to_snapshot(mappings),
+    }
+
+
+@router.get(
+    "/assignments/{worker_id}/media/{asset_id}",
+    dependencies=[Depends(require_agent), Depends(require_secure_transport)],
+)
+async def get_assignment_media(
+    worker_id: str, asset_id: int, agent_id: str, db: AgentDb, agent_key: str | None = AgentKey
+) -> FileResponse:
+    """A replacement media asset used by the assignment's transforms."""
+    await _require_key(db, agent_id, agent_key)
+    user_id, _, _ = await _assignment_row(db, agent_id, worker_id)
+    async with db.execute(
+        "SELECT file_path FROM media_assets WHERE id = ? AND user_id = ?", (asset_id, user_id)
+    ) as cur:
+        row = await cur.fetchone()
+    if not row or not Path(row[0]).is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media asset not found")
+    return FileResponse(row[0])
+
+
+@router.get("")
+async def list_agents(_: AdminUser, db: ReadDb) -> list[dict]:
+    """Registered agents with capacity, current load and liveness (admin only)."""
+    return [
+        {
+            "agent_id": a.agent_id,
+            "host_id": a.host_id,
+            "capacity": a.capacity,
+            "load": a.load,
+            "live": a.live(),
+            "last_seen": a.last_seen,
+        }
+        for a in await agents.list_agents(db)
+    ]
+
+
+@router.delete("/{agent_id}/key")
+async def reset_agent_key(agent_id: str, _: AdminUser, db: Db) -> dict:
+    """Forget the agent's key: its next heartbeat is issued a new one (admin only)."""
+    if not await agents.reset_key(db, agent_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Agent not found")
+    await db.commit()
+    return {"status": "ok"}
@@ -9,8 +9,10 @@ from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from app.auth import create_access_token, create_refresh_token, decode_token
-from app.auth.password import hash_password, verify_password
-from app.web.deps import CurrentUser, Db
+from app.auth.password import hash_password_async, verify_password_async
+from app.auth.principal_cache import invalidate_principal
+from app.db.sqlite import sqlite_writer
+from app.web.deps import CurrentUser, Db, ReadDb
 from app.web.schemas.auth import (
     ChangePasswordRequest,
     LoginRequest,
@@ -29,8 +31,9 @@ def _hash_token(token: str) -> str:
 
 
 @router.post("/login", response_model=LoginResponse)
-async def login(data: LoginRequest, db: Db) -> dict:
-    """Login with email and password, returns access and refresh tokens."""
+async def login(data: LoginRequest, db: ReadDb) -> dict:
+    """Login with email and password, returns access and refresh tokens. The password is verified
+    before the writer is taken to record the refresh token."""
     async with db.execute(
         "SELECT id, email, name, role, status, password_hash FROM users WHERE email = ?",
         (data.email.lower(),),
@@ -47,7 +50,7 @@ async def login(data: LoginRequest, db: Db) -> dict:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Account is not active",
         )
-    if not verify_password(data.password, password_hash):
+    if not await verify_password_async(data.password, password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
@@ -55,11 +58,12 @@ async def login(data: LoginRequest, db: Db) -> dict:
     access_token = create_access_token(sub=email, user_id=user_id, role=role)
     refresh_token = create_refresh_token(sub=email, user_id=user_id)
     expires_at = datetime.now(timezone.utc) + timedelta(days=7)
-    await db.execute(
-        "INSERT INTO refresh_tokens (user_id, token_hash, expires_at) VALUES (?, ?, ?)",
-        (user_id, _hash_token(refresh_token), expires_at.isoformat()),
-    )
-    await db.commit()
+    async with sqlite_writer() as wdb:
+        await wdb.execute(
+            "INSERT INTO refresh_tokens (user_id, token_hash, expires_at) VALUES (?, ?, ?)",
+            (user_id, _hash_token(refresh_token), expires_at.isoformat()),
+        )
+        await wdb.commit()
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
@@ -151,6 +155,7 @@ async def update_me(
             (user["id"],),
         )
     await db.commit()
+    invalidate_principal(user["id"])
     async with db.execute(
         "SELECT id, email, name, role, status, timezone FROM users WHERE id = ? AND status = 'active'",
         (user["id"],),
@@ -172,9 +177,10 @@ async def update_me(
 async def change_password(
     data: ChangePasswordRequest,
     user: CurrentUser,
-    db: Db,
+    db: ReadDb,
 ) -> dict:
-    """Change current user's password. Requires current password verification."""
+    """Change current user's password. Requires current password verification. Both hashes are
+    computed before the writer is taken."""
     async with db.execute(
         "SELECT password_hash FROM users WHERE id = ?",
         (user["id"],),
@@ -185,15 +191,17 @@ async def change_password(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password change not supported for this account",
         )
-    if not verify_password(data.current_password, row[0]):
+    if not await verify_password_async(data.current_password, row[0]):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect",
         )
-    new_hash = hash_password(data.new_password)
-    await db.execute(
-        "UPDATE users SET password_hash = ?, updated_at = datetime('now') WHERE id = ?",
-        (new_hash, user["id"]),
-    )
-    await db.commit()
+    new_hash = await hash_password_async(data.new_password)
+    async with sqlite_writer() as wdb:
+        await wdb.execute(
+            "UPDATE users SET password_hash = ?, updated_at = datetime('now') WHERE id = ?",
+            (new_hash, user["id"]),
+        )
+        await wdb.commit()
+    invalidate_principal(user["id"])
     return {"status": "ok"}
@@ -4,7 +4,7 @@ from __future__ import annotations
 
 from fastapi import APIRouter, HTTPException, status
 
-from app.web.deps import CurrentUser, Db
+from app.web.deps import CurrentUser, Db, ReadDb
 from app.web.mapping_access import get_mapping_scope
 from app.web.routers.workers import restart_workers_for_mapping
 from app.web.schemas.mappings import (
@@ -19,7 +19,7 @@ router = APIRouter(prefix="/mappings", tags=["filters"])
 @router.get("/{mapping_id}/filters", response_model=list[MappingFilterResponse])
 async def list_filters(
     mapping_id: int,
-    db: Db,
+    db: ReadDb,
     user: CurrentUser,
 ) -> list[dict]:
     """List filters for a mapping."""
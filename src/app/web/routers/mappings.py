@@ -2,13 +2,21 @@
 
 from __future__ import annotations
 
+import json
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 
+from app.db.pagination import after_condition, next_cursor, order_by, parse_key_cursor, sort_columns
+from app.db.row_counts import cached_count
+from app.db.search import rank_order, search_from
+from app.services import mapping_bulk
 from app.services.mapping_service import WEEKDAY_COLS
-from app.web.deps import CurrentUser, Db
-from app.web.routers.workers import restart_workers_for_mapping
+from app.web.deps import CurrentUser, Db, ReadDb
+from app.web.routers.transforms import normalize_transform
+from app.web.routers.workers import restart_workers_for_accounts, restart_workers_for_mapping
 
 
 def _schedule_summary(row: tuple | None) -> str:
@@ -29,6 +37,7 @@ from app.web.schemas.mappings import (
     ChannelMappingCreate,
     ChannelMappingUpdate,
     ChannelMappingResponse,
+    MappingBulkImport,
 )
 from app.web.schemas.schedules import ScheduleResponse, ScheduleUpdate
 
@@ -36,46 +45,69 @@ router = APIRouter(prefix="/mappings", tags=["mappings"])
 
 
 _ALLOWED_SORT = {"id", "name", "source_chat_id", "dest_chat_id", "enabled", "created_at", "user_id"}
+_LIST_COLUMNS = [
+    "id", "user_id", "source_chat_id", "dest_chat_id", "name", "source_chat_title", "dest_chat_title",
+    "enabled", "telegram_account_id", "created_at",
+]
 
 
 @router.get("")
 async def list_mappings(
-    db: Db,
+    db: ReadDb,
     user: CurrentUser,
     user_id: int | None = None,
+    q: str | None = None,
     page: int = 1,
     page_size: int = 20,
-    sort_by: str = "id",
+    sort_by: str | None = None,
     sort_order: str = "asc",
+    after: str | None = None,
 ) -> dict:
-    """List channel mappings. Users see own; admins can filter by user_id. Returns paginated {items, total, page, page_size, total_pages}."""
+    """List channel mappings. Users see own; admins can filter by user_id. q searches name, chat
+    titles and chat ids (word prefixes, best matches first unless sort_by is given). Returns
+    paginated {items, total, page, page_size, total_pages, next_cursor}; pass next_cursor as
+    `after` to continue by index seek instead of OFFSET (not available for relevance order)."""
     page_size = min(max(1, page_size), 100)
     page = max(1, page)
-    offset = (page - 1) * page_size
     col = sort_by if sort_by in _ALLOWED_SORT else "id"
-    direction = "DESC" if sort_order.lower() == "desc" else "ASC"
-    order = f"ORDER BY {col} {direction}"
-
-    if user["role"] == "admin" and user_id is not None:
-        base = "FROM channel_mappings WHERE user_id = ?"
-        params: list = [user_id]
-    elif user["role"] == "admin":
-        base = "FROM channel_mappings"
-        params = []
+    descending = sort_order.lower() == "desc"
+    keys = sort_columns(col)
+    try:
+        after_key = parse_key_cursor(after, len(keys)) if after else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+    source, params = search_from("channel_mappings", q)
+    searching = bool(params)
+    scope_id = user_id if user["role"] == "admin" else user["id"]
+    conditions = []
+    if scope_id is not None:
+        conditions.append("user_id = ?")
+        params.append(scope_id)
+
+    if searching:
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        async with db.execute(f"SELECT COUNT(*) {source}{where}", params) as cur:
+            total = (await cur.fetchone())[0]
     else:
-        base = "FROM channel_mappings WHERE user_id = ?"
-        params = [user["id"]]
-
-    async with db.execute(f"SELECT COUNT(*) {base}", params) as cur:
-        total = (await cur.fetchone())[0]
-
-    cols = "id, user_id, source_chat_id, dest_chat_id, name, source_chat_title, dest_chat_title, enabled, telegram_account_id, created_at"
-    params.extend([page_size, offset])
+        total = await cached_count(db, "channel_mappings", scope_id)
+    ranked = searching and sort_by is None and after_key is None
+    order = rank_order(total) if ranked else order_by(keys, descending)
+    offset = (page - 1) * page_size
+    if after_key is not None:
+        cond, cond_params = after_condition(keys, after_key, descending)
+        conditions.append(cond)
+        params.extend(cond_params)
+        offset = 0
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    params.extend([page_size + 1, offset])
     async with db.execute(
-        f"SELECT {cols} {base} {order} LIMIT ? OFFSET ?",
+        f"SELECT {', '.join(_LIST_COLUMNS)} {source}{where} {order} LIMIT ? OFFSET ?",
         params,
     ) as cur:
         rows = await cur.fetchall()
+    cursor = None if ranked else next_cursor(rows, page_size, [_LIST_COLUMNS.index(k) for k in keys])
+    rows = rows[:page_size]
 
     mapping_ids = [r[0] for r in rows]
     schedule_by_mapping: dict[int, tuple | None] = {}
@@ -119,53 +151,158 @@ async def list_mappings(
         "page": page,
         "page_size": page_size,
         "total_pages": total_pages,
+        "next_cursor": cursor,
     }
 
 
 @router.post("/schedule/bulk-apply")
 async def bulk_apply_schedule(db: Db, user: CurrentUser) -> dict:
     """Apply current user's default schedule to all of their mappings."""
-    from app.services.mapping_service import WEEKDAY_COLS
+    result = await mapping_bulk.apply_user_schedule(db, user["id"])
+    if result.account_ids:
+        restart_workers_for_accounts(result.account_ids)
+    return {"status": "ok", "updated": result.affected}
 
-    cols = ", ".join(WEEKDAY_COLS)
-    async with db.execute(
-        f"SELECT {cols} FROM user_schedules WHERE user_id = ?",
-        (user["id"],),
-    ) as cur:
-        user_row = await cur.fetchone()
-    if not user_row or all(x is None for x in user_row):
-        return {"status": "ok", "updated": 0}
-    async with db.execute(
-        "SELECT id FROM channel_mappings WHERE user_id = ?",
-        (user["id"],),
-    ) as cur:
-        mapping_ids = [r[0] for r in await cur.fetchall()]
-    placeholders = ", ".join("?" for _ in WEEKDAY_COLS)
-    for mid in mapping_ids:
-        await db.execute(
-            f"""INSERT INTO mapping_schedules (mapping_id, {cols})
-                VALUES (?, {placeholders})
-                ON CONFLICT(mapping_id) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in WEEKDAY_COLS)}""",
-            (mid, *user_row),
+
+@router.get("/export", response_model=None)
+async def export_mappings(
+    db: ReadDb,
+    user: CurrentUser,
+    user_id: int | None = None,
+    format: str = "json",
+) -> dict | Response:
+    """Export mappings with nested filters, transforms and schedule overrides as JSON or CSV, in the
+    layout POST /mappings/bulk accepts. Users export their own; admins everything or by user_id."""
+    if format not in mapping_bulk.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of: {', '.join(mapping_bulk.EXPORT_FORMATS)}",
         )
-    await db.commit()
+    owner = user_id if user["role"] == "admin" else user["id"]
+    items = await mapping_bulk.export_mappings(db, owner)
+    if format == "csv":
+        return Response(
+            mapping_bulk.mappings_to_csv(items),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="mappings.csv"'},
+        )
+    return {"mappings": items}
+
+
+async def _read_bulk_payload(request: Request) -> dict:
+    body = await request.body()
+    if "csv" in request.headers.get("content-type", ""):
+        try:
+            return {"mappings": mapping_bulk.mappings_from_csv(body.decode("utf-8-sig"))}
+        except (UnicodeDecodeError, ValueError) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid CSV: {e}") from e
     try:
-        # Deduplicate: restart once per unique (user_id, telegram_account_id) to avoid
-        # rapid stop/spawn cycles when many mappings share the same account.
-        seen: set[tuple[int, int | None]] = set()
-        for mid in mapping_ids:
-            async with db.execute(
-                "SELECT user_id, telegram_account_id FROM channel_mappings WHERE id = ?",
-                (mid,),
-            ) as cur:
-                row = (await cur.fetchone()) or (user["id"], None)
-            pair = (row[0], row[1])
-            if pair not in seen:
-                seen.add(pair)
-                await restart_workers_for_mapping(db, row[0], row[1])
-    except Exception:
-        pass
-    return {"status": "ok", "updated": len(mapping_ids)}
+        payload = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be JSON or text/csv"
+        ) from e
+    return {"mappings": payload} if isinstance(payload, list) else payload
+
+
+async def _validate_bulk_import(db: Db, owner_id: int, data: MappingBulkImport) -> list[mapping_bulk.MappingImportRow]:
+    """Check every mapping before anything is written; collects all errors into one 400."""
+    errors: list[dict] = []
+    account_ids = {m.telegram_account_id for m in data.mappings if m.telegram_account_id is not None}
+    asset_ids = {
+        t.replacement_media_asset_id
+        for m in data.mappings
+        for t in m.transforms
+        if t.replacement_media_asset_id is not None
+    }
+    owned_accounts: set[int] = set()
+    owned_assets: set[int] = set()
+    if account_ids:
+        async with db.execute(
+            "SELECT id FROM telegram_accounts WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+            (owner_id, json.dumps(sorted(account_ids))),
+        ) as cur:
+            owned_accounts = {r[0] for r in await cur.fetchall()}
+    if asset_ids:
+        async with db.execute(
+            "SELECT id FROM media_assets WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+            (owner_id, json.dumps(sorted(asset_ids))),
+        ) as cur:
+            owned_assets = {r[0] for r in await cur.fetchall()}
+
+    rows: list[mapping_bulk.MappingImportRow] = []
+    for i, m in enumerate(data.mappings):
+        if m.telegram_account_id is not None and m.telegram_account_id not in owned_accounts:
+            errors.append({"loc": ["mappings", i, "telegram_account_id"], "msg": "Telegram account not found"})
+        transforms = []
+        for j, t in enumerate(m.transforms):
+            try:
+                values = normalize_transform(t)
+            except HTTPException as e:
+                errors.append({"loc": ["mappings", i, "transforms", j], "msg": e.detail})
+                continue
+            asset_id = values.replacement_media_asset_id
+            if asset_id is not None and asset_id not in owned_assets:
+                errors.append({
+                    "loc": ["mappings", i, "transforms", j, "replacement_media_asset_id"],
+                    "msg": "replacement media asset must belong to mapping owner",
+                })
+            transforms.append(values)
+        schedule = None
+        if m.schedule is not None:
+            values = tuple(getattr(m.schedule, c) for c in WEEKDAY_COLS)
+            schedule = values if any(x is not None for x in values) else None
+        rows.append(mapping_bulk.MappingImportRow(
+            mapping=(
+                m.source_chat_id,
+                m.dest_chat_id,
+                m.name or "",
+                m.telegram_account_id,
+                m.source_chat_title or "",
+                m.dest_chat_title or "",
+                1 if m.enabled else 0,
+            ),
+            filters=[tuple(getattr(f, c) for c in mapping_bulk.FILTER_FIELDS) for f in m.filters],
+            transforms=transforms,
+            schedule=schedule,
+        ))
+    if errors:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=errors[:100])
+    return rows
+
+
+@router.post("/bulk", status_code=status.HTTP_201_CREATED)
+async def bulk_import_mappings(
+    request: Request,
+    db: Db,
+    user: CurrentUser,
+    user_id: int | None = None,
+) -> dict:
+    """Create many mappings with nested filters, transforms and schedules from JSON
+    ({"mappings": [...]}) or CSV in the export layout. Everything is validated first, then written
+    in one transaction; each affected account's worker restarts once. Admins may import for user_id."""
+    owner_id = int(user["id"])
+    if user["role"] == "admin" and user_id is not None:
+        async with db.execute("SELECT 1 FROM users WHERE id = ?", (user_id,)) as cur:
+            if not await cur.fetchone():
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        owner_id = user_id
+    try:
+        data = MappingBulkImport.model_validate(await _read_bulk_payload(request))
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False)) from e
+    if not data.mappings:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No mappings to import")
+    if len(data.mappings) > mapping_bulk.MAX_IMPORT_MAPPINGS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {mapping_bulk.MAX_IMPORT_MAPPINGS} mappings per import",
+        )
+    rows = await _validate_bulk_import(db, owner_id, data)
+    result = await mapping_bulk.import_mappings(db, owner_id, rows)
+    if result.account_ids:
+        restart_workers_for_accounts(result.account_ids)
+    return {"status": "ok", "created": result.affected, "ids": result.mapping_ids}
 
 
 @router.post("", response_model=ChannelMappingResponse, status_code=status.HTTP_201_CREATED)
@@ -224,7 +361,7 @@ async def create_mapping(
 @router.get("/{mapping_id}", response_model=ChannelMappingResponse)
 async def get_mapping(
     mapping_id: int,
-    db: Db,
+    db: ReadDb,
     user: CurrentUser,
 ) -> dict:
     """Get channel mapping by ID."""
@@ -330,7 +467,7 @@ async def update_mapping(
 @router.get("/{mapping_id}/schedule", response_model=ScheduleResponse)
 async def get_mapping_schedule(
     mapping_id: int,
-    db: Db,
+    db: ReadDb,
     user: CurrentUser,
 ) -> dict:
     """Get mapping schedule override. Returns null-like (all None) if using user default."""
@@ -10,7 +10,7 @@ from pathlib import Path
 from fastapi import APIRouter, File, Form, HTTPException, UploadFile, status
 
 from app.config import settings
-from app.web.deps import CurrentUser, Db
+from app.web.deps import CurrentUser, Db, ReadDb
 from app.web.schemas.media_assets import MediaAssetResponse
 
 router = APIRouter(prefix="/media-assets", tags=["media-assets"])
@@ -68,7 +68,7 @@ def _asset_row_to_dict(row: tuple) -> dict:
 
 
 @router.get("", response_model=list[MediaAssetResponse])
-async def list_media_assets(db: Db, user: CurrentUser, user_id: int | None = None) -> list[dict]:
+async def list_media_assets(db: ReadDb, user: CurrentUser, user_id: int | None = None) -> list[dict]:
     """List uploaded media assets. Users see own assets; admins can optionally filter by user_id."""
     if user["role"] == "admin":
         if user_id is None:
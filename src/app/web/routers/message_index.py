@@ -2,25 +2,62 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
 
-from app.web.deps import CurrentUser, Db
+from app.db.message_index import (
+    KEY_COLUMNS,
+    TooManyPartitionsError,
+    count_rows,
+    default_retention_days,
+    index_reader,
+    read_source,
+    require_readable_partitions,
+    select_page,
+)
+from app.db.pagination import next_cursor, parse_key_cursor
+from app.services.exports import (
+    DEFAULT_BATCH_SIZE,
+    EXPORT_FORMATS,
+    MESSAGE_INDEX_FIELDS,
+    clamp_batch_size,
+    encode_export,
+    export_filename,
+    export_media_type,
+    iter_message_index_batches,
+    prime_stream,
+    with_sqlite,
+)
+from app.services.app_settings import MAX_RETENTION_DAYS
+from app.web.deps import AdminUser, CurrentUser, Db, ReadDb
 
 router = APIRouter(prefix="/message-index", tags=["message-index"])
 
 
+def _require_readable_partitions() -> None:
+    try:
+        require_readable_partitions()
+    except TooManyPartitionsError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e)) from e
+
+
 @router.get("")
 async def list_message_index(
-    db: Db,
     user: CurrentUser,
     user_id: int | None = None,
     source_chat_id: int | None = None,
     dest_chat_id: int | None = None,
     page: int = 1,
     page_size: int = 50,
+    after: str | None = None,
 ) -> dict:
-    """List dest_message_index entries. Users see own; admins can filter by user_id."""
-    offset = (page - 1) * page_size
+    """List dest_message_index entries in primary-key order (user, source chat, source message,
+    dest chat). Users see own; admins can filter by user_id. Pass the returned next_cursor as
+    `after` to fetch the following page by index seek instead of OFFSET (page is then ignored)."""
+    page_size = max(1, page_size)
+    page = max(1, page)
     current_user_id = int(user["id"])
     if user["role"] == "admin" and user_id is not None:
         actual_user = int(user_id)
@@ -28,35 +65,30 @@ async def list_message_index(
         actual_user = current_user_id
     else:
         actual_user = None
-    query = """SELECT user_id, source_chat_id, source_msg_id, dest_chat_id, dest_msg_id
-               FROM dest_message_index WHERE 1=1"""
-    params: list = []
-    if actual_user is not None:
-        query += " AND user_id = ?"
-        params.append(actual_user)
-    if source_chat_id is not None:
-        query += " AND source_chat_id = ?"
-        params.append(source_chat_id)
-    if dest_chat_id is not None:
-        query += " AND dest_chat_id = ?"
-        params.append(dest_chat_id)
-    query += " ORDER BY source_chat_id, source_msg_id LIMIT ? OFFSET ?"
-    params.extend([page_size, offset])
-    async with db.execute(query, params) as cur:
-        rows = await cur.fetchall()
-    count_query = "SELECT COUNT(*) FROM dest_message_index WHERE 1=1"
-    count_params = []
+    try:
+        after_key = parse_key_cursor(after, len(KEY_COLUMNS)) if after else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+    filters: dict[str, int] = {}
     if actual_user is not None:
-        count_query += " AND user_id = ?"
-        count_params.append(actual_user)
+        filters["user_id"] = actual_user
     if source_chat_id is not None:
-        count_query += " AND source_chat_id = ?"
-        count_params.append(source_chat_id)
+        filters["source_chat_id"] = source_chat_id
     if dest_chat_id is not None:
-        count_query += " AND dest_chat_id = ?"
-        count_params.append(dest_chat_id)
-    async with db.execute(count_query, count_params) as cur:
-        total = (await cur.fetchone())[0]
+        filters["dest_chat_id"] = dest_chat_id
+    offset = 0 if after_key is not None else (page - 1) * page_size
+    _require_readable_partitions()
+    async with index_reader() as db:
+        rows = await select_page(db, filters, page_size + 1, after_key, offset)
+        if source_chat_id is None and dest_chat_id is None:
+            total = await count_rows(db, actual_user)
+        else:
+            source = await read_source(db)
+            where = " AND ".join(f"{col} = ?" for col in filters)
+            async with db.execute(f"SELECT COUNT(*) FROM {source} WHERE {where}", list(filters.values())) as cur:
+                total = (await cur.fetchone())[0]
+    cursor = next_cursor(rows, page_size, range(len(KEY_COLUMNS)))
+    rows = rows[:page_size]
     # Non-admin: server-side post-filter to never return other users' data
     if user["role"] != "admin":
         rows = [r for r in rows if r[0] is not None and int(r[0]) == current_user_id]
@@ -69,6 +101,7 @@ async def list_message_index(
                 "source_msg_id": r[2],
                 "dest_chat_id": r[3],
                 "dest_msg_id": r[4],
+                "created_at": r[5],
             }
             for r in rows
         ],
@@ -76,4 +109,95 @@ async def list_message_index(
         "page": page,
         "page_size": page_size,
         "total_pages": total_pages,
+        "next_cursor": cursor,
     }
+
+
+@router.get("/export")
+async def export_message_index(
+    user: CurrentUser,
+    user_id: int | None = None,
+    source_chat_id: int | None = None,
+    dest_chat_id: int | None = None,
+    format: str = "ndjson",
+    gzip: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> StreamingResponse:
+    """Stream dest_message_index entries as NDJSON or CSV (optionally gzipped) in primary-key order.
+    Users export their own entries; admins can filter by user_id."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}",
+        )
+    batch_size = clamp_batch_size(batch_size)
+    if user["role"] != "admin":
+        actual_user = int(user["id"])
+    else:
+        actual_user = int(user_id) if user_id is not None else None
+    _require_readable_partitions()
+    batches = await prime_stream(
+        with_sqlite(
+            lambda db: iter_message_index_batches(
+                db,
+                batch_size,
+                user_id=actual_user,
+                source_chat_id=source_chat_id,
+                dest_chat_id=dest_chat_id,
+            )
+        )
+    )
+    filename = export_filename("message_index", format, gzip)
+    return StreamingResponse(
+        encode_export(batches, format, MESSAGE_INDEX_FIELDS, gzip=gzip),
+        media_type=export_media_type(format, gzip),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        background=BackgroundTask(batches.aclose),
+    )
+
+
+class RetentionUpdate(BaseModel):
+    retention_days: int | None = Field(None, ge=0, le=MAX_RETENTION_DAYS)  # None = inherit, 0 = keep forever
+
+
+@router.get("/retention")
+async def get_retention(db: ReadDb, _admin: AdminUser) -> dict:
+    """Global message index retention and the per-user / per-mapping overrides."""
+    async with db.execute(
+        "SELECT id, message_index_retention_days FROM users WHERE message_index_retention_days IS NOT NULL"
+    ) as cur:
+        users = [{"user_id": r[0], "retention_days": r[1]} for r in await cur.fetchall()]
+    async with db.execute(
+        """SELECT id, user_id, message_index_retention_days FROM channel_mappings
+           WHERE message_index_retention_days IS NOT NULL"""
+    ) as cur:
+        mappings = [
+            {"mapping_id": r[0], "user_id": r[1], "retention_days": r[2]} for r in await cur.fetchall()
+        ]
+    return {"default_retention_days": default_retention_days(), "users": users, "mappings": mappings}
+
+
+@router.put("/retention/users/{user_id}")
+async def set_user_retention(user_id: int, data: RetentionUpdate, db: Db, _admin: AdminUser) -> dict:
+    """Override message index retention for a user (mapping overrides still win)."""
+    cursor = await db.execute(
+        "UPDATE users SET message_index_retention_days = ? WHERE id = ?",
+        (data.retention_days, user_id),
+    )
+    await db.commit()
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return {"user_id": user_id, "retention_days": data.retention_days}
+
+
+@router.put("/retention/mappings/{mapping_id}")
+async def set_mapping_retention(mapping_id: int, data: RetentionUpdate, db: Db, _admin: AdminUser) -> dict:
+    """Override message index retention for one mapping."""
+    cursor = await db.execute(
+        "UPDATE channel_mappings SET message_index_retention_days = ? WHERE id = ?",
+        (data.retention_days, mapping_id),
+    )
+    await db.commit()
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mapping not found")
+    return {"mapping_id": mapping_id, "retention_days": data.retention_days}
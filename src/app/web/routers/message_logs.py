@@ -3,13 +3,38 @@
 from __future__ import annotations
 
 import logging
-from datetime import datetime
 
 from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
 from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+from starlette.background import BackgroundTask
 
 from app.db.mongo import get_mongo_db
-from app.web.deps import CurrentUser, Db
+from app.services.exports import (
+    DEFAULT_BATCH_SIZE,
+    EXPORT_FORMATS,
+    MESSAGE_LOG_FIELDS,
+    clamp_batch_size,
+    encode_export,
+    export_filename,
+    export_media_type,
+    iter_message_log_batches,
+    prime_stream,
+    with_sqlite,
+)
+from app.services.log_queries import (
+    COUNT_MODES,
+    count_logs,
+    fetch_cursor_page,
+    fill_missing_chat_titles,
+    message_log_item,
+    message_logs_match,
+    page_pipeline,
+    parse_cursor,
+    scoped_user_id,
+)
+from app.services.log_tail import get_log_tail_hub, sse_events
+from app.web.deps import CurrentUser, ReadDb, StreamUser
 
 router = APIRouter(prefix="/message-logs", tags=["message-logs"])
 logger = logging.getLogger(__name__)
@@ -31,7 +56,7 @@ def _mongo_error_message(e: Exception) -> str:
 @router.get("")
 async def list_message_logs(
     user: CurrentUser,
-    db: Db,
+    db: ReadDb,
     user_id: int | None = None,
     source_chat_id: int | None = None,
     dest_chat_id: int | None = None,
@@ -39,91 +64,63 @@ async def list_message_logs(
     date_to: str | None = None,
     page: int = 1,
     page_size: int = 50,
+    pagination: str = "page",
+    cursor: str | None = None,
+    count: str | None = None,
 ) -> dict:
-    """List message logs from MongoDB. Users see own; admins can filter."""
+    """List message logs from MongoDB. Users see own; admins can filter.
+
+    pagination=cursor (or passing a cursor token) uses keyset pagination on (timestamp, _id) and
+    returns {items, page_size, next_cursor, prev_cursor, total, total_exact}; page/page_size offset
+    pagination stays the default. count: exact (page default) | capped (cursor default) | estimated | none.
+    """
+    use_cursor = cursor is not None or pagination == "cursor"
+    count_mode = count or ("capped" if use_cursor else "exact")
+    if count_mode not in COUNT_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"count must be one of: {', '.join(COUNT_MODES)}",
+        )
+    try:
+        parsed_cursor = parse_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+    page = max(1, page)
+    page_size = max(1, page_size)
     try:
         mongo_db = get_mongo_db()
-        match: dict = {}
         current_user_id = int(user["id"])
-        # Non-admin: always restrict to own data
-        if user["role"] != "admin":
-            match["user_id"] = current_user_id
-        # Admin: restrict only when user_id query param is provided
-        elif user_id is not None:
-            match["user_id"] = int(user_id)
-        if source_chat_id is not None:
-            match["source_chat_id"] = source_chat_id
-        if dest_chat_id is not None:
-            match["dest_chat_id"] = dest_chat_id
-        if date_from or date_to:
-            match["timestamp"] = {}
-            if date_from:
-                match["timestamp"]["$gte"] = datetime.fromisoformat(date_from.replace("Z", "+00:00"))
-            if date_to:
-                match["timestamp"]["$lte"] = datetime.fromisoformat(date_to.replace("Z", "+00:00"))
-        pipeline = [{"$match": match}]
-        count_cursor = mongo_db.message_logs.aggregate(
-            pipeline + [{"$count": "total"}]
+        match = message_logs_match(
+            user_id=scoped_user_id(user, user_id),
+            source_chat_id=source_chat_id,
+            dest_chat_id=dest_chat_id,
+            date_from=date_from,
+            date_to=date_to,
         )
-        total = 0
-        async for doc in count_cursor:
-            total = doc["total"]
-            break
-        pipeline.extend([
-            {"$sort": {"timestamp": -1}},
-            {"$skip": (page - 1) * page_size},
-            {"$limit": page_size},
-        ])
-        cursor = mongo_db.message_logs.aggregate(pipeline)
-        items = []
-        need_fallback: set[tuple[int, int, int]] = set()
-        async for doc in cursor:
-            ts = doc.get("timestamp")
-            uid = doc.get("user_id")
-            src_id = doc.get("source_chat_id")
-            dest_id = doc.get("dest_chat_id")
-            src_title = doc.get("source_chat_title") or None
-            dest_title = doc.get("dest_chat_title") or None
-            if (src_title is None or src_title == "" or dest_title is None or dest_title == "") and uid is not None and src_id is not None and dest_id is not None:
-                need_fallback.add((uid, src_id, dest_id))
-            items.append({
-                "user_id": uid,
-                "source_chat_id": src_id,
-                "source_msg_id": doc.get("source_msg_id"),
-                "dest_chat_id": dest_id,
-                "dest_msg_id": doc.get("dest_msg_id"),
-                "source_chat_title": src_title or None,
-                "dest_chat_title": dest_title or None,
-                "timestamp": ts.isoformat() if hasattr(ts, "isoformat") else str(ts),
-                "status": doc.get("status"),
-            })
-        if need_fallback:
-            title_map: dict[tuple[int, int, int], tuple[str | None, str | None]] = {}
-            keys_list = list(need_fallback)
-            placeholders = ",".join(["(?,?,?)"] * len(keys_list))
-            params = [x for t in keys_list for x in t]
-            async with db.execute(
-                f"SELECT user_id, source_chat_id, dest_chat_id, source_chat_title, dest_chat_title "
-                f"FROM channel_mappings WHERE (user_id, source_chat_id, dest_chat_id) IN "
-                f"(VALUES {placeholders})",
-                params,
-            ) as cur:
-                async for row in cur:
-                    uid, src_id, dest_id = row[0], row[1], row[2]
-                    st, dt = row[3] or None, row[4] or None
-                    title_map[(int(uid), int(src_id), int(dest_id))] = (st, dt)
-            for it in items:
-                key = (it["user_id"], it["source_chat_id"], it["dest_chat_id"])
-                if key in title_map and (not it.get("source_chat_title") or not it.get("dest_chat_title")):
-                    st, dt = title_map[key]
-                    if not it.get("source_chat_title"):
-                        it["source_chat_title"] = st
-                    if not it.get("dest_chat_title"):
-                        it["dest_chat_title"] = dt
+        total, total_exact = await count_logs(mongo_db.message_logs, match, count_mode)
+        next_cursor = prev_cursor = None
+        if use_cursor:
+            docs, next_cursor, prev_cursor = await fetch_cursor_page(
+                mongo_db.message_logs, match, parsed_cursor, page_size
+            )
+        else:
+            docs = [
+                doc async for doc in mongo_db.message_logs.aggregate(page_pipeline(match, page, page_size))
+            ]
+        items = [message_log_item(doc) for doc in docs]
+        await fill_missing_chat_titles(db, items)
         # Non-admin: server-side post-filter to never return other users' data
         if user["role"] != "admin":
             items = [it for it in items if it.get("user_id") is not None and int(it["user_id"]) == current_user_id]
-            total = await mongo_db.message_logs.count_documents(match)
+        if use_cursor:
+            return {
+                "items": items,
+                "page_size": page_size,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor,
+                "total": total,
+                "total_exact": total_exact,
+            }
         total_pages = max(1, (total + page_size - 1) // page_size) if total else 1
         return {
             "items": items,
@@ -141,3 +138,75 @@ async def list_message_logs(
     except Exception as e:
         logger.exception("Unexpected message_logs error: %s", e)
         raise
+
+
+@router.get("/export")
+async def export_message_logs(
+    user: CurrentUser,
+    user_id: int | None = None,
+    source_chat_id: int | None = None,
+    dest_chat_id: int | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    format: str = "ndjson",
+    gzip: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> StreamingResponse:
+    """Stream message logs as NDJSON or CSV (optionally gzipped), newest first.
+    Same scoping and filters as the list endpoint; memory is bounded by batch_size."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}",
+        )
+    batch_size = clamp_batch_size(batch_size)
+    owner_id = int(user["id"]) if user["role"] != "admin" else None
+    try:
+        coll = get_mongo_db().message_logs
+        match = message_logs_match(
+            user_id=scoped_user_id(user, user_id),
+            source_chat_id=source_chat_id,
+            dest_chat_id=dest_chat_id,
+            date_from=date_from,
+            date_to=date_to,
+        )
+        batches = await prime_stream(
+            with_sqlite(
+                lambda db: iter_message_log_batches(coll, match, batch_size, db=db, owner_id=owner_id)
+            )
+        )
+    except (OperationFailure, ServerSelectionTimeoutError) as e:
+        logger.warning("Mongo message_logs export failed: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=_mongo_error_message(e),
+        ) from e
+    filename = export_filename("message_logs", format, gzip)
+    return StreamingResponse(
+        encode_export(batches, format, MESSAGE_LOG_FIELDS, gzip=gzip),
+        media_type=export_media_type(format, gzip),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        background=BackgroundTask(batches.aclose),
+    )
+
+
+@router.get("/stream")
+async def stream_message_logs(
+    user: StreamUser,
+    user_id: int | None = None,
+    source_chat_id: int | None = None,
+    dest_chat_id: int | None = None,
+) -> StreamingResponse:
+    """Live tail of new message logs as Server-Sent Events (event: message_log).
+    Users see own; admins can filter. Accepts ?access_token= for EventSource clients."""
+    match = message_logs_match(
+        user_id=scoped_user_id(user, user_id),
+        source_chat_id=source_chat_id,
+        dest_chat_id=dest_chat_id,
+    )
+    hub = get_log_tail_hub("message_logs")
+    return StreamingResponse(
+        sse_events(hub, match, "message_log"),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,54 @@
+"""Prometheus scrape endpoint: the API's own metrics plus every live worker's.
+
+Workers are never called here: each publishes its metrics snapshot with its runtime heartbeat
+(app.db.worker_heartbeats), so a scrape is two SQLite reads and costs the workers nothing.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.db import leases, worker_heartbeats
+from app.utils.metrics import REGISTRY, render
+from app.web.deps import ReadDb, require_metrics_scraper
+
+router = APIRouter(tags=["metrics"])
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _heartbeat_samples(hb: dict[str, Any], now: float) -> dict[str, list]:
+    """The heartbeat columns as a registry snapshot."""
+    counters = [
+        ["tgcopier_worker_messages_total", {"mapping_id": mapping_id, "outcome": outcome}, value]
+        for mapping_id, outcomes in hb["mappings"].items()
+        for outcome, value in outcomes.items()
+    ]
+    if hb["cpu_seconds"] is not None:
+        counters.append(["tgcopier_worker_cpu_seconds_total", {}, hb["cpu_seconds"]])
+    gauges = [["tgcopier_worker_heartbeat_age_seconds", {}, round(now - hb["updated_at"], 3)]]
+    for queue in ("inflight", "log_queue"):
+        if hb[queue] is not None:
+            gauges.append(["tgcopier_worker_queue_depth", {"queue": queue}, hb[queue]])
+    if hb["loop_lag_ms"] is not None:
+        gauges.append(["tgcopier_worker_loop_lag_seconds", {}, hb["loop_lag_ms"] / 1000])
+    if hb["rss_bytes"] is not None:
+        gauges.append(["tgcopier_worker_rss_bytes", {}, hb["rss_bytes"]])
+    return {"counters": counters, "gauges": gauges}
+
+
+@router.get("/metrics", dependencies=[Depends(require_metrics_scraper)])
+async def metrics(db: ReadDb) -> PlainTextResponse:
+    """Prometheus text format. Worker series carry account_id; only workers with a live lease."""
+    now = time.time()
+    heartbeats = await worker_heartbeats.get_heartbeats(db, await leases.live_leases(db))
+    sources: list[tuple[dict, dict]] = [({}, REGISTRY.snapshot())]
+    for account_id, hb in sorted(heartbeats.items()):
+        labels = {"account_id": account_id}
+        sources.append((labels, hb["metrics"]))
+        sources.append((labels, _heartbeat_samples(hb, now)))
+    return PlainTextResponse(render(sources), media_type=CONTENT_TYPE)
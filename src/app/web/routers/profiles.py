@@ -0,0 +1,78 @@
+"""On-demand sampling profiles of a running worker or of the API itself (admin only).
+
+POST /api/workers/{worker_id}/profile?seconds=30 queues a profile (worker_id "api" profiles this
+API process). The output is collapsed stacks under PROFILES_DIR, one "stack count" line each,
+ready for flamegraph.pl or speedscope. See app.db.worker_profiles for how workers, including
+those on remote agents, pick requests up.
+"""
+
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import FileResponse
+
+from app.config import settings
+from app.db import leases, worker_profiles
+from app.services.profiling import start_api_profile
+from app.web.deps import AdminUser, Db, ReadDb
+
+router = APIRouter(prefix="/workers", tags=["workers"])
+
+API_TARGET = "api"
+
+
+@router.post("/{worker_id}/profile", status_code=status.HTTP_202_ACCEPTED)
+async def start_profile(worker_id: str, user: AdminUser, db: Db, seconds: float = 30) -> dict:
+    """Profile a worker (or the API, worker_id "api") for `seconds`. Poll GET
+    /api/workers/profiles/{id} until it is done, then download it."""
+    if not 1 <= seconds <= settings.profile_max_seconds:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"seconds must be between 1 and {settings.profile_max_seconds:g} (PROFILE_MAX_SECONDS)",
+        )
+    await worker_profiles.expire(db)
+    hz = max(1, settings.profile_sample_hz)
+    if worker_id == API_TARGET:
+        if await worker_profiles.active(db, API_TARGET, None):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="The API is already being profiled")
+        profile = await worker_profiles.create(db, API_TARGET, seconds, hz, int(user["id"]), status="running")
+        start_api_profile(profile)
+        return profile
+    async with db.execute("SELECT account_id FROM worker_registry WHERE worker_id = ?", (worker_id,)) as cur:
+        row = await cur.fetchone()
+    if not row or not await leases.live_leases(db, [row[0]]):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Worker not found")
+    account_id = row[0]
+    if await worker_profiles.active(db, "worker", account_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="This worker is already being profiled")
+    return await worker_profiles.create(
+        db, "worker", seconds, hz, int(user["id"]), worker_id=worker_id, account_id=account_id
+    )
+
+
+@router.get("/profiles")
+async def list_profiles(user: AdminUser, db: ReadDb, limit: int = 50) -> list[dict]:
+    """Recent profiles, newest first. Overdue ones are failed by the profiles maintenance job."""
+    return await worker_profiles.list_profiles(db, max(1, min(limit, 500)))
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, user: AdminUser, db: ReadDb) -> dict:
+    profile = await worker_profiles.get(db, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return profile
+
+
+@router.get("/profiles/{profile_id}/download")
+async def download_profile(profile_id: str, user: AdminUser, db: ReadDb) -> FileResponse:
+    """The collapsed stacks, e.g. `flamegraph.pl profile.collapsed > profile.svg`."""
+    profile = await worker_profiles.get(db, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if profile["status"] != "done":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Profile is {profile['status']}")
+    path = worker_profiles.profiles_dir() / f"{profile_id}.collapsed"
+    if not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile output was removed")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=path.name)
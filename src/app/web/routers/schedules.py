@@ -5,7 +5,7 @@ from __future__ import annotations
 from fastapi import APIRouter, HTTPException, status
 
 from app.services.mapping_service import WEEKDAY_COLS
-from app.web.deps import CurrentUser, Db
+from app.web.deps import CurrentUser, Db, ReadDb
 from app.web.schemas.schedules import ScheduleResponse, ScheduleUpdate
 
 router = APIRouter(prefix="/users", tags=["schedules"])
@@ -29,7 +29,7 @@ async def _get_user_schedule(db, user_id: int) -> dict:
 
 
 @router.get("/me/schedule", response_model=ScheduleResponse)
-async def get_user_schedule(db: Db, user: CurrentUser) -> dict:
+async def get_user_schedule(db: ReadDb, user: CurrentUser) -> dict:
     """Get current user's default schedule. Returns UTC HH:MM. Null = unrestricted for that slot."""
     return await _get_user_schedule(db, user["id"])
 
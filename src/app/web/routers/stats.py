@@ -4,16 +4,18 @@ from __future__ import annotations
 
 from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
 
+from app.config import settings
+from app.db import latency_rollups
 from app.db.mongo import get_mongo_db
-from app.web.deps import CurrentUser, Db
+from app.web.deps import CurrentUser, ReadDb
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
 
 @router.get("/dashboard")
-async def get_dashboard_stats(user: CurrentUser, db: Db) -> dict:
+async def get_dashboard_stats(user: CurrentUser, db: ReadDb) -> dict:
     """Dashboard statistics for the current user."""
     current_user_id = int(user["id"])
     now = datetime.now(timezone.utc)
@@ -111,3 +113,72 @@ async def get_dashboard_stats(user: CurrentUser, db: Db) -> dict:
         "mappings_enabled": mappings_enabled,
         "accounts_total": sum(account_status.values()),
     }
+
+
+async def _mapping_latency(db: ReadDb, user: dict, user_id: int | None, hours: float) -> list[dict]:
+    """Latency rollups joined with their mappings. Users see own; admins can filter by user_id."""
+    if not 0 < hours <= settings.latency_rollup_retention_days * 24:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="hours is outside the rollup retention")
+    owner = int(user["id"]) if user["role"] != "admin" else user_id
+    sql = "SELECT id, user_id, source_chat_id, dest_chat_id, source_chat_title, dest_chat_title, enabled FROM channel_mappings"
+    params: tuple = ()
+    if owner is not None:
+        sql += " WHERE user_id = ?"
+        params = (owner,)
+    async with db.execute(sql, params) as cur:
+        mappings = {row[0]: row for row in await cur.fetchall()}
+    latency = await latency_rollups.mapping_latency(db, None if owner is None else list(mappings), hours)
+    return [
+        {
+            "mapping_id": mapping_id,
+            "user_id": m[1],
+            "source_chat_id": m[2],
+            "dest_chat_id": m[3],
+            "source_chat_title": m[4],
+            "dest_chat_title": m[5],
+            "enabled": bool(m[6]),
+            **latency[mapping_id],
+        }
+        for mapping_id, m in sorted(mappings.items())
+        if mapping_id in latency
+    ]
+
+
+@router.get("/latency")
+async def get_mapping_latency(user: CurrentUser, db: ReadDb, hours: float = 24, user_id: int | None = None) -> dict:
+    """Copy latency (source message date -> completed send) per mapping over the last `hours`,
+    from the hourly rollups: message count, mean, estimated p50/p95/p99 seconds and the bucket
+    counts (one per bound in `buckets`, then the overflow)."""
+    items = await _mapping_latency(db, user, user_id, hours)
+    return {"hours": hours, "buckets": list(latency_rollups.BUCKETS), "items": items}
+
+
+@router.get("/slo-breaches")
+async def get_slo_breaches(
+    user: CurrentUser,
+    db: ReadDb,
+    hours: float = 24,
+    slo_seconds: float | None = None,
+    percentile: float | None = None,
+    min_messages: int = 1,
+    user_id: int | None = None,
+) -> dict:
+    """Mappings whose copy latency percentile over the last `hours` exceeds the SLO
+    (COPY_LATENCY_SLO_SECONDS at COPY_LATENCY_SLO_PERCENTILE unless given), worst first."""
+    slo = settings.copy_latency_slo_seconds if slo_seconds is None else slo_seconds
+    pct = settings.copy_latency_slo_percentile if percentile is None else percentile
+    if slo <= 0 or not 0 < pct < 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="slo_seconds must be positive and percentile between 0 and 100",
+        )
+    items = []
+    for item in await _mapping_latency(db, user, user_id, hours):
+        if item["messages"] < min_messages:
+            continue
+        counts = item.pop("counts")
+        observed = latency_rollups.quantile(counts, pct / 100)
+        if observed is not None and observed > slo:
+            items.append({**item, "observed_seconds": observed})
+    items.sort(key=lambda i: i["observed_seconds"], reverse=True)
+    return {"hours": hours, "slo_seconds": slo, "percentile": pct, "items": items}
@@ -0,0 +1,90 @@
+"""Sampled message traces of the workers' handlers (TRACE_SAMPLE_RATE, app.db.message_traces)."""
+
+from __future__ import annotations
+
+import time
+
+from fastapi import APIRouter, HTTPException, status
+
+from app.db import message_traces
+from app.web.deps import CurrentUser, ReadDb
+
+router = APIRouter(prefix="/traces", tags=["traces"])
+
+OUTCOMES = ("sent", "filtered", "failed")
+MAX_LIMIT = 500
+
+
+async def _account_scope(db: ReadDb, user: dict, account_id: int | None) -> list[int] | None:
+    """Account ids the caller may read (None: all, for admins without a filter)."""
+    if user["role"] == "admin":
+        return None if account_id is None else [account_id]
+    async with db.execute("SELECT id FROM telegram_accounts WHERE user_id = ?", (int(user["id"]),)) as cur:
+        own = [r[0] for r in await cur.fetchall()]
+    if account_id is None:
+        return own
+    if account_id not in own:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+    return [account_id]
+
+
+async def _list(
+    db: ReadDb,
+    user: dict,
+    account_id: int | None,
+    mapping_id: int | None,
+    outcome: str | None,
+    since_minutes: float | None,
+    limit: int,
+) -> list[dict]:
+    if outcome is not None and outcome not in OUTCOMES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"outcome must be one of {', '.join(OUTCOMES)}")
+    since = time.time() - since_minutes * 60 if since_minutes is not None else None
+    return await message_traces.list_traces(
+        db,
+        await _account_scope(db, user, account_id),
+        outcome=outcome,
+        mapping_id=mapping_id,
+        since=since,
+        limit=max(1, min(limit, MAX_LIMIT)),
+    )
+
+
+@router.get("")
+async def list_traces(
+    db: ReadDb,
+    user: CurrentUser,
+    account_id: int | None = None,
+    mapping_id: int | None = None,
+    outcome: str | None = None,
+    since_minutes: float | None = None,
+    limit: int = 50,
+) -> dict:
+    """Newest sampled traces first. Users see their accounts' traces; admins see all."""
+    items = await _list(db, user, account_id, mapping_id, outcome, since_minutes, limit)
+    return {"items": items, "count": len(items)}
+
+
+@router.get("/export")
+async def export_traces(
+    db: ReadDb,
+    user: CurrentUser,
+    account_id: int | None = None,
+    mapping_id: int | None = None,
+    outcome: str | None = None,
+    since_minutes: float | None = None,
+    limit: int = 100,
+) -> dict:
+    """The same selection as OTLP/JSON, e.g. for POST to an OpenTelemetry collector's /v1/traces."""
+    return message_traces.to_otlp(await _list(db, user, account_id, mapping_id, outcome, since_minutes, limit))
+
+
+@router.get("/{trace_id}")
+async def get_trace(trace_id: str, db: ReadDb, user: CurrentUser) -> dict:
+    trace = await message_traces.get_trace(db, trace_id)
+    if trace is not None and user["role"] != "admin":
+        if trace["account_id"] not in await _account_scope(db, user, None):
+            trace = None
+    if trace is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trace not found")
+    return trace
@@ -6,8 +6,9 @@ import re
 
 from fastapi import APIRouter, HTTPException, status
 
+from app.services.mapping_bulk import TransformValues
 from app.utils.regex import regex_flags_from_string
-from app.web.deps import CurrentUser, Db
+from app.web.deps import CurrentUser, Db, ReadDb
 from app.web.mapping_access import get_mapping_scope
 from app.web.routers.workers import restart_workers_for_mapping
 from app.web.schemas.mappings import (
@@ -130,6 +131,38 @@ def _validate_transform_payload(
     return None, None, None, replacement_media_asset_id, apply_to_media_types
 
 
+def normalize_transform(data: MappingTransformCreate) -> TransformValues:
+    """Normalize and validate a new rule (HTTPException 400 on error); media asset ownership is
+    checked by the caller."""
+    rule_type = _normalize_rule_type(data.rule_type)
+    (
+        find_text,
+        regex_pattern,
+        regex_flags,
+        replacement_media_asset_id,
+        apply_to_media_types,
+    ) = _validate_transform_payload(
+        rule_type=rule_type,
+        find_text=data.find_text,
+        replace_text=data.replace_text,
+        regex_pattern=data.regex_pattern,
+        regex_flags=_normalize_regex_flags(data.regex_flags),
+        replacement_media_asset_id=data.replacement_media_asset_id,
+        apply_to_media_types=_normalize_apply_to_media_types(data.apply_to_media_types),
+    )
+    return TransformValues(
+        rule_type,
+        find_text,
+        data.replace_text,
+        regex_pattern,
+        regex_flags,
+        replacement_media_asset_id,
+        apply_to_media_types,
+        1 if data.enabled else 0,
+        data.priority,
+    )
+
+
 async def _validate_media_asset_for_mapping(
     db: Db,
     *,
@@ -171,7 +204,7 @@ def _row_to_response(row: tuple) -> dict:
 
 
 @router.get("/{mapping_id}/transforms", response_model=list[MappingTransformResponse])
-async def list_transforms(mapping_id: int, db: Db, user: CurrentUser) -> list[dict]:
+async def list_transforms(mapping_id: int, db: ReadDb, user: CurrentUser) -> list[dict]:
     """List text/regex/emoji/media/template transformation rules for a mapping."""
     await get_mapping_scope(db, user, mapping_id)
     async with db.execute(
@@ -198,29 +231,12 @@ async def create_transform(
 ) -> dict:
     """Create a transformation rule for a mapping."""
     mapping_user_id, mapping_account_id = await get_mapping_scope(db, user, mapping_id)
-    rule_type = _normalize_rule_type(data.rule_type)
-    regex_flags = _normalize_regex_flags(data.regex_flags)
-    apply_to_media_types = _normalize_apply_to_media_types(data.apply_to_media_types)
-    (
-        find_text,
-        regex_pattern,
-        regex_flags,
-        replacement_media_asset_id,
-        apply_to_media_types,
-    ) = _validate_transform_payload(
-        rule_type=rule_type,
-        find_text=data.find_text,
-        replace_text=data.replace_text,
-        regex_pattern=data.regex_pattern,
-        regex_flags=regex_flags,
-        replacement_media_asset_id=data.replacement_media_asset_id,
-        apply_to_media_types=apply_to_media_types,
-    )
-    if replacement_media_asset_id is not None:
+    values = normalize_transform(data)
+    if values.replacement_media_asset_id is not None:
         await _validate_media_asset_for_mapping(
             db,
             mapping_user_id=mapping_user_id,
-            replacement_media_asset_id=replacement_media_asset_id,
+            replacement_media_asset_id=values.replacement_media_asset_id,
         )
 
     cursor = await db.execute(
@@ -228,18 +244,7 @@ async def create_transform(
         "(mapping_id, rule_type, find_text, replace_text, regex_pattern, regex_flags, "
         "replacement_media_asset_id, apply_to_media_types, enabled, priority) "
         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (
-            mapping_id,
-            rule_type,
-            find_text,
-            data.replace_text,
-            regex_pattern,
-            regex_flags,
-            replacement_media_asset_id,
-            apply_to_media_types,
-            1 if data.enabled else 0,
-            data.priority,
-        ),
+        (mapping_id, *values),
     )
     await db.commit()
     transform_id = cursor.lastrowid
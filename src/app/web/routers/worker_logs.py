@@ -2,13 +2,35 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timezone
-
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+from starlette.background import BackgroundTask
 
 from app.db.mongo import get_mongo_db
-from app.web.deps import CurrentUser
+from app.services.exports import (
+    DEFAULT_BATCH_SIZE,
+    EXPORT_FORMATS,
+    WORKER_LOG_FIELDS,
+    clamp_batch_size,
+    encode_export,
+    export_filename,
+    export_media_type,
+    iter_worker_log_batches,
+    prime_stream,
+)
+from app.services.log_queries import (
+    COUNT_MODES,
+    count_logs,
+    fetch_cursor_page,
+    page_pipeline,
+    parse_cursor,
+    scoped_user_id,
+    worker_log_item,
+    worker_logs_match,
+)
+from app.services.log_tail import get_log_tail_hub, sse_events
+from app.web.deps import CurrentUser, StreamUser
 
 router = APIRouter(prefix="/worker-logs", tags=["worker-logs"])
 
@@ -36,57 +58,60 @@ async def list_worker_logs(
     date_to: str | None = None,
     page: int = 1,
     page_size: int = 50,
+    pagination: str = "page",
+    cursor: str | None = None,
+    count: str | None = None,
 ) -> dict:
-    """List worker logs from MongoDB. Users see own; admins can filter."""
+    """List worker logs from MongoDB. Users see own; admins can filter.
+
+    Supports the same cursor/count options as /message-logs (keyset on (timestamp, _id)).
+    """
+    use_cursor = cursor is not None or pagination == "cursor"
+    count_mode = count or ("capped" if use_cursor else "exact")
+    if count_mode not in COUNT_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"count must be one of: {', '.join(COUNT_MODES)}",
+        )
+    try:
+        parsed_cursor = parse_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+    page = max(1, page)
+    page_size = max(1, page_size)
     try:
         mongo_db = get_mongo_db()
-        match: dict = {}
         current_user_id = int(user["id"])
-        # Non-admin: always restrict to own data
-        if user["role"] != "admin":
-            match["user_id"] = current_user_id
-        # Admin: restrict only when user_id query param is provided
-        elif user_id is not None:
-            match["user_id"] = int(user_id)
-        if account_id is not None:
-            match["account_id"] = account_id
-        if level is not None:
-            match["level"] = level.upper()
-        if date_from or date_to:
-            match["timestamp"] = {}
-            if date_from:
-                match["timestamp"]["$gte"] = datetime.fromisoformat(date_from.replace("Z", "+00:00"))
-            if date_to:
-                match["timestamp"]["$lte"] = datetime.fromisoformat(date_to.replace("Z", "+00:00"))
-
-        pipeline = [{"$match": match}]
-        count_cursor = mongo_db.worker_logs.aggregate(
-            pipeline + [{"$count": "total"}]
+        match = worker_logs_match(
+            user_id=scoped_user_id(user, user_id),
+            account_id=account_id,
+            level=level,
+            date_from=date_from,
+            date_to=date_to,
         )
-        total = 0
-        async for doc in count_cursor:
-            total = doc["total"]
-            break
-        pipeline.extend([
-            {"$sort": {"timestamp": -1}},
-            {"$skip": (page - 1) * page_size},
-            {"$limit": page_size},
-        ])
-        cursor = mongo_db.worker_logs.aggregate(pipeline)
-        items = []
-        async for doc in cursor:
-            ts = doc.get("timestamp")
-            items.append({
-                "user_id": doc.get("user_id"),
-                "account_id": doc.get("account_id"),
-                "level": doc.get("level"),
-                "message": doc.get("message"),
-                "timestamp": ts.isoformat() if hasattr(ts, "isoformat") else str(ts),
-            })
+        total, total_exact = await count_logs(mongo_db.worker_logs, match, count_mode)
+        next_cursor = prev_cursor = None
+        if use_cursor:
+            docs, next_cursor, prev_cursor = await fetch_cursor_page(
+                mongo_db.worker_logs, match, parsed_cursor, page_size
+            )
+        else:
+            docs = [
+                doc async for doc in mongo_db.worker_logs.aggregate(page_pipeline(match, page, page_size))
+            ]
+        items = [worker_log_item(doc) for doc in docs]
         # Non-admin: server-side post-filter to never return other users' data
         if user["role"] != "admin":
             items = [it for it in items if it.get("user_id") is not None and int(it["user_id"]) == current_user_id]
-            total = await mongo_db.worker_logs.count_documents(match)
+        if use_cursor:
+            return {
+                "items": items,
+                "page_size": page_size,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor,
+                "total": total,
+                "total_exact": total_exact,
+            }
         total_pages = max(1, (total + page_size - 1) // page_size) if total else 1
         return {
             "items": items,
@@ -100,3 +125,67 @@ async def list_worker_logs(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=_mongo_error_message(e),
         ) from e
+
+
+@router.get("/export")
+async def export_worker_logs(
+    user: CurrentUser,
+    user_id: int | None = None,
+    account_id: int | None = None,
+    level: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    format: str = "ndjson",
+    gzip: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> StreamingResponse:
+    """Stream worker logs as NDJSON or CSV (optionally gzipped), newest first.
+    Same scoping and filters as the list endpoint; memory is bounded by batch_size."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}",
+        )
+    batch_size = clamp_batch_size(batch_size)
+    owner_id = int(user["id"]) if user["role"] != "admin" else None
+    try:
+        match = worker_logs_match(
+            user_id=scoped_user_id(user, user_id),
+            account_id=account_id,
+            level=level,
+            date_from=date_from,
+            date_to=date_to,
+        )
+        batches = await prime_stream(
+            iter_worker_log_batches(get_mongo_db().worker_logs, match, batch_size, owner_id=owner_id)
+        )
+    except (OperationFailure, ServerSelectionTimeoutError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=_mongo_error_message(e),
+        ) from e
+    filename = export_filename("worker_logs", format, gzip)
+    return StreamingResponse(
+        encode_export(batches, format, WORKER_LOG_FIELDS, gzip=gzip),
+        media_type=export_media_type(format, gzip),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        background=BackgroundTask(batches.aclose),
+    )
+
+
+@router.get("/stream")
+async def stream_worker_logs(
+    user: StreamUser,
+    user_id: int | None = None,
+    account_id: int | None = None,
+    level: str | None = None,
+) -> StreamingResponse:
+    """Live tail of new worker logs as Server-Sent Events (event: worker_log).
+    Users see own; admins can filter. Accepts ?access_token= for EventSource clients."""
+    match = worker_logs_match(user_id=scoped_user_id(user, user_id), account_id=account_id, level=level)
+    hub = get_log_tail_hub("worker_logs")
+    return StreamingResponse(
+        sse_events(hub, match, "worker_log"),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
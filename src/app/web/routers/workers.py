@@ -9,25 +9,41 @@ from datetime import datetime, timezone
 import signal
 import subprocess
 import sys
+import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
 
 import aiosqlite
 from fastapi import APIRouter, Depends, HTTPException, status
 
-from app.web.deps import CurrentUser, Db
+from app import worker_zygote
+from app.config import settings
+from app.db import agents, leases, worker_heartbeats
+from app.db.sqlite import get_sqlite, sqlite_writer
+from app.utils.paths import PROJECT_ROOT, WORKER_LOG_DIR, resolve
+from app.worker_drain import EXIT_DRAIN_INCOMPLETE
+from app.web.deps import CurrentUser, ReadDb
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/workers", tags=["workers"])
 
-# In-memory registry: worker_id -> {user_id, account_id, session_path, process?, pid, ...}
-# process may be None for reattached workers (orphans from prior API run)
+# In-memory registry: worker_id -> {user_id, account_id, session_path, process?, pid, generation,
+# host_id, agent_id, owned, ...}. process may be None for reattached workers (orphans from prior API
+# run, or workers of other API instances/hosts), zygote-forked workers and workers placed on remote
+# agents (agent_id set). owned marks the workers this API supervises (spawned or adopted); only
+# those are stopped on shutdown.
+# Liveness comes from worker_leases (app.db.leases), not from signalling PIDs.
 _workers: dict[str, dict[str, Any]] = {}
-_worker_counter = 0
+# Beyond the worker's drain deadline: Telegram disconnect and the bounded Mongo log flush.
+STOP_GRACE_SECONDS = 5.0
+_supervisor_task: asyncio.Task | None = None
+# Background worker restarts after mapping edits (restart_workers_for_accounts), run one at a time.
+_restart_tasks: set[asyncio.Task] = set()
+_last_restart: asyncio.Task | None = None
 
 
 def _is_process_alive(w: dict[str, Any]) -> bool:
-    """Check if a worker process is still running."""
+    """Check if a local worker process is still running (used while signalling it)."""
     proc = w.get("process")
     if proc is not None:
         return proc.poll() is None
@@ -41,43 +57,115 @@ def _is_process_alive(w: dict[str, Any]) -> bool:
         return False
 
 
+def _stop_timeout() -> float:
+    """How long a stopped worker gets to drain before it is force-killed."""
+    return settings.worker_drain_timeout_seconds + STOP_GRACE_SECONDS
+
+
+def _log_worker_exit(w: dict[str, Any]) -> None:
+    proc = w.get("process")
+    code = proc.returncode if proc is not None else None
+    if code == EXIT_DRAIN_INCOMPLETE:
+        logger.warning("Worker %s stopped before its drain finished (messages were in flight)", w["id"])
+    elif code is not None and code not in (0, -signal.SIGTERM):
+        logger.warning("Worker %s exited with status %s", w["id"], code)
+
+
 async def _terminate_worker(w: dict[str, Any]) -> None:
-    """Terminate a worker process (managed or reattached). Waits for exit before returning."""
+    """Signal a worker process on this host. SIGTERM starts the worker's drain; it is killed if
+    still running after _stop_timeout(). Waits for exit before returning."""
     proc = w.get("process")
     pid = w.get("pid")
-    if proc is not None and proc.poll() is None:
+    timeout = _stop_timeout()
+    if proc is not None:
+        if proc.poll() is not None:
+            return
         proc.terminate()
         try:
-            proc.wait(timeout=5)
+            await asyncio.to_thread(proc.wait, timeout)
         except subprocess.TimeoutExpired:
+            logger.warning("Worker %s did not drain within %.1fs; killing pid=%s", w["id"], timeout, pid)
             proc.kill()
-    elif pid is not None:
+            await asyncio.to_thread(proc.wait)
+        _log_worker_exit(w)
+    elif pid:
         try:
             os.kill(pid, signal.SIGTERM)
-            await _wait_for_pid_exit(pid, timeout_sec=5.0)
         except OSError:
-            pass
+            return
+        if not await _wait_for_pid_exit(pid, timeout_sec=timeout):
+            logger.warning("Worker %s did not drain within %.1fs; killing pid=%s", w["id"], timeout, pid)
+            try:
+                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except OSError:
+                pass
+
+
+async def _wait_for_lease_release(account_id: int, generation: int, timeout_sec: float) -> bool:
+    """Poll (on a connection of its own) until the lease at `generation` is released, expired or
+    superseded."""
+    polls = int(timeout_sec / 0.25) or 1
+    db = await get_sqlite()
+    try:
+        for _ in range(polls):
+            lease = await leases.get_lease(db, account_id)
+            if lease is None or lease.generation != generation or not lease.live():
+                return True
+            await asyncio.sleep(0.25)
+    finally:
+        await db.close()
+    return False
+
+
+async def _stop_worker(w: dict[str, Any], forget: bool = True) -> None:
+    """Drain-stop a worker, free its lease and (with `forget`) drop its worker_registry row. A worker
+    on this host gets SIGTERM right away; one on another host or agent sees stop_requested at its
+    next heartbeat and releases the lease when done. The writer is only taken to request the stop
+    and to release the lease, never while the worker drains."""
+    account_id, generation = w["account_id"], w.get("generation", 0)
+    async with sqlite_writer() as db:
+        live = await leases.request_stop(db, account_id, generation)
+    if w.get("process") is not None:
+        await _terminate_worker(w)
+    elif live and w.get("host_id") == leases.HOST_ID and not w.get("agent_id"):
+        # The lease is being renewed, so the recorded pid is still this worker's (no PID reuse).
+        await _terminate_worker(w)
+    elif live:
+        timeout = _stop_timeout() + settings.worker_heartbeat_seconds
+        if not await _wait_for_lease_release(account_id, generation, timeout):
+            logger.warning(
+                "Worker %s on host %s did not release its lease within %.1fs", w["id"], w.get("host_id"), timeout
+            )
+    async with sqlite_writer() as db:
+        if forget or w.get("agent_id"):
+            # Delete the row in the release's commit, or an agent heartbeat would re-place the worker.
+            await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (w["id"],))
+        await leases.release(db, account_id, generation)
 
 
 async def _prune_dead_workers(db: aiosqlite.Connection) -> None:
-    """Remove dead workers from the registry and worker_registry table."""
-    dead = [wid for wid, w in _workers.items() if not _is_process_alive(w)]
+    """Remove workers whose lease is gone (or whose local process exited) from the in-memory
+    registry and worker_registry. Rows of remote agents stay for re-placement."""
+    if not _workers:
+        return
+    live = await leases.live_leases(db, {w["account_id"] for w in _workers.values()})
+    dead = []
+    for wid, w in _workers.items():
+        lease = live.get(w["account_id"])
+        exited = w.get("process") is not None and w["process"].poll() is not None
+        if exited or lease is None or lease.generation != w.get("generation"):
+            dead.append(wid)
     for wid in dead:
-        del _workers[wid]
-        await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (wid,))
+        w = _workers.pop(wid)
+        if w.get("process") is not None:
+            # Crashed before releasing its lease: free it now rather than after the TTL.
+            await leases.release(db, w["account_id"], w.get("generation", 0))
+        if not w.get("agent_id"):
+            await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (wid,))
     if dead:
         await db.commit()
 
 
-def _pid_alive(pid: int) -> bool:
-    """Check if a process with the given PID is alive."""
-    try:
-        os.kill(pid, 0)
-        return True
-    except OSError:
-        return False
-
-
 async def _wait_for_pid_exit(pid: int, timeout_sec: float = 5.0) -> bool:
     """Poll until process exits or timeout. Returns True if exited within timeout."""
     polls = int(timeout_sec / 0.1) or 1
@@ -90,24 +178,55 @@ async def _wait_for_pid_exit(pid: int, timeout_sec: float = 5.0) -> bool:
     return False
 
 
+def _started_at(created_at: Any) -> Any:
+    """Normalize SQLite datetime to ISO UTC for frontend."""
+    if created_at and "T" not in str(created_at) and "Z" not in str(created_at) and "+" not in str(created_at):
+        return str(created_at).replace(" ", "T") + "Z"
+    return created_at
+
+
+# worker_registry rows joined with their lease; `live` is 1 while the lease at the row's generation
+# is unexpired.
+_REGISTRY_SELECT = (
+    "SELECT r.worker_id, r.user_id, r.account_id, r.session_path, r.pid, r.created_at, r.generation, "
+    "r.host_id, (l.generation = r.generation AND l.expires_at > ?) AS live, r.agent_id "
+    "FROM worker_registry r LEFT JOIN worker_leases l ON l.account_id = r.account_id"
+)
+
+
+def _reattach(row) -> dict[str, Any]:
+    worker_id, uid, account_id, session_path, pid, created_at, generation, host_id = row[:8]
+    agent_id = row[9]
+    return {
+        "id": worker_id,
+        "user_id": uid,
+        "account_id": account_id,
+        "session_path": session_path,
+        "process": None,
+        "pid": pid,
+        "started_at": _started_at(created_at),
+        "generation": generation,
+        "host_id": host_id,
+        "agent_id": agent_id,
+        "owned": False,
+    }
+
+
 async def _list_workers_from_registry(
     db: aiosqlite.Connection, user: dict
 ) -> tuple[list[dict], int, int, int]:
     """
-    List workers from worker_registry (source of truth). Prunes dead PIDs, reattaches
-    alive workers missing from _workers, and returns the response list.
+    List workers from worker_registry (source of truth), read on `db`. Prunes rows without a live
+    lease (briefly taking the writer), reattaches live workers missing from _workers, and returns
+    the response list.
     Returns (items, workers_in_registry, workers_reattached, workers_pruned).
     """
+    now = time.time()
     if user["role"] != "admin":
-        async with db.execute(
-            "SELECT worker_id, user_id, account_id, session_path, pid, created_at FROM worker_registry WHERE user_id = ?",
-            (user["id"],),
-        ) as cur:
+        async with db.execute(f"{_REGISTRY_SELECT} WHERE r.user_id = ?", (now, user["id"])) as cur:
             rows = await cur.fetchall()
     else:
-        async with db.execute(
-            "SELECT worker_id, user_id, account_id, session_path, pid, created_at FROM worker_registry"
-        ) as cur:
+        async with db.execute(_REGISTRY_SELECT, (now,)) as cur:
             rows = await cur.fetchall()
 
     workers_in_registry = len(rows)
@@ -115,93 +234,100 @@ async def _list_workers_from_registry(
     workers_pruned = 0
     items: list[dict] = []
 
+    pruned: list[str] = []
     for row in rows:
-        worker_id, uid, account_id, session_path, pid, created_at = (
-            row[0], row[1], row[2], row[3], row[4], row[5]
-        )
-        if not _pid_alive(pid):
-            await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
-            workers_pruned += 1
+        worker_id = row[0]
+        if not row[8] and row[9]:
+            continue  # its agent was lost; the next agent heartbeat re-places it
+        if not row[8]:
+            pruned.append(worker_id)
             continue
 
-        # Normalize SQLite datetime to ISO UTC for frontend
-        started_at = created_at
-        if created_at and "T" not in str(created_at) and "Z" not in str(created_at) and "+" not in str(created_at):
-            started_at = str(created_at).replace(" ", "T") + "Z"
-
         # Reattach to _workers if missing (e.g. worker started by another API instance)
         if worker_id not in _workers:
-            _workers[worker_id] = {
-                "id": worker_id,
-                "user_id": uid,
-                "account_id": account_id,
-                "session_path": session_path,
-                "process": None,
-                "pid": pid,
-                "started_at": started_at,
-            }
+            _workers[worker_id] = _reattach(row)
             workers_reattached += 1
+        w = _workers[worker_id]
 
         items.append({
             "id": worker_id,
-            "user_id": uid,
-            "account_id": account_id,
-            "session_path": session_path,
-            "pid": pid,
+            "user_id": w["user_id"],
+            "account_id": w["account_id"],
+            "session_path": w["session_path"],
+            "pid": w["pid"],
+            "host_id": w["host_id"],
+            "agent_id": w.get("agent_id"),
             "running": True,
-            "started_at": started_at,
+            "started_at": w["started_at"],
         })
 
-    if workers_pruned:
-        await db.commit()
+    if pruned:
+        async with sqlite_writer() as wdb:
+            await wdb.executemany("DELETE FROM worker_registry WHERE worker_id = ?", [(w,) for w in pruned])
+            await wdb.commit()
+        workers_pruned = len(pruned)
+    if items:
+        heartbeats = await worker_heartbeats.get_heartbeats(db, {i["account_id"] for i in items})
+        for item in items:
+            w = _workers[item["id"]]
+            item["heartbeat"] = worker_heartbeats.summary_for(heartbeats, w["account_id"], w.get("generation"), now)
 
     return items, workers_in_registry, workers_reattached, workers_pruned
 
 
+def live_worker_count() -> int:
+    """Workers in this API's registry whose process is still running."""
+    return sum(1 for w in _workers.values() if _is_process_alive(w))
+
+
+async def worker_health(db: aiosqlite.Connection) -> list[dict[str, Any]]:
+    """The runtime heartbeat summary of every worker in this API's registry."""
+    heartbeats = await worker_heartbeats.get_heartbeats(db, {w["account_id"] for w in _workers.values()})
+    now = time.time()
+    return [
+        {
+            "worker_id": w["id"],
+            "account_id": w["account_id"],
+            "heartbeat": worker_heartbeats.summary_for(heartbeats, w["account_id"], w.get("generation"), now),
+        }
+        for w in list(_workers.values())
+    ]
+
+
 async def _prune_orphaned_registry_rows(db: aiosqlite.Connection) -> None:
-    """Remove worker_registry rows whose PIDs are no longer running (e.g. worker crashed, API
-    restarted). This prevents 'Worker already running' when the process is actually dead."""
+    """Remove worker_registry rows without a live lease (e.g. worker crashed, API restarted).
+    This prevents 'Worker already running' when the worker is actually gone. Rows of lost remote
+    agents are left for re-placement."""
     async with db.execute(
-        "SELECT worker_id, pid FROM worker_registry"
+        f"DELETE FROM worker_registry WHERE agent_id IS NULL AND {leases.REGISTRY_ROW_ORPHANED}", (time.time(),)
     ) as cur:
-        rows = await cur.fetchall()
-    deleted = 0
-    for worker_id, pid in rows:
-        try:
-            os.kill(pid, 0)
-        except OSError:
-            await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
-            deleted += 1
+        deleted = cur.rowcount
     if deleted:
         await db.commit()
         logger.info("Pruned %d orphaned worker_registry row(s)", deleted)
 
 
-def _next_worker_id() -> str:
-    global _worker_counter
-    _worker_counter += 1
-    return f"w{_worker_counter}"
+def _zygote_socket_path() -> str:
+    return str(resolve(settings.worker_zygote_socket))
 
 
-def _account_has_running_worker(account_id: int) -> bool:
-    """Check if any running worker exists for this account (in-memory)."""
-    for w in _workers.values():
-        if w.get("account_id") == account_id and _is_process_alive(w):
-            return True
-    return False
+def start_worker_zygote() -> None:
+    """Start the pre-forked worker zygote (API startup). Spawns cold-start workers until it is ready."""
+    if not settings.worker_zygote or not worker_zygote.supported():
+        return
+    WORKER_LOG_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        worker_zygote.start(
+            _zygote_socket_path(), str(PROJECT_ROOT), str(WORKER_LOG_DIR / "worker_zygote.log")
+        )
+    except OSError as e:
+        logger.warning("Worker zygote not started, workers will cold start: %s", e)
 
 
-async def _account_has_worker_in_registry(db: aiosqlite.Connection, account_id: int) -> bool:
-    """Check if worker_registry has any row for this account with alive PID (covers workers
-    started by other API processes)."""
-    async with db.execute(
-        "SELECT worker_id, pid FROM worker_registry WHERE account_id = ?", (account_id,)
-    ) as cur:
-        rows = await cur.fetchall()
-    for _worker_id, pid in rows:
-        if _pid_alive(pid):
-            return True
-    return False
+async def stop_worker_zygote() -> None:
+    """Stop the worker zygote (API shutdown) in a thread, so waiting for it to exit does not block
+    the event loop; running workers are stopped separately."""
+    await asyncio.to_thread(worker_zygote.stop)
 
 
 async def _spawn_worker_for_account(
@@ -210,92 +336,213 @@ async def _spawn_worker_for_account(
     user_id: int,
     session_path: str,
 ) -> bool:
-    """Spawn a worker process for an account. Returns True if spawned."""
-    if _account_has_running_worker(account_id) or await _account_has_worker_in_registry(db, account_id):
+    """Claim the account's lease and spawn a worker process under it, here or on the remote agent
+    chosen by WORKER_PLACEMENT. Returns False if another worker holds the lease."""
+    agent = await _place_worker(db)
+    if agent is None:
+        generation = await leases.claim(db, account_id)
+    else:
+        generation = await leases.claim(db, account_id, owner=agents.owner(agent.agent_id), host_id=agent.host_id)
+    if generation is None:
         return False
-    project_root = Path(__file__).resolve().parents[4]
-    session_abs = (project_root / session_path).resolve() if not Path(session_path).is_absolute() else Path(session_path)
-    worker_id = _next_worker_id()
+    try:
+        if agent is None:
+            await _spawn_claimed_worker(db, account_id, user_id, session_path, generation)
+        else:
+            await _assign_claimed_worker(db, agent, account_id, user_id, session_path, generation)
+    except BaseException:
+        await leases.release(db, account_id, generation)
+        raise
+    return True
+
+
+async def _place_worker(db: aiosqlite.Connection) -> agents.Agent | None:
+    """The remote agent the next worker goes to, or None to spawn it on this host."""
+    if settings.worker_placement == "local":
+        return None
+    agent = await agents.place(db)
+    if agent is None and settings.worker_placement == "agents":
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No worker agent has free capacity",
+        )
+    return agent
+
+
+async def _register_worker(db: aiosqlite.Connection, w: dict[str, Any]) -> None:
+    _workers[w["id"]] = w
+    # The claim makes this API the only writer of the account's row; replace any stale one.
+    await db.execute("DELETE FROM worker_registry WHERE account_id = ?", (w["account_id"],))
+    await db.execute(
+        "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid, generation, host_id, "
+        "agent_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            w["id"], w["user_id"], w["account_id"], w["session_path"], w["pid"] or 0, w["generation"],
+            w["host_id"], w["agent_id"],
+        ),
+    )
+    await db.commit()
+
+
+async def _assign_claimed_worker(
+    db: aiosqlite.Connection,
+    agent: agents.Agent,
+    account_id: int,
+    user_id: int,
+    session_path: str,
+    generation: int,
+) -> None:
+    """Record the worker as assigned to `agent`; the agent picks it up at its next heartbeat and
+    reports its pid once running."""
+    worker_id = f"w{account_id}-{generation}"
+    await _register_worker(db, {
+        "id": worker_id,
+        "user_id": user_id,
+        "account_id": account_id,
+        "session_path": session_path,
+        "process": None,
+        "pid": None,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "generation": generation,
+        "host_id": agent.host_id,
+        "agent_id": agent.agent_id,
+        "owned": False,
+    })
+    logger.info(
+        "Assigned worker %s for account_id=%s to agent %s (load %d/%d)",
+        worker_id, account_id, agent.agent_id, agent.load + 1, agent.capacity,
+    )
+
+
+async def _spawn_claimed_worker(
+    db: aiosqlite.Connection,
+    account_id: int,
+    user_id: int,
+    session_path: str,
+    generation: int,
+) -> None:
+    session_abs = Path(session_path) if Path(session_path).is_absolute() else (PROJECT_ROOT / session_path).resolve()
+    # Generations never repeat for an account, so ids are unique across API instances and hosts.
+    worker_id = f"w{account_id}-{generation}"
     cmd = [
         sys.executable, "-m", "app.main",
         "db", "run-worker",
         str(user_id),
         str(session_abs),
         "--account-id", str(account_id),
+        "--lease-generation", str(generation),
     ]
-    worker_log_dir = project_root / "data"
-    worker_log_dir.mkdir(parents=True, exist_ok=True)
-    stderr_path = worker_log_dir / f"worker_{account_id}_{worker_id}.log"
-    try:
-        stderr_handle = open(stderr_path, "w", encoding="utf-8")
-    except OSError:
-        stderr_handle = None
-    proc = subprocess.Popen(
-        cmd,
-        cwd=str(project_root),
-        stdout=subprocess.DEVNULL,
-        stderr=stderr_handle if stderr_handle else subprocess.DEVNULL,
-        stdin=subprocess.DEVNULL,
-        creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0,
-    )
-    pid = proc.pid
-    started_at = datetime.now(timezone.utc).isoformat()
-    _workers[worker_id] = {
+    WORKER_LOG_DIR.mkdir(parents=True, exist_ok=True)
+    stderr_path = WORKER_LOG_DIR / f"worker_{account_id}_{worker_id}.log"
+    proc = None
+    pid = None
+    if worker_zygote.running():
+        pid = await worker_zygote.spawn(
+            _zygote_socket_path(),
+            user_id=user_id,
+            session_path=str(session_abs),
+            account_id=account_id,
+            log_path=str(stderr_path),
+            lease_generation=generation,
+        )
+    if pid is None:
+        try:
+            stderr_handle = open(stderr_path, "w", encoding="utf-8")
+        except OSError:
+            stderr_handle = None
+        proc = subprocess.Popen(
+            cmd,
+            cwd=str(PROJECT_ROOT),
+            stdout=subprocess.DEVNULL,
+            stderr=stderr_handle if stderr_handle else subprocess.DEVNULL,
+            stdin=subprocess.DEVNULL,
+            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0,
+        )
+        pid = proc.pid
+    await _register_worker(db, {
         "id": worker_id,
         "user_id": user_id,
         "account_id": account_id,
         "session_path": session_path,
         "process": proc,
         "pid": pid,
-        "started_at": started_at,
-    }
-    await db.execute(
-        "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid) VALUES (?, ?, ?, ?, ?)",
-        (worker_id, user_id, account_id, session_path, pid),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "generation": generation,
+        "host_id": leases.HOST_ID,
+        "agent_id": None,
+        "owned": True,
+    })
+    logger.info(
+        "Spawned worker %s for account_id=%s pid=%s (%s)",
+        worker_id, account_id, pid, "cold start" if proc is not None else "zygote",
     )
-    await db.commit()
-    logger.info("Spawned worker %s for account_id=%s pid=%s", worker_id, account_id, pid)
-    return True
 
 
-async def stop_workers_for_account(account_id: int, db: aiosqlite.Connection) -> None:
+async def stop_workers_for_account(account_id: int) -> None:
     """Stop and remove all workers for a given account_id. Uses worker_registry as source of
-    truth so workers started by other API processes are also stopped. Waits for each process
-    to exit before returning."""
-    async with db.execute(
-        "SELECT worker_id, user_id, session_path, pid FROM worker_registry WHERE account_id = ?",
-        (account_id,),
-    ) as cur:
-        rows = await cur.fetchall()
-    for worker_id, uid, session_path, pid in rows:
-        if not _pid_alive(pid):
-            await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
-            continue
-        try:
-            os.kill(pid, signal.SIGTERM)
-        except OSError:
-            await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
-            continue
-        await _wait_for_pid_exit(pid, timeout_sec=5.0)
-        # Force-kill if still alive after wait (SIGKILL not on Windows)
-        try:
-            os.kill(pid, 0)
-            kill_sig = getattr(signal, "SIGKILL", signal.SIGTERM)
-            os.kill(pid, kill_sig)
-        except OSError:
-            pass
-        if worker_id in _workers:
-            del _workers[worker_id]
-        await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
+    truth so workers started by other API processes or hosts are also stopped. Signals them all,
+    then waits for them to drain and release their leases concurrently. Callers must not hold the
+    writer (see _stop_worker)."""
+    async with sqlite_writer() as db:
+        async with db.execute(
+            f"{_REGISTRY_SELECT} WHERE r.account_id = ?", (time.time(), account_id)
+        ) as cur:
+            rows = await cur.fetchall()
+    # Prefer the in-memory entry: for workers this API spawned it holds the Popen to reap.
+    to_stop = [_workers.pop(row[0], None) or _reattach(row) for row in rows]
     # Also stop any in-memory workers not yet in registry (race)
-    to_stop = [wid for wid, w in _workers.items() if w.get("account_id") == account_id]
-    for wid in to_stop:
-        w = _workers[wid]
-        await _terminate_worker(w)
-        del _workers[wid]
-        await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (wid,))
-    if rows or to_stop:
-        await db.commit()
+    to_stop += [_workers.pop(wid) for wid, w in list(_workers.items()) if w.get("account_id") == account_id]
+    await asyncio.gather(*(_stop_worker(w) for w in to_stop))
+
+
+async def _restart_accounts(account_ids: Iterable[int]) -> None:
+    """Restart (or start) the worker of each account once, after one registry prune. All the old
+    workers drain at once, then the new ones are spawned."""
+    try:
+        ids = list(dict.fromkeys(account_ids))
+        async with sqlite_writer() as db:
+            await _prune_dead_workers(db)
+            await _prune_orphaned_registry_rows(db)
+            async with db.execute(
+                f"SELECT id, user_id, session_path FROM telegram_accounts WHERE status = 'active' "
+                f"AND session_path IS NOT NULL AND session_path != '' AND id IN ({', '.join('?' * len(ids))})",
+                ids,
+            ) as cur:
+                accounts = {r[0]: r for r in await cur.fetchall()}
+        # Always stop first (registry-first stops workers from any API process); ensures
+        # no overlap of old and new workers before spawn.
+        await asyncio.gather(*(stop_workers_for_account(a) for a in accounts))
+        for account_id, user_id, session_path in (accounts[a] for a in ids if a in accounts):
+            try:
+                async with sqlite_writer() as db:
+                    await _spawn_worker_for_account(db, account_id, user_id, session_path)
+            except Exception as e:
+                logger.warning(
+                    "Failed to start/restart worker for account %s after mapping change: %s",
+                    account_id,
+                    e,
+                )
+    except Exception as e:
+        logger.warning("restart_workers_for_accounts failed: %s", e)
+
+
+async def _restart_after(previous: asyncio.Task | None, account_ids: list[int]) -> None:
+    if previous is not None and not previous.done():
+        await asyncio.gather(previous, return_exceptions=True)
+    await _restart_accounts(account_ids)
+
+
+def restart_workers_for_accounts(account_ids: Iterable[int]) -> asyncio.Task:
+    """Restart the workers of `account_ids` in the background, after any earlier restart (see
+    _restart_accounts). Used by mapping edits, which hold the writer: the restart waits for it, and
+    the request does not wait for the drain. N changed mappings on one account cause a single
+    stop/spawn cycle."""
+    global _last_restart
+    task = asyncio.create_task(_restart_after(_last_restart, list(account_ids)), name="restart-workers")
+    _restart_tasks.add(task)
+    task.add_done_callback(_restart_tasks.discard)
+    _last_restart = task
+    return task
 
 
 async def restart_workers_for_mapping(
@@ -303,50 +550,209 @@ async def restart_workers_for_mapping(
     mapping_user_id: int,
     mapping_telegram_account_id: int | None,
 ) -> None:
-    """Restart workers affected by a mapping change. If no worker is running for an account
-    that has mappings, start one so forwarding begins without manual Worker Start."""
-    try:
-        await _prune_dead_workers(db)
-        await _prune_orphaned_registry_rows(db)
-        if mapping_telegram_account_id is not None:
-            account_ids = [mapping_telegram_account_id]
-        else:
+    """Restart workers affected by a mapping change, in the background. If no worker is running for
+    an account that has mappings, start one so forwarding begins without manual Worker Start."""
+    if mapping_telegram_account_id is not None:
+        account_ids = [mapping_telegram_account_id]
+    else:
+        try:
             async with db.execute(
                 "SELECT id FROM telegram_accounts WHERE user_id = ? AND status = 'active' "
                 "AND session_path IS NOT NULL AND session_path != ''",
                 (mapping_user_id,),
             ) as cur:
                 rows = await cur.fetchall()
-            account_ids = [r[0] for r in rows]
-        for account_id in account_ids:
-            async with db.execute(
-                "SELECT user_id, session_path FROM telegram_accounts WHERE id = ? AND status = 'active'",
-                (account_id,),
-            ) as cur:
-                acc_row = await cur.fetchone()
-            if not acc_row or not acc_row[1]:
-                continue
-            user_id, session_path = acc_row[0], acc_row[1]
-            # Always stop first (registry-first stops workers from any API process); ensures
-            # no overlap of old and new workers before spawn.
-            await stop_workers_for_account(account_id, db)
+        except Exception as e:
+            logger.warning("restart_workers_for_mapping failed: %s", e)
+            return
+        account_ids = [r[0] for r in rows]
+    restart_workers_for_accounts(account_ids)
+
+
+async def sync_agent_workers(
+    db: aiosqlite.Connection,
+    agent_id: str,
+    running: list[dict[str, Any]],
+    exited: list[dict[str, Any]],
+) -> tuple[list[dict[str, Any]], list[str]]:
+    """Apply an agent heartbeat: free the leases of workers that exited, renew those still running
+    (the agent heartbeats for its workers), record their relayed runtime heartbeats and collect the
+    ones to stop (stop requested or lease lost). Returns (assignments the agent has not started yet, worker_ids to stop).
+    Only entries matching a worker_registry row of this agent (worker_id, account_id, generation)
+    touch leases and heartbeats; a running worker without one is stopped."""
+    async with db.execute(
+        "SELECT worker_id, account_id, generation FROM worker_registry WHERE agent_id = ?", (agent_id,)
+    ) as cur:
+        placed = {row[0]: (row[1], row[2]) for row in await cur.fetchall()}
+
+    for e in exited:
+        if placed.get(e["worker_id"]) != (e["account_id"], e["generation"]):
+            logger.info("Agent %s reported the exit of worker %s, which is not placed on it", agent_id, e["worker_id"])
+            continue
+        await db.execute(
+            "DELETE FROM worker_registry WHERE worker_id = ? AND agent_id = ?", (e["worker_id"], agent_id)
+        )
+        await leases.release(db, e["account_id"], e["generation"])
+        _workers.pop(e["worker_id"], None)
+        if e.get("error") or e.get("exit_code") not in (None, 0, -signal.SIGTERM):
+            logger.warning(
+                "Worker %s on agent %s exited with status %s %s",
+                e["worker_id"], agent_id, e.get("exit_code"), e.get("error") or "",
+            )
+    await db.commit()
+
+    stop: list[str] = []
+    for r in running:
+        if placed.get(r["worker_id"]) != (r["account_id"], r["generation"]):
+            logger.warning("Worker %s on agent %s is not placed on it; stopping it", r["worker_id"], agent_id)
+            stop.append(r["worker_id"])
+            continue
+        state = await leases.renew(db, r["account_id"], r["generation"])
+        if state is None:
+            logger.warning("Worker %s on agent %s lost its lease; stopping it", r["worker_id"], agent_id)
+        if state is None or state:
+            stop.append(r["worker_id"])
+        if state is not None and r.get("stats"):
+            # Workers on agents write generation 0 (they do not know it); record the lease's.
+            await worker_heartbeats.publish(
+                db, {**r["stats"], "account_id": r["account_id"], "generation": r["generation"]}
+            )
+        if r.get("pid"):
+            await db.execute(
+                "UPDATE worker_registry SET pid = ? WHERE worker_id = ? AND agent_id = ?",
+                (r["pid"], r["worker_id"], agent_id),
+            )
+            if r["worker_id"] in _workers:
+                _workers[r["worker_id"]]["pid"] = r["pid"]
+    await db.commit()
+
+    known = {r["worker_id"] for r in running} | {e["worker_id"] for e in exited}
+    now = time.time()
+    async with db.execute(
+        "SELECT r.worker_id, r.user_id, r.account_id, r.generation, l.stop_requested "
+        "FROM worker_registry r JOIN worker_leases l "
+        "ON l.account_id = r.account_id AND l.generation = r.generation AND l.expires_at > ? "
+        "WHERE r.agent_id = ?",
+        (now, agent_id),
+    ) as cur:
+        rows = await cur.fetchall()
+    assignments: list[dict[str, Any]] = []
+    for worker_id, user_id, account_id, generation, stop_requested in rows:
+        if worker_id in known:
+            continue
+        if stop_requested:
+            # Stopped before the agent started it: nothing to drain.
+            await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
+            await leases.release(db, account_id, generation)
+            _workers.pop(worker_id, None)
+            continue
+        assignments.append(
+            {"worker_id": worker_id, "user_id": user_id, "account_id": account_id, "generation": generation}
+        )
+    return assignments, stop
+
+
+async def replace_lost_agent_workers(db: aiosqlite.Connection) -> int:
+    """Place again the workers of agents that stopped heartbeating (their leases expired). Runs on
+    every agent heartbeat and on restore. Returns how many were placed."""
+    async with db.execute(
+        f"SELECT worker_id, user_id, account_id FROM worker_registry "
+        f"WHERE agent_id IS NOT NULL AND {leases.REGISTRY_ROW_ORPHANED}",
+        (time.time(),),
+    ) as cur:
+        rows = await cur.fetchall()
+    placed = 0
+    for worker_id, user_id, account_id in rows:
+        _workers.pop(worker_id, None)
+        async with db.execute(
+            "SELECT session_path FROM telegram_accounts WHERE id = ? AND status = 'active'", (account_id,)
+        ) as cur:
+            acc_row = await cur.fetchone()
+        if not acc_row or not acc_row[0]:
+            await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
+            await db.commit()
+            continue
+        try:
+            if await _spawn_worker_for_account(db, account_id, user_id, acc_row[0]):
+                placed += 1
+                logger.info("Re-placed worker %s (account_id=%s) of a lost agent", worker_id, account_id)
+        except HTTPException as e:
+            logger.debug("Workers of lost agents wait for capacity: %s", e.detail)
+            break
+        except Exception as e:
+            logger.warning("Could not re-place worker %s of a lost agent: %s", worker_id, e)
+    return placed
+
+
+async def restart_stale_workers(db: aiosqlite.Connection) -> list[int]:
+    """Restart the workers whose lease is live but whose runtime heartbeat is older than
+    WORKER_STALE_SECONDS: the lease alone misses a worker whose agent renews it, or one stuck in a
+    handler while the loop still turns. A worker that has not heartbeated yet is measured from its
+    registry row. Returns the restarted account ids."""
+    if settings.worker_stale_seconds <= 0:
+        return []
+    now = time.time()
+    async with db.execute(
+        "SELECT r.account_id, r.worker_id, "
+        "MAX(COALESCE(h.updated_at, 0), CAST(strftime('%s', r.created_at) AS REAL)) AS seen "
+        "FROM worker_registry r "
+        "JOIN worker_leases l ON l.account_id = r.account_id AND l.generation = r.generation "
+        "AND l.expires_at > ? AND l.stop_requested = 0 "
+        "LEFT JOIN worker_heartbeats h ON h.account_id = r.account_id "
+        "WHERE seen < ?",
+        (now, now - settings.worker_stale_seconds),
+    ) as cur:
+        rows = await cur.fetchall()
+    for account_id, worker_id, seen in rows:
+        logger.warning(
+            "Worker %s (account_id=%s) has not heartbeated for %.0fs; restarting it",
+            worker_id, account_id, now - seen,
+        )
+    account_ids = [r[0] for r in rows]
+    if account_ids:
+        await _restart_accounts(account_ids)
+    return account_ids
+
+
+async def _supervise_workers() -> None:
+    db = await get_sqlite()
+    try:
+        while True:
+            await asyncio.sleep(max(settings.worker_heartbeat_seconds, 1.0) * 2)
             try:
-                await _spawn_worker_for_account(db, account_id, user_id, session_path)
+                await restart_stale_workers(db)
             except Exception as e:
-                logger.warning(
-                    "Failed to start/restart worker for account %s after mapping change: %s",
-                    account_id,
-                    e,
-                )
-    except Exception as e:
-        logger.warning("restart_workers_for_mapping failed: %s", e)
+                logger.warning("Stale worker check failed: %s", e)
+    finally:
+        await db.close()
+
+
+def start_worker_supervisor() -> None:
+    """Start the background check that restarts workers with a stale runtime heartbeat."""
+    global _supervisor_task
+    if _supervisor_task is None and settings.worker_stale_seconds > 0:
+        _supervisor_task = asyncio.create_task(_supervise_workers(), name="worker-supervisor")
+
+
+async def stop_worker_supervisor() -> None:
+    global _supervisor_task
+    task, _supervisor_task = _supervisor_task, None
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
 
 
 @router.get("")
-async def list_workers(user: CurrentUser, db: Db) -> list[dict]:
+async def list_workers(user: CurrentUser, db: ReadDb) -> list[dict]:
     """List running workers. Uses worker_registry as source of truth; reattaches workers
     missing from in-memory state. Dead workers are pruned."""
-    await _prune_dead_workers(db)
+    if _workers:
+        async with sqlite_writer() as wdb:
+            await _prune_dead_workers(wdb)
     items, in_registry, reattached, pruned = await _list_workers_from_registry(db, user)
     if reattached > 0 or pruned > 0:
         logger.info(
@@ -368,7 +774,7 @@ async def list_workers(user: CurrentUser, db: Db) -> list[dict]:
 @router.post("/start")
 async def start_worker(
     user: CurrentUser,
-    db: Db,
+    db: ReadDb,
     account_id: int,
     user_id: int | None = None,
 ) -> dict:
@@ -396,34 +802,18 @@ async def start_worker(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Account has no session path (bot accounts cannot run workers)",
         )
-    await _prune_dead_workers(db)
-    await _prune_orphaned_registry_rows(db)
     session_path = row[2]
-    # Check in-memory registry
-    if _account_has_running_worker(account_id):
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Worker already running for this account",
-        )
-    # Check persistent registry (orphans from prior API run). Prune dead entries.
-    async with db.execute(
-        "SELECT worker_id, pid FROM worker_registry WHERE account_id = ?", (account_id,)
-    ) as cur:
-        reg_rows = await cur.fetchall()
-    for worker_id, reg_pid in reg_rows:
-        try:
-            os.kill(reg_pid, 0)
-        except OSError:
-            # Process is dead; remove stale row so we can start a new worker
-            await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
-            continue
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Worker already running for this account",
-        )
-    if reg_rows:
-        await db.commit()
-    spawned = await _spawn_worker_for_account(db, account_id, target_user, session_path)
+    async with sqlite_writer() as wdb:
+        await _prune_dead_workers(wdb)
+        await _prune_orphaned_registry_rows(wdb)
+        # A live lease means a worker runs for this account (here, on another API instance or host).
+        lease = await leases.get_lease(wdb, account_id)
+        if lease is not None and lease.live():
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Worker already running for this account",
+            )
+        spawned = await _spawn_worker_for_account(wdb, account_id, target_user, session_path)
     if not spawned:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -444,92 +834,65 @@ async def start_worker(
 async def stop_worker(
     worker_id: str,
     user: CurrentUser,
-    db: Db,
+    db: ReadDb,
 ) -> dict:
-    """Stop a running worker."""
+    """Stop a running worker. Waits for its drain without holding the writer."""
     if worker_id not in _workers:
         # Worker may have been listed by another API instance; try to reattach from registry
-        async with db.execute(
-            "SELECT worker_id, user_id, account_id, session_path, pid, created_at FROM worker_registry WHERE worker_id = ?",
-            (worker_id,),
-        ) as cur:
+        async with db.execute(f"{_REGISTRY_SELECT} WHERE r.worker_id = ?", (time.time(), worker_id)) as cur:
             row = await cur.fetchone()
         if row:
-            _, uid, account_id, session_path, pid, created_at = row
-            if user["role"] != "admin" and uid != user["id"]:
+            if user["role"] != "admin" and row[1] != user["id"]:
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-            if _pid_alive(pid):
-                started_at = created_at
-                if created_at and "T" not in str(created_at) and "Z" not in str(created_at) and "+" not in str(created_at):
-                    started_at = str(created_at).replace(" ", "T") + "Z"
-                _workers[worker_id] = {
-                    "id": worker_id,
-                    "user_id": uid,
-                    "account_id": account_id,
-                    "session_path": session_path,
-                    "process": None,
-                    "pid": pid,
-                    "started_at": started_at,
-                }
+            if row[8]:
+                _workers[worker_id] = _reattach(row)
             else:
-                await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
-                await db.commit()
+                async with sqlite_writer() as wdb:
+                    await wdb.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
+                    await wdb.commit()
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Worker not found (already stopped)")
         else:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Worker not found")
     w = _workers[worker_id]
     if user["role"] != "admin" and w["user_id"] != user["id"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-    await _terminate_worker(w)
-    del _workers[worker_id]
-    await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
-    await db.commit()
+    await _stop_worker(w)
+    _workers.pop(worker_id, None)  # an agent heartbeat reporting the exit may have removed it already
     return {"status": "ok"}
 
 
 async def restore_workers_from_db(db: aiosqlite.Connection) -> None:
-    """Restore workers from worker_registry. Reattach orphans (alive PIDs); for dead PIDs
-    (e.g. after graceful shutdown), spawn new workers. Only accounts that had workers get them back."""
-    global _worker_counter
-    async with db.execute(
-        "SELECT worker_id, user_id, account_id, session_path, pid, created_at FROM worker_registry"
-    ) as cur:
+    """Restore workers from worker_registry. Reattach workers whose lease is live (adopting those on
+    this host, so this API supervises them); for expired or released leases (e.g. after graceful
+    shutdown), claim and spawn new workers. Only accounts that had workers get them back."""
+    async with db.execute(_REGISTRY_SELECT, (time.time(),)) as cur:
         rows = await cur.fetchall()
-    max_num = 0
     for row in rows:
-        worker_id, user_id, account_id, session_path, pid = row[0], row[1], row[2], row[3], row[4]
-        created_at = row[5]
-        try:
-            os.kill(pid, 0)
-        except OSError:
+        worker_id, user_id, account_id, session_path = row[0], row[1], row[2], row[3]
+        if not row[8] and row[9]:
+            continue  # placed on a lost agent: re-placed below
+        if not row[8]:
             await db.execute("DELETE FROM worker_registry WHERE worker_id = ?", (worker_id,))
             await _spawn_worker_for_account(db, account_id, user_id, session_path)
             continue
-        # Normalize SQLite datetime to ISO UTC for frontend
-        started_at = created_at
-        if created_at and "T" not in created_at and "Z" not in created_at and "+" not in created_at:
-            started_at = created_at.replace(" ", "T") + "Z"
-        _workers[worker_id] = {
-            "id": worker_id,
-            "user_id": user_id,
-            "account_id": account_id,
-            "session_path": session_path,
-            "process": None,
-            "pid": pid,
-            "started_at": started_at,
-        }
-        if worker_id.startswith("w") and worker_id[1:].isdigit():
-            max_num = max(max_num, int(worker_id[1:]))
-    _worker_counter = max_num
+        w = _reattach(row)
+        if w["host_id"] == leases.HOST_ID and not w["agent_id"]:
+            w["owned"] = await leases.adopt(db, account_id, w["generation"])
+        _workers[worker_id] = w
     await db.commit()
-
-
-async def terminate_all_workers(db: aiosqlite.Connection) -> None:
-    """Terminate all workers on API shutdown. Keep worker_registry rows so restore can
-    spawn workers for these accounts on next startup."""
-    to_stop = list(_workers.items())
-    for wid, w in to_stop:
-        await _terminate_worker(w)
-        del _workers[wid]
-    if to_stop:
-        await db.commit()
+    await replace_lost_agent_workers(db)
+
+
+async def terminate_all_workers() -> None:
+    """Stop the workers this API supervises on shutdown (workers of other API instances or hosts
+    keep running). Pending background restarts are cancelled. Keep worker_registry rows so restore
+    can spawn workers for these accounts on next startup."""
+    global _last_restart
+    _last_restart = None
+    for task in list(_restart_tasks):
+        task.cancel()
+    await asyncio.gather(*_restart_tasks, return_exceptions=True)
+    to_stop = [w for w in _workers.values() if w.get("owned")]
+    # Drain concurrently so shutdown takes one drain deadline, not one per worker.
+    await asyncio.gather(*(_stop_worker(w, forget=False) for w in to_stop))
+    _workers.clear()
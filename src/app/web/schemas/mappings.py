@@ -4,6 +4,8 @@ from __future__ import annotations
 
 from pydantic import BaseModel
 
+from app.web.schemas.schedules import ScheduleUpdate
+
 
 class MappingFilterCreate(BaseModel):
     include_text: str | None = None
@@ -96,3 +98,22 @@ class ChannelMappingResponse(BaseModel):
     enabled: bool
     telegram_account_id: int | None
     created_at: str | None
+
+
+class MappingBulkItem(BaseModel):
+    """One mapping of a bulk import, with its filters, transforms and schedule override nested."""
+
+    source_chat_id: int
+    dest_chat_id: int
+    name: str | None = None
+    telegram_account_id: int | None = None
+    source_chat_title: str | None = None
+    dest_chat_title: str | None = None
+    enabled: bool = True
+    filters: list[MappingFilterCreate] = []
+    transforms: list[MappingTransformCreate] = []
+    schedule: ScheduleUpdate | None = None
+
+
+class MappingBulkImport(BaseModel):
+    mappings: list[MappingBulkItem]
@@ -1,21 +1,32 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
 import os
+import queue
 import shutil
+import threading
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
 from app.config import settings
+from app.db import leases, worker_heartbeats
 from app.db.mongo import get_mongo_db
 from app.db.sqlite import get_sqlite, init_sqlite
-from app.services.mapping_service import list_enabled_mappings
+from app.services.mapping_service import list_enabled_mappings, mappings_from_snapshot
+from app.services.profiling import serve_worker_profiles
 from app.worker_log_handler import MongoWorkerLogHandler, test_mongo_connection
 from app.telegram.client_manager import attach_handler, start_user_client
 from app.telegram.handlers import build_message_handler
+from app.utils import startup_profile
+from app.worker_drain import EXIT_DRAIN_INCOMPLETE, EXIT_OK, Drain
+from app.worker_stats import FloodWaitRecorder, WorkerStats
 
 logger = logging.getLogger(__name__)
 
+LOG_FLUSH_TIMEOUT_SECONDS = 5.0
+
 
 def _worker_session_path(session_path: str) -> str:
     """Use a unique copy of the session per worker process to avoid 'database is locked'
@@ -34,11 +45,76 @@ def _worker_session_path(session_path: str) -> str:
         return str(path)
 
 
+def _stop_listener(listener: QueueListener) -> None:
+    """Flush queued log records to Mongo, but never hold up exit for longer than
+    LOG_FLUSH_TIMEOUT_SECONDS (each record can wait out a server selection timeout)."""
+    stopper = threading.Thread(target=listener.stop, daemon=True)
+    stopper.start()
+    stopper.join(LOG_FLUSH_TIMEOUT_SECONDS)
+
+
+def _log_mongo_check(task: asyncio.Task) -> None:
+    if task.cancelled():
+        return
+    err, db_name = task.result()
+    if err:
+        logger.warning("MongoDB worker_logs disabled (connection failed): %s", err)
+    else:
+        logger.info("MongoDB worker_logs connected OK (database: %s)", db_name)
+
+
+async def _hold_lease(db, account_id: int, generation: int, drain: Drain) -> None:
+    """Renew the worker lease every WORKER_HEARTBEAT_SECONDS. Requests a drain when the API asks for
+    a stop or the lease is lost; keeps renewing while draining so the account cannot be claimed by
+    another worker in the meantime."""
+    while True:
+        try:
+            stop = await leases.renew(db, account_id, generation)
+        except Exception as e:
+            logger.warning("Worker lease heartbeat failed (will retry): %s", e)
+        else:
+            if stop is None:
+                logger.warning("Worker lease lost (account_id=%s generation=%s); stopping", account_id, generation)
+                drain.requested.set()
+                return
+            if stop and not drain.requested.is_set():
+                logger.info("Stop requested through the worker lease")
+                drain.requested.set()
+        await asyncio.sleep(settings.worker_heartbeat_seconds)
+
+
+async def _publish_heartbeat(
+    db, account_id: int, generation: int, stats: WorkerStats, drain: Drain, log_queue: queue.SimpleQueue | None
+) -> None:
+    """Write the runtime heartbeat every WORKER_HEARTBEAT_SECONDS (worker_heartbeats). A remote
+    agent's worker does not know its lease generation and writes 0; the agent relays it."""
+    while True:
+        try:
+            await worker_heartbeats.publish(db, {
+                "account_id": account_id,
+                "generation": generation,
+                "host_id": leases.HOST_ID,
+                **stats.snapshot(
+                    inflight=len(drain.inflight()),
+                    log_queue=log_queue.qsize() if log_queue is not None else None,
+                ),
+            })
+        except Exception as e:
+            logger.warning("Worker runtime heartbeat failed (will retry): %s", e)
+        await asyncio.sleep(settings.worker_heartbeat_seconds)
+
+
 async def run_worker(
     user_id: int,
     session_path: str,
     telegram_account_id: int | None = None,
-) -> None:
+    lease_generation: int | None = None,
+    mappings_snapshot: str | None = None,
+) -> int:
+    """Run until Telegram disconnects or a drain is requested (SIGTERM, or a stop through the
+    lease). Returns the exit status. With lease_generation (set by the API), the worker heartbeats
+    that lease from startup on and releases it on exit. With mappings_snapshot (a JSON file written
+    by a remote agent, which holds the lease through the API), mappings are not read from SQLite."""
     level = getattr(logging, settings.log_level.upper(), logging.INFO)
     fmt = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
     logging.basicConfig(level=level, format=fmt)
@@ -53,27 +129,60 @@ async def run_worker(
     except Exception:
         pass  # non-fatal
 
+    stats = WorkerStats(
+        trace_sample_rate=settings.trace_sample_rate, slow_callback_seconds=settings.slow_callback_seconds
+    )
+    FloodWaitRecorder(stats).install()
+    mongo_listener: QueueListener | None = None
+    log_queue: queue.SimpleQueue | None = None
     try:
-        mongo_handler = MongoWorkerLogHandler(user_id=user_id, account_id=telegram_account_id)
+        mongo_handler = MongoWorkerLogHandler(
+            user_id=user_id, account_id=telegram_account_id, metrics=stats.metrics
+        )
         mongo_handler.setLevel(level)
         mongo_handler.setFormatter(logging.Formatter("%(message)s"))
-        logging.getLogger().addHandler(mongo_handler)
-        # Test MongoDB connectivity; log result so user sees it in worker.log
-        err, db_name = test_mongo_connection()
-        if err:
-            logger.warning("MongoDB worker_logs disabled (connection failed): %s", err)
-        else:
-            logger.info("MongoDB worker_logs connected OK (database: %s)", db_name)
+        # Log calls only enqueue; a listener thread does the Mongo writes, so a slow or unreachable
+        # Mongo never stalls startup or the event loop.
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.setLevel(level)
+        mongo_listener = QueueListener(log_queue, mongo_handler, respect_handler_level=True)
+        mongo_listener.start()
+        logging.getLogger().addHandler(queue_handler)
     except Exception as e:
         logger.warning("MongoDB worker_logs handler skipped: %s", e)
+    # Test MongoDB connectivity (up to the 5 s server selection timeout when it is down) alongside
+    # the SQLite and Telegram startup rather than before it; the result lands in worker.log.
+    mongo_check = asyncio.create_task(asyncio.to_thread(test_mongo_connection))
+    mongo_check.add_done_callback(_log_mongo_check)
 
+    drain = Drain()
+    db = None
+    lease_task: asyncio.Task | None = None
+    stats_tasks: list[asyncio.Task] = []
+    leased = lease_generation is not None and telegram_account_id is not None
     try:
-        await init_sqlite()
+        with startup_profile.phase("init sqlite"):
+            await init_sqlite()
         mongo_db = get_mongo_db()
         db = await get_sqlite()
-        mappings = list(
-            await list_enabled_mappings(db, user_id, telegram_account_id=telegram_account_id)
-        )
+        if leased:
+            lease_task = asyncio.create_task(_hold_lease(db, telegram_account_id, lease_generation, drain))
+        if telegram_account_id is not None:
+            stats_tasks = [
+                asyncio.create_task(stats.sample_loop_lag()),
+                asyncio.create_task(_publish_heartbeat(
+                    db, telegram_account_id, lease_generation or 0, stats, drain, log_queue
+                )),
+                asyncio.create_task(serve_worker_profiles(db, telegram_account_id)),
+            ]
+        with startup_profile.phase("load mappings"):
+            if mappings_snapshot:
+                mappings = mappings_from_snapshot(json.loads(Path(mappings_snapshot).read_text(encoding="utf-8")))
+            else:
+                mappings = list(
+                    await list_enabled_mappings(db, user_id, telegram_account_id=telegram_account_id)
+                )
 
         source_ids = sorted({m.source_chat_id for m in mappings})
         logger.info(
@@ -85,31 +194,72 @@ async def run_worker(
 
         worker_session = _worker_session_path(session_path)
         logger.debug("Using worker session copy: %s", worker_session)
-        client = await start_user_client(worker_session)
+        with startup_profile.phase("connect telegram"):
+            client = await start_user_client(worker_session)
         logger.info("Connected to Telegram: user_id=%s account_id=%s", user_id, telegram_account_id)
-        handler = build_message_handler(user_id=user_id, mappings=mappings, db=db, mongo_db=mongo_db)
-        attach_handler(client, handler)
+        handler = build_message_handler(user_id=user_id, mappings=mappings, db=db, mongo_db=mongo_db, stats=stats)
+        attach_handler(client, drain.wrap(handler))
+        drain.install_signal_handlers()
+        startup_profile.report()
+
+        running = asyncio.ensure_future(client.run_until_disconnected())
+        stop = asyncio.ensure_future(drain.requested.wait())
+        await asyncio.wait({running, stop}, return_when=asyncio.FIRST_COMPLETED)
+        if not stop.done():
+            stop.cancel()
+            await running
+            logger.info("Worker disconnected: user_id=%s account_id=%s (Telegram client closed)", user_id, telegram_account_id)
+            return EXIT_OK
 
-        await client.run_until_disconnected()
-        logger.info("Worker disconnected: user_id=%s account_id=%s (Telegram client closed)", user_id, telegram_account_id)
+        timeout = settings.worker_drain_timeout_seconds
+        logger.info("Worker draining: user_id=%s account_id=%s deadline=%.1fs", user_id, telegram_account_id, timeout)
+        clean = await drain.drain(timeout)
+        await client.disconnect()
+        try:
+            await running
+        except Exception as e:
+            logger.debug("Telegram client closed with error during drain: %s", e)
+        logger.info(
+            "Worker drained: user_id=%s account_id=%s clean=%s skipped_updates=%d",
+            user_id, telegram_account_id, clean, drain.skipped,
+        )
+        return EXIT_OK if clean else EXIT_DRAIN_INCOMPLETE
     except Exception as e:
         logger.exception(
             "Worker exited with uncaught exception: user_id=%s account_id=%s: %s",
             user_id, telegram_account_id, e,
         )
         raise
+    finally:
+        if lease_task is not None:
+            lease_task.cancel()
+        for task in stats_tasks:
+            task.cancel()
+        if db is not None:
+            try:
+                if leased:
+                    await leases.release(db, telegram_account_id, lease_generation)
+                await db.close()
+            except Exception as e:
+                logger.warning("Could not release worker lease / close SQLite: %s", e)
+        if mongo_listener is not None:
+            _stop_listener(mongo_listener)
 
 
 def run_worker_sync(
     user_id: int,
     session_path: str,
     telegram_account_id: int | None = None,
-) -> None:
-    asyncio.run(
+    lease_generation: int | None = None,
+    mappings_snapshot: str | None = None,
+) -> int:
+    return asyncio.run(
         run_worker(
             user_id=user_id,
             session_path=session_path,
             telegram_account_id=telegram_account_id,
+            lease_generation=lease_generation,
+            mappings_snapshot=mappings_snapshot,
         )
     )
 
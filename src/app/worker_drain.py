@@ -0,0 +1,85 @@
+"""Graceful drain for a running worker.
+
+On SIGTERM the worker stops taking new updates, lets in-flight handler calls (send, reply index
+write, message log) finish within WORKER_DRAIN_TIMEOUT_SECONDS, then disconnects and flushes its
+log sinks. Messages still in flight at the deadline are logged so they can be checked by hand.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Exit statuses of `tg-copier db run-worker`; the API logs them when it stops a worker.
+EXIT_OK = 0
+EXIT_DRAIN_INCOMPLETE = 75  # EX_TEMPFAIL: drain deadline passed with messages still in flight
+
+
+def _event_label(event: Any) -> str:
+    message = getattr(event, "message", None)
+    return f"chat {getattr(event, 'chat_id', '?')} msg {getattr(message, 'id', '?')}"
+
+
+class Drain:
+    """Tracks in-flight handler calls and turns away new ones once draining starts."""
+
+    def __init__(self) -> None:
+        self.requested = asyncio.Event()
+        self.skipped = 0
+        self._draining = False
+        self._inflight: dict[int, str] = {}
+        self._next_id = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    def inflight(self) -> list[str]:
+        return list(self._inflight.values())
+
+    def wrap(self, handler: Callable[[Any], Awaitable[None]]) -> Callable[[Any], Awaitable[None]]:
+        async def _drained_handler(event: Any) -> None:
+            if self._draining:
+                self.skipped += 1
+                return
+            self._next_id += 1
+            call_id = self._next_id
+            self._inflight[call_id] = _event_label(event)
+            self._idle.clear()
+            try:
+                await handler(event)
+            finally:
+                del self._inflight[call_id]
+                if not self._inflight:
+                    self._idle.set()
+
+        return _drained_handler
+
+    def install_signal_handlers(self) -> None:
+        """Request a drain on SIGTERM/SIGINT (no-op where the loop cannot handle signals)."""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.requested.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop accepting updates and wait for in-flight calls. Returns True if all finished."""
+        self._draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Drain deadline (%.1fs) passed with %d message(s) in flight: %s",
+                timeout, len(self._inflight), "; ".join(self.inflight()),
+            )
+            return False
+        return True
@@ -4,11 +4,13 @@ from __future__ import annotations
 
 import logging
 import sys
+import time
 from datetime import datetime, timezone
 from typing import Any
 
 from app.config import settings
 from app.services.app_settings import get_setting_sync
+from app.utils.metrics import Registry
 
 
 def _resolve_mongo_uri() -> str:
@@ -24,10 +26,11 @@ def _resolve_mongo_db() -> str:
 class MongoWorkerLogHandler(logging.Handler):
     """Logging handler that writes worker logs to MongoDB worker_logs collection."""
 
-    def __init__(self, user_id: int, account_id: int | None = None):
+    def __init__(self, user_id: int, account_id: int | None = None, metrics: Registry | None = None):
         super().__init__()
         self._user_id = user_id
         self._account_id = account_id
+        self._metrics = metrics  # records the insert latency (tgcopier_db_write_seconds)
 
     def emit(self, record: logging.LogRecord) -> None:
         try:
@@ -35,7 +38,7 @@ class MongoWorkerLogHandler(logging.Handler):
 
             uri = _resolve_mongo_uri()
             db_name = _resolve_mongo_db()
-            client = MongoClient(uri)
+            client = MongoClient(uri, serverSelectionTimeoutMS=5000)
             db = client[db_name]
             doc: dict[str, Any] = {
                 "user_id": self._user_id,
@@ -44,7 +47,12 @@ class MongoWorkerLogHandler(logging.Handler):
                 "message": self.format(record),
                 "timestamp": datetime.now(timezone.utc),
             }
+            start = time.perf_counter()
             db.worker_logs.insert_one(doc)
+            if self._metrics is not None:
+                self._metrics.observe(
+                    "tgcopier_db_write_seconds", time.perf_counter() - start, store="mongo", op="worker_log"
+                )
             client.close()
         except Exception as e:
             print(
@@ -57,14 +65,19 @@ def test_mongo_connection() -> tuple[str | None, str]:
     """Test MongoDB write. Returns (error_message, db_name). error_message is None on success."""
     try:
         from pymongo import MongoClient
+        from pymongo.errors import OperationFailure
 
         uri = _resolve_mongo_uri()
         db_name = _resolve_mongo_db()
         client = MongoClient(uri, serverSelectionTimeoutMS=5000)
         db = client[db_name]
-        doc = {"_test": True, "source": "worker_log_handler"}
+        # timestamp is required when worker_logs is a time-series collection
+        doc = {"_test": True, "source": "worker_log_handler", "timestamp": datetime.now(timezone.utc)}
         db.worker_logs.insert_one(doc)
-        db.worker_logs.delete_one({"_test": True})
+        try:
+            db.worker_logs.delete_one({"_test": True})
+        except OperationFailure:
+            pass  # time-series deletes by non-meta fields need MongoDB 7.0+; retention expires it
         client.close()
         return (None, db_name)
     except Exception as e:
@@ -0,0 +1,150 @@
+"""In-process runtime stats of a worker, published as its heartbeat (app.db.worker_heartbeats).
+
+The message handler records updates, sends, per-mapping outcomes and per-mapping copy latency
+histograms (plain dict increments, no locking: everything runs on the worker's event loop), and
+stage latencies, send errors and flood waits into `metrics` (app.utils.metrics, shared with the
+Mongo log thread). snapshot() adds event-loop lag and slow-callback reports
+(app.utils.loop_monitor), RSS and CPU time and is written every
+WORKER_HEARTBEAT_SECONDS, together with the message traces sampled by `tracer`
+(app.worker_traces). The latency histograms are cumulative; publishing adds their growth to the
+hourly rollups in app.db.latency_rollups.
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import sys
+import time
+from typing import Any
+
+from app.utils.loop_monitor import LAG_SAMPLE_SECONDS, LoopMonitor
+from app.utils.metrics import COPY_LATENCY_BUCKETS, Registry
+from app.worker_traces import MessageTrace, Tracer
+
+OUTCOMES = ("in", "out", "filtered", "failed")
+
+
+def rss_bytes() -> int | None:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class WorkerStats:
+    def __init__(self, trace_sample_rate: float = 0.0, slow_callback_seconds: float = 0.0) -> None:
+        self.started_at = time.time()
+        self.last_update_at: float | None = None
+        self.last_send_at: float | None = None
+        self.mappings: dict[int, dict[str, int]] = {}
+        # mapping_id -> [count per COPY_LATENCY_BUCKETS bucket..., count above the last, sum]
+        self.latency: dict[int, list[float]] = {}
+        self.metrics = Registry()
+        self.tracer = Tracer(trace_sample_rate)
+        self.loop_monitor = LoopMonitor(self.metrics, slow_callback_seconds)
+
+    def update_received(self) -> None:
+        self.last_update_at = time.time()
+
+    def count(self, mapping_id: int, outcome: str) -> None:
+        counters = self.mappings.get(mapping_id)
+        if counters is None:
+            counters = self.mappings[mapping_id] = dict.fromkeys(OUTCOMES, 0)
+        counters[outcome] += 1
+        if outcome == "out":
+            self.last_send_at = time.time()
+
+    def lap(self, stage: str, since: float, trace: MessageTrace | None = None, mapping_id: int | None = None) -> float:
+        """Record the time since `since` (perf_counter) as a handler stage, and as a span of a
+        sampled message's trace; returns the end time."""
+        now = time.perf_counter()
+        self.metrics.observe("tgcopier_handler_stage_seconds", now - since, stage=stage)
+        if trace is not None:
+            trace.span(stage, since, now, mapping_id)
+        return now
+
+    def sent(self, message_time: float, mapping_id: int | None = None) -> None:
+        """End-to-end copy latency of a completed send (message_time: source message epoch)."""
+        latency = max(time.time() - message_time, 0.0)
+        self.metrics.observe("tgcopier_copy_latency_seconds", latency)
+        if mapping_id is not None:
+            h = self.latency.get(mapping_id)
+            if h is None:
+                h = self.latency[mapping_id] = [0.0] * (len(COPY_LATENCY_BUCKETS) + 2)
+            h[bisect.bisect_left(COPY_LATENCY_BUCKETS, latency)] += 1
+            h[-1] += latency
+
+    def send_failed(self, error: BaseException) -> None:
+        self.metrics.inc("tgcopier_send_errors_total", error=type(error).__name__)
+
+    def flood_wait(self, seconds: float) -> None:
+        self.metrics.inc("tgcopier_floodwaits_total")
+        self.metrics.inc("tgcopier_floodwait_seconds_total", float(seconds))
+
+    def db_write(self, store: str, op: str, seconds: float) -> None:
+        self.metrics.observe("tgcopier_db_write_seconds", seconds, store=store, op=op)
+
+    async def sample_loop_lag(self, interval: float = LAG_SAMPLE_SECONDS) -> None:
+        """Run forever, keeping the largest sleep overshoot since the last snapshot (and watching
+        for slow callbacks when enabled)."""
+        await self.loop_monitor.run(interval)
+
+    def snapshot(self, inflight: int | None = None, log_queue: int | None = None) -> dict[str, Any]:
+        """Heartbeat fields (without account/generation); resets the loop-lag maximum and hands
+        over the traces sampled since the previous snapshot. inflight and log_queue are the
+        worker's messages in flight and Mongo log queue depth, which it tracks elsewhere."""
+        lag = self.loop_monitor.take_max_lag()
+        return {
+            "pid": os.getpid(),
+            "updated_at": time.time(),
+            "started_at": self.started_at,
+            "last_update_at": self.last_update_at,
+            "last_send_at": self.last_send_at,
+            "loop_lag_ms": round(lag * 1000, 1),
+            "slow_callbacks": list(self.loop_monitor.slow_callbacks),
+            "rss_bytes": rss_bytes(),
+            "cpu_seconds": round(time.process_time(), 3),
+            "mappings": {str(k): dict(v) for k, v in self.mappings.items()},
+            "metrics": self.metrics.snapshot(),
+            "latency": {str(k): list(v) for k, v in self.latency.items()},
+            "traces": self.tracer.drain(),
+            "inflight": inflight,
+            "log_queue": log_queue,
+        }
+
+
+class FloodWaitRecorder(logging.Filter):
+    """Counts the flood waits Telethon sleeps through by itself (up to flood_sleep_threshold), which
+    never reach the handler as FloodWaitError: Telethon only logs them, at INFO, from
+    telethon.client.users. install() lowers that logger to INFO; records below the root level are
+    dropped here again so the worker log does not change."""
+
+    LOGGER = "telethon.client.users"
+
+    def __init__(self, stats: WorkerStats) -> None:
+        super().__init__()
+        self.stats = stats
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.msg, str) and record.msg.endswith("flood wait") and len(record.args or ()) > 1:
+            try:
+                self.stats.flood_wait(float(record.args[1]))
+            except (TypeError, ValueError):
+                pass
+        return logging.getLogger().isEnabledFor(record.levelno)
+
+    def install(self) -> None:
+        telethon_logger = logging.getLogger(self.LOGGER)
+        if not telethon_logger.isEnabledFor(logging.INFO):
+            telethon_logger.setLevel(logging.INFO)
+        telethon_logger.addFilter(self)
@@ -0,0 +1,79 @@
+"""Sampled per-message traces of the worker's message handler.
+
+With TRACE_SAMPLE_RATE > 0, a sampled message gets a MessageTrace: one span per mapping (its
+outcome) and one per handler stage inside it (filter, transform, reply_lookup, send, index,
+dest_title, message_log), taken from the same perf_counter laps that feed the stage histograms.
+Finished traces wait in a bounded buffer and go out with the next runtime heartbeat
+(app.db.message_traces). Unsampled messages cost one random() call.
+"""
+
+from __future__ import annotations
+
+import random
+import secrets
+import time
+from collections import deque
+from typing import Any
+
+# Sampled traces kept between two heartbeats; beyond this the oldest are dropped.
+PENDING_TRACES = 200
+
+# Message outcome: the most significant outcome of its mappings.
+_OUTCOME_RANK = {"failed": 3, "sent": 2, "filtered": 1}
+
+
+class MessageTrace:
+    __slots__ = ("trace_id", "started_at", "_t0", "attributes", "spans", "outcome")
+
+    def __init__(self, **attributes: Any) -> None:
+        self.trace_id = secrets.token_hex(16)
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.attributes = attributes
+        self.spans: list[dict[str, Any]] = []
+        self.outcome = "no_mapping"
+
+    def span(self, name: str, start: float, end: float, mapping_id: int | None = None, **attributes: Any) -> None:
+        """Record a span between two perf_counter readings."""
+        self.spans.append({
+            "name": name,
+            "mapping_id": mapping_id,
+            "offset_ms": round((start - self._t0) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+            "attributes": attributes,
+        })
+
+    def mapping_done(self, mapping_id: int, outcome: str, start: float) -> None:
+        self.span("mapping", start, time.perf_counter(), mapping_id, outcome=outcome)
+        if _OUTCOME_RANK.get(outcome, 0) > _OUTCOME_RANK.get(self.outcome, 0):
+            self.outcome = outcome
+
+    def record(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "duration_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "outcome": self.outcome,
+            "attributes": self.attributes,
+            "spans": self.spans,
+        }
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0, pending: int = PENDING_TRACES) -> None:
+        self.sample_rate = sample_rate
+        self.pending: deque[dict[str, Any]] = deque(maxlen=pending)
+
+    def start(self, **attributes: Any) -> MessageTrace | None:
+        """A trace for this message, or None if it is not sampled."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        return MessageTrace(**attributes)
+
+    def finish(self, trace: MessageTrace) -> None:
+        self.pending.append(trace.record())
+
+    def drain(self) -> list[dict[str, Any]]:
+        traces = list(self.pending)
+        self.pending.clear()
+        return traces
@@ -0,0 +1,272 @@
+"""Pre-forked worker zygote: a process that has already imported the worker (Telethon, Motor,
+pydantic settings) and forks a ready worker per "run" request on a local Unix socket.
+
+The API starts one zygote (`tg-copier db worker-zygote`) and asks it for workers; a forked worker
+skips interpreter start and imports, so spawn-to-handler time is mostly the Telegram connect.
+POSIX only; callers fall back to a cold `python -m app.main db run-worker` when spawn() returns None.
+
+Protocol: one JSON line per connection, answered by one JSON line.
+  {"cmd": "run", "user_id": 1, "session_path": "/abs/x.session", "account_id": 2, "log_path": "...",
+   "lease_generation": 7}
+    -> {"pid": 4242} or {"error": "..."}
+  {"cmd": "ping"} -> {"pid": <zygote pid>}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import traceback
+from pathlib import Path
+from typing import Any
+
+from app.utils import startup_profile
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT_SECONDS = 2.0
+REPLY_TIMEOUT_SECONDS = 5.0
+PARENT_CHECK_SECONDS = 1.0  # how often the zygote checks whether the API that started it is gone
+
+_process: subprocess.Popen | None = None
+
+
+def supported() -> bool:
+    return hasattr(os, "fork") and hasattr(socket, "AF_UNIX")
+
+
+# --- API side -------------------------------------------------------------------------------
+
+
+def start(socket_path: str, cwd: str, log_path: str) -> bool:
+    """Start the zygote in the background. It binds the socket once its imports are done; until
+    then spawn() finds no socket and callers cold-start workers."""
+    global _process
+    if not supported() or running():
+        return False
+    cmd = [sys.executable, "-m", "app.main", "db", "worker-zygote", "--socket", socket_path]
+    try:
+        stderr_handle = open(log_path, "w", encoding="utf-8")
+    except OSError:
+        stderr_handle = None
+    _process = subprocess.Popen(
+        cmd,
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=stderr_handle if stderr_handle else subprocess.DEVNULL,
+        stdin=subprocess.DEVNULL,
+    )
+    if stderr_handle:
+        stderr_handle.close()
+    logger.info("Started worker zygote pid=%s socket=%s", _process.pid, socket_path)
+    return True
+
+
+def running() -> bool:
+    """True if this process started a zygote that is still alive."""
+    return _process is not None and _process.poll() is None
+
+
+def stop(timeout: float = 5.0) -> None:
+    """Blocking: stop the zygote, waiting up to timeout before killing it. Workers it forked run in
+    their own sessions and are not affected."""
+    global _process
+    proc, _process = _process, None
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+async def request(socket_path: str, message: dict[str, Any]) -> dict[str, Any] | None:
+    """Send one command to the zygote. Returns its reply, or None if it is unreachable."""
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(socket_path), CONNECT_TIMEOUT_SECONDS
+        )
+    except (OSError, asyncio.TimeoutError) as e:
+        logger.debug("Worker zygote unreachable at %s: %s", socket_path, e)
+        return None
+    try:
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), REPLY_TIMEOUT_SECONDS)
+        return json.loads(line) if line else None
+    except (OSError, asyncio.TimeoutError, ValueError) as e:
+        logger.warning("Worker zygote request failed: %s", e)
+        return None
+    finally:
+        writer.close()
+
+
+async def spawn(
+    socket_path: str,
+    user_id: int,
+    session_path: str,
+    account_id: int | None,
+    log_path: str,
+    lease_generation: int | None = None,
+) -> int | None:
+    """Ask the zygote to fork a worker. Returns the worker pid, or None to fall back to a cold start."""
+    reply = await request(
+        socket_path,
+        {
+            "cmd": "run",
+            "user_id": user_id,
+            "session_path": session_path,
+            "account_id": account_id,
+            "log_path": log_path,
+            "lease_generation": lease_generation,
+        },
+    )
+    if reply is None:
+        return None
+    if "pid" not in reply:
+        logger.warning("Worker zygote could not fork a worker: %s", reply.get("error"))
+        return None
+    return int(reply["pid"])
+
+
+# --- Zygote side ----------------------------------------------------------------------------
+
+
+def _reap_children(_signum: int, _frame: Any) -> None:
+    # Reap promptly: the API waits for a stopped worker with kill(pid, 0), which succeeds on a zombie.
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        logger.info("Worker pid=%s exited with status %s", pid, os.waitstatus_to_exitcode(status))
+
+
+def _exit_on_sigterm(_signum: int, _frame: Any) -> None:
+    raise SystemExit(0)
+
+
+def _redirect_stdio(log_path: str) -> None:
+    devnull = os.open(os.devnull, os.O_RDWR)
+    try:
+        log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    except OSError:
+        log_fd = os.dup(devnull)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.dup2(log_fd, 2)
+    os.close(devnull)
+    os.close(log_fd)
+
+
+def _run_forked_worker(req: dict[str, Any], inherited: list[socket.socket]) -> None:
+    """Body of a forked worker; never returns."""
+    code = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        for sock in inherited:
+            sock.close()
+        # Own session, like a cold-started worker: survives the zygote and API restarts.
+        os.setsid()
+        _redirect_stdio(req["log_path"])
+        startup_profile.reset()
+        from app.worker import run_worker_sync
+
+        code = run_worker_sync(
+            user_id=int(req["user_id"]),
+            session_path=str(req["session_path"]),
+            telegram_account_id=req.get("account_id"),
+            lease_generation=req.get("lease_generation"),
+        ) or 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            logging.shutdown()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def _handle(conn: socket.socket, listener: socket.socket) -> dict[str, Any]:
+    with conn.makefile("rb") as stream:
+        line = stream.readline()
+    try:
+        req = json.loads(line)
+    except ValueError:
+        return {"error": "invalid request"}
+    cmd = req.get("cmd") if isinstance(req, dict) else None
+    if cmd == "ping":
+        return {"pid": os.getpid()}
+    if cmd != "run":
+        return {"error": f"unknown command: {cmd!r}"}
+    missing = [k for k in ("user_id", "session_path", "log_path") if k not in req]
+    if missing:
+        return {"error": f"missing fields: {', '.join(missing)}"}
+    try:
+        pid = os.fork()
+    except OSError as e:
+        return {"error": f"fork failed: {e}"}
+    if pid == 0:
+        _run_forked_worker(req, [conn, listener])
+    logger.info("Forked worker pid=%s for account_id=%s", pid, req.get("account_id"))
+    return {"pid": pid}
+
+
+def serve(socket_path: str) -> None:
+    """Preload the worker, then fork workers on request until SIGTERM or until the parent exits.
+
+    The zygote stays single-threaded (no event loop, no DB or Mongo clients) so fork() is safe.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    with startup_profile.phase("preload worker"):
+        import app.worker  # noqa: F401
+    startup_profile.report()
+
+    parent = os.getppid()
+    path = Path(socket_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    signal.signal(signal.SIGCHLD, _reap_children)
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    try:
+        listener.bind(str(path))
+        os.chmod(path, 0o600)
+        listener.listen(16)
+        listener.settimeout(PARENT_CHECK_SECONDS)
+        logger.info("Worker zygote ready pid=%s socket=%s", os.getpid(), path)
+        while os.getppid() == parent:
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                conn.settimeout(REPLY_TIMEOUT_SECONDS)
+                try:
+                    reply = _handle(conn, listener)
+                    conn.sendall(json.dumps(reply).encode() + b"\n")
+                except OSError as e:
+                    logger.warning("Worker zygote request failed: %s", e)
+        logger.info("Worker zygote parent exited; shutting down")
+    finally:
+        listener.close()
+        path.unlink(missing_ok=True)
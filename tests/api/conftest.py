@@ -10,6 +10,11 @@ from app.auth.password import hash_password
 from app.db.sqlite import get_sqlite, init_sqlite
 
 
+def run_async(coro):
+    """Run a coroutine against the test DB from a sync test (the TestClient owns its own loop)."""
+    return asyncio.run(coro)
+
+
 @pytest.fixture
 def api_client(tmp_path):
     """Create TestClient with tmp SQLite DB, seeded with user and mapping."""
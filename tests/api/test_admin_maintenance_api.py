@@ -0,0 +1,27 @@
+"""API tests for /admin/maintenance."""
+
+
+def test_maintenance_status_admin_only(api_client, admin_token, user_token):
+    r = api_client.get("/api/admin/maintenance", headers={"Authorization": f"Bearer {user_token}"})
+    assert r.status_code == 403
+    r = api_client.get("/api/admin/maintenance", headers={"Authorization": f"Bearer {admin_token}"})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["started"] is True
+    names = {j["name"] for j in data["jobs"]}
+    assert {"login_sessions", "refresh_tokens", "worker_registry", "message_index"} <= names
+
+
+def test_run_job_now_records_run(api_client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    r = api_client.post("/api/admin/maintenance/refresh_tokens/run", headers=headers)
+    assert r.status_code == 200
+    assert r.json()["last_run"]["complete"] is True
+    assert r.json()["last_run"]["error"] is None
+
+    data = api_client.get("/api/admin/maintenance", headers=headers).json()
+    assert data["recent_runs"][0]["job"] == "refresh_tokens"
+    job = next(j for j in data["jobs"] if j["name"] == "refresh_tokens")
+    assert job["runs"] == 1
+
+    assert api_client.post("/api/admin/maintenance/nope/run", headers=headers).status_code == 404
@@ -0,0 +1,60 @@
+"""API tests for /admin/settings log retention fields."""
+
+from unittest.mock import AsyncMock, patch
+
+
+def test_admin_settings_retention_roundtrip(api_client, admin_token):
+    """Admin can set per-collection retention; it is stored and pushed to MongoDB."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    r = api_client.get("/api/admin/settings", headers=headers)
+    assert r.status_code == 200
+    assert r.json()["worker_logs_retention_days"] is None
+    assert r.json()["logs_timeseries"] is False
+
+    with patch("app.db.mongo_storage.apply_all_log_retention", new=AsyncMock()) as apply:
+        r = api_client.patch(
+            "/api/admin/settings",
+            headers=headers,
+            json={"worker_logs_retention_days": 30, "logs_timeseries": True},
+        )
+    assert r.status_code == 200
+    data = r.json()
+    assert data["worker_logs_retention_days"] == 30
+    assert data["worker_logs_retention_days_set"] is True
+    assert data["message_logs_retention_days"] is None
+    assert data["logs_timeseries"] is True
+    apply.assert_awaited_once()
+
+
+def test_admin_settings_retention_validation(api_client, admin_token, user_token):
+    r = api_client.patch(
+        "/api/admin/settings",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"message_logs_retention_days": -1},
+    )
+    assert r.status_code == 400
+    r = api_client.patch(
+        "/api/admin/settings",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"mongo_db": "logs2", "worker_logs_retention_days": 30, "message_index_retention_days": 4000},
+    )
+    assert r.status_code == 400
+    settings = api_client.get("/api/admin/settings", headers={"Authorization": f"Bearer {admin_token}"}).json()
+    assert (settings["mongo_db_set"], settings["worker_logs_retention_days_set"]) == (False, False)  # nothing saved
+    r = api_client.patch(
+        "/api/admin/settings",
+        headers={"Authorization": f"Bearer {user_token}"},
+        json={"message_logs_retention_days": 5},
+    )
+    assert r.status_code == 403
+
+
+def test_admin_settings_message_index_retention(api_client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    assert api_client.get("/api/admin/settings", headers=headers).json()["message_index_retention_days"] is None
+    r = api_client.patch("/api/admin/settings", headers=headers, json={"message_index_retention_days": 90})
+    assert r.status_code == 200
+    assert r.json()["message_index_retention_days"] == 90
+    assert r.json()["message_index_retention_days_set"] is True
+    r = api_client.patch("/api/admin/settings", headers=headers, json={"message_index_retention_days": 4000})
+    assert r.status_code == 400
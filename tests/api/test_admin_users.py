@@ -96,3 +96,28 @@ def test_patch_user_404(api_client, admin_token):
         json={"name": "X"},
     )
     assert r.status_code == 404
+
+
+def test_deactivated_user_rejected_immediately_despite_principal_cache(api_client, admin_token, user_token):
+    """get_current_user caches principals, but admin status changes invalidate the entry at once."""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    assert api_client.get("/api/auth/me", headers=headers).status_code == 200  # now cached
+
+    r = api_client.patch(
+        "/api/admin/users/1",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"status": "inactive"},
+    )
+    assert r.status_code == 200
+    assert api_client.get("/api/auth/me", headers=headers).status_code == 401
+
+
+def test_role_change_visible_on_next_request(api_client, admin_token, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    assert api_client.get("/api/auth/me", headers=headers).json()["role"] == "user"
+    api_client.patch(
+        "/api/admin/users/1",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"role": "admin"},
+    )
+    assert api_client.get("/api/auth/me", headers=headers).json()["role"] == "admin"
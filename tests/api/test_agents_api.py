@@ -0,0 +1,406 @@
+"""API tests for remote worker agents: auth, placement by load, bundles, stop and re-placement."""
+
+import base64
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import aiosqlite
+import pytest
+
+from app.agent import Agent, AgentApiError
+from app.config import settings
+from app.db import agents, message_index, worker_heartbeats, worker_profiles
+from app.db.migrations import MIGRATIONS
+from app.db.sqlite import get_sqlite
+from app.services.profiling import run_profile
+from app.web.routers import workers
+
+from .conftest import run_async
+
+TOKEN = "agent-secret"
+
+
+class _TestClientApi:
+    """app.agent.ApiClient over the FastAPI TestClient."""
+
+    base_url = "https://testserver"
+
+    def __init__(self, client, token: str = TOKEN):
+        self.client = client
+        self.token = token
+        self.agent_key: str | None = None
+
+    @property
+    def headers(self) -> dict:
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if self.agent_key:
+            headers[agents.KEY_HEADER] = self.agent_key
+        return headers
+
+    def request(self, method, path, body=None, params=None):
+        r = self.client.request(method, self.base_url + path, json=body, params=params, headers=self.headers)
+        if r.status_code >= 400:
+            raise AgentApiError(f"{method} {path}: HTTP {r.status_code} {r.text}")
+        return r.json()
+
+    def download(self, path, dest: Path, params=None):
+        r = self.client.get(self.base_url + path, params=params, headers=self.headers)
+        if r.status_code >= 400:
+            raise AgentApiError(f"GET {path}: HTTP {r.status_code}")
+        dest.write_bytes(r.content)
+
+
+class _Spawner:
+    """Starts a sleeping process in place of `db run-worker` and records the commands."""
+
+    def __init__(self):
+        self.cmds: list[list[str]] = []
+
+    def __call__(self, cmd, log_path):
+        self.cmds.append(cmd)
+        return subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+
+@pytest.fixture(autouse=True)
+def agent_settings(monkeypatch):
+    monkeypatch.setattr(settings, "agent_token", TOKEN)
+    monkeypatch.setattr(settings, "worker_placement", "agents")
+    monkeypatch.setattr(settings, "worker_heartbeat_seconds", 0.05)
+    workers._workers.clear()
+    yield
+    workers._workers.clear()
+
+
+@pytest.fixture
+def accounts(api_client, tmp_path):
+    """Three active accounts of user 1 with session files (account 1 comes from the fixture)."""
+    async def seed():
+        db = await get_sqlite()
+        for i in (2, 3):
+            await db.execute(
+                "INSERT INTO telegram_accounts (user_id, type, session_path, status) VALUES (1, 'user', ?, 'active')",
+                (str(tmp_path / f"user1_{i}.session"),),
+            )
+        await db.commit()
+        async with db.execute("SELECT id, session_path FROM telegram_accounts ORDER BY id") as cur:
+            rows = await cur.fetchall()
+        await db.close()
+        return rows
+
+    rows = run_async(seed())
+    for account_id, path in rows:
+        Path(path).write_bytes(f"session-{account_id}".encode())
+    return [r[0] for r in rows]
+
+
+def _agent(api_client, tmp_path, agent_id, capacity, stats_db=None):
+    return Agent(
+        _TestClientApi(api_client), agent_id, capacity, tmp_path / agent_id, spawn=_Spawner(), drain_timeout=1,
+        stats_db=stats_db,
+    )
+
+
+def _stop_all(*agents):
+    for agent in agents:
+        for w in agent.workers.values():
+            w.process.kill()
+            w.process.wait()
+
+
+def _start(api_client, user_token, account_id):
+    return api_client.post(
+        "/api/workers/start", params={"account_id": account_id}, headers={"Authorization": f"Bearer {user_token}"}
+    )
+
+
+def test_agent_endpoints_need_the_agent_token(api_client, user_token, monkeypatch):
+    body = {"agent_id": "a", "capacity": 1}
+    assert api_client.post("/api/agents/heartbeat", json=body).status_code == 401
+    r = api_client.post("/api/agents/heartbeat", json=body, headers={"Authorization": f"Bearer {user_token}"})
+    assert r.status_code == 401
+    monkeypatch.setattr(settings, "agent_token", "")
+    r = api_client.post("/api/agents/heartbeat", json=body, headers={"Authorization": f"Bearer {TOKEN}"})
+    assert r.status_code == 404
+
+
+def test_workers_are_placed_on_least_loaded_agents_and_run_there(api_client, user_token, admin_token, accounts, tmp_path):
+    assert _start(api_client, user_token, accounts[0]).status_code == 503  # no agent yet
+
+    a = _agent(api_client, tmp_path, "agent-a", 2)
+    b = _agent(api_client, tmp_path, "agent-b", 1)
+    assert a.heartbeat() and b.heartbeat()
+    try:
+        for account_id in accounts:
+            assert _start(api_client, user_token, account_id).status_code == 200
+        listed = api_client.get("/api/agents", headers={"Authorization": f"Bearer {admin_token}"}).json()
+        assert [(x["agent_id"], x["load"], x["capacity"], x["live"]) for x in listed] == [
+            ("agent-a", 2, 2, True), ("agent-b", 1, 1, True),
+        ]
+        assert _start(api_client, user_token, accounts[0]).status_code == 409
+
+        a.heartbeat()
+        b.heartbeat()
+        assert len(a.workers) == 2 and len(b.workers) == 1
+        # The worker runs from the fetched session and mappings snapshot, not the API's SQLite.
+        cmd = b.spawn.cmds[0]
+        session = Path(cmd[cmd.index("run-worker") + 2])
+        assert session.read_bytes().startswith(b"session-")
+        assert "--lease-generation" not in cmd
+        snapshot = Path(cmd[cmd.index("--mappings-snapshot") + 1]).read_text()
+        assert '"source_chat_id": 10' in snapshot
+
+        a.heartbeat()
+        b.heartbeat()  # reports pids
+        items = api_client.get("/api/workers", headers={"Authorization": f"Bearer {user_token}"}).json()
+        pids = {w.worker_id: w.process.pid for ag in (a, b) for w in ag.workers.values()}
+        assert {i["id"]: i["pid"] for i in items} == pids
+        assert {i["agent_id"] for i in items} == {"agent-a", "agent-b"}
+    finally:
+        _stop_all(a, b)
+
+
+def test_stop_drains_the_worker_on_its_agent(api_client, user_token, accounts, tmp_path):
+    a = _agent(api_client, tmp_path, "agent-a", 1)
+    a.heartbeat()
+    worker_id = _start(api_client, user_token, accounts[0]).json()["id"]
+    a.heartbeat()
+    proc = a.workers[worker_id].process
+
+    stop = threading.Event()
+    runner = threading.Thread(target=a.run, args=(stop,))
+    runner.start()
+    try:
+        r = api_client.post(f"/api/workers/{worker_id}/stop", headers={"Authorization": f"Bearer {user_token}"})
+        assert r.status_code == 200
+        assert proc.poll() is not None
+        assert not a.workers
+    finally:
+        stop.set()
+        runner.join(10)
+    assert api_client.get("/api/workers", headers={"Authorization": f"Bearer {user_token}"}).json() == []
+
+
+def test_workers_of_a_lost_agent_are_placed_again(api_client, user_token, accounts, tmp_path):
+    a = _agent(api_client, tmp_path, "agent-a", 1)
+    b = _agent(api_client, tmp_path, "agent-b", 1)
+    a.heartbeat()
+    worker_id = _start(api_client, user_token, accounts[0]).json()["id"]
+    a.heartbeat()
+    assert list(a.workers) == [worker_id]
+    b.heartbeat()
+
+    async def lose_agent_a():
+        db = await get_sqlite()
+        await db.execute("UPDATE worker_agents SET last_seen = 0 WHERE agent_id = 'agent-a'")
+        await db.execute("UPDATE worker_leases SET expires_at = 0 WHERE owner = 'agent:agent-a'")
+        await db.commit()
+        await db.close()
+
+    try:
+        run_async(lose_agent_a())
+        # Not listed while it waits for re-placement, but not pruned like a crashed local worker.
+        assert api_client.get("/api/workers", headers={"Authorization": f"Bearer {user_token}"}).json() == []
+        b.heartbeat()  # re-places the worker on agent-b
+        b.heartbeat()
+        assert [w.account_id for w in b.workers.values()] == [accounts[0]]
+        assert worker_id not in b.workers  # a new lease generation, so a new worker id
+
+        # agent-a comes back: its old worker was fenced off and is stopped.
+        a.heartbeat()
+        assert a.workers[worker_id].stop_deadline is not None
+    finally:
+        _stop_all(a, b)
+
+
+def test_bundle_is_only_served_to_the_assigned_agent(api_client, user_token, accounts, tmp_path):
+    a = _agent(api_client, tmp_path, "agent-a", 1)
+    b = _agent(api_client, tmp_path, "agent-b", 1)
+    a.heartbeat()
+    worker_id = _start(api_client, user_token, accounts[0]).json()["id"]
+    b.heartbeat()
+    path = f"/api/agents/assignments/{worker_id}"
+    with pytest.raises(AgentApiError, match="HTTP 404"):
+        b.api.request("GET", path, params={"agent_id": "agent-b"})
+    with pytest.raises(AgentApiError, match="HTTP 401"):  # agent-b's key is not agent-a's
+        b.api.request("GET", path, params={"agent_id": "agent-a"})
+    with pytest.raises(AgentApiError, match="HTTP 401"):  # the shared token alone is not enough
+        _TestClientApi(api_client).request("GET", path, params={"agent_id": "agent-a"})
+    bundle = a.api.request("GET", path, params={"agent_id": "agent-a"})
+    assert base64.b64decode(bundle["session"]) == f"session-{accounts[0]}".encode()
+
+
+def test_agents_cannot_report_workers_placed_elsewhere(api_client, user_token, accounts, tmp_path):
+    a = _agent(api_client, tmp_path, "agent-a", 1)
+    b = _agent(api_client, tmp_path, "agent-b", 1)
+    a.heartbeat()
+    worker_id = _start(api_client, user_token, accounts[0]).json()["id"]
+    b.heartbeat()
+    try:
+        a.heartbeat()
+        w = a.workers[worker_id]
+        entry = {"worker_id": worker_id, "account_id": w.account_id, "generation": w.generation}
+        body = {"agent_id": "agent-b", "capacity": 1, "running": [{**entry, "stats": {"pid": 1}}], "exited": [entry]}
+        reply = b.api.request("POST", "/api/agents/heartbeat", body)
+        assert reply["stop"] == [worker_id]  # agent-b is told to stop what it does not run
+
+        async def lease_and_heartbeat():
+            db = await get_sqlite()
+            async with db.execute(
+                "SELECT generation, owner FROM worker_leases WHERE account_id = ?", (w.account_id,)
+            ) as cur:
+                lease = tuple(await cur.fetchone())
+            heartbeats = await worker_heartbeats.get_heartbeats(db, [w.account_id])
+            await db.close()
+            return lease, heartbeats
+
+        lease, heartbeats = run_async(lease_and_heartbeat())
+        assert lease == (w.generation, "agent:agent-a") and heartbeats == {}
+        assert a.heartbeat() and worker_id in a.workers and a.workers[worker_id].stop_deadline is None
+    finally:
+        _stop_all(a, b)
+
+
+def test_session_bundles_need_https(api_client, user_token, accounts, tmp_path, monkeypatch):
+    a = _agent(api_client, tmp_path, "agent-a", 1)
+    a.heartbeat()
+    worker_id = _start(api_client, user_token, accounts[0]).json()["id"]
+    path = f"/api/agents/assignments/{worker_id}"
+    r = api_client.get(path, params={"agent_id": "agent-a"}, headers=a.api.headers)  # http://testserver
+    assert r.status_code == 403
+    monkeypatch.setattr(settings, "agent_allow_http", True)
+    assert api_client.get(path, params={"agent_id": "agent-a"}, headers=a.api.headers).status_code == 200
+
+
+def test_agent_key_is_issued_on_first_heartbeat_and_required_after(api_client, admin_token, tmp_path):
+    a = _agent(api_client, tmp_path, "agent-a", 1)
+    assert a.api.agent_key is None
+    assert a.heartbeat()
+    key_path = tmp_path / "agent-a" / "agent.key"
+    assert key_path.read_text() == a.api.agent_key
+    if os.name == "posix":
+        assert key_path.stat().st_mode & 0o777 == 0o600
+    assert a.heartbeat()
+
+    body = {"agent_id": "agent-a", "capacity": 1}
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    assert api_client.post("/api/agents/heartbeat", json=body, headers=headers).status_code == 401
+    wrong = {**headers, agents.KEY_HEADER: "nope"}
+    assert api_client.post("/api/agents/heartbeat", json=body, headers=wrong).status_code == 401
+
+    restarted = _agent(api_client, tmp_path, "agent-a", 1)  # same work dir: picks the key up
+    assert restarted.api.agent_key == a.api.agent_key and restarted.heartbeat()
+
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    assert api_client.delete("/api/agents/agent-x/key", headers=admin).status_code == 404
+    assert api_client.delete("/api/agents/agent-a/key", headers=admin).status_code == 200
+    old_key = a.api.agent_key
+    assert a.heartbeat()  # reissued
+    assert a.api.agent_key != old_key and key_path.read_text() == a.api.agent_key
+
+
+def test_agent_relays_the_message_index(api_client, user_token, admin_token, accounts, tmp_path, monkeypatch):
+    node_db = tmp_path / "node.db"
+    a = _agent(api_client, tmp_path, "agent-a", 1, stats_db=str(node_db))
+    a.heartbeat()
+    _start(api_client, user_token, accounts[0])
+    a.heartbeat()
+
+    async def worker_copies_messages():  # what the node's worker does with MESSAGE_INDEX_RELAY set
+        async with aiosqlite.connect(node_db) as db:
+            await db.executescript(message_index.PARTITION_SCHEMA_SQL + MIGRATIONS[27])  # v28: the outbox
+            monkeypatch.setattr(settings, "message_index_relay", True)
+            await message_index.save_dest_mapping(db, 1, 10, 100, 20, 200)
+            await message_index.save_dest_mapping(db, 3, 30, 300, 40, 400)  # not a user of agent-a's workers
+            monkeypatch.setattr(settings, "message_index_relay", False)
+
+    try:
+        run_async(worker_copies_messages())
+        assert len(message_index.outbox_on_node(str(node_db))) == 2
+        a.heartbeat()
+        assert message_index.outbox_on_node(str(node_db)) == []
+        admin = {"Authorization": f"Bearer {admin_token}"}
+        rows = api_client.get("/api/message-index", headers=admin).json()["items"]
+        assert [(r["user_id"], r["source_msg_id"], r["dest_msg_id"]) for r in rows] == [(1, 100, 200)]
+    finally:
+        _stop_all(a)
+
+
+def test_agent_relays_worker_runtime_heartbeats(api_client, user_token, accounts, tmp_path):
+    node_db = tmp_path / "node.db"  # the agent node's SQLite, where its workers write heartbeats
+    a = _agent(api_client, tmp_path, "agent-a", 1, stats_db=str(node_db))
+    a.heartbeat()
+    worker_id = _start(api_client, user_token, accounts[0]).json()["id"]
+    a.heartbeat()
+
+    async def worker_writes_heartbeat():
+        async with aiosqlite.connect(node_db) as db:
+            for migration in MIGRATIONS[20:26]:  # v21-v26: worker_heartbeats and its additions, profiles
+                await db.executescript(migration)
+            await worker_heartbeats.publish(db, {
+                "account_id": accounts[0], "generation": 0, "pid": 4242,
+                "mappings": {"1": {"in": 5, "out": 4, "filtered": 0, "failed": 1}},
+            })
+
+    try:
+        run_async(worker_writes_heartbeat())
+        a.heartbeat()
+        items = api_client.get("/api/workers", headers={"Authorization": f"Bearer {user_token}"}).json()
+        assert [i["id"] for i in items] == [worker_id]
+        assert items[0]["heartbeat"]["messages"] == {"in": 5, "out": 4, "filtered": 0, "failed": 1}
+
+        async def relayed_generation():
+            db = await get_sqlite()
+            hb = (await worker_heartbeats.get_heartbeats(db, [accounts[0]]))[accounts[0]]
+            await db.close()
+            return hb["generation"]
+
+        assert run_async(relayed_generation()) == a.workers[worker_id].generation
+    finally:
+        _stop_all(a)
+
+
+def test_agent_relays_worker_profiles(api_client, user_token, admin_token, accounts, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profiles_dir", str(tmp_path / "profiles"))
+    node_db = tmp_path / "node.db"
+    a = _agent(api_client, tmp_path, "agent-a", 1, stats_db=str(node_db))
+    a.heartbeat()
+    worker_id = _start(api_client, user_token, accounts[0]).json()["id"]
+    a.heartbeat()
+
+    async def node_schema():
+        async with aiosqlite.connect(node_db) as db:
+            for migration in MIGRATIONS[20:26]:
+                await db.executescript(migration)
+
+    async def worker_runs_profile():  # what serve_worker_profiles does on the node
+        async with aiosqlite.connect(node_db) as db:
+            (profile,) = await worker_profiles.claim_pending(db, accounts[0])
+            await run_profile(db, profile)
+
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    try:
+        run_async(node_schema())
+        r = api_client.post(f"/api/workers/{worker_id}/profile", params={"seconds": 1}, headers=admin)
+        assert r.status_code == 202
+        profile_id = r.json()["id"]
+        a.heartbeat()  # the reply hands the request to the agent, which queues it on the node
+        assert api_client.get(f"/api/workers/profiles/{profile_id}", headers=admin).json()["status"] == "running"
+        agent = {"Authorization": f"Bearer {TOKEN}"}
+        forged = {"agent_id": "agent-b", "capacity": 1, "profiles": [{"id": profile_id, "status": "failed"}]}
+        assert api_client.post("/api/agents/heartbeat", json=forged, headers=agent).status_code == 200
+        assert api_client.get(f"/api/workers/profiles/{profile_id}", headers=admin).json()["status"] == "running"
+        forged["profiles"][0]["id"] = "../../etc/x"
+        assert api_client.post("/api/agents/heartbeat", json=forged, headers=agent).status_code == 422
+        run_async(worker_runs_profile())
+        a.heartbeat()  # relays the result
+        profile = api_client.get(f"/api/workers/profiles/{profile_id}", headers=admin).json()
+        assert profile["status"] == "done" and profile["samples"] > 0
+        r = api_client.get(f"/api/workers/profiles/{profile_id}/download", headers=admin)
+        assert r.status_code == 200 and r.text
+        a.heartbeat()  # the acknowledged result is dropped from the node
+        assert worker_profiles.finished_on_node(str(node_db)) == []
+    finally:
+        _stop_all(a)
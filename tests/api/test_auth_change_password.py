@@ -63,3 +63,43 @@ def test_change_password_admin_can_use_own(api_client, admin_token):
         json={"email": "admin@test.com", "password": "adminnew"},
     )
     assert login_r.status_code == 200
+
+
+def test_login_429_when_password_pool_saturated(api_client, monkeypatch):
+    """Logins beyond the bcrypt pending limit are rejected fast instead of queueing."""
+    from app.auth import password as pw
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "password_hash_max_pending", 1)
+    monkeypatch.setattr(pw, "_in_flight", 1)
+    r = api_client.post("/api/auth/login", json={"email": "user@test.com", "password": "pass"})
+    assert r.status_code == 429
+    assert r.headers["retry-after"] == "1"
+
+    monkeypatch.setattr(pw, "_in_flight", 0)
+    r = api_client.post("/api/auth/login", json={"email": "user@test.com", "password": "pass"})
+    assert r.status_code == 200
+
+
+def test_passwords_are_checked_without_holding_the_writer(api_client, user_token, monkeypatch):
+    """bcrypt runs before the pooled writer is taken, so other writes do not queue behind it."""
+    from app.auth import password as pw
+    from app.db.sqlite import get_sqlite_pool
+    from app.web.routers import auth
+
+    held: list[bool] = []
+
+    async def verify(password, password_hash):
+        held.append(get_sqlite_pool()._write_lock.locked())
+        return await pw.verify_password_async(password, password_hash)
+
+    monkeypatch.setattr(auth, "verify_password_async", verify)
+    r = api_client.post("/api/auth/login", json={"email": "user@test.com", "password": "pass"})
+    assert r.status_code == 200
+    r = api_client.post(
+        "/api/auth/change-password",
+        json={"current_password": "pass", "new_password": "newpass"},
+        headers={"Authorization": f"Bearer {user_token}"},
+    )
+    assert r.status_code == 200
+    assert held == [False, False]
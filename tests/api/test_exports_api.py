@@ -0,0 +1,130 @@
+"""API tests for the streaming /export routes (message logs, worker logs, message index)."""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
+
+from pymongo.errors import ServerSelectionTimeoutError
+
+from app.db.sqlite import get_sqlite
+
+
+def _mock_mongo(coll_name: str, docs: list[dict], calls: list):
+    def mock_aggregate(pipeline, **kwargs):
+        calls.append((pipeline, kwargs))
+
+        async def gen():
+            for d in docs:
+                yield d
+        return gen()
+
+    mock_coll = AsyncMock()
+    mock_coll.aggregate = mock_aggregate
+    mock_db = AsyncMock()
+    setattr(mock_db, coll_name, mock_coll)
+    return mock_db
+
+
+def test_message_logs_export_ndjson_scoped_with_title_fallback(api_client, user_token):
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    docs = [
+        {"user_id": 1, "source_chat_id": 10, "dest_chat_id": 20, "timestamp": ts, "status": "ok"},
+        {"user_id": 3, "source_chat_id": 30, "dest_chat_id": 40, "timestamp": ts, "status": "ok"},
+    ]
+
+    async def set_titles():
+        db = await get_sqlite()
+        await db.execute(
+            "UPDATE channel_mappings SET source_chat_title = 'Src', dest_chat_title = 'Dst' WHERE user_id = 1"
+        )
+        await db.commit()
+        await db.close()
+
+    asyncio.run(set_titles())
+    calls: list = []
+    mock_db = _mock_mongo("message_logs", docs, calls)
+    with patch("app.web.routers.message_logs.get_mongo_db", return_value=mock_db):
+        r = api_client.get(
+            "/api/message-logs/export",
+            params={"batch_size": 1},
+            headers={"Authorization": f"Bearer {user_token}"},
+        )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert 'filename="message_logs.ndjson"' in r.headers["content-disposition"]
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    # Post-filter drops the other user's row even if the mock returned it
+    assert len(rows) == 1
+    assert rows[0]["source_chat_title"] == "Src"
+    pipeline, kwargs = calls[0]
+    assert pipeline[0]["$match"]["user_id"] == 1
+    assert kwargs["batchSize"] == 1
+
+
+def test_worker_logs_export_csv_gzip(api_client, admin_token):
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    docs = [{"user_id": 1, "account_id": 5, "level": "INFO", "message": "hi, there", "timestamp": ts}]
+    calls: list = []
+    mock_db = _mock_mongo("worker_logs", docs, calls)
+    with patch("app.web.routers.worker_logs.get_mongo_db", return_value=mock_db):
+        r = api_client.get(
+            "/api/worker-logs/export",
+            params={"format": "csv", "gzip": "true", "level": "info"},
+            headers={"Authorization": f"Bearer {admin_token}"},
+        )
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/gzip"
+    lines = gzip.decompress(r.content).decode().splitlines()
+    assert lines[0] == "user_id,account_id,level,message,timestamp"
+    assert '"hi, there"' in lines[1]
+    assert calls[0][0][0]["$match"] == {"level": "INFO"}
+
+
+def test_log_export_invalid_format_400(api_client, user_token):
+    r = api_client.get(
+        "/api/message-logs/export",
+        params={"format": "xml"},
+        headers={"Authorization": f"Bearer {user_token}"},
+    )
+    assert r.status_code == 400
+
+
+def test_log_export_mongo_unavailable_503(api_client, admin_token):
+    def failing_aggregate(pipeline, **kwargs):
+        async def gen():
+            raise ServerSelectionTimeoutError("timeout")
+            yield
+        return gen()
+
+    mock_db = AsyncMock()
+    mock_db.worker_logs.aggregate = failing_aggregate
+    with patch("app.web.routers.worker_logs.get_mongo_db", return_value=mock_db):
+        r = api_client.get("/api/worker-logs/export", headers={"Authorization": f"Bearer {admin_token}"})
+    assert r.status_code == 503
+
+
+def test_message_index_export_scoped_to_user(api_client, user_token):
+    async def seed():
+        db = await get_sqlite()
+        await db.executemany(
+            "INSERT INTO dest_message_index (user_id, source_chat_id, source_msg_id, dest_chat_id, dest_msg_id) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(1, 10, i, 20, 100 + i) for i in range(7)] + [(3, 30, 1, 40, 1)],
+        )
+        await db.commit()
+        await db.close()
+
+    asyncio.run(seed())
+    r = api_client.get(
+        "/api/message-index/export",
+        params={"user_id": 3, "batch_size": 3},
+        headers={"Authorization": f"Bearer {user_token}"},
+    )
+    assert r.status_code == 200
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["source_msg_id"] for row in rows] == list(range(7))
+    assert {row["user_id"] for row in rows} == {1}
@@ -0,0 +1,123 @@
+"""API tests for bulk mapping import and export."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.web.routers import mappings as mappings_router
+
+
+@pytest.fixture
+def restarts(monkeypatch):
+    calls: list[list[int]] = []
+
+    def _record(account_ids):
+        calls.append(list(account_ids))
+
+    monkeypatch.setattr(mappings_router, "restart_workers_for_accounts", _record)
+    return calls
+
+
+def _auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _payload(n):
+    return {
+        "mappings": [
+            {
+                "source_chat_id": 1000 + i,
+                "dest_chat_id": -1000 - i,
+                "name": f"m{i}",
+                "telegram_account_id": 1 if i % 2 else None,
+                "filters": [{"include_text": "news"}],
+                "transforms": [{"rule_type": "text", "find_text": "a", "replace_text": "b", "priority": 5}],
+                "schedule": {"mon_start_utc": "09:00", "mon_end_utc": "17:00"},
+            }
+            for i in range(n)
+        ]
+    }
+
+
+def test_bulk_import_then_export_round_trip(api_client, user_token, restarts):
+    r = api_client.post("/api/mappings/bulk", headers=_auth(user_token), json=_payload(50))
+    assert r.status_code == 201
+    body = r.json()
+    assert body["created"] == 50 and len(body["ids"]) == 50
+    # Pinned and unpinned mappings both resolve to user 1's only account: one restart in total.
+    assert restarts == [[1]]
+
+    r = api_client.get("/api/mappings/export", headers=_auth(user_token))
+    assert r.status_code == 200
+    items = r.json()["mappings"]
+    assert len(items) == 51  # seeded mapping + imported
+    imported = items[-1]
+    assert imported["name"] == "m49" and imported["telegram_account_id"] == 1
+    assert imported["filters"] == [{"include_text": "news", "exclude_text": None, "media_types": None, "regex_pattern": None}]
+    assert imported["transforms"][0]["find_text"] == "a" and imported["transforms"][0]["priority"] == 5
+    assert imported["schedule"]["mon_start_utc"] == "09:00"
+    assert items[0]["schedule"] is None
+
+
+def test_bulk_import_csv_from_export(api_client, user_token, restarts):
+    api_client.post("/api/mappings/bulk", headers=_auth(user_token), json=_payload(3))
+    r = api_client.get("/api/mappings/export?format=csv", headers=_auth(user_token))
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    csv_text = r.text
+    assert csv_text.splitlines()[0].startswith("id,user_id,source_chat_id,dest_chat_id")
+
+    r = api_client.post(
+        "/api/mappings/bulk",
+        headers={**_auth(user_token), "Content-Type": "text/csv"},
+        content=csv_text.encode(),
+    )
+    assert r.status_code == 201
+    assert r.json()["created"] == 4
+    items = api_client.get("/api/mappings/export", headers=_auth(user_token)).json()["mappings"]
+    assert len(items) == 8
+    assert items[-1]["transforms"][0]["replace_text"] == "b"
+    assert items[-1]["schedule"]["mon_end_utc"] == "17:00"
+
+
+def test_bulk_import_validates_everything_before_writing(api_client, user_token, restarts):
+    payload = _payload(3)
+    payload["mappings"][1]["telegram_account_id"] = 999
+    payload["mappings"][2]["transforms"] = [{"rule_type": "regex", "regex_pattern": "("}]
+    r = api_client.post("/api/mappings/bulk", headers=_auth(user_token), json=payload)
+    assert r.status_code == 400
+    locs = [e["loc"] for e in r.json()["detail"]]
+    assert ["mappings", 1, "telegram_account_id"] in locs
+    assert ["mappings", 2, "transforms", 0] in locs
+    assert restarts == []
+    items = api_client.get("/api/mappings/export", headers=_auth(user_token)).json()["mappings"]
+    assert len(items) == 1
+
+
+def test_bulk_import_rejects_bad_schema_and_empty(api_client, user_token, restarts):
+    bad = {"mappings": [{"source_chat_id": 1, "dest_chat_id": 2, "schedule": {"mon_start_utc": "9am"}}]}
+    assert api_client.post("/api/mappings/bulk", headers=_auth(user_token), json=bad).status_code == 422
+    assert api_client.post("/api/mappings/bulk", headers=_auth(user_token), json={"mappings": []}).status_code == 400
+    r = api_client.post(
+        "/api/mappings/bulk", headers={**_auth(user_token), "Content-Type": "application/json"}, content=b"{nope"
+    )
+    assert r.status_code == 400
+
+
+def test_export_scope_and_admin_import_for_user(api_client, user_token, admin_token, restarts):
+    items = api_client.get("/api/mappings/export", headers=_auth(user_token)).json()["mappings"]
+    assert {m["user_id"] for m in items} == {1}
+    items = api_client.get("/api/mappings/export", headers=_auth(admin_token)).json()["mappings"]
+    assert {m["user_id"] for m in items} == {1, 3}
+
+    r = api_client.post(
+        "/api/mappings/bulk?user_id=3",
+        headers=_auth(admin_token),
+        json=[{"source_chat_id": 5, "dest_chat_id": 6}],
+    )
+    assert r.status_code == 201
+    assert restarts == []  # user 3 has no active account
+    items = api_client.get("/api/mappings/export?user_id=3", headers=_auth(admin_token)).json()["mappings"]
+    assert [(m["source_chat_id"], m["dest_chat_id"]) for m in items] == [(30, 40), (5, 6)]
+    assert api_client.post("/api/mappings/bulk?user_id=99", headers=_auth(admin_token), json=_payload(1)).status_code == 404
+    assert api_client.get("/api/mappings/export?format=xml", headers=_auth(user_token)).status_code == 400
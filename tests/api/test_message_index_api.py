@@ -0,0 +1,119 @@
+"""API tests for /api/message-index listing and retention overrides."""
+
+import asyncio
+
+from app.db.sqlite import get_sqlite
+
+
+def _seed_mapping():
+    async def seed():
+        db = await get_sqlite()
+        await db.execute(
+            "INSERT INTO channel_mappings (id, user_id, source_chat_id, dest_chat_id) VALUES (7, 1, 10, 20)"
+        )
+        await db.execute(
+            "INSERT INTO dest_message_index (user_id, source_chat_id, source_msg_id, dest_chat_id, dest_msg_id, created_at) "
+            "VALUES (1, 10, 1, 20, 100, '2026-01-01 00:00:00')"
+        )
+        await db.commit()
+        await db.close()
+
+    asyncio.run(seed())
+
+
+def test_list_includes_created_at(api_client, user_token):
+    _seed_mapping()
+    r = api_client.get("/api/message-index", headers={"Authorization": f"Bearer {user_token}"})
+    assert r.status_code == 200
+    assert r.json()["items"] == [
+        {
+            "user_id": 1,
+            "source_chat_id": 10,
+            "source_msg_id": 1,
+            "dest_chat_id": 20,
+            "dest_msg_id": 100,
+            "created_at": "2026-01-01 00:00:00",
+        }
+    ]
+
+
+def test_retention_overrides_admin_only(api_client, admin_token, user_token):
+    _seed_mapping()
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    r = api_client.put(
+        "/api/message-index/retention/mappings/7",
+        headers={"Authorization": f"Bearer {user_token}"},
+        json={"retention_days": 5},
+    )
+    assert r.status_code == 403
+
+    assert api_client.put("/api/message-index/retention/mappings/7", headers=admin, json={"retention_days": 5}).status_code == 200
+    assert api_client.put("/api/message-index/retention/users/1", headers=admin, json={"retention_days": 0}).status_code == 200
+    assert api_client.put("/api/message-index/retention/users/99", headers=admin, json={"retention_days": 1}).status_code == 404
+    assert api_client.put("/api/message-index/retention/users/1", headers=admin, json={"retention_days": -1}).status_code == 422
+
+    r = api_client.get("/api/message-index/retention", headers=admin)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["default_retention_days"] is None
+    assert body["users"] == [{"user_id": 1, "retention_days": 0}]
+    assert body["mappings"] == [{"mapping_id": 7, "user_id": 1, "retention_days": 5}]
+
+    assert api_client.put("/api/message-index/retention/mappings/7", headers=admin, json={"retention_days": None}).status_code == 200
+    assert api_client.get("/api/message-index/retention", headers=admin).json()["mappings"] == []
+
+
+def test_list_walks_pages_with_after_cursor(api_client, user_token, admin_token):
+    async def seed():
+        db = await get_sqlite()
+        await db.executemany(
+            "INSERT INTO dest_message_index (user_id, source_chat_id, source_msg_id, dest_chat_id, dest_msg_id) "
+            "VALUES (?, ?, ?, 20, ?)",
+            [(1, 10 + i % 2, i, i) for i in range(7)] + [(3, 10, 1, 1)],
+        )
+        await db.commit()
+        await db.close()
+
+    asyncio.run(seed())
+    headers = {"Authorization": f"Bearer {user_token}"}
+    seen, after = [], None
+    while True:
+        r = api_client.get("/api/message-index", headers=headers, params={"page_size": 3, "after": after})
+        assert r.status_code == 200
+        body = r.json()
+        assert body["total"] == 7
+        seen += [(i["source_chat_id"], i["source_msg_id"]) for i in body["items"]]
+        after = body["next_cursor"]
+        if after is None:
+            break
+    assert seen == sorted((10 + i % 2, i) for i in range(7))
+    assert api_client.get("/api/message-index?page=3&page_size=3", headers=headers).json()["items"][0]["source_msg_id"] == 5
+    assert api_client.get("/api/message-index", headers={"Authorization": f"Bearer {admin_token}"}).json()["total"] == 8
+    assert api_client.get("/api/message-index?after=nope", headers=headers).status_code == 400
+
+
+def test_partitioned_reads_refuse_when_some_months_cannot_be_attached(api_client, user_token, tmp_path, monkeypatch):
+    from app.config import settings
+    from app.db import message_index as mi
+    from app.db.sqlite import get_sqlite_pool
+
+    monkeypatch.setattr(settings, "message_index_partition_dir", str(tmp_path / "parts"))
+    mi._create_partition_file(mi.partition_path("202601"))
+    headers = {"Authorization": f"Bearer {user_token}"}
+    assert api_client.get("/api/message-index", headers=headers).status_code == 200
+
+    async def attached_to_pool_readers():
+        databases = set()
+        for _ in range(len(pool._readers)):
+            async with pool.reader().execute("PRAGMA database_list") as cur:
+                databases |= {r[1] for r in await cur.fetchall()}
+        return databases
+
+    pool = get_sqlite_pool()
+    assert asyncio.run(attached_to_pool_readers()) == {"main"}  # partitions go on a connection of its own
+
+    for month in range(2, 2 + mi.MAX_ATTACHED_PARTITIONS):
+        mi._create_partition_file(mi.partition_path(f"2026{month:02d}"))
+    r = api_client.get("/api/message-index", headers=headers)
+    assert r.status_code == 409 and "partitions" in r.json()["detail"]
+    assert api_client.get("/api/message-index/export", headers=headers).status_code == 409
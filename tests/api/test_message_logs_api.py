@@ -143,3 +143,79 @@ def test_message_logs_batch_title_fallback(
     # Batch fallback should have filled titles from channel_mappings
     assert item["source_chat_title"] == "Source Channel"
     assert item["dest_chat_title"] == "Dest Channel"
+
+
+def test_message_logs_cursor_mode(api_client, user_token):
+    """pagination=cursor returns keyset tokens and a capped total instead of page numbers."""
+    from bson import ObjectId
+
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    docs = [
+        {
+            "_id": ObjectId(),
+            "user_id": 1,
+            "source_chat_id": 10,
+            "dest_chat_id": 20,
+            "source_chat_title": "S",
+            "dest_chat_title": "D",
+            "timestamp": base,
+            "status": "ok",
+        }
+        for _ in range(3)
+    ]
+    pipelines = []
+
+    def mock_aggregate(pipeline):
+        pipelines.append(pipeline)
+
+        async def list_gen():
+            for d in docs[: pipeline[-1]["$limit"]]:
+                yield d
+        return list_gen()
+
+    mock_coll = AsyncMock()
+    mock_coll.aggregate = mock_aggregate
+    mock_coll.count_documents = AsyncMock(return_value=3)
+    mock_db = AsyncMock()
+    mock_db.message_logs = mock_coll
+
+    with patch("app.web.routers.message_logs.get_mongo_db", return_value=mock_db):
+        r = api_client.get(
+            "/api/message-logs",
+            params={"pagination": "cursor", "page_size": 2},
+            headers={"Authorization": f"Bearer {user_token}"},
+        )
+        assert r.status_code == 200
+        data = r.json()
+        assert set(data.keys()) == {"items", "page_size", "next_cursor", "prev_cursor", "total", "total_exact"}
+        assert len(data["items"]) == 2
+        assert data["next_cursor"]
+        assert data["prev_cursor"] is None
+        assert data["total"] == 3
+        # Capped count is used by default in cursor mode
+        assert mock_coll.count_documents.await_args.kwargs.get("limit") is not None
+
+        r = api_client.get(
+            "/api/message-logs",
+            params={"cursor": data["next_cursor"], "page_size": 2},
+            headers={"Authorization": f"Bearer {user_token}"},
+        )
+        assert r.status_code == 200
+    # Non-admin scope is applied inside the keyset match
+    assert pipelines[-1][0]["$match"]["$and"][0] == {"user_id": 1}
+
+
+def test_message_logs_invalid_cursor_400(api_client, user_token):
+    r = api_client.get(
+        "/api/message-logs",
+        params={"cursor": "garbage"},
+        headers={"Authorization": f"Bearer {user_token}"},
+    )
+    assert r.status_code == 400
+
+
+def test_log_streams_require_auth(api_client):
+    """Live tail endpoints reject missing or invalid tokens (header or ?access_token=)."""
+    assert api_client.get("/api/message-logs/stream").status_code == 401
+    r = api_client.get("/api/worker-logs/stream", params={"access_token": "not-a-jwt"})
+    assert r.status_code == 401
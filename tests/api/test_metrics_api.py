@@ -0,0 +1,65 @@
+"""API tests for GET /metrics: API request latency, worker series from heartbeats, access control."""
+
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.db import leases, worker_heartbeats
+from app.db.sqlite import get_sqlite
+from app.worker_stats import WorkerStats
+
+from .conftest import run_async
+
+
+def test_metrics_include_api_routes_and_live_workers(api_client, user_token, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "scrape")
+    api_client.get("/api/workers", headers={"Authorization": f"Bearer {user_token}"})
+    api_client.post("/api/workers/w404/stop", headers={"Authorization": f"Bearer {user_token}"})
+
+    stats = WorkerStats()
+    stats.count(1, "in")
+    stats.count(1, "out")
+    stats.lap("send", 0.0)
+    stats.send_failed(TimeoutError())
+
+    async def publish():
+        db = await get_sqlite()
+        generation = await leases.claim(db, 1)
+        await worker_heartbeats.publish(db, {"account_id": 1, "generation": generation, **stats.snapshot(inflight=2)})
+        # A heartbeat left by a worker whose lease is gone is not exported.
+        await worker_heartbeats.publish(db, {"account_id": 9, "generation": 1, **stats.snapshot()})
+        await db.close()
+
+    run_async(publish())
+    r = api_client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = r.text.splitlines()
+    assert any(
+        line.startswith('tgcopier_http_request_duration_seconds_count{method="GET",route="/api/workers",status="2xx"}')
+        for line in lines
+    )
+    assert any(
+        line.startswith('tgcopier_http_request_duration_seconds_count{method="POST",'
+                        'route="/api/workers/{worker_id}/stop",status="4xx"}')
+        for line in lines
+    )
+    assert 'tgcopier_worker_messages_total{account_id="1",mapping_id="1",outcome="out"} 1' in lines
+    assert 'tgcopier_worker_queue_depth{account_id="1",queue="inflight"} 2' in lines
+    assert 'tgcopier_send_errors_total{account_id="1",error="TimeoutError"} 1' in lines
+    assert 'tgcopier_handler_stage_seconds_count{account_id="1",stage="send"} 1' in lines
+    assert 'account_id="9"' not in r.text
+
+
+def test_metrics_token_and_disable(api_client, monkeypatch):
+    # Without a token only localhost may scrape (the test client is not local) or METRICS_OPEN.
+    assert api_client.get("/metrics").status_code == 403
+    local = TestClient(api_client.app, client=("127.0.0.1", 50000))
+    assert local.get("/metrics").status_code == 200
+    monkeypatch.setattr(settings, "metrics_open", True)
+    assert api_client.get("/metrics").status_code == 200
+    monkeypatch.setattr(settings, "metrics_token", "scrape")
+    assert api_client.get("/metrics").status_code == 401
+    assert api_client.get("/metrics", headers={"Authorization": "Bearer scrape"}).status_code == 200
+    monkeypatch.setattr(settings, "metrics_enabled", False)
+    assert api_client.get("/metrics", headers={"Authorization": "Bearer scrape"}).status_code == 404
@@ -0,0 +1,114 @@
+"""API tests for on-demand profiles: the API itself, a local worker, access and limits."""
+
+import time
+
+import pytest
+
+from app.config import settings
+from app.db import cleanup, leases, worker_profiles
+from app.db.sqlite import get_sqlite
+from app.services.profiling import run_profile
+
+from .conftest import run_async
+
+
+@pytest.fixture(autouse=True)
+def profiles_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profiles_dir", str(tmp_path / "profiles"))
+    monkeypatch.setattr(settings, "profile_sample_hz", 200)
+    return tmp_path / "profiles"
+
+
+def _wait_done(api_client, headers, profile_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        profile = api_client.get(f"/api/workers/profiles/{profile_id}", headers=headers).json()
+        if profile["status"] not in ("pending", "running"):
+            return profile
+        time.sleep(0.1)
+    raise AssertionError(f"profile {profile_id} did not finish")
+
+
+def test_profile_the_api_and_download_collapsed_stacks(api_client, admin_token, profiles_dir):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    r = api_client.post("/api/workers/api/profile", params={"seconds": 1}, headers=admin)
+    assert r.status_code == 202
+    profile = r.json()
+    assert (profile["target"], profile["status"], profile["hz"]) == ("api", "running", 200)
+    assert api_client.post("/api/workers/api/profile", params={"seconds": 1}, headers=admin).status_code == 409
+
+    done = _wait_done(api_client, admin, profile["id"])
+    assert done["status"] == "done" and done["samples"] > 0 and done["overhead_pct"] is not None
+    assert (profiles_dir / f"{profile['id']}.collapsed").is_file()
+    r = api_client.get(f"/api/workers/profiles/{profile['id']}/download", headers=admin)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    lines = r.text.splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("MainThread;" in line for line in lines)
+    assert [p["id"] for p in api_client.get("/api/workers/profiles", headers=admin).json()] == [profile["id"]]
+
+
+def test_worker_profile_is_queued_for_the_workers_account(api_client, admin_token):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    assert api_client.post("/api/workers/w404/profile", headers=admin).status_code == 404
+
+    async def register_worker():
+        db = await get_sqlite()
+        generation = await leases.claim(db, 1)
+        await db.execute(
+            "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid, generation) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ("w1", 1, 1, "s.session", 1234, generation),
+        )
+        await db.commit()
+        await db.close()
+
+    run_async(register_worker())
+    r = api_client.post("/api/workers/w1/profile", params={"seconds": 1}, headers=admin)
+    assert r.status_code == 202
+    profile = r.json()
+    assert (profile["account_id"], profile["worker_id"], profile["status"]) == (1, "w1", "pending")
+    assert api_client.post("/api/workers/w1/profile", headers=admin).status_code == 409
+    r = api_client.get(f"/api/workers/profiles/{profile['id']}/download", headers=admin)
+    assert r.status_code == 409
+
+    async def worker_runs_it():  # what serve_worker_profiles does in the worker process
+        db = await get_sqlite()
+        (claimed,) = await worker_profiles.claim_pending(db, 1)
+        assert await worker_profiles.claim_pending(db, 1) == []
+        await run_profile(db, claimed)
+        await db.close()
+
+    run_async(worker_runs_it())
+    assert api_client.get(f"/api/workers/profiles/{profile['id']}", headers=admin).json()["status"] == "done"
+    assert api_client.get(f"/api/workers/profiles/{profile['id']}/download", headers=admin).status_code == 200
+
+
+def test_profiles_are_admin_only_and_bounded(api_client, user_token, admin_token, monkeypatch):
+    user = {"Authorization": f"Bearer {user_token}"}
+    assert api_client.post("/api/workers/api/profile", headers=user).status_code == 403
+    assert api_client.get("/api/workers/profiles", headers=user).status_code == 403
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    monkeypatch.setattr(settings, "profile_max_seconds", 10.0)
+    assert api_client.post("/api/workers/api/profile", params={"seconds": 11}, headers=admin).status_code == 400
+    assert api_client.post("/api/workers/api/profile", params={"seconds": 0}, headers=admin).status_code == 400
+    assert api_client.get("/api/workers/profiles/nope", headers=admin).status_code == 404
+
+
+def test_overdue_profiles_fail(api_client, admin_token):
+    async def stale_request():
+        db = await get_sqlite()
+        profile = await worker_profiles.create(db, "worker", 1, 100, 2, worker_id="w9", account_id=9)
+        await db.execute("UPDATE worker_profiles SET created_at = created_at - 1000 WHERE id = ?", (profile["id"],))
+        await db.commit()
+        await db.close()
+        return profile["id"]
+
+    profile_id = run_async(stale_request())
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    (profile,) = api_client.get("/api/workers/profiles", headers=admin).json()
+    assert profile["status"] == "pending"  # listing is read-only; the profiles maintenance job expires
+    run_async(cleanup.purge_profiles_job(time.monotonic() + 60, 100))
+    (profile,) = api_client.get("/api/workers/profiles", headers=admin).json()
+    assert (profile["id"], profile["status"]) == (profile_id, "failed")
@@ -21,7 +21,7 @@ def test_mappings_pagination_contract(api_client, user_token):
     )
     assert r.status_code == 200
     data = r.json()
-    assert set(data.keys()) == {"items", "total", "page", "page_size", "total_pages"}
+    assert set(data.keys()) == {"items", "total", "page", "page_size", "total_pages", "next_cursor"}
     assert isinstance(data["items"], list)
 
 
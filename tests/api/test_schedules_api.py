@@ -135,3 +135,13 @@ def test_admin_can_manage_other_user_mapping_schedule(api_client, admin_token):
     )
     assert r.status_code == 200
     assert r.json()["status"] == "ok"
+
+
+def test_bulk_apply_schedule_writes_every_mapping(api_client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    api_client.patch("/api/users/me/schedule", headers=headers, json={"tue_start_utc": "07:00", "tue_end_utc": "19:00"})
+    r = api_client.post("/api/mappings/schedule/bulk-apply", headers=headers)
+    assert r.status_code == 200
+    assert r.json()["updated"] == api_client.get("/api/mappings", headers=headers).json()["total"]
+    r = api_client.get("/api/mappings/1/schedule", headers=headers)
+    assert r.json()["tue_start_utc"] == "07:00"
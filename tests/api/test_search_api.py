@@ -0,0 +1,92 @@
+"""API tests for `q` full-text search on list endpoints."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.auth import create_access_token
+from app.db.search import match_expression
+
+
+def _auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.parametrize(
+    ("q", "expected"),
+    [
+        ("Crypto news", '"crypto"* "news"*'),
+        ("-1001234", '"1001234"*'),
+        ('a" OR b NEAR(', '"a"* "or"* "b"* "near"*'),
+        ("  ", None),
+        (None, None),
+    ],
+)
+def test_match_expression_quotes_prefix_terms(q, expected):
+    assert match_expression(q) == expected
+
+
+def test_mapping_search_ranks_and_scopes(api_client, user_token, admin_token):
+    headers = _auth(user_token)
+    api_client.post(
+        "/api/mappings/bulk",
+        headers=headers,
+        json=[
+            {"source_chat_id": -1001111, "dest_chat_id": -1002222, "name": "Crypto digest", "source_chat_title": "Crypto Crypto News"},
+            {"source_chat_id": -1003333, "dest_chat_id": -1004444, "name": "Weather", "dest_chat_title": "Crypto archive"},
+            {"source_chat_id": -1005555, "dest_chat_id": -1006666, "name": "Sports"},
+        ],
+    )
+    r = api_client.get("/api/mappings?q=crypto", headers=headers)
+    assert r.status_code == 200
+    data = r.json()
+    assert data["total"] == 2
+    assert [m["name"] for m in data["items"]] == ["Crypto digest", "Weather"]
+
+    assert [m["name"] for m in api_client.get("/api/mappings?q=cry&sort_by=name&sort_order=desc", headers=headers).json()["items"]] == [
+        "Weather",
+        "Crypto digest",
+    ]
+    assert api_client.get("/api/mappings?q=1005", headers=headers).json()["items"][0]["name"] == "Sports"
+    assert api_client.get("/api/mappings?q=crypto+sports", headers=headers).json()["total"] == 0
+    # Blank q lists everything; other users never see these rows.
+    assert api_client.get("/api/mappings?q=%20", headers=headers).json()["total"] == 4
+    other = create_access_token(sub="other@test.com", user_id=3, role="user")
+    assert api_client.get("/api/mappings?q=crypto", headers=_auth(other)).json()["total"] == 0
+    assert api_client.get("/api/mappings?q=crypto&user_id=1", headers=_auth(admin_token)).json()["total"] == 2
+
+
+def test_user_and_account_search(api_client, user_token, admin_token):
+    r = api_client.get("/api/admin/users?q=adm", headers=_auth(admin_token))
+    assert r.status_code == 200
+    assert [u["email"] for u in r.json()["items"]] == ["admin@test.com"]
+    assert api_client.get("/api/admin/users?q=test.com", headers=_auth(admin_token)).json()["total"] == 3
+
+    api_client.patch("/api/accounts/1", headers=_auth(user_token), json={"name": "Main Phone"})
+    r = api_client.get("/api/accounts?q=main", headers=_auth(user_token))
+    assert r.status_code == 200
+    assert [a["id"] for a in r.json()["items"]] == [1]
+    assert api_client.get("/api/accounts?q=zzz", headers=_auth(user_token)).json()["total"] == 0
+
+
+def test_broad_search_falls_back_to_id_order(api_client, user_token, monkeypatch):
+    from app.db import search
+
+    headers = _auth(user_token)
+    api_client.post(
+        "/api/mappings/bulk",
+        headers=headers,
+        json=[
+            {"source_chat_id": 1, "dest_chat_id": 2, "name": "alpha"},
+            {"source_chat_id": 3, "dest_chat_id": 4, "name": "alpha alpha alpha"},
+        ],
+    )
+    assert [m["name"] for m in api_client.get("/api/mappings?q=alpha", headers=headers).json()["items"]] == [
+        "alpha alpha alpha",
+        "alpha",
+    ]
+    monkeypatch.setattr(search, "RANK_MAX_ROWS", 1)
+    assert [m["name"] for m in api_client.get("/api/mappings?q=alpha", headers=headers).json()["items"]] == [
+        "alpha",
+        "alpha alpha alpha",
+    ]
@@ -1,9 +1,17 @@
-"""API tests for /api/stats/dashboard and /api/admin/stats/dashboard."""
+"""API tests for /api/stats (dashboard, latency, SLO breaches) and /api/admin/stats/dashboard."""
 
 from __future__ import annotations
 
+import asyncio
+import bisect
+import time
+
 import pytest
 
+from app.db import worker_heartbeats
+from app.db.latency_rollups import BUCKETS
+from app.db.sqlite import get_sqlite
+
 
 def test_stats_dashboard_200_schema(api_client, user_token):
     """User stats endpoint returns 200 and expected schema (works without MongoDB)."""
@@ -81,3 +89,61 @@ def test_admin_stats_dashboard_403_user_role(api_client, user_token):
         headers={"Authorization": f"Bearer {user_token}"},
     )
     assert r.status_code == 403
+
+
+
+def _publish_latency(generation: int, latency_by_mapping: dict[int, list[float]]) -> None:
+    """Publish account 1's worker heartbeat with cumulative copy latency histograms."""
+    latency = {}
+    for mapping_id, values in latency_by_mapping.items():
+        h = latency[str(mapping_id)] = [0.0] * (len(BUCKETS) + 2)
+        for value in values:
+            h[bisect.bisect_left(BUCKETS, value)] += 1
+            h[-1] += value
+
+    async def publish():
+        db = await get_sqlite()
+        await worker_heartbeats.publish(
+            db, {"account_id": 1, "generation": generation, "updated_at": time.time(), "latency": latency}
+        )
+        await db.close()
+
+    asyncio.run(publish())
+
+
+def test_mapping_latency_rolls_up_heartbeat_growth(api_client, user_token, admin_token):
+    """Only the growth of a worker's cumulative histograms is added; a restart counts in full."""
+    _publish_latency(1, {1: [0.4] * 10, 2: [0.4]})
+    _publish_latency(1, {1: [0.4] * 10, 2: [0.4]})  # e.g. relayed twice: adds nothing
+    _publish_latency(1, {1: [0.4] * 10 + [20.0] * 10, 2: [0.4]})
+    _publish_latency(2, {1: [0.4] * 5})  # restarted worker
+
+    r = api_client.get("/api/stats/latency", headers={"Authorization": f"Bearer {user_token}"})
+    assert r.status_code == 200
+    (item,) = r.json()["items"]  # mapping 2 belongs to another user
+    assert (item["mapping_id"], item["source_chat_id"], item["messages"]) == (1, 10, 25)
+    assert 0.25 < item["p50_seconds"] <= 0.5 and 10 < item["p95_seconds"] <= 30
+    assert item["mean_seconds"] == round((15 * 0.4 + 10 * 20.0) / 25, 3)
+    assert len(item["counts"]) == len(r.json()["buckets"]) + 1
+
+    admin = api_client.get("/api/stats/latency", headers={"Authorization": f"Bearer {admin_token}"}).json()
+    assert [i["mapping_id"] for i in admin["items"]] == [1, 2]
+    assert api_client.get("/api/stats/latency", params={"hours": 0}, headers={"Authorization": f"Bearer {user_token}"}).status_code == 400
+
+
+def test_slo_breaches_list_mappings_over_the_percentile(api_client, user_token, admin_token):
+    _publish_latency(1, {1: [0.4] * 90 + [20.0] * 10, 2: [0.4] * 100})
+    admin = {"Authorization": f"Bearer {admin_token}"}
+
+    r = api_client.get("/api/stats/slo-breaches", params={"slo_seconds": 5, "percentile": 95}, headers=admin)
+    assert r.status_code == 200
+    data = r.json()
+    assert (data["slo_seconds"], data["percentile"]) == (5, 95)
+    assert [(i["mapping_id"], i["messages"]) for i in data["items"]] == [(1, 100)]
+    assert data["items"][0]["observed_seconds"] > 5 and "counts" not in data["items"][0]
+
+    assert api_client.get("/api/stats/slo-breaches", params={"slo_seconds": 5, "percentile": 50}, headers=admin).json()["items"] == []
+    assert api_client.get("/api/stats/slo-breaches", params={"slo_seconds": 5, "min_messages": 101}, headers=admin).json()["items"] == []
+    assert api_client.get("/api/stats/slo-breaches", params={"percentile": 100}, headers=admin).status_code == 400
+    user = api_client.get("/api/stats/slo-breaches", params={"slo_seconds": 5}, headers={"Authorization": f"Bearer {user_token}"})
+    assert [i["mapping_id"] for i in user.json()["items"]] == [1]
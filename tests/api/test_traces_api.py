@@ -0,0 +1,81 @@
+"""API tests for sampled message traces: list/get scoping and the OTLP/JSON export."""
+
+import time
+
+from app.db import worker_heartbeats
+from app.db.sqlite import get_sqlite
+
+from .conftest import run_async
+
+
+def _trace(trace_id: str, outcome: str, mapping_id: int = 1) -> dict:
+    return {
+        "trace_id": trace_id,
+        "started_at": time.time(),
+        "duration_ms": 12.5,
+        "outcome": outcome,
+        "attributes": {"source_chat_id": 10, "message_id": 7},
+        "spans": [
+            {"name": "send", "mapping_id": mapping_id, "offset_ms": 1.0, "duration_ms": 10.0, "attributes": {}},
+            {"name": "mapping", "mapping_id": mapping_id, "offset_ms": 0.5, "duration_ms": 11.0,
+             "attributes": {"outcome": outcome}},
+        ],
+    }
+
+
+def _publish():
+    async def publish():
+        db = await get_sqlite()
+        await worker_heartbeats.publish(db, {
+            "account_id": 1, "generation": 1, "traces": [_trace("a" * 32, "sent"), _trace("b" * 32, "failed", 2)],
+        })
+        # Not the user's account: only admins see it.
+        await worker_heartbeats.publish(db, {"account_id": 9, "generation": 1, "traces": [_trace("c" * 32, "sent")]})
+        await db.close()
+
+    run_async(publish())
+
+
+def test_traces_are_listed_per_owned_account(api_client, user_token, admin_token):
+    _publish()
+    user = {"Authorization": f"Bearer {user_token}"}
+    r = api_client.get("/api/traces", headers=user)
+    assert r.status_code == 200
+    assert {t["trace_id"] for t in r.json()["items"]} == {"a" * 32, "b" * 32}
+    assert [t["trace_id"] for t in api_client.get("/api/traces", params={"outcome": "failed"}, headers=user).json()["items"]] == ["b" * 32]
+    assert [t["trace_id"] for t in api_client.get("/api/traces", params={"mapping_id": 1}, headers=user).json()["items"]] == ["a" * 32]
+    assert api_client.get("/api/traces", params={"outcome": "bogus"}, headers=user).status_code == 400
+    assert api_client.get("/api/traces", params={"account_id": 9}, headers=user).status_code == 404
+
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    assert api_client.get("/api/traces", headers=admin).json()["count"] == 3
+    assert api_client.get("/api/traces", params={"account_id": 9}, headers=admin).json()["count"] == 1
+
+
+def test_get_trace_hides_other_accounts(api_client, user_token, admin_token):
+    _publish()
+    user = {"Authorization": f"Bearer {user_token}"}
+    r = api_client.get(f"/api/traces/{'a' * 32}", headers=user)
+    assert r.status_code == 200
+    assert r.json()["spans"][0]["name"] == "send" and r.json()["account_id"] == 1
+    assert api_client.get(f"/api/traces/{'c' * 32}", headers=user).status_code == 404
+    assert api_client.get(f"/api/traces/{'c' * 32}", headers={"Authorization": f"Bearer {admin_token}"}).status_code == 200
+    assert api_client.get("/api/traces/missing", headers=user).status_code == 404
+
+
+def test_export_is_otlp_json(api_client, user_token):
+    _publish()
+    r = api_client.get("/api/traces/export", params={"outcome": "sent"}, headers={"Authorization": f"Bearer {user_token}"})
+    assert r.status_code == 200
+    (resource,) = r.json()["resourceSpans"]
+    assert {"key": "account_id", "value": {"intValue": "1"}} in resource["resource"]["attributes"]
+    spans = resource["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["message", "send", "mapping"]
+    root, send, mapping = spans
+    assert {s["traceId"] for s in spans} == {"a" * 32}
+    assert mapping["parentSpanId"] == root["spanId"] and send["parentSpanId"] == mapping["spanId"]
+    assert int(send["endTimeUnixNano"]) - int(send["startTimeUnixNano"]) == 10_000_000
+
+
+def test_traces_require_auth(api_client):
+    assert api_client.get("/api/traces").status_code == 401
@@ -2,11 +2,14 @@
 
 import asyncio
 import os
-from unittest.mock import MagicMock, patch
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from app.db.sqlite import get_sqlite
+from app.config import settings
+from app.db import leases, worker_heartbeats
+from app.db.sqlite import close_sqlite_pool, get_sqlite, init_sqlite, open_sqlite_pool, sqlite_writer
 from app.web.routers import workers
 
 
@@ -19,10 +22,8 @@ def _run_async(coro):
 def reset_worker_registry():
     """Reset in-memory worker registry before/after each test."""
     workers._workers.clear()
-    workers._worker_counter = 0
     yield
     workers._workers.clear()
-    workers._worker_counter = 0
 
 
 def test_start_worker_with_stale_registry_succeeds(api_client, user_token):
@@ -61,6 +62,42 @@ def test_start_worker_with_stale_registry_succeeds(api_client, user_token):
     assert data["started_at"] is not None
 
 
+def test_start_worker_forks_from_zygote_and_falls_back_to_cold_start(api_client, user_token):
+    """With a zygote running, the worker is forked by it (no Popen); if it cannot fork, Popen is used."""
+    fake_proc = MagicMock()
+    fake_proc.pid = 12345
+    fake_proc.poll.return_value = None
+    headers = {"Authorization": f"Bearer {user_token}"}
+
+    with (
+        patch.object(workers.worker_zygote, "running", return_value=True),
+        patch.object(workers.worker_zygote, "spawn", AsyncMock(return_value=os.getpid())) as spawn,
+        patch("app.web.routers.workers.subprocess.Popen", return_value=fake_proc) as popen,
+    ):
+        r = api_client.post("/api/workers/start", params={"account_id": 1}, headers=headers)
+        assert r.status_code == 200
+        assert r.json()["pid"] == os.getpid()
+        popen.assert_not_called()
+        assert spawn.await_args.kwargs["log_path"].endswith(".log")
+        assert workers._workers[r.json()["id"]]["process"] is None
+
+        workers._workers.clear()
+        _run_async(_clear_registry())
+        spawn.return_value = None
+        r = api_client.post("/api/workers/start", params={"account_id": 1}, headers=headers)
+        assert r.status_code == 200
+        assert r.json()["pid"] == 12345
+        popen.assert_called_once()
+
+
+async def _clear_registry():
+    db = await get_sqlite()
+    await db.execute("DELETE FROM worker_registry")
+    await db.execute("DELETE FROM worker_leases")
+    await db.commit()
+    await db.close()
+
+
 def test_list_workers_returns_started_at(api_client, user_token):
     """GET /workers includes started_at for each running worker."""
     fake_proc = MagicMock()
@@ -87,16 +124,18 @@ def test_list_workers_returns_started_at(api_client, user_token):
 
 
 def test_list_workers_reattaches_from_registry_when_missing_from_memory(api_client, user_token):
-    """When worker_registry has a row with alive PID but worker is not in _workers
-    (e.g. started by another API instance), list_workers returns it and reattaches."""
+    """When worker_registry has a row with a live lease but worker is not in _workers
+    (e.g. started by another API instance or host), list_workers returns it and reattaches."""
     workers._workers.clear()
     alive_pid = os.getpid()
 
     async def add_registry_row():
         db = await get_sqlite()
+        generation = await leases.claim(db, 1, owner="other-host:1", host_id="other-host")
         await db.execute(
-            "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid) VALUES (?, ?, ?, ?, ?)",
-            ("w99", 1, 1, "data/user1.session", alive_pid),
+            "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid, generation, host_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ("w99", 1, 1, "data/user1.session", alive_pid, generation, "other-host"),
         )
         await db.commit()
         await db.close()
@@ -115,4 +154,147 @@ def test_list_workers_reattaches_from_registry_when_missing_from_memory(api_clie
     assert w["account_id"] == 1
     assert w["running"] is True
     assert w["pid"] == alive_pid
+    assert w["host_id"] == "other-host"
     assert "w99" in workers._workers
+    # Not supervised by this API: shutdown leaves it running (and never signals a PID on another host).
+    assert workers._workers["w99"]["owned"] is False
+
+
+def test_stop_worker_on_another_host_goes_through_the_lease(api_client, user_token, monkeypatch):
+    """A worker on another host is never signalled: the API sets stop_requested on its lease, waits
+    for the worker to release it (here it never does) and then frees it itself."""
+    monkeypatch.setattr(settings, "worker_drain_timeout_seconds", 0.2)
+    monkeypatch.setattr(settings, "worker_heartbeat_seconds", 0.1)
+    monkeypatch.setattr(workers, "STOP_GRACE_SECONDS", 0.0)
+
+    async def add_remote_worker():
+        db = await get_sqlite()
+        generation = await leases.claim(db, 1, owner="other-host:1", host_id="other-host")
+        await db.execute(
+            "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid, generation, host_id) "
+            "VALUES (?, 1, 1, 's', ?, ?, 'other-host')",
+            (f"w1-{generation}", os.getpid(), generation),
+        )
+        await db.commit()
+        await db.close()
+        return generation
+
+    generation = _run_async(add_remote_worker())
+    with (
+        patch("app.web.routers.workers.os.kill") as kill,
+        patch.object(workers.leases, "request_stop", side_effect=leases.request_stop) as request_stop,
+    ):
+        r = api_client.post(f"/api/workers/w1-{generation}/stop", headers={"Authorization": f"Bearer {user_token}"})
+    assert r.status_code == 200
+    kill.assert_not_called()
+    assert request_stop.call_args.args[1:] == (1, generation)
+
+    async def state():
+        db = await get_sqlite()
+        lease = await leases.get_lease(db, 1)
+        async with db.execute("SELECT COUNT(*) FROM worker_registry") as cur:
+            rows = (await cur.fetchone())[0]
+        await db.close()
+        return lease.live(), rows
+
+    assert _run_async(state()) == (False, 0)
+
+
+def test_bulk_restart_drains_workers_together_without_holding_the_writer(tmp_path, monkeypatch):
+    """Restarting several accounts signals every old worker first and waits for all of them at
+    once; the pooled writer stays free for other requests while they drain."""
+    monkeypatch.setattr(settings, "sqlite_path", str(tmp_path / "restart.db"))
+    monkeypatch.setattr(settings, "worker_drain_timeout_seconds", 0.4)
+    monkeypatch.setattr(settings, "worker_heartbeat_seconds", 0.1)
+    monkeypatch.setattr(workers, "STOP_GRACE_SECONDS", 0.0)
+
+    async def scenario():
+        await init_sqlite()
+        pool = await open_sqlite_pool()
+        try:
+            async with sqlite_writer() as db:
+                for account_id in (1, 2):
+                    await db.execute(
+                        "INSERT INTO telegram_accounts (id, user_id, type, session_path, status) "
+                        "VALUES (?, 1, 'user', ?, 'active')",
+                        (account_id, f"s{account_id}"),
+                    )
+                    generation = await leases.claim(db, account_id, owner="other-host:1", host_id="other-host")
+                    await db.execute(
+                        "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid, generation, "
+                        "host_id) VALUES (?, 1, ?, 's', 1, ?, 'other-host')",
+                        (f"w{account_id}", account_id, generation),
+                    )
+                await db.commit()
+            started = time.monotonic()
+            with patch("app.web.routers.workers.subprocess.Popen", return_value=fake_proc):
+                task = workers.restart_workers_for_accounts([1, 2])
+                await asyncio.sleep(0.2)
+                writer_free = not pool._write_lock.locked()
+                await task
+            elapsed = time.monotonic() - started
+            async with pool.reader().execute("SELECT worker_id FROM worker_registry ORDER BY account_id") as cur:
+                rows = [r[0] for r in await cur.fetchall()]
+            return writer_free, elapsed, rows
+        finally:
+            await close_sqlite_pool()
+
+    fake_proc = MagicMock()
+    fake_proc.pid = 12345
+    fake_proc.poll.return_value = None
+    writer_free, elapsed, rows = _run_async(scenario())
+    assert writer_free
+    # The old workers never release their leases: one drain deadline (0.5 s with the heartbeat)
+    # for both, not one per worker.
+    assert 0.4 < elapsed < 0.9
+    assert rows == ["w1-2", "w2-2"]
+
+
+def test_stale_worker_heartbeat_is_listed_and_the_worker_restarted(api_client, user_token, monkeypatch):
+    """GET /workers shows the runtime heartbeat; a worker whose heartbeat is older than
+    WORKER_STALE_SECONDS (its lease still live) is stopped and started again."""
+    monkeypatch.setattr(settings, "worker_drain_timeout_seconds", 0.2)
+    monkeypatch.setattr(settings, "worker_heartbeat_seconds", 0.1)
+    monkeypatch.setattr(settings, "worker_stale_seconds", 20.0)
+    monkeypatch.setattr(workers, "STOP_GRACE_SECONDS", 0.0)
+
+    async def add_worker():
+        db = await get_sqlite()
+        generation = await leases.claim(db, 1, owner="other-host:1", host_id="other-host")
+        await db.execute(
+            "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid, generation, host_id, "
+            "created_at) VALUES (?, 1, 1, 's', ?, ?, 'other-host', '2000-01-01 00:00:00')",
+            (f"w1-{generation}", os.getpid(), generation),
+        )
+        await worker_heartbeats.publish(db, {
+            "account_id": 1, "generation": generation, "pid": os.getpid(), "updated_at": time.time() - 5,
+            "mappings": {"1": {"in": 3, "out": 2, "filtered": 1, "failed": 0}},
+        })
+        await db.close()
+        return generation
+
+    async def age_heartbeat_and_check():
+        db = await get_sqlite()
+        fresh = await workers.restart_stale_workers(db)
+        await db.execute("UPDATE worker_heartbeats SET updated_at = updated_at - 60")
+        await db.commit()
+        with patch("app.web.routers.workers.subprocess.Popen", return_value=fake_proc):
+            stale = await workers.restart_stale_workers(db)
+        async with db.execute("SELECT worker_id FROM worker_registry") as cur:
+            rows = await cur.fetchall()
+        await db.close()
+        return fresh, stale, rows
+
+    generation = _run_async(add_worker())
+    r = api_client.get("/api/workers", headers={"Authorization": f"Bearer {user_token}"})
+    hb = r.json()[0]["heartbeat"]
+    assert hb["messages"] == {"in": 3, "out": 2, "filtered": 1, "failed": 0}
+    assert 4 < hb["age_seconds"] < 20
+
+    fake_proc = MagicMock()
+    fake_proc.pid = 12345
+    fake_proc.poll.return_value = None
+    fresh, stale, rows = _run_async(age_heartbeat_and_check())
+    assert fresh == []
+    assert stale == [1]
+    assert rows == [(f"w1-{generation + 1}",)]
@@ -560,3 +560,87 @@ async def test_handler_forwards_even_if_mongo_log_write_fails(tmp_path):
     assert len(client.sent_messages) == 1
     assert client.sent_messages[0][1] == "hello"
 
+
+
+@pytest.mark.asyncio
+async def test_handler_counts_outcomes_per_mapping_for_the_worker_heartbeat(tmp_path):
+    from app.config import settings
+    from app.worker_stats import WorkerStats
+
+    settings.sqlite_path = str(tmp_path / "test.db")
+    await init_sqlite()
+    db = await get_sqlite()
+
+    mapping = ChannelMapping(
+        id=1,
+        user_id=1,
+        source_chat_id=10,
+        dest_chat_id=20,
+        enabled=True,
+        filters=[MappingFilter(include_text="hello", exclude_text=None, media_types=None, regex_pattern=None)],
+        source_chat_title=None,
+        dest_chat_title=None,
+    )
+    stats = WorkerStats()
+    client = DummyClient()
+    mongo = DummyMongo()
+    handler = build_message_handler(user_id=1, mappings=[mapping], db=db, mongo_db=mongo, stats=stats)
+
+    await handler(DummyEvent(chat_id=10, message=DummyMessage(1, "hello"), client=client))
+    await handler(DummyEvent(chat_id=10, message=DummyMessage(2, "other"), client=client))
+    await handler(DummyEvent(chat_id=99, message=DummyMessage(3, "hello"), client=client))
+
+    assert stats.mappings == {1: {"in": 2, "out": 1, "filtered": 1, "failed": 0}}
+    assert stats.last_update_at is not None and stats.last_send_at is not None
+    snapshot = stats.metrics.snapshot()
+    stages = {h[1]["stage"] for h in snapshot["histograms"] if h[0] == "tgcopier_handler_stage_seconds"}
+    assert stages == {"filter", "transform", "send", "index", "dest_title", "message_log"}
+    histograms = {(h[0], tuple(h[1].values())): sum(h[2]) for h in snapshot["histograms"]}
+    assert histograms[("tgcopier_copy_latency_seconds", ())] == 1
+    assert histograms[("tgcopier_db_write_seconds", ("dest_index", "sqlite"))] == 1
+    assert histograms[("tgcopier_db_write_seconds", ("message_log", "mongo"))] == 1
+    assert sum(stats.latency[1][:-1]) == 1 and list(stats.latency) == [1]
+    (log,) = mongo.logs
+    assert log["mapping_id"] == 1
+    assert log["timestamp"] <= log["dispatched_at"] <= log["completed_at"]
+
+
+@pytest.mark.asyncio
+async def test_handler_records_sampled_message_traces(tmp_path):
+    from app.config import settings
+    from app.worker_stats import WorkerStats
+
+    settings.sqlite_path = str(tmp_path / "test.db")
+    await init_sqlite()
+    db = await get_sqlite()
+
+    mappings = [
+        ChannelMapping(
+            id=1, user_id=1, source_chat_id=10, dest_chat_id=20, enabled=True, filters=[],
+            source_chat_title=None, dest_chat_title="Dest",
+        ),
+        ChannelMapping(
+            id=2, user_id=1, source_chat_id=10, dest_chat_id=30, enabled=True,
+            filters=[MappingFilter(include_text="never", exclude_text=None, media_types=None, regex_pattern=None)],
+            source_chat_title=None, dest_chat_title="Dest",
+        ),
+    ]
+    stats = WorkerStats(trace_sample_rate=1.0)
+    handler = build_message_handler(user_id=1, mappings=mappings, db=db, mongo_db=DummyMongo(), stats=stats)
+
+    await handler(DummyEvent(chat_id=10, message=DummyMessage(1, "hello"), client=DummyClient()))
+    await handler(DummyEvent(chat_id=99, message=DummyMessage(2, "hello"), client=DummyClient()))
+
+    traces = stats.snapshot()["traces"]
+    assert len(traces) == 1  # messages without a mapping are not kept
+    trace = traces[0]
+    assert trace["outcome"] == "sent"
+    assert trace["attributes"] == {"source_chat_id": 10, "message_id": 1, "user_id": 1}
+    spans = [(s["name"], s["mapping_id"], s["attributes"].get("outcome")) for s in trace["spans"]]
+    assert spans == [
+        ("filter", 1, None), ("transform", 1, None), ("send", 1, None), ("index", 1, None),
+        ("dest_title", 1, None), ("message_log", 1, None), ("mapping", 1, "sent"),
+        ("mapping", 2, "filtered"),
+    ]
+    assert all(s["duration_ms"] >= 0 and s["offset_ms"] >= 0 for s in trace["spans"])
+    assert stats.snapshot()["traces"] == []
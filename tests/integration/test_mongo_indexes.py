@@ -34,3 +34,21 @@ async def test_mongo_indexes_exist_when_connected():
                 )
     except Exception as e:
         pytest.skip(f"MongoDB not available: {e}")
+
+
+@pytest.mark.asyncio
+async def test_log_retention_ttl_applied_when_connected():
+    """apply_log_retention turns the timestamp index into a TTL index and back."""
+    from app.db.mongo_storage import TTL_INDEX_NAME, apply_log_retention, get_retention_days
+
+    try:
+        db = get_mongo_db()
+        await db.command("ping")
+    except Exception as e:
+        pytest.skip(f"MongoDB not available: {e}")
+    try:
+        await apply_log_retention(db, "worker_logs", 30)
+        info = (await db.worker_logs.index_information())[TTL_INDEX_NAME]
+        assert info["expireAfterSeconds"] == 30 * 86400
+    finally:
+        await apply_log_retention(db, "worker_logs", get_retention_days("worker_logs"))
@@ -0,0 +1,72 @@
+"""Explain every log query shape against a real MongoDB and fail on COLLSCAN or in-memory SORT."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config import settings
+from app.db.mongo import get_mongo_client
+from app.db.mongo_indexes import INDEXES
+
+from mongo_query_shapes import iter_query_shapes  # tests/mongo_query_shapes.py
+
+BAD_STAGES = {"COLLSCAN", "SORT"}
+
+
+def _winning_stages(node, in_winning: bool = False) -> list[str]:
+    """Stage names inside any winningPlan of an explain document (rejectedPlans are ignored)."""
+    stages: list[str] = []
+    if isinstance(node, dict):
+        if in_winning and isinstance(node.get("stage"), str):
+            stages.append(node["stage"])
+        for key, value in node.items():
+            if key == "rejectedPlans":
+                continue
+            stages += _winning_stages(value, in_winning or key in ("winningPlan", "queryPlan"))
+    elif isinstance(node, list):
+        for item in node:
+            stages += _winning_stages(item, in_winning)
+    return stages
+
+
+@pytest.mark.asyncio
+async def test_log_query_shapes_use_indexes():
+    client = get_mongo_client()
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        pytest.skip(f"MongoDB not available: {e}")
+    db = client[f"{settings.mongo_db}_explain_test"]
+    try:
+        base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for coll_name, specs in INDEXES.items():
+            coll = db[coll_name]
+            for spec in specs:
+                await coll.create_index(spec["keys"], name=spec["name"])
+            # Enough spread that the planner has real choices to make.
+            await coll.insert_many(
+                [
+                    {
+                        "user_id": i % 7,
+                        "account_id": i % 5,
+                        "level": ("INFO", "WARNING", "ERROR")[i % 3],
+                        "source_chat_id": -1000 - i % 11,
+                        "dest_chat_id": -2000 - i % 13,
+                        "timestamp": base + timedelta(minutes=i),
+                    }
+                    for i in range(2000)
+                ]
+            )
+        failures = []
+        for coll_name, shape, pipeline in iter_query_shapes():
+            explain = await db.command(
+                {"explain": {"aggregate": coll_name, "pipeline": pipeline, "cursor": {}}, "verbosity": "queryPlanner"}
+            )
+            bad = BAD_STAGES.intersection(_winning_stages(explain))
+            if bad:
+                failures.append(f"{coll_name} {shape}: {sorted(bad)}")
+        assert not failures, "Query shapes without index support:\n" + "\n".join(failures)
+    finally:
+        await client.drop_database(db.name)
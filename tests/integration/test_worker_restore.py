@@ -4,6 +4,7 @@ from unittest.mock import MagicMock, patch
 
 import pytest
 
+from app.db import leases
 from app.db.sqlite import get_sqlite, init_sqlite
 from app.web.routers import workers
 
@@ -38,7 +39,6 @@ async def test_restore_does_not_auto_start_workers(db_with_active_account):
     Only orphan workers (from worker_registry with living PIDs) are reattached."""
     db = db_with_active_account
     workers._workers.clear()
-    workers._worker_counter = 0
 
     with patch("subprocess.Popen") as mock_popen:
         await workers.restore_workers_from_db(db)
@@ -54,7 +54,6 @@ async def test_restore_spawns_workers_for_dead_registry_entries(db_with_active_a
     restore spawns new workers for those accounts."""
     db = db_with_active_account
     workers._workers.clear()
-    workers._worker_counter = 0
 
     async with db.execute("SELECT session_path FROM telegram_accounts WHERE id = 1") as cur:
         row = await cur.fetchone()
@@ -80,4 +79,34 @@ async def test_restore_spawns_workers_for_dead_registry_entries(db_with_active_a
     assert "started_at" in w
     assert w["started_at"] is not None
 
-    await workers.terminate_all_workers(db)
+    await workers.terminate_all_workers()
+
+
+@pytest.mark.asyncio
+async def test_restore_adopts_live_workers_on_this_host_only(db_with_active_account):
+    """Live leases are reattached without spawning; only those on this host become supervised
+    (stopped on shutdown) by this API."""
+    db = db_with_active_account
+    workers._workers.clear()
+    await db.execute(
+        "INSERT INTO telegram_accounts (id, user_id, type, session_path, status) VALUES (2, 1, 'user', 's2', 'active')"
+    )
+    local = await leases.claim(db, 1, owner="old-api", host_id=leases.HOST_ID)
+    remote = await leases.claim(db, 2, owner="other-api", host_id="other-host")
+    for account_id, generation, host_id in ((1, local, leases.HOST_ID), (2, remote, "other-host")):
+        await db.execute(
+            "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid, generation, host_id) "
+            "VALUES (?, 1, ?, 's', 4242, ?, ?)",
+            (f"w{account_id}-{generation}", account_id, generation, host_id),
+        )
+    await db.commit()
+
+    with patch("subprocess.Popen") as mock_popen:
+        await workers.restore_workers_from_db(db)
+
+    assert not mock_popen.called
+    owned = {w["account_id"]: w["owned"] for w in workers._workers.values()}
+    assert owned == {1: True, 2: False}
+    assert (await leases.get_lease(db, 1)).owner == leases.INSTANCE_ID
+    assert (await leases.get_lease(db, 2)).owner == "other-api"
+    workers._workers.clear()
@@ -0,0 +1,49 @@
+"""Log query shapes shared by the unit and integration index tests (test_mongo_query_shape_plans,
+test_mongo_query_shapes)."""
+
+from __future__ import annotations
+
+from itertools import combinations
+
+from bson import ObjectId
+
+from app.services.log_queries import (
+    MESSAGE_LOG_FILTERS,
+    WORKER_LOG_FILTERS,
+    cursor_pipeline,
+    message_logs_match,
+    page_pipeline,
+    parse_iso_datetime,
+    worker_logs_match,
+)
+
+
+def iter_query_shapes():
+    """Yield (collection, shape_name, pipeline) for every filter combination the log endpoints can
+    issue, built with the same helpers the routers use.
+    "/count" shapes mirror the pipeline count_documents() sends for filtered totals."""
+    samples = {"user_id": 1, "source_chat_id": -1001, "dest_chat_id": -1002, "account_id": 1, "level": "ERROR"}
+    builders = {
+        "message_logs": (message_logs_match, MESSAGE_LOG_FILTERS),
+        "worker_logs": (worker_logs_match, WORKER_LOG_FILTERS),
+    }
+    cursor = {"ts": parse_iso_datetime("2024-01-15T00:00:00Z"), "id": ObjectId(), "d": "next"}
+    for coll_name, (build, fields) in builders.items():
+        for n in range(len(fields) + 1):
+            for combo in combinations(fields, n):
+                for ranged in (False, True):
+                    kwargs = {f: samples[f] for f in combo}
+                    if ranged:
+                        kwargs.update(date_from="2024-01-01T00:00:00Z", date_to="2024-02-01T00:00:00Z")
+                    match = build(**kwargs)
+                    name = "+".join(combo) or "all"
+                    if ranged:
+                        name += "+range"
+                    yield coll_name, f"{name}/page", page_pipeline(match, 2, 50)
+                    yield coll_name, f"{name}/cursor", cursor_pipeline(match, cursor, 50)
+                    yield coll_name, f"{name}/cursor-prev", cursor_pipeline(match, {**cursor, "d": "prev"}, 50)
+                    if match:
+                        yield coll_name, f"{name}/count", [
+                            {"$match": match},
+                            {"$group": {"_id": 1, "n": {"$sum": 1}}},
+                        ]
@@ -0,0 +1,138 @@
+"""Unit tests for the remote worker agent (assignment start, failure reports, self-fencing) and the
+mappings snapshot it runs workers from."""
+
+from __future__ import annotations
+
+import base64
+import json
+from pathlib import Path
+
+from app.agent import Agent, AgentApiError, _Worker
+from app.services.mapping_service import (
+    ChannelMapping,
+    MappingFilter,
+    MappingTransform,
+    Schedule,
+    mappings_from_snapshot,
+    mappings_to_snapshot,
+)
+
+
+class _FakeProcess:
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.returncode = None
+        self.signals: list[str] = []
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.signals.append("TERM")
+
+    def kill(self):
+        self.signals.append("KILL")
+        self.returncode = -9
+
+
+class _FakeApi:
+    base_url = "http://api"
+
+    def __init__(self):
+        self.replies: list = []
+        self.heartbeats: list[dict] = []
+        self.bundles: dict[str, dict] = {}
+        self.downloads: list[str] = []
+
+    def request(self, method, path, body=None, params=None):
+        if path == "/api/agents/heartbeat":
+            self.heartbeats.append(body)
+            reply = self.replies.pop(0) if self.replies else {}
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+        worker_id = path.rsplit("/", 1)[-1]
+        if worker_id not in self.bundles:
+            raise AgentApiError(f"GET {path}: HTTP 404")
+        return self.bundles[worker_id]
+
+    def download(self, path, dest, params=None):
+        self.downloads.append(path)
+        Path(dest).write_bytes(b"asset")
+
+
+def _mapping() -> ChannelMapping:
+    return ChannelMapping(
+        id=1, user_id=1, source_chat_id=10, dest_chat_id=20, enabled=True,
+        filters=[MappingFilter(include_text="a", exclude_text=None, media_types=None, regex_pattern=None)],
+        source_chat_title=None, dest_chat_title="Dest",
+        transforms=[MappingTransform(
+            id=5, rule_type="media", replacement_media_asset_id=7,
+            replacement_media_asset_path="/api/host/media/7_logo.png", replacement_media_kind="photo",
+        )],
+        schedule=Schedule(*(["09:00", "17:00"] + [None] * 12)),
+    )
+
+
+def test_mappings_snapshot_round_trip():
+    mapping = _mapping()
+    snapshot = json.loads(json.dumps(mappings_to_snapshot([mapping])))
+    assert mappings_from_snapshot(snapshot) == [mapping]
+
+
+def test_assignment_runs_from_bundle_with_local_media(tmp_path):
+    api = _FakeApi()
+    api.bundles["w3-1"] = {
+        "worker_id": "w3-1", "user_id": 1, "account_id": 3, "generation": 1,
+        "session": base64.b64encode(b"sqlite-session").decode(),
+        "mappings": mappings_to_snapshot([_mapping()]),
+    }
+    spawned = []
+    agent = Agent(api, "a", 2, tmp_path, spawn=lambda cmd, log: spawned.append(cmd) or _FakeProcess(100))
+    api.replies = [
+        {"assignments": [{"worker_id": "w3-1", "account_id": 3, "generation": 1},
+                         {"worker_id": "w4-2", "account_id": 4, "generation": 2}]},
+    ]
+    assert agent.heartbeat()
+
+    assert list(agent.workers) == ["w3-1"]
+    cmd = spawned[0]
+    assert Path(cmd[cmd.index("run-worker") + 2]).read_bytes() == b"sqlite-session"
+    snapshot = json.loads(Path(cmd[cmd.index("--mappings-snapshot") + 1]).read_text())
+    local_asset = snapshot[0]["transforms"][0]["replacement_media_asset_path"]
+    assert Path(local_asset).read_bytes() == b"asset" and local_asset.startswith(str(tmp_path))
+    assert api.downloads == ["/api/agents/assignments/w3-1/media/7"]
+
+    # The failed assignment is reported as exited (freeing its lease); the running worker is renewed.
+    agent.heartbeat()
+    body = api.heartbeats[-1]
+    assert [w["worker_id"] for w in body["running"]] == ["w3-1"]
+    assert [(e["worker_id"], "404" in e["error"]) for e in body["exited"]] == [("w4-2", True)]
+
+
+def test_stop_drains_then_reports_exit(tmp_path):
+    api = _FakeApi()
+    agent = Agent(api, "a", 1, tmp_path, spawn=lambda cmd, log: _FakeProcess(100))
+    proc = _FakeProcess(100)
+    agent.workers["w1-1"] = _Worker("w1-1", 1, 1, proc)
+    api.replies = [{"stop": ["w1-1"]}]
+    agent.heartbeat()
+    assert proc.signals == ["TERM"]
+    proc.returncode = 0
+    agent.heartbeat()
+    assert api.heartbeats[-1]["exited"] == [{"worker_id": "w1-1", "account_id": 1, "generation": 1, "exit_code": 0}]
+    agent.heartbeat()
+    assert api.heartbeats[-1]["exited"] == []  # reported once
+
+
+def test_agent_stops_workers_when_api_unreachable_past_lease_ttl(tmp_path):
+    api = _FakeApi()
+    agent = Agent(api, "a", 1, tmp_path)
+    proc = _FakeProcess(100)
+    agent.workers["w1-1"] = _Worker("w1-1", 1, 1, proc)
+    api.replies = [AgentApiError("down"), AgentApiError("down")]
+    assert agent.heartbeat() is False
+    assert proc.signals == []  # within the lease TTL: keep running
+    agent.lease_ttl_seconds = 0.0
+    assert agent.heartbeat() is False
+    assert proc.signals == ["TERM"]
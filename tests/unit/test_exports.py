@@ -0,0 +1,105 @@
+"""Unit tests for the streaming export encoders and batch iterators."""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import json
+
+import aiosqlite
+import pytest
+
+from app.services.exports import (
+    MESSAGE_INDEX_FIELDS,
+    encode_export,
+    iter_message_index_batches,
+    prime_stream,
+)
+
+
+async def _batches(*batches):
+    for b in batches:
+        yield b
+
+
+async def _collect(chunks) -> bytes:
+    return b"".join([c async for c in chunks])
+
+
+@pytest.mark.asyncio
+async def test_ndjson_and_csv_encoding():
+    rows = [{"a": 1, "b": "x,y"}, {"a": 2, "b": "ü"}]
+    out = await _collect(encode_export(_batches(rows[:1], rows[1:]), "ndjson", ["a", "b"]))
+    assert [json.loads(line) for line in out.decode().splitlines()] == rows
+
+    out = await _collect(encode_export(_batches(rows), "csv", ["a", "b"]))
+    parsed = list(csv.DictReader(io.StringIO(out.decode())))
+    assert parsed == [{"a": "1", "b": "x,y"}, {"a": "2", "b": "ü"}]
+
+
+@pytest.mark.asyncio
+async def test_gzip_output_round_trips_and_empty_csv_keeps_header():
+    out = await _collect(encode_export(_batches(), "csv", ["a", "b"], gzip=True))
+    assert gzip.decompress(out).decode().strip() == "a,b"
+
+
+@pytest.mark.asyncio
+async def test_invalid_format_rejected():
+    with pytest.raises(ValueError):
+        encode_export(_batches(), "xml", [])
+
+
+@pytest.mark.asyncio
+async def test_message_index_batches_walk_primary_key(tmp_path):
+    async with aiosqlite.connect(tmp_path / "t.db") as db:
+        await db.execute(
+            """CREATE TABLE dest_message_index (
+                 user_id INTEGER NOT NULL, source_chat_id INTEGER NOT NULL,
+                 source_msg_id INTEGER NOT NULL, dest_chat_id INTEGER NOT NULL,
+                 dest_msg_id INTEGER NOT NULL,
+                 PRIMARY KEY (user_id, source_chat_id, source_msg_id, dest_chat_id))"""
+        )
+        rows = [(u, s, m, d, m * 10) for u in (1, 2) for s in (10, 11) for m in range(3) for d in (20, 21)]
+        await db.executemany("INSERT INTO dest_message_index VALUES (?,?,?,?,?)", rows)
+        await db.commit()
+
+        batches = [b async for b in iter_message_index_batches(db, 5)]
+        assert all(len(b) <= 5 for b in batches)
+        flat = [tuple(r[f] for f in MESSAGE_INDEX_FIELDS) for b in batches for r in b]
+        assert flat == sorted(rows)
+
+        batches = [b async for b in iter_message_index_batches(db, 4, user_id=2, dest_chat_id=21)]
+        flat = [r for b in batches for r in b]
+        assert len(flat) == 6
+        assert {(r["user_id"], r["dest_chat_id"]) for r in flat} == {(2, 21)}
+
+
+@pytest.mark.asyncio
+async def test_prime_stream_raises_before_first_byte():
+    async def failing():
+        raise RuntimeError("boom")
+        yield  # pragma: no cover
+
+    with pytest.raises(RuntimeError):
+        await prime_stream(failing())
+
+    primed = await prime_stream(_batches([1], [2]))
+    assert [b async for b in primed] == [[1], [2]]
+
+
+@pytest.mark.asyncio
+async def test_closing_a_primed_stream_closes_its_source():
+    closed = []
+
+    async def source():
+        try:
+            yield [1]
+            yield [2]
+        finally:
+            closed.append(True)
+
+    primed = await prime_stream(source())
+    assert await primed.__anext__() == [1]
+    await primed.aclose()  # what the export routes' BackgroundTask does after a disconnect
+    assert closed == [True]
@@ -0,0 +1,34 @@
+"""Unit tests for per-mapping latency rollups: heartbeat growth and percentile estimates."""
+
+from __future__ import annotations
+
+from app.db.latency_rollups import BUCKETS, growth, quantile
+
+
+def _hist(**counts: int) -> list[float]:
+    """Histogram with counts by bucket index name (b0, b1, ...) and a zero sum."""
+    h = [0.0] * (len(BUCKETS) + 2)
+    for key, value in counts.items():
+        h[int(key[1:])] = value
+    return h
+
+
+def test_growth_subtracts_the_previous_heartbeat_of_the_same_worker():
+    old = {"1": _hist(b0=2), "2": _hist(b1=1)}
+    new = {"1": _hist(b0=5, b3=1), "2": _hist(b1=1), "3": _hist(b2=4)}
+    assert growth(new, old) == {1: _hist(b0=3, b3=1), 3: _hist(b2=4)}
+    assert growth(new, None) == {1: new["1"], 2: new["2"], 3: new["3"]}
+    # A histogram that shrank comes from a restarted worker.
+    assert growth({"1": _hist(b0=1)}, old) == {1: _hist(b0=1)}
+    assert growth({"1": [1.0, 2.0]}, None) == {}
+
+
+def test_quantile_interpolates_within_buckets():
+    counts = [0] * (len(BUCKETS) + 1)
+    counts[0] = 50  # <= 0.25s
+    counts[1] = 50  # 0.25 - 0.5s
+    assert quantile(counts, 0.5) == 0.25
+    assert quantile(counts, 0.75) == 0.375
+    assert quantile([0] * (len(BUCKETS) + 1), 0.5) is None
+    overflow = [0] * len(BUCKETS) + [3]
+    assert quantile(overflow, 0.99) == BUCKETS[-1]
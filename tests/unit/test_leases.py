@@ -0,0 +1,94 @@
+"""Unit tests for worker leases (claim/renew/release CAS, fencing, worker heartbeat)."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from app.config import settings
+from app.db import leases
+from app.db.sqlite import get_sqlite, init_sqlite
+from app.worker import _hold_lease
+from app.worker_drain import Drain
+
+
+@pytest.fixture
+async def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_path", str(tmp_path / "leases.db"))
+    await init_sqlite()
+    conn = await get_sqlite()
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_claim_is_exclusive_and_generations_fence_old_workers(db):
+    gen = await leases.claim(db, 1, owner="api-a", host_id="host-a")
+    assert gen == 1
+    assert await leases.claim(db, 1, owner="api-b", host_id="host-b") is None
+    assert await leases.renew(db, 1, gen) is False
+
+    assert await leases.request_stop(db, 1, gen) is True
+    assert await leases.renew(db, 1, gen) is True
+    assert await leases.release(db, 1, gen) is True
+    assert await leases.renew(db, 1, gen) is None  # released: the worker is fenced off
+
+    gen2 = await leases.claim(db, 1, owner="api-b", host_id="host-b")
+    assert gen2 == 2
+    lease = await leases.get_lease(db, 1)
+    assert (lease.owner, lease.host_id, lease.stop_requested, lease.live()) == ("api-b", "host-b", False, True)
+    # The old generation can neither renew, stop nor release the new claim.
+    assert await leases.renew(db, 1, gen) is None
+    assert await leases.request_stop(db, 1, gen) is False
+    assert await leases.release(db, 1, gen) is False
+    assert set(await leases.live_leases(db)) == {1}
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_can_be_claimed_but_not_renewed(db):
+    gen = await leases.claim(db, 1, ttl=0.0)
+    assert await leases.live_leases(db, [1]) == {}
+    assert await leases.renew(db, 1, gen) is None
+    assert await leases.claim(db, 1) == gen + 1
+
+
+@pytest.mark.asyncio
+async def test_registry_rows_without_live_lease_are_orphaned(db):
+    gen = await leases.claim(db, 1)
+    await leases.claim(db, 2, ttl=0.0)
+    for worker_id, account_id, generation in (("w1-1", 1, gen), ("w1-0", 3, 0), ("w2-1", 2, 1)):
+        await db.execute(
+            "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid, generation) "
+            "VALUES (?, 1, ?, 's', 1, ?)",
+            (worker_id, account_id, generation),
+        )
+    async with db.execute(
+        f"SELECT worker_id FROM worker_registry WHERE {leases.REGISTRY_ROW_ORPHANED} ORDER BY worker_id",
+        (time.time(),),
+    ) as cur:
+        assert [r[0] for r in await cur.fetchall()] == ["w1-0", "w2-1"]
+
+
+@pytest.mark.asyncio
+async def test_worker_heartbeat_drains_on_stop_request_and_lost_lease(db, monkeypatch):
+    monkeypatch.setattr(settings, "worker_heartbeat_seconds", 0.02)
+    gen = await leases.claim(db, 1, ttl=1.0)
+    drain = Drain()
+    task = asyncio.create_task(_hold_lease(db, 1, gen, drain))
+    await asyncio.sleep(0.1)
+    assert not drain.requested.is_set()
+    first = (await leases.get_lease(db, 1)).heartbeat_at
+    assert first is not None
+
+    await leases.request_stop(db, 1, gen)
+    await asyncio.wait_for(drain.requested.wait(), 2)
+    await asyncio.sleep(0.1)
+    assert not task.done()  # keeps the lease while draining
+    assert (await leases.get_lease(db, 1)).heartbeat_at > first
+
+    await leases.release(db, 1, gen)
+    await asyncio.wait_for(task, 2)
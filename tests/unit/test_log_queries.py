@@ -0,0 +1,132 @@
+"""Unit tests for keyset pagination and counting over the Mongo log collections."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.services.log_queries import (
+    COUNT_CAP,
+    count_logs,
+    cursor_pipeline,
+    fetch_cursor_page,
+    parse_cursor,
+)
+from app.utils.cursor import encode_cursor
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    for key, cond in query.items():
+        if key == "$and":
+            if not all(_matches(doc, q) for q in cond):
+                return False
+        elif key == "$or":
+            if not any(_matches(doc, q) for q in cond):
+                return False
+        elif isinstance(cond, dict):
+            val = doc.get(key)
+            for op, arg in cond.items():
+                if op == "$lt" and not val < arg:
+                    return False
+                if op == "$gt" and not val > arg:
+                    return False
+                if op == "$lte" and not val <= arg:
+                    return False
+                if op == "$gte" and not val >= arg:
+                    return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+class FakeCollection:
+    """Evaluates the $match/$sort/$limit pipelines produced by cursor_pipeline."""
+
+    def __init__(self, docs: list[dict]):
+        self.docs = docs
+
+    def aggregate(self, pipeline: list[dict]):
+        rows = list(self.docs)
+        for stage in pipeline:
+            if "$match" in stage:
+                rows = [d for d in rows if _matches(d, stage["$match"])]
+            elif "$sort" in stage:
+                for field, direction in reversed(list(stage["$sort"].items())):
+                    rows.sort(key=lambda d: d[field], reverse=direction < 0)
+            elif "$limit" in stage:
+                rows = rows[: stage["$limit"]]
+
+        async def gen():
+            for row in rows:
+                yield row
+
+        return gen()
+
+
+def _docs(n: int) -> list[dict]:
+    base = datetime(2024, 1, 1)
+    # Pairs share a timestamp so the _id tie-breaker is exercised.
+    return [
+        {"_id": ObjectId(), "timestamp": base + timedelta(seconds=i // 2), "user_id": 1, "n": i}
+        for i in range(n)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_cover_all_docs_once_and_walk_back():
+    coll = FakeCollection(_docs(7))
+    seen: list[int] = []
+    pages = []
+    docs, next_cursor, prev_cursor = await fetch_cursor_page(coll, {"user_id": 1}, None, 3)
+    assert prev_cursor is None
+    while True:
+        pages.append([d["n"] for d in docs])
+        seen.extend(d["n"] for d in docs)
+        if not next_cursor:
+            break
+        docs, next_cursor, prev_cursor = await fetch_cursor_page(
+            coll, {"user_id": 1}, parse_cursor(next_cursor), 3
+        )
+    assert sorted(seen) == list(range(7))
+    assert len(seen) == 7
+    assert pages[0] == [6, 5, 4]
+    assert pages[-1] == [0]
+
+    docs, _, prev_cursor = await fetch_cursor_page(coll, {"user_id": 1}, parse_cursor(prev_cursor), 3)
+    assert [d["n"] for d in docs] == pages[-2]
+
+
+def test_cursor_pipeline_seeks_on_timestamp_and_id():
+    ts = datetime(2024, 1, 1)
+    oid = ObjectId()
+    pipeline = cursor_pipeline({"user_id": 1}, {"ts": ts, "id": oid, "d": "next"}, 50)
+    match = pipeline[0]["$match"]
+    assert match["$and"][0] == {"user_id": 1}
+    assert match["$and"][1]["timestamp"] == {"$lte": ts}
+    assert match["$and"][1]["$or"] == [{"timestamp": {"$lt": ts}}, {"_id": {"$lt": oid}}]
+    assert pipeline[1] == {"$sort": {"timestamp": -1, "_id": -1}}
+    assert pipeline[2] == {"$limit": 51}
+
+
+def test_parse_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_cursor("not-a-cursor")
+    with pytest.raises(ValueError):
+        parse_cursor(encode_cursor({"ts": "2024-01-01T00:00:00", "id": "nope"}))
+
+
+@pytest.mark.asyncio
+async def test_count_capped_reports_cap_when_exceeded():
+    class Coll:
+        async def count_documents(self, match, limit=None):
+            return min(50_000, limit) if limit else 50_000
+
+        async def estimated_document_count(self):
+            return 49_000
+
+    assert await count_logs(Coll(), {"user_id": 1}, "capped") == (COUNT_CAP, False)
+    assert await count_logs(Coll(), {}, "estimated") == (49_000, False)
+    assert await count_logs(Coll(), {}, "exact") == (50_000, True)
+    assert await count_logs(Coll(), {}, "none") == (None, False)
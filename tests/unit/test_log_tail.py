@@ -0,0 +1,204 @@
+"""Unit tests for the live log tail hub (change stream, polling fallback, SSE framing)."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import ConfigurationError, OperationFailure
+
+from app.services import log_tail
+from app.services.log_tail import LogTailHub, doc_matches, sse_events
+
+BASE = datetime(2024, 1, 1)
+
+
+def _match(doc: dict, query: dict) -> bool:
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(_match(doc, q) for q in cond):
+                return False
+        elif isinstance(cond, dict):
+            if not all(doc.get(key) > arg for op, arg in cond.items() if op == "$gt"):
+                return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+class PollingCollection:
+    """Collection without change streams: watch() fails, aggregate() evaluates tail pipelines."""
+
+    def __init__(self, docs: list[dict] | None = None):
+        self.docs = list(docs or [])
+        self.queries = 0
+
+    def watch(self, pipeline, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+    def aggregate(self, pipeline):
+        self.queries += 1
+        rows = list(self.docs)
+        for stage in pipeline:
+            if "$match" in stage:
+                rows = [d for d in rows if _match(d, stage["$match"])]
+            elif "$sort" in stage:
+                for f, direction in reversed(list(stage["$sort"].items())):
+                    rows.sort(key=lambda d: d[f], reverse=direction < 0)
+            elif "$limit" in stage:
+                rows = rows[: stage["$limit"]]
+
+        async def gen():
+            for r in rows:
+                yield r
+
+        return gen()
+
+    def insert(self, timestamp: datetime | None = None, **fields) -> None:
+        timestamp = timestamp or BASE + timedelta(seconds=len(self.docs))
+        self.docs.append({"_id": ObjectId(), "timestamp": timestamp, **fields})
+
+
+class ChangeStreamCollection:
+    def __init__(self):
+        self.changes: asyncio.Queue = asyncio.Queue()
+        self.watch_calls = 0
+
+    def watch(self, pipeline, **kwargs):
+        self.watch_calls += 1
+        coll = self
+
+        class Stream:
+            resume_token = {"_data": "x"}
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def __aiter__(self):
+                return self
+
+            async def __anext__(self):
+                return await coll.changes.get()
+
+        return Stream()
+
+
+async def _drain(sub, n: int, timeout: float = 1.0) -> list[dict]:
+    return [await asyncio.wait_for(sub.queue.get(), timeout) for _ in range(n)]
+
+
+def test_doc_matches_equality_filter():
+    doc = {"user_id": 1, "level": "INFO", "account_id": 5}
+    assert doc_matches(doc, {})
+    assert doc_matches(doc, {"user_id": 1, "level": "INFO"})
+    assert not doc_matches(doc, {"user_id": 2})
+
+
+@pytest.mark.asyncio
+async def test_poll_fallback_fans_out_one_upstream_to_filtered_subscribers():
+    coll = PollingCollection()
+    coll.insert(user_id=1, level="INFO", message="old")
+    hub = LogTailHub("worker_logs", coll_factory=lambda: coll, poll_interval=0.01)
+    sub_user = hub.subscribe({"user_id": 1})
+    sub_errors = hub.subscribe({"level": "ERROR"})
+    task = hub._task
+    await asyncio.sleep(0.05)
+    assert hub.mode == "poll"
+
+    coll.insert(user_id=1, level="INFO", message="a")
+    coll.insert(user_id=2, level="ERROR", message="b")
+    coll.insert(user_id=1, level="ERROR", message="c")
+
+    assert [i["message"] for i in await _drain(sub_user, 2)] == ["a", "c"]
+    assert [i["message"] for i in await _drain(sub_errors, 2)] == ["b", "c"]
+    assert hub._task is task  # second subscriber reused the upstream reader
+
+    hub.unsubscribe(sub_user)
+    assert hub._task is task
+    hub.unsubscribe(sub_errors)
+    assert hub._task is None
+    await asyncio.sleep(0)
+    assert task.cancelled() or task.done()
+    queries = coll.queries
+    await asyncio.sleep(0.05)
+    assert coll.queries == queries  # idle hub issues no queries
+
+
+@pytest.mark.asyncio
+async def test_poll_follows_insertion_order_not_timestamps():
+    coll = PollingCollection()
+    coll.insert(message="old")
+    hub = LogTailHub("worker_logs", coll_factory=lambda: coll, poll_interval=0.01)
+    sub = hub.subscribe({})
+    await asyncio.sleep(0.05)
+    coll.insert(message="a")
+    coll.insert(message="late", timestamp=BASE - timedelta(days=1))  # a worker flushing a buffered log
+    assert [i["message"] for i in await _drain(sub, 2)] == ["a", "late"]
+    await hub.stop()
+
+
+@pytest.mark.asyncio
+async def test_upstream_retries_when_the_collection_is_unavailable(monkeypatch):
+    monkeypatch.setattr(log_tail, "_RETRY_DELAY_SECONDS", 0.01)
+    coll = PollingCollection()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConfigurationError("no Mongo yet")
+        return coll
+
+    hub = LogTailHub("worker_logs", coll_factory=factory, poll_interval=0.01)
+    sub = hub.subscribe({})
+    await asyncio.sleep(0.05)
+    assert hub.mode == "poll" and len(calls) == 2
+    coll.insert(message="a")
+    assert [i["message"] for i in await _drain(sub, 1)] == ["a"]
+    await hub.stop()
+
+
+@pytest.mark.asyncio
+async def test_change_stream_used_when_available():
+    coll = ChangeStreamCollection()
+    hub = LogTailHub("message_logs", coll_factory=lambda: coll)
+    sub = hub.subscribe({"user_id": 1})
+    await asyncio.sleep(0)
+    await coll.changes.put({"operationType": "insert", "fullDocument": {"user_id": 2, "timestamp": BASE}})
+    await coll.changes.put(
+        {"operationType": "insert", "fullDocument": {"user_id": 1, "source_chat_id": 10, "timestamp": BASE}}
+    )
+    (item,) = await _drain(sub, 1)
+    assert hub.mode == "change_stream"
+    assert item["source_chat_id"] == 10
+    assert item["timestamp"] == BASE.isoformat()
+    await hub.stop()
+    assert coll.watch_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_sse_events_frames_items_keepalive_and_unsubscribes():
+    coll = ChangeStreamCollection()
+    hub = LogTailHub("worker_logs", coll_factory=lambda: coll)
+    events = sse_events(hub, {}, "worker_log", keepalive=0.01)
+    assert await events.__anext__() == "retry: 3000\n\n"
+    assert hub.subscriber_count == 1
+    assert await events.__anext__() == ": keepalive\n\n"
+
+    await coll.changes.put({"fullDocument": {"user_id": 1, "level": "INFO", "message": "m", "timestamp": BASE}})
+    frame = await events.__anext__()
+    while frame.startswith(":"):
+        frame = await events.__anext__()
+    event_line, data_line, _, _ = frame.split("\n")
+    assert event_line == "event: worker_log"
+    assert json.loads(data_line[len("data: "):])["message"] == "m"
+
+    await events.aclose()
+    assert hub.subscriber_count == 0
+    assert hub._task is None
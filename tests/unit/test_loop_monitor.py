@@ -0,0 +1,55 @@
+"""Unit tests for the event-loop lag sampler and the slow-callback watchdog."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from app.utils.loop_monitor import LoopMonitor
+from app.utils.metrics import Registry
+
+
+def _blocking_call(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def _histogram_count(registry: Registry, name: str) -> float:
+    return sum(sum(h[2]) for h in registry.snapshot()["histograms"] if h[0] == name)
+
+
+@pytest.mark.asyncio
+async def test_slow_callback_is_reported_with_the_blocking_stack(caplog):
+    registry = Registry()
+    monitor = LoopMonitor(registry, slow_callback_seconds=0.05)
+    task = asyncio.create_task(monitor.run(interval=0.01))
+    await asyncio.sleep(0.05)
+    _blocking_call(0.3)  # blocks the event loop
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    (report,) = monitor.slow_callbacks
+    assert "_blocking_call" in report["stack"]
+    assert report["blocked_ms"] >= 200
+    assert registry.snapshot()["counters"] == [["tgcopier_slow_callbacks_total", {}, 1.0]]
+    assert any("Event loop blocked" in r.getMessage() for r in caplog.records)
+    assert monitor.take_max_lag() >= 0.2 and monitor.take_max_lag() == 0.0
+    assert _histogram_count(registry, "tgcopier_event_loop_lag_seconds") >= 2
+
+
+@pytest.mark.asyncio
+async def test_watchdog_is_off_by_default():
+    registry = Registry()
+    monitor = LoopMonitor(registry)
+    task = asyncio.create_task(monitor.run(interval=0.01))
+    await asyncio.sleep(0.02)
+    _blocking_call(0.1)
+    await asyncio.sleep(0.02)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not monitor.slow_callbacks
+    assert registry.snapshot()["counters"] == []
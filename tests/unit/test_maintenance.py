@@ -0,0 +1,176 @@
+"""Unit tests for the maintenance scheduler and the cleanup jobs it runs."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config import settings
+from app.db import cleanup, leases
+from app.db.sqlite import get_sqlite, init_sqlite
+from app.services import maintenance
+from app.services.maintenance import MaintenanceJob, MaintenanceScheduler
+
+
+@pytest.fixture
+async def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_path", str(tmp_path / "maint.db"))
+    await init_sqlite()
+    conn = await get_sqlite()
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+def _dead_pid() -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+async def _runs(db):
+    async with db.execute("SELECT job, removed, complete, error FROM maintenance_runs ORDER BY id") as cur:
+        return await cur.fetchall()
+
+
+@pytest.mark.asyncio
+async def test_run_job_records_outcome_and_reschedules(db, monkeypatch):
+    calls = []
+
+    async def partial(deadline, batch_size):
+        calls.append(batch_size)
+        return (3, len(calls) > 1)
+
+    async def broken(deadline, batch_size):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(settings, "maintenance_batch_size", 7)
+    sched = MaintenanceScheduler([MaintenanceJob("partial", 600, partial), MaintenanceJob("broken", 600, broken)])
+
+    run = await sched.run_job(sched.jobs["partial"])
+    assert run["removed"] == 3 and run["complete"] is False
+    assert sched.jobs["partial"].next_run - time.monotonic() <= maintenance.INCOMPLETE_RETRY_SECONDS
+    await sched.run_job(sched.jobs["partial"])
+    assert sched.jobs["partial"].next_run - time.monotonic() > 500
+    assert calls == [7, 7]
+
+    run = await sched.run_job(sched.jobs["broken"])
+    assert run["error"] == "boom"
+    status = {s["name"]: s for s in sched.status()}
+    assert status["broken"]["failures"] == 1
+    assert status["partial"]["total_removed"] == 6
+    assert await _runs(db) == [("partial", 3, 0, None), ("partial", 3, 1, None), ("broken", 0, 1, "boom")]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_loop_runs_due_jobs_until_stopped(db):
+    ran = asyncio.Event()
+
+    async def job(deadline, batch_size):
+        ran.set()
+        return (0, True)
+
+    sched = MaintenanceScheduler([MaintenanceJob("quick", 3600, job)])
+    sched.start(initial_delay=0)
+    await asyncio.wait_for(ran.wait(), timeout=5)
+    assert sched.started
+    await sched.stop()
+    assert not sched.started
+    assert sched.jobs["quick"].runs == 1
+
+
+@pytest.mark.asyncio
+async def test_stop_lets_running_job_finish_and_record(db):
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow(deadline, batch_size):
+        started.set()
+        await release.wait()
+        return (2, True)
+
+    sched = MaintenanceScheduler([MaintenanceJob("slow", 3600, slow)])
+    sched.start(initial_delay=0)
+    await asyncio.wait_for(started.wait(), timeout=5)
+    stopping = asyncio.create_task(sched.stop())
+    await asyncio.sleep(0.05)
+    assert not stopping.done()
+    release.set()
+    await asyncio.wait_for(stopping, timeout=5)
+    assert sched.jobs["slow"].runs == 1
+    assert await _runs(db) == [("slow", 2, 1, None)]
+
+
+@pytest.mark.asyncio
+async def test_refresh_tokens_and_login_sessions_jobs_batch(db):
+    now = datetime.now(timezone.utc)
+    await db.execute("INSERT INTO users (id, email, role, status) VALUES (1, 'a@test.com', 'user', 'active')")
+    await db.executemany(
+        "INSERT INTO refresh_tokens (user_id, token_hash, expires_at) VALUES (1, ?, ?)",
+        [(f"old{i}", (now - timedelta(days=1)).isoformat()) for i in range(5)]
+        + [("live", (now + timedelta(days=1)).isoformat())],
+    )
+    await db.executemany(
+        "INSERT INTO login_sessions (user_id, phone, tmp_session_name, status, created_at) VALUES (1, 'p', 't', ?, ?)",
+        [("completed", "2000-01-01 00:00:00"), ("pending", "2000-01-01 00:00:00"), ("cancelled", "2999-01-01 00:00:00")],
+    )
+    await db.commit()
+
+    assert await cleanup.purge_expired_refresh_tokens_job(time.monotonic() - 1, 2) == (2, False)
+    assert await cleanup.purge_expired_refresh_tokens_job(time.monotonic() + 60, 2) == (3, True)
+    async with db.execute("SELECT token_hash FROM refresh_tokens") as cur:
+        assert await cur.fetchall() == [("live",)]
+
+    assert await cleanup.purge_login_sessions_job(time.monotonic() + 60, 10) == (1, True)
+
+
+@pytest.mark.asyncio
+async def test_worker_file_jobs_skip_live_and_recent_files(db, tmp_path, monkeypatch):
+    dead = _dead_pid()
+    sessions = tmp_path / "sessions"
+    sessions.mkdir()
+    monkeypatch.setattr(settings, "sessions_dir", str(sessions))
+    old = time.time() - 3 * 86400
+    stale_copy = sessions / f"acc_worker_{dead}.session"
+    live_copy = sessions / f"acc_worker_{os.getpid()}.session"
+    fresh_copy = sessions / f"other_worker_{dead}.session"
+    original = sessions / "acc.session"
+    for path in (stale_copy, live_copy, fresh_copy, original):
+        path.write_text("x")
+    for path in (stale_copy, live_copy, original):
+        os.utime(path, (old, old))
+    assert await cleanup.purge_worker_session_copies_job(time.monotonic() + 60, 10) == (1, True)
+    assert not stale_copy.exists() and live_copy.exists() and fresh_copy.exists() and original.exists()
+
+    logs = tmp_path / "data"
+    logs.mkdir()
+    monkeypatch.setattr(cleanup, "WORKER_LOG_DIR", logs)
+    monkeypatch.setattr(settings, "worker_log_retention_days", 1)
+    generation = await leases.claim(db, 5)
+    await db.execute(
+        "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid, generation) "
+        "VALUES ('w5-1', 1, 5, 's', ?, ?)",
+        (os.getpid(), generation),
+    )
+    await db.commit()
+    for name in ("worker_5_w1.log", "worker_5_w5-1.log", "worker_6_w3.log", "worker.log"):
+        (logs / name).write_text("x")
+        os.utime(logs / name, (old, old))
+    (logs / "worker_7_w4.log").write_text("recent")
+    assert await cleanup.purge_worker_stderr_logs_job(time.monotonic() + 60, 10) == (2, True)
+    assert sorted(p.name for p in logs.iterdir()) == ["worker.log", "worker_5_w5-1.log", "worker_7_w4.log"]
+
+    assert await cleanup.purge_dead_worker_registry_job(time.monotonic() + 60, 10) == (0, True)
+    # No live lease for account 9 (e.g. a worker registered before leases, or one that crashed).
+    await db.execute(
+        "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid) VALUES ('w9', 1, 9, 's', ?)",
+        (dead,),
+    )
+    await db.commit()
+    assert await cleanup.purge_dead_worker_registry_job(time.monotonic() + 60, 10) == (1, True)
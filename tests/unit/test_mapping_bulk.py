@@ -0,0 +1,137 @@
+"""Unit tests for set-based bulk mapping mutations."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.config import settings
+from app.db.sqlite import get_sqlite, init_sqlite
+from app.services import mapping_bulk
+from app.services.mapping_service import WEEKDAY_COLS
+
+MAPPINGS_PER_USER = 300
+
+
+@pytest.fixture
+async def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_path", str(tmp_path / "bulk.db"))
+    await init_sqlite()
+    conn = await get_sqlite()
+    try:
+        await conn.executemany(
+            "INSERT INTO users (id, email, role, status) VALUES (?, ?, 'user', 'active')",
+            [(1, "a@test.com"), (2, "b@test.com")],
+        )
+        # User 1: two active accounts (10, 11) and one without a session (12). User 2: account 20.
+        await conn.executemany(
+            "INSERT INTO telegram_accounts (id, user_id, type, session_path, status) VALUES (?, ?, 'user', ?, 'active')",
+            [(10, 1, "s10"), (11, 1, "s11"), (12, 1, None), (20, 2, "s20")],
+        )
+        # User 1 mappings alternate between pinned to 10 and unpinned; user 2 mappings pinned to 20.
+        await conn.executemany(
+            "INSERT INTO channel_mappings (user_id, source_chat_id, dest_chat_id, enabled, telegram_account_id) "
+            "VALUES (?, ?, ?, 1, ?)",
+            [(1, i, -i, 10 if i % 2 else None) for i in range(1, MAPPINGS_PER_USER + 1)]
+            + [(2, i, -i, 20) for i in range(1, 11)],
+        )
+        await conn.commit()
+        yield conn
+    finally:
+        await conn.close()
+
+
+async def _ids(db, user_id):
+    async with db.execute("SELECT id FROM channel_mappings WHERE user_id = ? ORDER BY id", (user_id,)) as cur:
+        return [r[0] for r in await cur.fetchall()]
+
+
+async def _count(db, sql, params=()):
+    async with db.execute(sql, params) as cur:
+        return (await cur.fetchone())[0]
+
+
+@pytest.mark.asyncio
+async def test_apply_user_schedule_uses_constant_statements(db):
+    schedule = ["09:00", "17:00"] + [None] * (len(WEEKDAY_COLS) - 2)
+    await db.execute(
+        f"INSERT INTO user_schedules (user_id, {', '.join(WEEKDAY_COLS)}) VALUES (?, {', '.join('?' * len(WEEKDAY_COLS))})",
+        (1, *schedule),
+    )
+    # One pre-existing override must be overwritten, not duplicated.
+    first = (await _ids(db, 1))[0]
+    await db.execute("INSERT INTO mapping_schedules (mapping_id, sun_start_utc) VALUES (?, '01:00')", (first,))
+    await db.commit()
+
+    statements: list[str] = []
+    await db.set_trace_callback(statements.append)
+    result = await mapping_bulk.apply_user_schedule(db, 1)
+    await db.set_trace_callback(None)
+
+    assert result.affected == MAPPINGS_PER_USER
+    assert result.account_ids == [10, 11]
+    assert len(statements) <= 5  # read schedule, BEGIN, INSERT ... SELECT, COMMIT, accounts
+    assert await _count(db, "SELECT COUNT(*) FROM mapping_schedules") == MAPPINGS_PER_USER
+    assert await _count(
+        db, "SELECT COUNT(*) FROM mapping_schedules WHERE mon_start_utc = '09:00' AND sun_start_utc IS NULL"
+    ) == MAPPINGS_PER_USER
+
+
+@pytest.mark.asyncio
+async def test_apply_user_schedule_without_default_is_noop(db):
+    result = await mapping_bulk.apply_user_schedule(db, 1)
+    assert (result.affected, result.account_ids) == (0, [])
+
+
+@pytest.mark.asyncio
+async def test_failed_bulk_write_rolls_back(db):
+    before = await _count(db, "SELECT COUNT(*) FROM channel_mappings")
+    rows = [mapping_bulk.MappingImportRow(mapping=(1, -1, "m", None, "", "", 1), filters=[("too", "few")])]
+    with pytest.raises(Exception):
+        await mapping_bulk.import_mappings(db, 2, rows)
+    assert await _count(db, "SELECT COUNT(*) FROM channel_mappings") == before
+
+
+@pytest.mark.asyncio
+async def test_import_mappings_batches_ten_thousand_rows(db):
+    n = 10_000
+    rows = [
+        mapping_bulk.MappingImportRow(
+            mapping=(i, -i, f"m{i}", 20 if i % 2 else None, "", "", 1),
+            filters=[("x", None, None, None)],
+            transforms=[("text", "a", "b", None, None, None, None, 1, 100)],
+            schedule=("09:00", "17:00") + (None,) * 12 if i % 3 == 0 else None,
+        )
+        for i in range(n)
+    ]
+    statements: list[str] = []
+    await db.set_trace_callback(statements.append)
+    result = await mapping_bulk.import_mappings(db, 2, rows)
+    await db.set_trace_callback(None)
+
+    assert result.affected == n and result.account_ids == [20]
+    assert result.mapping_ids == list(range(result.mapping_ids[0], result.mapping_ids[0] + n))
+    # executemany statements are traced per row ("--" lines are trigger/FTS internals); everything
+    # else is a fixed handful.
+    assert len([s for s in statements if not s.startswith(("INSERT", "--"))]) <= 5
+    exported = await mapping_bulk.export_mappings(db, 2)
+    assert len(exported) == n + 10
+    last = exported[-1]
+    assert (last["source_chat_id"], last["filters"][0]["include_text"], last["transforms"][0]["replace_text"]) == (
+        n - 1, "x", "b"
+    )
+    assert await _count(db, "SELECT COUNT(*) FROM mapping_schedules") == len(range(0, n, 3))
+
+
+def test_csv_round_trip_keeps_nested_parts():
+    items = [{
+        "id": 1, "user_id": 2, "source_chat_id": 3, "dest_chat_id": 4, "name": "a,b", "telegram_account_id": None,
+        "source_chat_title": "", "dest_chat_title": "", "enabled": False,
+        "filters": [{"include_text": "x"}], "transforms": [], "schedule": {"mon_start_utc": "09:00"},
+    }]
+    (row,) = mapping_bulk.mappings_from_csv(mapping_bulk.mappings_to_csv(items))
+    assert row == {
+        "source_chat_id": "3", "dest_chat_id": "4", "name": "a,b", "enabled": "false",
+        "filters": [{"include_text": "x"}], "schedule": {"mon_start_utc": "09:00"},
+    }
+    with pytest.raises(ValueError):
+        mapping_bulk.mappings_from_csv("source_chat_id,dest_chat_id,filters\n1,2,[oops\n")
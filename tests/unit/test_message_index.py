@@ -0,0 +1,149 @@
+"""Unit tests for dest_message_index storage: created_at, retention pruning, monthly partitions."""
+
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from app.config import settings
+from app.db import message_index as mi
+from app.db.sqlite import get_sqlite, init_sqlite
+
+NOW = datetime(2026, 6, 15, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_path", str(tmp_path / "mi.db"))
+    monkeypatch.setattr(settings, "message_index_partition_dir", str(tmp_path / "parts"))
+    monkeypatch.setattr(settings, "message_index_partition", "none")
+    monkeypatch.setattr(settings, "message_index_retention_days", 0)
+    await init_sqlite()
+    conn = await get_sqlite()
+    try:
+        await conn.executemany(
+            "INSERT INTO users (id, email, role, status) VALUES (?, ?, 'user', 'active')",
+            [(1, "a@test.com"), (2, "b@test.com")],
+        )
+        await conn.commit()
+        yield conn
+    finally:
+        await conn.close()
+
+
+async def _insert(db, rows, table="dest_message_index"):
+    await db.executemany(
+        f"INSERT INTO {table} (user_id, source_chat_id, source_msg_id, dest_chat_id, dest_msg_id, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    await db.commit()
+
+
+async def _remaining(db):
+    async with db.execute(f"SELECT user_id, source_chat_id, source_msg_id FROM {await mi.read_source(db)}") as cur:
+        return sorted(await cur.fetchall())
+
+
+@pytest.mark.asyncio
+async def test_save_sets_created_at_and_lookup(db):
+    await mi.save_dest_mapping(db, 1, 10, 5, 20, 50)
+    assert await mi.lookup_dest_msg_id(db, 1, 10, 5, 20) == 50
+    assert await mi.lookup_dest_msg_id(db, 1, 10, 6, 20) is None
+    async with db.execute("SELECT created_at FROM dest_message_index") as cur:
+        (created_at,) = await cur.fetchone()
+    assert created_at is not None
+
+
+@pytest.mark.asyncio
+async def test_prune_resolves_mapping_then_user_then_default(db, monkeypatch):
+    monkeypatch.setattr(settings, "message_index_retention_days", 30)
+    await db.execute(
+        "INSERT INTO channel_mappings (id, user_id, source_chat_id, dest_chat_id) VALUES (1, 1, 10, 20), (2, 1, 11, 21)"
+    )
+    await db.execute("UPDATE channel_mappings SET message_index_retention_days = 5 WHERE id = 1")
+    await db.execute("UPDATE channel_mappings SET message_index_retention_days = 0 WHERE id = 2")
+    await db.execute("UPDATE users SET message_index_retention_days = 0 WHERE id = 2")
+    old, week, fresh = "2026-01-01 00:00:00", "2026-06-08 00:00:00", "2026-06-14 00:00:00"
+    await _insert(
+        db,
+        [
+            (1, 10, 1, 20, 1, week),  # mapping 1: 5 days -> deleted
+            (1, 10, 2, 20, 2, fresh),  # mapping 1: kept
+            (1, 11, 1, 21, 3, old),  # mapping 2: keep forever
+            (1, 12, 1, 22, 4, old),  # user 1 default 30 days -> deleted
+            (1, 12, 2, 22, 5, week),  # kept
+            (2, 10, 1, 20, 6, old),  # user 2 keeps forever
+        ],
+    )
+    result = await mi.prune_message_index(db, now=NOW, batch_size=1, pause_seconds=0)
+    assert result["deleted"] == 2
+    assert await _remaining(db) == [(1, 10, 2), (1, 11, 1), (1, 12, 2), (2, 10, 1)]
+
+
+@pytest.mark.asyncio
+async def test_prune_stamps_legacy_rows_instead_of_deleting(db, monkeypatch):
+    monkeypatch.setattr(settings, "message_index_retention_days", 1)
+    await _insert(db, [(1, 10, m, 20, m, None) for m in range(5)])
+    result = await mi.prune_message_index(db, now=NOW, batch_size=2, pause_seconds=0)
+    assert result == {"deleted": 0, "stamped": 5, "partitions_dropped": [], "complete": True}
+    async with db.execute("SELECT DISTINCT created_at FROM dest_message_index") as cur:
+        assert await cur.fetchall() == [("2026-06-15 12:00:00",)]
+
+
+@pytest.mark.asyncio
+async def test_month_partitions_write_read_and_drop(db, monkeypatch):
+    monkeypatch.setattr(settings, "message_index_partition", "month")
+    await _insert(db, [(1, 10, 1, 20, 100, "2025-01-01 00:00:00")])  # pre-partitioning row
+    await mi.save_dest_mapping(db, 1, 10, 2, 20, 200)
+    current = mi.month_key(datetime.now(timezone.utc))
+    assert mi.list_partition_keys() == [current]
+    assert await mi.lookup_dest_msg_id(db, 1, 10, 2, 20) == 200
+    assert await mi.lookup_dest_msg_id(db, 1, 10, 1, 20) == 100
+    async with db.execute("SELECT COUNT(*) FROM main.dest_message_index") as cur:
+        assert (await cur.fetchone())[0] == 1
+
+    mi._create_partition_file(mi.partition_path("202501"))
+    await mi.sync_partitions(db)
+    await _insert(db, [(1, 11, 1, 21, 300, "2025-01-20 00:00:00")], table="dmi_202501.dest_message_index")
+    assert len(await _remaining(db)) == 3
+
+    monkeypatch.setattr(settings, "message_index_retention_days", 90)
+    result = await mi.prune_message_index(db, now=datetime.now(timezone.utc), pause_seconds=0)
+    assert result["partitions_dropped"] == ["202501"]
+    assert result["deleted"] == 1  # the old main-table row
+    assert not mi.partition_path("202501").exists()
+    assert await _remaining(db) == [(1, 10, 2)]
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_and_cached_counts_span_partitions(db, monkeypatch):
+    monkeypatch.setattr(settings, "message_index_partition", "month")
+    await _insert(db, [(1, 10, i, 20, i, "2025-01-01 00:00:00") for i in range(0, 6, 2)])  # main table
+    for i in range(1, 6, 2):
+        await mi.save_dest_mapping(db, 1, 10, i, 20, i)
+    await mi.save_dest_mapping(db, 1, 10, 1, 20, 99)  # re-copy updates the row, not the count
+    await mi.save_dest_mapping(db, 2, 10, 1, 20, 1)
+    # A partition file created before row counts existed is counted directly.
+    old = sqlite3.connect(mi.partition_path("202501"))
+    old.executescript(mi.PARTITION_SCHEMA_SQL.split("CREATE TABLE IF NOT EXISTS row_counts")[0])
+    old.close()
+    await mi.sync_partitions(db)
+    await _insert(db, [(1, 9, 1, 20, 1, "2025-01-20 00:00:00")], table="dmi_202501.dest_message_index")
+
+    assert await mi.count_rows(db, 1) == 7
+    assert await mi.count_rows(db) == 8
+
+    keys, after = [], None
+    while True:
+        rows = await mi.select_page(db, {"user_id": 1}, 3, after)
+        keys += [r[:3] for r in rows]
+        if len(rows) < 3:
+            break
+        after = list(rows[-1][:4])
+    assert keys == [(1, 9, 1)] + [(1, 10, i) for i in range(6)]
+    rows = await mi.select_page(db, {"user_id": 1, "source_chat_id": 10}, 10, [1, 10, 3, 20])
+    assert [r[2] for r in rows] == [4, 5]
+    assert (await mi.select_page(db, {"user_id": 1}, 1, [1, 10, 0, 20]))[0][4] == 99
@@ -0,0 +1,51 @@
+"""Unit tests for the in-process metrics registry, its Prometheus rendering and flood wait capture."""
+
+from __future__ import annotations
+
+import json
+import logging
+
+from app.utils.metrics import FAMILIES, Registry, render
+from app.worker_stats import FloodWaitRecorder, WorkerStats
+
+
+def test_histograms_render_cumulative_buckets_with_source_labels():
+    reg = Registry()
+    reg.observe("tgcopier_handler_stage_seconds", 0.003, stage="send")
+    reg.observe("tgcopier_handler_stage_seconds", 100.0, stage="send")
+    reg.inc("tgcopier_send_errors_total", error='Bad"Name')
+    snapshot = json.loads(json.dumps(reg.snapshot()))  # as shipped in the heartbeat
+
+    text = render([({"account_id": 3}, snapshot), ({}, {"counters": [["unknown_total", {}, 1]]})])
+    lines = text.splitlines()
+    assert "# TYPE tgcopier_handler_stage_seconds histogram" in lines
+    assert 'tgcopier_handler_stage_seconds_bucket{account_id="3",stage="send",le="0.0025"} 0' in lines
+    assert 'tgcopier_handler_stage_seconds_bucket{account_id="3",stage="send",le="0.005"} 1' in lines
+    assert 'tgcopier_handler_stage_seconds_bucket{account_id="3",stage="send",le="30"} 1' in lines
+    assert 'tgcopier_handler_stage_seconds_bucket{account_id="3",stage="send",le="+Inf"} 2' in lines
+    assert 'tgcopier_handler_stage_seconds_sum{account_id="3",stage="send"} 100.003' in lines
+    assert 'tgcopier_handler_stage_seconds_count{account_id="3",stage="send"} 2' in lines
+    assert 'tgcopier_send_errors_total{account_id="3",error="Bad\\"Name"} 1' in lines
+    assert "unknown_total" not in text
+    assert render([]) == ""
+
+
+def test_every_family_has_a_known_type():
+    for name, (kind, help_text, buckets) in FAMILIES.items():
+        assert kind in ("counter", "gauge", "histogram") and help_text
+        assert (buckets is not None) == (kind == "histogram"), name
+        assert name.endswith("_total") == (kind == "counter"), name
+
+
+def test_flood_waits_telethon_sleeps_through_are_counted():
+    stats = WorkerStats()
+    recorder = FloodWaitRecorder(stats)
+    record = logging.LogRecord(
+        FloodWaitRecorder.LOGGER, logging.INFO, __file__, 1,
+        "Sleeping%s for %ds (%s) on %s flood wait", ("", 7, "0:00:07", "SendMessageRequest"), None,
+    )
+    recorder.filter(record)
+    other = logging.LogRecord(FloodWaitRecorder.LOGGER, logging.INFO, __file__, 1, "Connecting", (), None)
+    recorder.filter(other)
+    counters = {c[0]: c[2] for c in stats.metrics.snapshot()["counters"]}
+    assert counters == {"tgcopier_floodwaits_total": 1.0, "tgcopier_floodwait_seconds_total": 7.0}
@@ -122,3 +122,271 @@ async def test_migration_v14_creates_media_assets_and_transform_columns(tmp_path
         index_names = {r[0] for r in rows}
         for idx_name in V14_INDEXES:
             assert idx_name in index_names, f"Expected index {idx_name} from migration v14"
+
+
+@pytest.mark.asyncio
+async def test_migration_v15_adds_message_index_created_at_and_retention(tmp_path):
+    """Migration v15 adds dest_message_index.created_at (indexed) and retention override columns."""
+    settings.sqlite_path = str(tmp_path / "migrations_v15_test.db")
+
+    await init_sqlite()
+
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        async with db.execute("PRAGMA table_info(dest_message_index)") as cur:
+            assert "created_at" in {r[1] for r in await cur.fetchall()}
+        for table in ("users", "channel_mappings"):
+            async with db.execute(f"PRAGMA table_info({table})") as cur:
+                assert "message_index_retention_days" in {r[1] for r in await cur.fetchall()}
+        async with db.execute("PRAGMA index_info(ix_dest_message_index_user_created)") as cur:
+            assert [r[2] for r in await cur.fetchall()] == ["user_id", "created_at"]
+
+
+@pytest.mark.asyncio
+async def test_migration_v16_creates_maintenance_runs(tmp_path):
+    """Migration v16 creates the maintenance_runs history table."""
+    settings.sqlite_path = str(tmp_path / "migrations_v16_test.db")
+
+    await init_sqlite()
+
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        async with db.execute("PRAGMA table_info(maintenance_runs)") as cur:
+            cols = {r[1] for r in await cur.fetchall()}
+    assert {"job", "started_at", "duration_ms", "removed", "complete", "error"} <= cols
+
+
+def test_split_statements_keeps_trigger_bodies_whole():
+    from app.db.migrations import split_statements
+
+    sql = """
+    CREATE TABLE t (a TEXT);
+    CREATE TRIGGER t_ai AFTER INSERT ON t BEGIN
+        INSERT INTO t_log VALUES (new.a);
+        UPDATE t_count SET n = n + 1;
+    END;
+    INSERT INTO t VALUES ('x;y');
+    """
+    stmts = split_statements(sql)
+    assert len(stmts) == 3
+    assert stmts[1].startswith("CREATE TRIGGER") and stmts[1].endswith("END")
+    assert stmts[2] == "INSERT INTO t VALUES ('x;y')"
+
+
+@pytest.mark.asyncio
+async def test_migration_v17_fts_tables_follow_source_rows(tmp_path):
+    """Migration v17 creates FTS5 tables that triggers keep in sync with inserts, updates and deletes."""
+    settings.sqlite_path = str(tmp_path / "migrations_v17_test.db")
+
+    await init_sqlite()
+
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await db.execute("INSERT INTO users (id, email, role, status, name) VALUES (1, 'ops@example.com', 'user', 'active', 'Ops')")
+        await db.execute(
+            "INSERT INTO channel_mappings (id, user_id, source_chat_id, dest_chat_id, name, source_chat_title) "
+            "VALUES (7, 1, -1001234567, -1009876543, 'Daily digest', 'Crypto News')"
+        )
+        await db.commit()
+
+        async def hits(table, expr):
+            async with db.execute(f"SELECT rowid FROM {table} WHERE {table} MATCH ?", (expr,)) as cur:
+                return [r[0] for r in await cur.fetchall()]
+
+        assert await hits("mappings_fts", '"crypto"*') == [7]
+        assert await hits("mappings_fts", '"1001234"*') == [7]
+        assert await hits("users_fts", '"ops"* "example"*') == [1]
+
+        await db.execute("UPDATE channel_mappings SET source_chat_title = 'Sports' WHERE id = 7")
+        await db.commit()
+        assert await hits("mappings_fts", '"crypto"*') == []
+        assert await hits("mappings_fts", '"sport"*') == [7]
+
+        await db.execute("DELETE FROM channel_mappings WHERE id = 7")
+        await db.commit()
+        assert await hits("mappings_fts", '"digest"*') == []
+
+
+@pytest.mark.asyncio
+async def test_migration_v18_row_counts_follow_inserts_moves_and_deletes(tmp_path):
+    """Migration v18 keeps per-user row counts in step with the counted tables."""
+    settings.sqlite_path = str(tmp_path / "migrations_v18_test.db")
+
+    await init_sqlite()
+
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await db.executemany(
+            "INSERT INTO users (id, email, role, status) VALUES (?, ?, 'user', 'active')",
+            [(1, "a@example.com"), (2, "b@example.com")],
+        )
+        await db.executemany(
+            "INSERT INTO channel_mappings (id, user_id, source_chat_id, dest_chat_id) VALUES (?, ?, ?, ?)",
+            [(1, 1, 10, 20), (2, 1, 11, 21), (3, 2, 12, 22)],
+        )
+        await db.execute("INSERT INTO telegram_accounts (user_id, type) VALUES (2, 'user')")
+        await db.commit()
+
+        async def counts(table):
+            async with db.execute(
+                "SELECT user_id, n FROM row_counts WHERE table_name = ? ORDER BY user_id", (table,)
+            ) as cur:
+                return [tuple(r) for r in await cur.fetchall()]
+
+        assert await counts("channel_mappings") == [(1, 2), (2, 1)]
+        assert await counts("telegram_accounts") == [(2, 1)]
+
+        await db.execute("UPDATE channel_mappings SET user_id = 2 WHERE id = 1")
+        await db.execute("DELETE FROM channel_mappings WHERE id = 3")
+        await db.commit()
+        assert await counts("channel_mappings") == [(1, 1), (2, 1)]
+
+
+@pytest.mark.asyncio
+async def test_migration_v19_adds_leases_and_keeps_one_registry_row_per_account(tmp_path, monkeypatch):
+    """Migration v19 creates worker_leases and dedupes worker_registry before making account_id unique."""
+    from app.db import migrations
+
+    settings.sqlite_path = str(tmp_path / "migrations_v19_test.db")
+    full = migrations.MIGRATIONS
+    monkeypatch.setattr(migrations, "MIGRATIONS", full[:18])
+    monkeypatch.setattr(migrations, "SCHEMA_VERSION", 18)
+    await init_sqlite()
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await db.executemany(
+            "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid) VALUES (?, 1, ?, 's', 1)",
+            [("w1", 5), ("w2", 5), ("w3", 6)],
+        )
+        await db.commit()
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", full)
+    monkeypatch.setattr(migrations, "SCHEMA_VERSION", len(full))
+    await init_sqlite()
+
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        async with db.execute("SELECT worker_id, generation, host_id FROM worker_registry ORDER BY worker_id") as cur:
+            assert await cur.fetchall() == [("w2", 0, ""), ("w3", 0, "")]
+        with pytest.raises(aiosqlite.IntegrityError):
+            await db.execute(
+                "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid) VALUES ('w4', 1, 5, 's', 1)"
+            )
+        async with db.execute("PRAGMA table_info(worker_leases)") as cur:
+            cols = {r[1] for r in await cur.fetchall()}
+    assert {"account_id", "generation", "owner", "host_id", "expires_at", "heartbeat_at", "stop_requested"} <= cols
+
+
+@pytest.mark.asyncio
+async def test_migration_v20_adds_worker_agents(tmp_path):
+    """Migration v20 creates worker_agents; existing registry rows are local workers (agent_id NULL)."""
+    settings.sqlite_path = str(tmp_path / "migrations_v20_test.db")
+    await init_sqlite()
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await db.execute(
+            "INSERT INTO worker_registry (worker_id, user_id, account_id, session_path, pid) VALUES ('w1', 1, 5, 's', 1)"
+        )
+        async with db.execute("SELECT agent_id FROM worker_registry") as cur:
+            assert await cur.fetchall() == [(None,)]
+        async with db.execute("PRAGMA table_info(worker_agents)") as cur:
+            cols = {r[1] for r in await cur.fetchall()}
+    assert {"agent_id", "host_id", "capacity", "last_seen", "created_at"} <= cols
+
+
+@pytest.mark.asyncio
+async def test_migration_v21_adds_worker_heartbeats(tmp_path):
+    """Migration v21 creates worker_heartbeats, one row per account."""
+    settings.sqlite_path = str(tmp_path / "migrations_v21_test.db")
+    await init_sqlite()
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await db.execute("INSERT INTO worker_heartbeats (account_id, updated_at) VALUES (5, 1.0)")
+        async with db.execute("SELECT generation, host_id, mappings FROM worker_heartbeats") as cur:
+            assert await cur.fetchall() == [(0, "", "{}")]
+        with pytest.raises(aiosqlite.IntegrityError):
+            await db.execute("INSERT INTO worker_heartbeats (account_id, updated_at) VALUES (5, 2.0)")
+
+
+@pytest.mark.asyncio
+async def test_migration_v22_adds_heartbeat_metrics(tmp_path):
+    """Migration v22 adds the metrics snapshot column to worker_heartbeats."""
+    settings.sqlite_path = str(tmp_path / "migrations_v22_test.db")
+    await init_sqlite()
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await db.execute("INSERT INTO worker_heartbeats (account_id, updated_at) VALUES (5, 1.0)")
+        async with db.execute("SELECT metrics FROM worker_heartbeats") as cur:
+            assert await cur.fetchall() == [("{}",)]
+
+
+@pytest.mark.asyncio
+async def test_migration_v23_adds_message_traces(tmp_path):
+    """Migration v23 creates message_traces, keyed by trace id."""
+    settings.sqlite_path = str(tmp_path / "migrations_v23_test.db")
+    await init_sqlite()
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await db.execute(
+            "INSERT INTO message_traces (trace_id, account_id, started_at, duration_ms, outcome) "
+            "VALUES ('t1', 5, 1.0, 2.0, 'sent')"
+        )
+        async with db.execute("SELECT attributes, spans FROM message_traces") as cur:
+            assert await cur.fetchall() == [("{}", "[]")]
+        with pytest.raises(aiosqlite.IntegrityError):
+            await db.execute(
+                "INSERT INTO message_traces (trace_id, account_id, started_at, duration_ms, outcome) "
+                "VALUES ('t1', 5, 1.0, 2.0, 'sent')"
+            )
+
+
+@pytest.mark.asyncio
+async def test_migration_v24_adds_latency_rollups(tmp_path):
+    """Migration v24 adds heartbeat latency histograms and one rollup row per mapping and hour."""
+    settings.sqlite_path = str(tmp_path / "migrations_v24_test.db")
+    await init_sqlite()
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await db.execute("INSERT INTO worker_heartbeats (account_id, updated_at) VALUES (5, 1.0)")
+        async with db.execute("SELECT latency FROM worker_heartbeats") as cur:
+            assert await cur.fetchall() == [("{}",)]
+        await db.execute("INSERT INTO mapping_latency_rollups (mapping_id, hour, counts) VALUES (1, 3600, '[]')")
+        with pytest.raises(aiosqlite.IntegrityError):
+            await db.execute("INSERT INTO mapping_latency_rollups (mapping_id, hour, counts) VALUES (1, 3600, '[]')")
+
+
+@pytest.mark.asyncio
+async def test_migration_v25_adds_heartbeat_slow_callbacks(tmp_path):
+    """Migration v25 adds the slow-callback reports column to worker_heartbeats."""
+    settings.sqlite_path = str(tmp_path / "migrations_v25_test.db")
+    await init_sqlite()
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await db.execute("INSERT INTO worker_heartbeats (account_id, updated_at) VALUES (5, 1.0)")
+        async with db.execute("SELECT slow_callbacks FROM worker_heartbeats") as cur:
+            assert await cur.fetchall() == [("[]",)]
+
+
+@pytest.mark.asyncio
+async def test_migration_v26_creates_worker_profiles(tmp_path):
+    """Migration v26 creates worker_profiles; new requests start pending."""
+    settings.sqlite_path = str(tmp_path / "migrations_v26_test.db")
+    await init_sqlite()
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await db.execute(
+            "INSERT INTO worker_profiles (id, target, account_id, seconds, hz, created_at) VALUES ('p1', 'worker', 5, 30, 100, 1.0)"
+        )
+        async with db.execute("SELECT status, path FROM worker_profiles") as cur:
+            assert await cur.fetchall() == [("pending", None)]
+
+
+@pytest.mark.asyncio
+async def test_init_skips_migrations_when_schema_version_matches(tmp_path, monkeypatch):
+    """A fully migrated database records SCHEMA_VERSION; later init_sqlite calls skip the check."""
+    from app.db import migrations
+
+    settings.sqlite_path = str(tmp_path / "schema_version_test.db")
+    await init_sqlite()
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        async with db.execute("PRAGMA user_version") as cur:
+            assert (await cur.fetchone())[0] == migrations.SCHEMA_VERSION == len(migrations.MIGRATIONS)
+
+    async def _fail(_db):
+        raise AssertionError("migrations should have been skipped")
+
+    monkeypatch.setattr(migrations, "run_migrations", _fail)
+    await init_sqlite()
+
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await db.execute("PRAGMA user_version = 1")
+        await db.commit()
+    with pytest.raises(AssertionError, match="skipped"):
+        await init_sqlite()  # an outdated version runs the migration check again
@@ -0,0 +1,67 @@
+"""Stand-in planner check: every log query shape must be served by an index in INDEXES.
+
+Mirrors the rules the MongoDB planner applies to the winning plan: equality fields form the index
+prefix, then the remaining index keys must provide the requested sort (forwards or backwards),
+otherwise the server falls back to an in-memory SORT; a filtered query with no usable prefix is a
+COLLSCAN. tests/integration/test_mongo_query_shapes.py runs the same shapes through a real explain.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from app.db.mongo_indexes import INDEXES
+
+from mongo_query_shapes import iter_query_shapes  # tests/mongo_query_shapes.py
+
+
+def _filter_fields(match: dict, eq: set, ranged: set) -> None:
+    for key, cond in match.items():
+        if key == "$and":
+            for sub in cond:
+                _filter_fields(sub, eq, ranged)
+        elif key.startswith("$"):
+            continue  # $or: residual filter, never used for index bounds here
+        elif isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+            ranged.add(key)
+        else:
+            eq.add(key)
+
+
+def _serves(keys: list[tuple[str, int]], eq: set, ranged: set, sort: dict | None) -> bool:
+    prefix = 0
+    while prefix < len(keys) and keys[prefix][0] in eq:
+        prefix += 1
+    if sort is None:
+        # Count: needs an index whose leading key is bounded by the filter.
+        return prefix > 0 or keys[0][0] in ranged
+    if eq and prefix == 0:
+        return False  # would scan the whole index on sort order alone
+    rest = keys[prefix : prefix + len(sort)]
+    if [f for f, _ in rest] != list(sort):
+        return False
+    signs = {d * sort[f] for f, d in rest}
+    return len(signs) == 1
+
+
+SHAPES = list(iter_query_shapes())
+
+
+@pytest.mark.parametrize("coll_name,shape,pipeline", SHAPES, ids=[f"{c}:{s}" for c, s, _ in SHAPES])
+def test_query_shape_has_index(coll_name, shape, pipeline):
+    match = pipeline[0]["$match"]
+    sort = next((stage["$sort"] for stage in pipeline if "$sort" in stage), None)
+    eq: set = set()
+    ranged: set = set()
+    _filter_fields(match, eq, ranged)
+    serving = [spec["name"] for spec in INDEXES[coll_name] if _serves(spec["keys"], eq, ranged, sort)]
+    assert serving, f"{coll_name} shape {shape} has no index (COLLSCAN or in-memory SORT)"
+
+
+def test_stand_in_detects_missing_index():
+    """Sanity check of the stand-in itself: an unindexed filter and a wrong sort are rejected."""
+    keys = [("user_id", 1), ("timestamp", -1), ("_id", -1)]
+    assert _serves(keys, {"user_id"}, set(), {"timestamp": 1, "_id": 1})
+    assert not _serves(keys, {"status"}, set(), {"timestamp": -1, "_id": -1})
+    assert not _serves(keys, {"user_id"}, set(), {"timestamp": -1, "_id": 1})
+    assert not _serves([("timestamp", -1), ("_id", -1)], {"level"}, set(), None)
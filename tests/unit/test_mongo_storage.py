@@ -0,0 +1,216 @@
+"""Unit tests for log retention (TTL) and the time-series migration, against an in-memory fake."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.config import settings
+from app.db.mongo_storage import (
+    TTL_INDEX_NAME,
+    apply_log_retention,
+    get_retention_days,
+    migrate_to_timeseries,
+)
+from app.db.sqlite import init_sqlite
+from app.services.app_settings import set_setting
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, n):
+        return self.docs[:n] if n is not None else self.docs
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+        self.docs: list[dict] = []
+        self.indexes: dict[str, dict] = {"_id_": {"key": [("_id", 1)]}}
+
+    async def index_information(self):
+        return dict(self.indexes)
+
+    async def create_index(self, keys, name, **kwargs):
+        self.indexes[name] = {"key": keys, **kwargs}
+
+    async def drop_index(self, name):
+        del self.indexes[name]
+
+    async def rename(self, new_name):
+        self.db.colls[new_name] = self.db.colls.pop(self.name)
+        self.name = new_name
+
+    def find(self, query, projection=None):
+        docs = self.docs
+        if "$gt" in query.get("_id", {}):
+            docs = [d for d in docs if d["_id"] > query["_id"]["$gt"]]
+        if "$in" in query.get("_id", {}):
+            docs = [d for d in docs if d["_id"] in query["_id"]["$in"]]
+        return FakeCursor(list(docs))
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    async def find_one(self, query):
+        return next((d for d in self.docs if d["_id"] == query["_id"]), None)
+
+    async def update_one(self, query, update, upsert=False):
+        doc = await self.find_one(query)
+        if doc is None:
+            doc = {"_id": query["_id"]}
+            self.docs.append(doc)
+        doc.update(update["$set"])
+
+    async def delete_one(self, query):
+        self.docs = [d for d in self.docs if d["_id"] != query["_id"]]
+
+    async def drop(self):
+        self.db.colls.pop(self.name, None)
+
+
+class FakeMongoDb:
+    def __init__(self):
+        self.colls: dict[str, FakeCollection] = {}
+        self.types: dict[str, str] = {}
+        self.commands: list[tuple] = []
+
+    def __getitem__(self, name):
+        if name not in self.colls:
+            self.colls[name] = FakeCollection(self, name)
+        return self.colls[name]
+
+    async def list_collection_names(self, filter=None):
+        return [n for n in self.colls if not filter or n == filter["name"]]
+
+    async def list_collections(self, filter=None):
+        infos = [
+            {"name": n, "type": self.types.get(n, "collection")}
+            for n in self.colls
+            if not filter or n == filter["name"]
+        ]
+
+        async def gen():
+            for i in infos:
+                yield i
+
+        return gen()
+
+    async def create_collection(self, name, timeseries=None, **kwargs):
+        self[name]
+        if timeseries:
+            self.types[name] = "timeseries"
+
+    async def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+
+@pytest.mark.asyncio
+async def test_retention_days_prefers_admin_setting_over_env(tmp_path, monkeypatch):
+    settings.sqlite_path = str(tmp_path / "retention.db")
+    await init_sqlite()
+    monkeypatch.setattr(settings, "worker_logs_retention_days", 14)
+    assert get_retention_days("worker_logs") == 14
+    assert get_retention_days("message_logs") is None
+
+    import aiosqlite
+
+    async with aiosqlite.connect(settings.sqlite_path) as db:
+        await set_setting(db, "worker_logs_retention_days", "0")
+        await set_setting(db, "message_logs_retention_days", "90")
+    assert get_retention_days("worker_logs") is None  # explicit "keep forever" beats env
+    assert get_retention_days("message_logs") == 90
+
+
+@pytest.mark.asyncio
+async def test_apply_log_retention_ttl_index_transitions():
+    db = FakeMongoDb()
+    coll = db["worker_logs"]
+    await coll.create_index([("timestamp", 1)], name=TTL_INDEX_NAME)
+
+    await apply_log_retention(db, "worker_logs", 30)  # plain -> TTL: rebuilt
+    assert coll.indexes[TTL_INDEX_NAME]["expireAfterSeconds"] == 30 * 86400
+    assert db.commands == []
+
+    await apply_log_retention(db, "worker_logs", 7)  # TTL -> TTL: collMod only
+    (args, kwargs), = db.commands
+    assert args == ("collMod", "worker_logs")
+    assert kwargs["index"] == {"name": TTL_INDEX_NAME, "expireAfterSeconds": 7 * 86400}
+
+    await apply_log_retention(db, "worker_logs", None)  # TTL -> keep forever
+    assert "expireAfterSeconds" not in coll.indexes[TTL_INDEX_NAME]
+
+
+@pytest.mark.asyncio
+async def test_apply_log_retention_timeseries_uses_collection_expiry():
+    db = FakeMongoDb()
+    await db.create_collection("message_logs", timeseries={"timeField": "timestamp"})
+    await apply_log_retention(db, "message_logs", 10)
+    await apply_log_retention(db, "message_logs", None)
+    assert [c[1]["expireAfterSeconds"] for c in db.commands] == [864000, "off"]
+
+
+@pytest.mark.asyncio
+async def test_migrate_to_timeseries_copies_in_batches_and_resumes(tmp_path):
+    settings.sqlite_path = str(tmp_path / "migrate.db")
+    await init_sqlite()
+    db = FakeMongoDb()
+    base = datetime(2024, 1, 1)
+    legacy_docs = [{"_id": ObjectId(), "user_id": 1, "timestamp": base + timedelta(minutes=i)} for i in range(7)]
+    legacy_docs.append({"_id": ObjectId(), "user_id": 1})  # no timestamp: cannot be stored
+    db["worker_logs"].docs = list(legacy_docs)
+
+    seen = []
+    result = await migrate_to_timeseries(db, "worker_logs", batch_size=3, progress=lambda d, t: seen.append(d))
+    assert result == {"collection": "worker_logs", "status": "migrated", "copied": 7, "skipped": 1}
+    assert db.types["worker_logs"] == "timeseries"
+    assert len(db["worker_logs"].docs) == 7
+    assert len(db["worker_logs_legacy"].docs) == 8
+    assert seen == [3, 6, 8]
+
+    # Rerun resumes from the checkpoint: nothing is copied twice.
+    again = await migrate_to_timeseries(db, "worker_logs", batch_size=3, drop_legacy=True)
+    assert again["copied"] == 7
+    assert again["status"] == "migrated_legacy_dropped"
+    assert len(db["worker_logs"].docs) == 7
+    assert "worker_logs_legacy" not in db.colls
+
+    done = await migrate_to_timeseries(db, "worker_logs")
+    assert done["status"] == "already_timeseries"
+
+
+@pytest.mark.asyncio
+async def test_migrate_to_timeseries_does_not_duplicate_a_batch_copied_before_its_checkpoint(tmp_path):
+    settings.sqlite_path = str(tmp_path / "migrate.db")
+    await init_sqlite()
+    db = FakeMongoDb()
+    base = datetime(2024, 1, 1)
+    db["worker_logs"].docs = [{"_id": ObjectId(), "user_id": 1, "timestamp": base + timedelta(minutes=i)} for i in range(5)]
+
+    async def interrupted(*args, **kwargs):
+        raise ConnectionError("interrupted after insert_many")
+
+    db["_log_migrations"].update_one = interrupted
+    with pytest.raises(ConnectionError):
+        await migrate_to_timeseries(db, "worker_logs", batch_size=3)
+    assert len(db["worker_logs"].docs) == 3
+    del db["_log_migrations"].update_one
+
+    result = await migrate_to_timeseries(db, "worker_logs", batch_size=3)
+    assert result["copied"] == 5
+    assert sorted(d["_id"] for d in db["worker_logs"].docs) == sorted(d["_id"] for d in db["worker_logs_legacy"].docs)
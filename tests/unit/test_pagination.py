@@ -0,0 +1,93 @@
+"""Unit tests for keyset pagination helpers and the indexes behind list sort orders."""
+
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+from app.config import settings
+from app.db.pagination import (
+    after_condition,
+    key_cursor,
+    next_cursor,
+    order_by,
+    parse_key_cursor,
+    sort_columns,
+)
+from app.db.sqlite import get_sqlite, init_sqlite
+from app.utils.cursor import encode_cursor
+from app.web.routers import accounts as accounts_router
+from app.web.routers import mappings as mappings_router
+
+NULLABLE_SORTS = {"name", "created_at"}
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    cursor = key_cursor(["Crypto, news", 42])
+    assert parse_key_cursor(cursor, 2) == ["Crypto, news", 42]
+    assert parse_key_cursor(key_cursor([None, 1]), 2) == [None, 1]
+    bad_tokens = ("%%%", key_cursor([1]), key_cursor([{"a": 1}, 2]), encode_cursor({"ts": "x"}), "bm90anNvbg")
+    for bad in bad_tokens:
+        with pytest.raises(ValueError):
+            parse_key_cursor(bad, 2)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_walk_matches_full_order_with_nulls(descending):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany(
+        "INSERT INTO t (id, name) VALUES (?, ?)",
+        [(i, None if i % 4 == 0 else f"n{i % 3}") for i in range(1, 30)],
+    )
+    keys = sort_columns("name")
+    order = order_by(keys, descending)
+    expected = [r[0] for r in conn.execute(f"SELECT id FROM t {order}")]
+
+    seen, cursor = [], None
+    while True:
+        where, params = "", []
+        if cursor is not None:
+            cond, params = after_condition(keys, parse_key_cursor(cursor, 2), descending)
+            where = f"WHERE {cond}"
+        rows = conn.execute(f"SELECT name, id FROM t {where} {order} LIMIT ?", [*params, 5]).fetchall()
+        seen += [r[1] for r in rows[:4]]
+        cursor = next_cursor(rows, 4, [0, 1])
+        if cursor is None:
+            break
+    assert seen == expected
+    conn.close()
+
+
+@pytest.mark.asyncio
+async def test_every_list_sort_order_is_served_by_an_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_path", str(tmp_path / "plans.db"))
+    await init_sqlite()
+    db = await get_sqlite()
+    try:
+        for table, allowed in (
+            ("channel_mappings", mappings_router._ALLOWED_SORT),
+            ("telegram_accounts", accounts_router._ALLOWED_SORT),
+        ):
+            for col in sorted(allowed):
+                keys = sort_columns(col)
+                for descending in (False, True):
+                    for scoped in (True, False):
+                        # Only nullable columns can produce a NULL cursor key.
+                        afters = [None, ["x", 1][-len(keys):]] + ([[None, 1]] if col in NULLABLE_SORTS else [])
+                        for after in afters:
+                            conditions, params = (["user_id = ?"], [1]) if scoped else ([], [])
+                            if after is not None:
+                                cond, cond_params = after_condition(keys, after, descending)
+                                conditions.append(cond)
+                                params += cond_params
+                            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+                            async with db.execute(
+                                f"EXPLAIN QUERY PLAN SELECT * FROM {table} {where} {order_by(keys, descending)} LIMIT 20",
+                                params,
+                            ) as cur:
+                                plan = " | ".join(r[3] for r in await cur.fetchall())
+                            assert "TEMP B-TREE" not in plan, (table, col, descending, scoped, after, plan)
+    finally:
+        await db.close()
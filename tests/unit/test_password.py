@@ -0,0 +1,91 @@
+"""Unit tests for the bounded bcrypt pool in app.auth.password."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.auth import password as pw
+from app.config import settings
+
+
+@pytest.fixture(autouse=True)
+def _fresh_pool():
+    pw.shutdown_password_executor()
+    yield
+    pw.shutdown_password_executor()
+
+
+def test_async_roundtrip_runs_on_bcrypt_threads(monkeypatch):
+    seen: list[str] = []
+    real = pw.verify_password
+
+    def _spy(plain, hashed):
+        seen.append(threading.current_thread().name)
+        return real(plain, hashed)
+
+    monkeypatch.setattr(pw, "verify_password", _spy)
+
+    async def _run():
+        hashed = await pw.hash_password_async("secret")
+        return hashed, await pw.verify_password_async("secret", hashed), await pw.verify_password_async("x", hashed)
+
+    hashed, ok, bad = asyncio.run(_run())
+    assert hashed.startswith("$2")
+    assert ok is True and bad is False
+    assert seen and all(name.startswith("bcrypt") for name in seen)
+    assert asyncio.run(pw.verify_password_async("secret", None)) is False
+    assert pw.password_ops_in_flight() == 0
+
+
+def test_rejects_when_pending_limit_reached(monkeypatch):
+    monkeypatch.setattr(settings, "password_hash_max_pending", 2)
+    gate = threading.Event()
+
+    def _slow(plain, hashed):
+        gate.wait(5)
+        return True
+
+    monkeypatch.setattr(pw, "verify_password", _slow)
+
+    async def _run():
+        first = [asyncio.create_task(pw.verify_password_async("a", "h")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(pw.PasswordHasherBusy):
+            await pw.verify_password_async("a", "h")
+        gate.set()
+        assert await asyncio.gather(*first) == [True, True]
+
+    asyncio.run(_run())
+    assert pw.password_ops_in_flight() == 0
+
+
+def test_event_loop_keeps_ticking_during_hashing():
+    hashed = pw.hash_password("secret")
+    started = time.perf_counter()
+    pw.verify_password("secret", hashed)
+    inline_cost = time.perf_counter() - started
+
+    async def _run():
+        gaps: list[float] = []
+        done = asyncio.Event()
+
+        async def _probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                gaps.append(time.perf_counter() - start)
+
+        probe = asyncio.create_task(_probe())
+        await asyncio.gather(*(pw.verify_password_async("secret", hashed) for _ in range(3)))
+        done.set()
+        await probe
+        return gaps
+
+    gaps = asyncio.run(_run())
+    # Inline bcrypt would stall the loop for at least one full verify.
+    assert len(gaps) > 5
+    assert max(gaps) < inline_cost / 2
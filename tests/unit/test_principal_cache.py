@@ -0,0 +1,71 @@
+"""Unit tests for the token memo and principal cache used by get_current_user."""
+
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+
+from app.auth import create_access_token
+from app.auth import principal_cache as pc
+from app.config import settings
+
+
+@pytest.fixture(autouse=True)
+def _clean_caches():
+    pc.clear_auth_caches()
+    yield
+    pc.clear_auth_caches()
+
+
+def test_token_memo_skips_reverification():
+    tok = create_access_token(sub="a@test.com", user_id=7, role="user")
+    with patch("app.auth.principal_cache.decode_token", wraps=pc.decode_token) as decode:
+        assert pc.decode_access_token(tok)["user_id"] == 7
+        assert pc.decode_access_token(tok)["user_id"] == 7
+    assert decode.call_count == 1
+
+
+def test_token_memo_rejects_tampered_payload_with_cached_signature():
+    tok = create_access_token(sub="a@test.com", user_id=7, role="user")
+    pc.decode_access_token(tok)
+    header, payload, signature = tok.split(".")
+    forged = ".".join([header, payload[:-2] + "AA", signature])
+    assert pc.decode_access_token(forged) is None
+
+
+def test_token_memo_drops_expired_tokens():
+    tok = create_access_token(sub="a@test.com", user_id=7, role="user")
+    pc.decode_access_token(tok)
+    with patch("app.auth.principal_cache.time.time", return_value=10**12):
+        with patch("app.auth.principal_cache.decode_token", return_value=None):
+            assert pc.decode_access_token(tok) is None
+
+
+def test_principal_cache_ttl_and_invalidation():
+    user = {"id": 1, "role": "user"}
+    pc.cache_principal(1, user, pc.principal_version(1))
+    cached = pc.get_cached_principal(1)
+    assert cached == user
+    cached["role"] = "admin"  # callers get a copy
+    assert pc.get_cached_principal(1)["role"] == "user"
+
+    pc.invalidate_principal(1)
+    assert pc.get_cached_principal(1) is None
+
+    pc.cache_principal(1, user, pc.principal_version(1))
+    with patch("app.auth.principal_cache.time.monotonic", return_value=10**12):
+        assert pc.get_cached_principal(1) is None  # past the TTL
+
+
+def test_load_racing_an_invalidation_is_not_cached():
+    version = pc.principal_version(1)  # request starts loading the row
+    pc.invalidate_principal(1)  # concurrent update commits
+    pc.cache_principal(1, {"id": 1, "role": "user"}, version)  # stale load finishes
+    assert pc.get_cached_principal(1) is None
+
+
+def test_ttl_zero_disables_principal_cache(monkeypatch):
+    monkeypatch.setattr(settings, "auth_principal_cache_ttl_seconds", 0)
+    pc.cache_principal(1, {"id": 1}, pc.principal_version(1))
+    assert pc.get_cached_principal(1) is None
@@ -0,0 +1,49 @@
+"""Unit tests for the in-process sampling profiler."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from app.utils import profiler
+
+
+def _spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_busy_thread_shows_up_in_collapsed_stacks():
+    stop = threading.Event()
+    t = threading.Thread(target=_spin, args=(stop,), name="spinner")
+    t.start()
+    try:
+        result = profiler.sample(0.5, 100)
+    finally:
+        stop.set()
+        t.join()
+    assert result["samples"] > 10
+    lines = result["collapsed"].splitlines()
+    spinner = [line for line in lines if line.startswith("spinner;")]
+    assert spinner and all("_spin (unit/test_profiler.py:" in line for line in spinner)
+    stack, count = spinner[0].rsplit(" ", 1)
+    assert int(count) > 0 and stack.split(";")[1].startswith("Thread._bootstrap")
+    assert result["overhead_pct"] < 50
+
+
+def test_stop_event_ends_sampling_early():
+    stop = threading.Event()
+    stop.set()
+    started = time.monotonic()
+    result = profiler.sample(30, 100, stop=stop)
+    assert time.monotonic() - started < 1
+    assert result["samples"] == 0 and result["collapsed"] == ""
+
+
+def test_distinct_stacks_are_capped(monkeypatch):
+    monkeypatch.setattr(profiler, "MAX_STACKS", 0)
+    results = []
+    t = threading.Thread(target=lambda: results.append(profiler.sample(0.2, 50)))
+    t.start()
+    t.join()  # the main thread, waiting here, is what gets sampled
+    assert results[0]["collapsed"].startswith("MainThread;[more stacks] ")
@@ -0,0 +1,97 @@
+"""Unit tests for the pooled SQLite connections (WAL, pragmas, serialized writer, read-only readers)."""
+
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.config import settings
+from app.db.sqlite import (
+    SqlitePool,
+    close_sqlite_pool,
+    get_sqlite,
+    init_sqlite,
+    open_sqlite_pool,
+    sqlite_writer,
+)
+
+
+@pytest.fixture
+async def pool(tmp_path):
+    settings.sqlite_path = str(tmp_path / "pool.db")
+    await init_sqlite()
+    p = SqlitePool(settings.sqlite_path, readers=2)
+    await p.open()
+    yield p
+    await p.close()
+
+
+@pytest.mark.asyncio
+async def test_connections_use_wal_and_tuned_pragmas(pool):
+    async with pool.writer() as db:
+        async with db.execute("PRAGMA journal_mode") as cur:
+            assert (await cur.fetchone())[0] == "wal"
+        async with db.execute("PRAGMA busy_timeout") as cur:
+            assert (await cur.fetchone())[0] == settings.sqlite_busy_timeout_ms
+    async with pool.reader().execute("PRAGMA synchronous") as cur:
+        assert (await cur.fetchone())[0] == 1  # NORMAL
+    db = await get_sqlite()
+    try:
+        async with db.execute("PRAGMA busy_timeout") as cur:
+            assert (await cur.fetchone())[0] == settings.sqlite_busy_timeout_ms
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_readers_are_read_only_and_see_committed_writes(pool):
+    async with pool.writer() as db:
+        await db.execute("INSERT INTO users (email) VALUES ('a@test.com')")
+        await db.commit()
+    for _ in range(2):  # both readers in the rotation
+        reader = pool.reader()
+        async with reader.execute("SELECT COUNT(*) FROM users") as cur:
+            assert (await cur.fetchone())[0] == 1
+        with pytest.raises(sqlite3.OperationalError):
+            await reader.execute("INSERT INTO users (email) VALUES ('b@test.com')")
+
+
+@pytest.mark.asyncio
+async def test_writer_is_serialized_and_rolls_back_unfinished_transactions(pool):
+    order: list[str] = []
+
+    async def request(name: str, commit: bool):
+        async with pool.writer() as db:
+            order.append(f"{name}-start")
+            await db.execute("INSERT INTO users (email) VALUES (?)", (f"{name}@test.com",))
+            await asyncio.sleep(0.01)
+            if commit:
+                await db.commit()
+            order.append(f"{name}-end")
+
+    await asyncio.gather(request("a", commit=False), request("b", commit=True))
+    assert order == ["a-start", "a-end", "b-start", "b-end"]
+    async with pool.reader().execute("SELECT email FROM users") as cur:
+        assert [r[0] for r in await cur.fetchall()] == ["b@test.com"]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_writer_takes_the_pool_writer_only_for_its_block(tmp_path):
+    settings.sqlite_path = str(tmp_path / "writer.db")
+    await init_sqlite()
+    async with sqlite_writer() as db:  # no pool open: a connection of its own
+        await db.execute("INSERT INTO users (email) VALUES ('a@test.com')")
+        await db.commit()
+    pool = await open_sqlite_pool()
+    try:
+        async with sqlite_writer() as db:
+            assert pool._write_lock.locked()
+            await db.execute("INSERT INTO users (email) VALUES ('b@test.com')")
+            await db.commit()
+        assert not pool._write_lock.locked()
+        async with pool.reader().execute("SELECT COUNT(*) FROM users") as cur:
+            assert (await cur.fetchone())[0] == 2
+    finally:
+        await close_sqlite_pool()
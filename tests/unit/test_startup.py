@@ -0,0 +1,48 @@
+"""Unit tests for the lightweight CLI entry path and startup profiling."""
+
+from __future__ import annotations
+
+import io
+import json
+import subprocess
+import sys
+
+from app.utils import startup_profile
+
+
+def test_cli_entry_does_not_import_the_web_stack():
+    code = (
+        "import json, sys, app.main; "
+        "print(json.dumps(sorted({m.split('.')[0] for m in sys.modules} & {'fastapi', 'uvicorn', 'jose', 'bcrypt'})"
+        " + sorted(m for m in sys.modules if m.startswith('app.web'))))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert json.loads(out) == []
+
+
+def test_phase_records_time_and_imported_packages(monkeypatch):
+    monkeypatch.setattr(startup_profile, "_phases", [])
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+    with startup_profile.phase("import colorsys"):
+        import colorsys  # noqa: F401
+    (phase,) = startup_profile.phases()
+    assert phase.name == "import colorsys"
+    assert phase.modules >= 1 and ("colorsys", 1) in phase.packages
+    assert phase.seconds >= 0
+
+
+def test_report_prints_only_when_enabled(monkeypatch):
+    monkeypatch.setattr(startup_profile, "_phases", [])
+    monkeypatch.setattr(startup_profile, "_enabled", False)
+    with startup_profile.phase("init sqlite"):
+        pass
+    out = io.StringIO()
+    startup_profile.report(out)
+    assert out.getvalue() == ""
+
+    startup_profile.enable()
+    startup_profile.report(out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith("startup profile")
+    assert lines[1].split()[:2] == ["init", "sqlite"]
+    assert lines[-1].split()[0] == "total"
@@ -0,0 +1,102 @@
+"""Unit tests for the worker drain on SIGTERM and the supervisor's drain deadline."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.web.routers import workers
+from app.worker_drain import EXIT_DRAIN_INCOMPLETE, Drain
+
+
+def _event(chat_id: int, msg_id: int):
+    return SimpleNamespace(chat_id=chat_id, message=SimpleNamespace(id=msg_id))
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_in_flight_calls_and_skips_new_updates():
+    release = asyncio.Event()
+    handled: list[int] = []
+
+    async def handler(event):
+        await release.wait()
+        handled.append(event.message.id)
+
+    drain = Drain()
+    wrapped = drain.wrap(handler)
+    task = asyncio.create_task(wrapped(_event(10, 1)))
+    await asyncio.sleep(0)
+    assert drain.inflight() == ["chat 10 msg 1"]
+
+    draining = asyncio.create_task(drain.drain(timeout=5))
+    await asyncio.sleep(0)
+    await wrapped(_event(10, 2))  # arrives after SIGTERM: not handled
+    release.set()
+    assert await draining is True
+    await task
+    assert handled == [1]
+    assert drain.skipped == 1
+
+
+@pytest.mark.asyncio
+async def test_drain_deadline_reports_unfinished_messages(caplog):
+    async def handler(_event):
+        await asyncio.sleep(10)
+
+    drain = Drain()
+    task = asyncio.create_task(drain.wrap(handler)(_event(10, 7)))
+    await asyncio.sleep(0)
+    with caplog.at_level(logging.WARNING, logger="app.worker_drain"):
+        assert await drain.drain(timeout=0.05) is False
+    assert "chat 10 msg 7" in caplog.text
+    task.cancel()
+
+
+def test_sigterm_requests_drain():
+    script = (
+        "import asyncio, os, signal\n"
+        "from app.worker_drain import Drain\n"
+        "async def main():\n"
+        "    drain = Drain()\n"
+        "    drain.install_signal_handlers()\n"
+        "    os.kill(os.getpid(), signal.SIGTERM)\n"
+        "    await asyncio.wait_for(drain.requested.wait(), 5)\n"
+        "asyncio.run(main())\n"
+    )
+    assert subprocess.run([sys.executable, "-c", script], timeout=30).returncode == 0
+
+
+@pytest.mark.asyncio
+async def test_terminate_honours_drain_deadline(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "worker_drain_timeout_seconds", 2.0)
+    monkeypatch.setattr(workers, "STOP_GRACE_SECONDS", 0.0)
+    # Drains in 0.3 s: inside the deadline, so it is not killed and its status is reported.
+    draining = subprocess.Popen([
+        sys.executable, "-c",
+        "import signal, sys, time\n"
+        "signal.signal(signal.SIGTERM, lambda *_: (time.sleep(0.3), sys.exit(%d)))\n"
+        "time.sleep(30)\n" % EXIT_DRAIN_INCOMPLETE,
+    ])
+    time.sleep(0.5)
+    w = {"id": "w1", "process": draining, "pid": draining.pid}
+    with caplog.at_level(logging.WARNING, logger="app.web.routers.workers"):
+        await workers._terminate_worker(w)
+    assert draining.returncode == EXIT_DRAIN_INCOMPLETE
+    assert "drain finished" in caplog.text
+
+    monkeypatch.setattr(settings, "worker_drain_timeout_seconds", 0.3)
+    stuck = subprocess.Popen([
+        sys.executable, "-c", "import signal, time\nsignal.signal(signal.SIGTERM, signal.SIG_IGN)\ntime.sleep(30)\n",
+    ])
+    time.sleep(0.5)
+    started = time.monotonic()
+    await workers._terminate_worker({"id": "w2", "process": stuck, "pid": stuck.pid})
+    assert stuck.returncode == -9
+    assert time.monotonic() - started < 5
@@ -0,0 +1,123 @@
+"""Unit tests for worker runtime stats and their heartbeat rows (publish, relay read, summary)."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from app.config import settings
+from app.db import message_traces, worker_heartbeats
+from app.db.sqlite import get_sqlite, init_sqlite
+from app.worker import _publish_heartbeat
+from app.worker_drain import Drain
+from app.worker_stats import WorkerStats
+from app.worker_traces import Tracer
+
+
+@pytest.fixture
+async def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_path", str(tmp_path / "heartbeats.db"))
+    await init_sqlite()
+    conn = await get_sqlite()
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+def test_snapshot_counts_outcomes_per_mapping_and_resets_loop_lag():
+    stats = WorkerStats()
+    stats.update_received()
+    stats.count(1, "in")
+    stats.count(1, "out")
+    stats.count(2, "in")
+    stats.count(2, "filtered")
+    stats.loop_monitor._lag_max = 0.25
+
+    snap = stats.snapshot(inflight=1)
+    assert snap["mappings"] == {
+        "1": {"in": 1, "out": 1, "filtered": 0, "failed": 0},
+        "2": {"in": 1, "out": 0, "filtered": 1, "failed": 0},
+    }
+    assert snap["last_update_at"] is not None and snap["last_send_at"] is not None
+    assert snap["loop_lag_ms"] == 250.0 and (snap["inflight"], snap["log_queue"]) == (1, None)
+    assert snap["rss_bytes"] > 0
+    assert stats.snapshot()["loop_lag_ms"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_published_heartbeat_is_read_back_and_summarized(db):
+    stats = WorkerStats()
+    stats.count(7, "in")
+    stats.count(7, "failed")
+    task = asyncio.create_task(_publish_heartbeat(db, 3, 2, stats, Drain(), None))
+    try:
+        for _ in range(50):
+            if await worker_heartbeats.get_heartbeats(db, [3]):
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        task.cancel()
+
+    hb = (await worker_heartbeats.get_heartbeats(db, [3]))[3]
+    assert (hb["generation"], hb["inflight"], hb["log_queue"]) == (2, 0, None)
+    assert worker_heartbeats.read_local(settings.sqlite_path, [3, 4]) == {3: hb}
+    assert await worker_heartbeats.get_heartbeats(db, []) == {}
+
+    summary = worker_heartbeats.summarize(hb, now=hb["updated_at"] + 4)
+    assert summary["age_seconds"] == 4.0
+    assert summary["messages"] == {"in": 1, "out": 0, "filtered": 0, "failed": 1}
+    assert summary["slow_callbacks"] == []
+    assert worker_heartbeats.summarize(None) is None
+
+
+def test_read_local_without_database_is_empty(tmp_path):
+    assert worker_heartbeats.read_local(str(tmp_path / "missing.db"), [1]) == {}
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_sampler_sees_a_blocked_loop():
+    stats = WorkerStats()
+    task = asyncio.create_task(stats.sample_loop_lag(interval=0.01))
+    await asyncio.sleep(0)
+    time.sleep(0.1)  # block the event loop
+    await asyncio.sleep(0.03)
+    task.cancel()
+    assert stats.snapshot()["loop_lag_ms"] >= 50
+
+
+def test_tracer_samples_and_bounds_pending_traces():
+    assert Tracer(0.0).start() is None
+    tracer = Tracer(1.0, pending=2)
+    for i in range(3):
+        trace = tracer.start(message_id=i)
+        t = time.perf_counter()
+        trace.span("send", t, t + 0.01, 4)
+        trace.mapping_done(4, "filtered" if i else "failed", t)
+        trace.mapping_done(5, "sent", t)
+        tracer.finish(trace)
+    traces = tracer.drain()
+    assert [t["attributes"]["message_id"] for t in traces] == [1, 2]
+    assert [t["outcome"] for t in traces] == ["sent", "sent"]
+    assert traces[0]["spans"][0]["duration_ms"] == 10.0
+    assert tracer.drain() == []
+
+
+@pytest.mark.asyncio
+async def test_published_traces_are_stored_once_and_relayed(db):
+    stats = WorkerStats(trace_sample_rate=1.0)
+    trace = stats.tracer.start(message_id=1)
+    trace.mapping_done(7, "sent", time.perf_counter())
+    stats.tracer.finish(trace)
+    hb = {"account_id": 3, "generation": 1, **stats.snapshot()}
+    await worker_heartbeats.publish(db, hb)
+    await worker_heartbeats.publish(db, hb)
+
+    stored = await message_traces.list_traces(db, [3])
+    assert [t["trace_id"] for t in stored] == [trace.trace_id]
+    assert stored[0]["spans"][0]["mapping_id"] == 7
+    relayed = worker_heartbeats.read_local(settings.sqlite_path, [3], traces_since=trace.started_at - 1)
+    assert [t["trace_id"] for t in relayed[3]["traces"]] == [trace.trace_id]
+    assert "traces" not in worker_heartbeats.read_local(settings.sqlite_path, [3])[3]
@@ -0,0 +1,114 @@
+"""Unit tests for the pre-forked worker zygote (socket protocol, fork, log redirect, reaping)."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from app import worker_zygote
+from app.web.routers import workers
+
+pytestmark = pytest.mark.skipif(not worker_zygote.supported(), reason="needs fork and AF_UNIX")
+
+# The forked child imports run_worker_sync from app.worker after fork, so patching it in the zygote
+# replaces the Telegram worker with one that records its arguments.
+ZYGOTE_SCRIPT = """
+import json, sys, time
+import app.worker
+
+def fake_run_worker_sync(**kwargs):
+    print("worker stderr line", file=sys.stderr)
+    with open(kwargs["session_path"] + ".ran", "w") as f:
+        json.dump(kwargs, f)
+    time.sleep(float(sys.argv[2]))
+
+app.worker.run_worker_sync = fake_run_worker_sync
+from app.worker_zygote import serve
+serve(sys.argv[1])
+"""
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+@pytest.fixture
+def zygote(tmp_path):
+    sock = tmp_path / "z.sock"
+    proc = subprocess.Popen([sys.executable, "-c", ZYGOTE_SCRIPT, str(sock), "0.2"])
+    try:
+        assert _wait_for(sock.exists), "zygote did not bind its socket"
+        yield proc, str(sock)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    assert not sock.exists()
+
+
+@pytest.mark.asyncio
+async def test_spawn_forks_worker_with_args_and_log(zygote, tmp_path):
+    proc, sock = zygote
+    session = tmp_path / "acc.session"
+    log_path = tmp_path / "worker.log"
+
+    pid = await worker_zygote.spawn(sock, user_id=7, session_path=str(session), account_id=3, log_path=str(log_path))
+
+    assert pid is not None and pid != proc.pid
+    ran = tmp_path / "acc.session.ran"
+    assert _wait_for(ran.exists)
+    assert json.loads(ran.read_text()) == {
+        "user_id": 7, "session_path": str(session), "telegram_account_id": 3, "lease_generation": None
+    }
+    # The zygote reaps exited workers, so kill(pid, 0) (how the API waits for a stopped worker) fails.
+    assert _wait_for(lambda: not _pid_alive(pid))
+    assert "worker stderr line" in log_path.read_text()
+    assert proc.poll() is None
+
+
+@pytest.mark.asyncio
+async def test_ping_and_bad_requests(zygote):
+    proc, sock = zygote
+    assert await worker_zygote.request(sock, {"cmd": "ping"}) == {"pid": proc.pid}
+    assert "error" in await worker_zygote.request(sock, {"cmd": "nope"})
+    assert "error" in await worker_zygote.request(sock, {"cmd": "run", "user_id": 1})
+
+
+@pytest.mark.asyncio
+async def test_spawn_returns_none_without_zygote(tmp_path):
+    assert await worker_zygote.spawn(str(tmp_path / "missing.sock"), 1, "x.session", 1, str(tmp_path / "l.log")) is None
+
+
+@pytest.mark.asyncio
+async def test_stopping_the_zygote_does_not_block_the_event_loop(monkeypatch):
+    monkeypatch.setattr(worker_zygote, "stop", lambda: time.sleep(0.3))  # a zygote slow to exit
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    await workers.stop_worker_zygote()
+    ticker.cancel()
+    assert ticks >= 10